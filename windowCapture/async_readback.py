@@ -0,0 +1,131 @@
+import collections
+from capture_backend import CaptureBackend, EventLoopThread
+
+
+# =======================================================
+# リードバックのパイプライン化（最大 depth 個を並行に読み出す）
+# =======================================================
+class PipelinedBackend(CaptureBackend):
+    """内側のバックエンドのフレームに対して frame.readback_async() を最大 depth 個まで並行に走らせる。
+
+    読み出しが済んだフレームを到着順に next_frame で返すので、フレーム N の変換中に
+    N+1 以降の読み出しが進む。depth 個走っている間は内側から取り出さない(内側のフレームプールが
+    埋まればそれ以上は溜まらない)のがバックプレッシャーになる。
+
+    readback_async は任意の awaitable でよく、イベントループ(EventLoopThread)で実行する。
+    metrics(Metrics)を渡すとステージ時間を "readback_async"(開始 → 完了) / "queued"(完了 → 取り出し) で記録する
+    (None なら計測しない)。
+    plan に FramePipeline.plan_reduce を渡すと、読み出しを始める前にフレームの reduce を決める。
+    coalesce を True にすると(ポリシーが "every" 以外のとき)、内側に溜まったフレームのうち最新のものだけを
+    読み出し、それより古いものは読み出さずに閉じる(どうせスケジューラが捨てるので)。その場合でも depth 2 以上では
+    読み終えたのに使われないフレームが出て遅くなるので、"every" 以外は depth 1 で使う(python -m bench readback)。
+    """
+    name = "pipelined"
+
+    def __init__(self, inner, depth=2, loop=None, metrics=None, coalesce=False):
+        super().__init__()
+        if depth < 1:
+            raise ValueError("depth must be >= 1")
+        self.inner, self.depth, self.loop = inner, depth, loop
+        self.metrics = metrics
+        self._own_loop = False
+        self.plan = None
+        self.coalesce = coalesce
+        self._inflight = collections.deque()    # [frame, future, 開始時刻, 完了時刻]
+        self.errors = 0
+        self.max_inflight = 0
+        self.readbacks = 0      # 読み出しを始めたフレーム数
+        self.superseded = 0     # coalesce で読み出さずに閉じたフレーム数
+        if hasattr(inner, "buffers"):
+            # 読み出し中のフレームもプールのバッファを使うので 1 つ余分に持たせる
+            inner.buffers = max(inner.buffers, depth + 1)
+
+    def open(self):
+        self.inner.on_frame_arrived(self._notify_arrived)
+        self.inner.on_resize(self._set_size)
+        self.inner.open()
+        self.size = self.inner.size
+        if self.loop is None:
+            shared = getattr(self.inner, "loop", None)
+            if isinstance(shared, EventLoopThread):
+                self.loop = shared
+            else:
+                self.loop, self._own_loop = EventLoopThread(), True
+
+    def start(self):
+        self.inner.start()
+
+    def _ready(self, item):
+        m = self.metrics
+        if m: item[3] = m.clock()
+        self._notify_arrived()
+
+    def _take(self):
+        f = self.inner.next_frame()
+        if not self.coalesce: return f
+        while f is not None:
+            g = self.inner.next_frame()
+            if g is None: break
+            f.close()
+            self.superseded += 1
+            f = g
+        return f
+
+    def _fill(self):
+        while len(self._inflight) < self.depth:
+            f = self._take()
+            if f is None: return
+            plan = self.plan and self.plan(f.width, f.height)
+            if plan: f.reduce(*plan)
+            m = self.metrics
+            item = [f, None, m.clock() if m else None, None]
+            item[1] = self.loop.submit(f.readback_async())
+            self.readbacks += 1
+            with self._lock:
+                self._inflight.append(item)
+                self.max_inflight = max(self.max_inflight, len(self._inflight))
+            item[1].add_done_callback(lambda _, item=item: self._ready(item))
+
+    def next_frame(self):
+        while True:
+            self._fill()
+            with self._lock:
+                if not self._inflight or not self._inflight[0][1].done():
+                    return None
+                frame, fut, t_start, t_done = self._inflight.popleft()
+            try:
+                fut.result()
+            except Exception as e:
+                self.errors += 1
+                print("readback error:", e)
+                frame.close()
+                continue
+            m = self.metrics
+            if m and t_start is not None:
+                now = m.clock()
+                t_done = t_done or now
+                m.add("readback_async", t_done - t_start)
+                m.add("queued", now - t_done)
+            self._fill()    # 空いた分の読み出しをすぐ始める
+            self.frames += 1
+            return frame
+
+    def stop(self):
+        self.inner.stop()
+        while self._inflight:
+            frame, fut, _, _ = self._inflight.popleft()
+            try: fut.result(1.0)
+            except Exception: pass
+            frame.close()
+
+    def close(self):
+        self.inner.close()
+        if self._own_loop:
+            self.loop.close(); self.loop = None
+
+    def stats(self):
+        s = self.inner.stats()
+        s.update(depth=self.depth, max_inflight=self.max_inflight, readback_errors=self.errors,
+                 readbacks=self.readbacks, superseded=self.superseded,
+                 stages=self.metrics.snapshot()["stages"] if self.metrics else {})
+        return s
@@ -0,0 +1,30 @@
+"""キャプチャ→表示パイプラインのベンチマーク（合成フレームで Linux でも実行可能）
+
+windowCapture ディレクトリで python -m bench <コマンド> として実行する。
+共通の道具は common.py、各コマンドは機能ごとのモジュールの add_commands で登録する。
+
+    python -m bench convert [--res 1280x720,2560x1440,3840x2160] [--frames 60]
+    python -m bench pipeline [--backend synthetic:1920x1080@0] [--frames 300] [--consumer-ms 0]
+    python -m bench record out.wcap [--backend synthetic:1280x720@0:bars] [--frames 120]
+        [--codec raw|delta] [--compress zlib] [--keyint 120] [--queue 8] [--drop oldest|newest]
+    python -m bench share [--readers 1,4] [--res 1920x1080] [--fps 240] [--seconds 3] [--slots 4]
+    python -m bench stream [--backend synthetic:1920x1080@60:bars] [--fast 2] [--slow 2] [--slow-rate 300000] [--seconds 8]
+    python -m bench roi [--rois 16,64,256] [--kinds mean,change,hist,template] [--budget-ms 2] [--crop 0,0,1280,720]
+    python -m bench governor [--traces static,video:24,clock,typing,scroll,game] [--trace-file trace.txt] [--budget 0.5] [--live]
+    python -m bench visibility [--script active:1,hidden:1,minimized:2,active:1] [--sink]
+    python -m bench resize [--from 1280x720] [--to 2560x1440] [--frames 240] [--growth 1.5]
+    python -m bench windows [--windows 400] [--procs 60] [--process-ms 0.5] [--refreshes 20]
+    python -m bench thumbs [--windows 40] [--visible 12] [--budget 20] [--capacity 64] [--live 2]
+    python -m bench config [--profiles 2000] [--lookups 2000] [--saves 200] [--delay 1.0]
+    python -m bench startup [--pick-ms 800] [--device-ms 250] [--repeat 3] [--top 8] [--real]
+    QT_QPA_PLATFORM=offscreen python -m bench gui [--res 2560x1440,3840x2160] [--view 800x480]
+    QT_QPA_PLATFORM=offscreen python -m bench paint [--res 1920x1080,2560x1440] [--view 800x480] [--modes old,rgb,rgb32,argb32]
+    python -m bench manager [--sessions 8] [--workers 1,2,4] [--backend synthetic:1920x1080@60] [--seconds 3]
+    python -m bench composite [--sources 8] [--res 1280x720] [--scale 0.25] [--layout shelf|grid] [--refresh 60]
+    python -m bench readback [--depth 0,1,2,3] [--readback-ms 8] [--backend synthetic:1920x1080@240]
+    python -m bench reduce [--res 2560x1440,3840x2160] [--view 800x480] [--crop 0,0,1920,1080] [--hwnd 0x...]
+        [--scale-modes fast,quality]
+    python -m bench metrics [--backend synthetic:1920x1080@0] [--frames 300] [--log stats.jsonl]
+    QT_QPA_PLATFORM=offscreen python -m bench suite [--out result.json] [--baseline base.json]
+        [--threshold 0.15] [--threshold '*_p99_ms=0.3'] [--keys 'fps_*,*_p95_ms'] [--repeat 3] [--full]
+"""
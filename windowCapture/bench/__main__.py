@@ -0,0 +1,11 @@
+import argparse
+from . import frames, sinks, roi, rate, picker, startup, display, sessions, suite
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(prog="python -m bench")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for m in (frames, sinks, roi, rate, picker, startup, display, sessions, suite):
+        m.add_commands(sub)
+    args = ap.parse_args()
+    args.fn(args)
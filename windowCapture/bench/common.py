@@ -0,0 +1,43 @@
+"""ベンチマーク共通の道具（解像度の解釈・合成フレーム・時間計測・旧変換・Qt）"""
+import sys, os, time
+import numpy as np
+
+# 各モジュールを置いたディレクトリ(子プロセスの cwd)
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RESOLUTIONS = "1280x720,1920x1080,2560x1440,3840x2160"
+
+
+def parse_res(text):
+    return [tuple(int(v) for v in r.split("x")) for r in text.split(",")]
+
+
+def parse_crop(text):
+    return tuple(int(v) for v in text.split(","))
+
+
+def synthetic_bgra(w, h, stride=None, seed=0):
+    stride = stride or w * 4
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 256, stride * h, np.uint8).tobytes()
+
+
+def timeit(fn, frames):
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(frames):
+        fn()
+    return (time.perf_counter() - t0) / frames
+
+
+def legacy_convert(buf, w, h):
+    # 旧 softwarebitmap_to_numpy のコピー列を再現: Buffer → IBuffer → bytearray → swizzle
+    ibuf = bytes(bytearray(buf))
+    data = bytearray(ibuf)
+    arr = np.frombuffer(data, dtype=np.uint8).reshape((h, w, 4))
+    return arr[:, :, :3][:, :, ::-1].copy()
+
+
+def qt_app():
+    from PyQt5 import QtWidgets
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
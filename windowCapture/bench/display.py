@@ -0,0 +1,241 @@
+"""表示側のベンチマーク: GUI スレッドの処理・描画形式・合成オーバーレイ"""
+import time, threading
+import numpy as np
+from frame_convert import FrameConverter
+from frame_ring import FrameRing
+from capture_scheduler import CaptureScheduler
+from capture_backend import make_backend, SyntheticBackend
+from pipeline import FramePipeline, run_capture
+from dirty_tiles import TileDiff, tile_rects, merge_masks
+from scale import Scaler
+from .common import RESOLUTIONS, parse_res, synthetic_bgra, timeit, legacy_convert, qt_app
+
+
+# =======================================================
+# GUI スレッドの 1 フレームあたりの処理時間（縮小を Qt で行う場合 / 事前に縮小した場合）
+# =======================================================
+def gui_frame(arr, target, fit):
+    """Overlay.on_frame + paintEvent 相当: ndarray → QImage → QPixmap → 描画"""
+    from PyQt5 import QtCore, QtGui
+    h, w, _ = arr.shape
+    img = QtGui.QImage(arr.data, w, h, arr.strides[0], QtGui.QImage.Format_RGB888)
+    pix = QtGui.QPixmap.fromImage(img)
+    p = QtGui.QPainter(target)
+    if fit: p.drawPixmap(target.rect(), pix)
+    else: p.drawPixmap(0, 0, pix)
+    p.end()
+
+
+def bench_gui(args):
+    from PyQt5 import QtGui
+    app = qt_app()
+    vw, vh = parse_res(args.view)[0]
+    target = QtGui.QImage(vw, vh, QtGui.QImage.Format_ARGB32_Premultiplied)  # ウィジェットの代わり
+    for w, h in parse_res(args.res):
+        src = np.frombuffer(synthetic_bgra(w, h), np.uint8).reshape(h, w, 4)
+        full = FrameConverter().convert_array(src)
+        t_before = timeit(lambda: gui_frame(full, target, True), args.frames)
+        for mode in ("fast", "quality"):
+            sc = Scaler(mode)
+            small = np.empty((vh, vw, 3), np.uint8)
+            t_scale = timeit(lambda: sc.scale(src, small), args.frames)
+            t_after = timeit(lambda: gui_frame(small, target, False), args.frames)
+            print(f"{w}x{h} → {vw}x{vh} [{mode:7s}]: GUI thread {t_before*1e3:7.2f} ms → {t_after*1e3:6.2f} ms"
+                  f" (capture thread +{t_scale*1e3:6.2f} ms)")
+
+
+# =======================================================
+# 表示形式ごとの描画時間（旧 tobytes+RGB888 / RGB888+QPixmap / BGRA のまま RGB32・ARGB32 を直接描画）
+# =======================================================
+def _paint_old(src, target, fit):
+    """windowCapture_old 相当: swizzle → tobytes → RGB888 の QImage → QPixmap → 描画"""
+    from PyQt5 import QtGui
+    h, w, _ = src.shape
+    rgb = legacy_convert(src, w, h)
+    img = QtGui.QImage(rgb.tobytes(), w, h, w * 3, QtGui.QImage.Format_RGB888)
+    p = QtGui.QPainter(target)
+    pix = QtGui.QPixmap.fromImage(img)
+    if fit: p.drawPixmap(target.rect(), pix)
+    else: p.drawPixmap(0, 0, pix)
+    p.end()
+
+
+def _paint_slot(arr, target, fit, qformat):
+    """Overlay.on_frame + paintEvent 相当(変化タイルは使わず毎回全体)"""
+    from PyQt5 import QtGui
+    h, w, c = arr.shape
+    img = QtGui.QImage(arr.data, w, h, arr.strides[0], qformat)
+    p = QtGui.QPainter(target)
+    if c == 3:
+        pix = QtGui.QPixmap.fromImage(img)      # RGB888 は一度 pixmap へ変換する
+        if fit: p.drawPixmap(target.rect(), pix)
+        else: p.drawPixmap(0, 0, pix)
+    elif fit: p.drawImage(target.rect(), img)
+    else: p.drawImage(0, 0, img)              # スロットを直接描く
+    p.end()
+
+
+def bench_paint(args):
+    from PyQt5 import QtGui
+    app = qt_app()
+    Q = QtGui.QImage
+    # overlay.DISPLAY_FORMATS と同じ (overlay は Windows でしか import できない)
+    formats = {"rgb": ("rgb", False, Q.Format_RGB888), "rgb32": ("bgra", False, Q.Format_RGB32),
+               "argb32": ("bgra", True, Q.Format_ARGB32_Premultiplied)}
+    vw, vh = parse_res(args.view)[0]
+    for w, h in parse_res(args.res):
+        backend = SyntheticBackend(w, h, 0, "noise")
+        backend.open(); backend.start()
+        # 半透明のオーバーレイのバックストアは ARGB32_Premultiplied
+        for label, view, fit in (("1:1", None, False), ("qt-fit", None, True), ("prescaled", (vw, vh), False)):
+            tw, th = (w, h) if view is None and not fit else (vw, vh)
+            target = QtGui.QImage(tw, th, QtGui.QImage.Format_ARGB32_Premultiplied)
+            row = []
+            for mode in args.modes.split(","):
+                if mode == "old":
+                    if view is not None: continue
+                    f = backend.next_frame()
+                    src = np.ascontiguousarray(f.bgra()); f.close()
+                    row.append(f"old {timeit(lambda: _paint_old(src, target, fit), args.frames) * 1e3:7.2f}")
+                    continue
+                fmt, opaque, qformat = formats[mode]
+                ring = FrameRing(3)
+                pipe = FramePipeline(ring)
+                pipe.pixel_format, pipe.opaque = fmt, opaque
+                pipe.set_output_size(view)
+                cap = gui = 0.0
+                for i in range(args.frames + 1):
+                    f = backend.next_frame()
+                    t0 = time.perf_counter()
+                    pipe.process(f)
+                    f.close()
+                    t1 = time.perf_counter()
+                    idx, arr, _, _ = ring.borrow()
+                    _paint_slot(arr, target, fit, qformat)
+                    ring.release(idx)
+                    if i:       # 1 回目は確保込みなので除く
+                        cap += t1 - t0; gui += time.perf_counter() - t1
+                n = args.frames
+                row.append(f"{mode} {cap / n * 1e3:6.2f}+{gui / n * 1e3:6.2f}")
+            print(f"{w}x{h} {label:9s} (capture+GUI ms): " + " | ".join(row))
+        backend.stop(); backend.close()
+
+
+# =======================================================
+# 合成オーバーレイ: ソースごとのウィンドウ / 1 枚に合成して 1 つのウィンドウ
+# =======================================================
+RAISE_HZ, VIS_HZ = 1 / 0.75, 4.0    # Overlay の _raise_timer と _vis_timer
+
+
+def _gui_loop(q, paint, out):
+    """GUI スレッドの代わり: キューの通知ごとに paint(msg) を 1 回(= 1 回の paintEvent)"""
+    t0 = time.thread_time()
+    while True:
+        msg = q.get()
+        if msg is None: break
+        paint(msg)
+        out["paints"] += 1
+    out["cpu"] = time.thread_time() - t0
+
+
+def bench_composite(args):
+    """同じソースを、ソースごとのウィンドウ(フレームごとに描画)と 1 枚の合成(リフレッシュごとに 1 回描画)で
+    表示したときの GUI スレッドの描画回数・CPU と、タイマーの起床回数を比べる。GUI の描画は
+    変化した範囲を表示先(ウィンドウのバッキングストア相当)へコピーすることで模擬する"""
+    import queue
+    from compositor import CompositeRenderer, CompositeSource, Compositor, LAYOUTS
+    n, dt = args.sources, args.seconds
+    view = (round(args.res[0] * args.scale), round(args.res[1] * args.scale))
+    spec = f"synthetic:{args.res[0]}x{args.res[1]}@{args.fps:g}:{args.pattern}"
+    # ソースごとのウィンドウ (Overlay を n 個)
+    q, out = queue.Queue(), {"paints": 0}
+    rings, scheds, threads, stores = [], [], [], [np.empty((view[1], view[0], 4), np.uint8) for _ in range(n)]
+    def paint_one(i):
+        got = rings[i].borrow()
+        if got is None: return
+        idx, arr, _, mask = got
+        try:
+            h, w = arr.shape[:2]
+            for x, y, rw, rh in ([(0, 0, w, h)] if mask is None else tile_rects(mask, w, h, 64)):
+                stores[i][y:y + rh, x:x + rw] = arr[y:y + rh, x:x + rw]
+        finally:
+            rings[i].release(idx)
+    gui = threading.Thread(target=_gui_loop, args=(q, paint_one, out))
+    gui.start()
+    c0, t0 = time.process_time(), time.perf_counter()
+    for i in range(n):
+        backend = make_backend(spec)
+        backend.open()
+        ring = FrameRing(3, merge=merge_masks)
+        pipe = FramePipeline(ring, diff=TileDiff(64))
+        pipe.pixel_format, pipe.opaque = "bgra", True
+        pipe.set_output_size(view)
+        sched = CaptureScheduler(args.policy)
+        rings.append(ring); scheds.append(sched)
+        threads.append(threading.Thread(target=run_capture, args=(backend, pipe, sched, lambda _, i=i: q.put(i)),
+                                        daemon=True))
+    for th in threads: th.start()
+    time.sleep(dt)
+    for s in scheds: s.stop()
+    for th in threads: th.join()
+    el, cpu = time.perf_counter() - t0, time.process_time() - c0
+    q.put(None); gui.join()
+    frames = sum(r.published for r in rings)
+    print(f"-- {n} ソース {spec} → {view[0]}x{view[1]} ずつ, {dt:g} 秒")
+    print(f"  ウィンドウごと: {n} ウィンドウ, フレーム {frames / el:6.1f}/s, 描画 {out['paints'] / el:6.1f}/s, "
+          f"GUI CPU {100 * out['cpu'] / el:5.1f}%, 全体 CPU {100 * cpu / el:5.1f}%, "
+          f"タイマー起床 {n * (RAISE_HZ + VIS_HZ):5.1f}/s")
+    # 1 枚に合成 (CompositeOverlay 1 つ)
+    q, out = queue.Queue(), {"paints": 0}
+    renderer = CompositeRenderer([CompositeSource(make_backend(spec), scale=args.scale, policy=args.policy)
+                                  for _ in range(n)], Compositor(LAYOUTS[args.layout]), 1 / args.refresh,
+                                 present=lambda: q.put(0))
+    store = [np.empty((0, 0, 4), np.uint8)]
+    def paint_all(_):
+        dirty = renderer.take()
+        comp = renderer.comp
+        with comp.lock:
+            c = comp.canvas
+            if store[0].shape != c.shape: store[0], dirty = np.empty_like(c), None
+            for x, y, w, h in dirty if dirty is not None else [(0, 0, c.shape[1], c.shape[0])]:
+                store[0][y:y + h, x:x + w] = c[y:y + h, x:x + w]
+    gui = threading.Thread(target=_gui_loop, args=(q, paint_all, out))
+    gui.start()
+    c0, t0 = time.process_time(), time.perf_counter()
+    renderer.start_sources().start()
+    time.sleep(dt)
+    for s in renderer.sources: s.sched.stop()
+    renderer.close()
+    el, cpu = time.perf_counter() - t0, time.process_time() - c0
+    q.put(None); gui.join()
+    st = renderer.stats()
+    frames = sum(s.ring.published for s in renderer.sources)
+    print(f"  合成 ({args.layout}): 1 ウィンドウ {st['canvas'][0]}x{st['canvas'][1]}, フレーム {frames / el:6.1f}/s, "
+          f"描画 {out['paints'] / el:6.1f}/s (上限 {args.refresh:g}), GUI CPU {100 * out['cpu'] / el:5.1f}%, "
+          f"全体 CPU {100 * cpu / el:5.1f}%, タイマー起床 {RAISE_HZ + VIS_HZ:5.1f}/s")
+    print("   ", st)
+
+
+def add_commands(sub):
+    p = sub.add_parser("gui")
+    p.add_argument("--res", default=RESOLUTIONS)
+    p.add_argument("--view", default="800x480")
+    p.add_argument("--frames", type=int, default=30)
+    p.set_defaults(fn=bench_gui)
+    p = sub.add_parser("paint")
+    p.add_argument("--res", default="1920x1080,2560x1440,3840x2160")
+    p.add_argument("--view", default="800x480")
+    p.add_argument("--modes", default="old,rgb,rgb32,argb32", help="old は旧オーバーレイ (tobytes+RGB888)")
+    p.add_argument("--frames", type=int, default=30)
+    p.set_defaults(fn=bench_paint)
+    p = sub.add_parser("composite")
+    p.add_argument("--sources", type=int, default=8)
+    p.add_argument("--res", type=lambda v: parse_res(v)[0], default=(1280, 720))
+    p.add_argument("--fps", type=float, default=60.0)
+    p.add_argument("--pattern", default="bars")
+    p.add_argument("--scale", type=float, default=0.25, help="各ソースの表示倍率")
+    p.add_argument("--layout", default="shelf", choices=["shelf", "grid"])
+    p.add_argument("--refresh", type=float, default=60.0, help="表示のリフレッシュレート (合成の present 上限)")
+    p.add_argument("--policy", default="latest")
+    p.add_argument("--seconds", type=float, default=3.0)
+    p.set_defaults(fn=bench_composite)
@@ -0,0 +1,388 @@
+"""フレーム処理のベンチマーク: 変換・パイプライン全体・リサイズ・リードバック・読み出し前の縮小・計測"""
+import time, threading, tracemalloc
+import numpy as np
+from frame_convert import FrameConverter
+from frame_ring import FrameRing
+from capture_scheduler import CaptureScheduler, CapturePolicy
+from capture_backend import make_backend, SyntheticBackend
+from pipeline import FramePipeline, run_capture
+from dirty_tiles import TileDiff, merge_masks
+from scale import Scaler
+from async_readback import PipelinedBackend
+from metrics import Metrics, Histogram, MetricsLogger
+from .common import RESOLUTIONS, parse_res, parse_crop, synthetic_bgra, timeit, legacy_convert
+
+
+# =======================================================
+# BGRA → RGB 変換
+# =======================================================
+def bench_convert(args):
+    for w, h in parse_res(args.res):
+        buf = synthetic_bgra(w, h)
+        conv = FrameConverter()
+        t_old = timeit(lambda: legacy_convert(buf, w, h), args.frames)
+        t_new = timeit(lambda: conv.convert(buf, w, h), args.frames)
+        old_bytes = 3 * w * h * 4 + w * h * 3
+        print(f"{w}x{h}: legacy {t_old*1e3:7.2f} ms ({old_bytes/1e6:6.1f} MB/frame) | "
+              f"converter {t_new*1e3:7.2f} ms ({conv.bytes_copied/1e6:6.1f} MB/frame)")
+
+
+# =======================================================
+# バックエンド → 変換 → リング → 表示側（スレッド）の全体
+# =======================================================
+def bench_pipeline(args):
+    backend = make_backend(args.backend)
+    backend.open()
+    ring = FrameRing(args.slots, merge=merge_masks)
+    pipe = FramePipeline(ring, diff=TileDiff(args.tile) if args.tile else None)
+    pipe.set_crop(args.crop)
+    pipe.set_output_size(args.view)
+    sched = CaptureScheduler(args.policy)
+    consumed = [0]
+
+    def consumer():
+        while sched.running:
+            got = ring.borrow()
+            if got is None:
+                time.sleep(0.0005); continue
+            time.sleep(args.consumer_ms / 1e3)   # 表示側の処理時間
+            ring.release(got[0])
+            consumed[0] += 1
+
+    def emit(idx):
+        if pipe.processed >= args.frames: sched.stop()
+
+    def frame_done():
+        # 変化なしで捨てられたフレームも数える
+        if pipe.processed + pipe.skipped_frames >= args.frames: sched.stop()
+
+    th = threading.Thread(target=consumer, daemon=True)
+    th.start()
+    t0 = time.perf_counter()
+    backend.on_frame_arrived(frame_done)
+    run_capture(backend, pipe, sched, emit)
+    dt = time.perf_counter() - t0
+    th.join()
+    backend.close()
+    frames_in = pipe.processed + pipe.skipped_frames
+    print(f"{args.backend}: {frames_in / dt:7.1f} fps in, {pipe.processed / dt:7.1f} fps converted, "
+          f"{consumed[0] / dt:7.1f} fps out")
+    print("  backend:", backend.stats())
+    print("  ring:   ", ring.stats())
+    print("  sched:  ", sched.stats())
+    print("  pipe:   ", pipe.stats())
+
+
+# =======================================================
+# 途中でサイズが変わるソース(ドラッグでのリサイズ)
+# =======================================================
+def _drag_sizes(a, b, frames):
+    """a → b → a を往復するサイズ列(ドラッグ中の端数サイズを含む)"""
+    for i in range(frames):
+        t = 1.0 - abs(1.0 - 2.0 * i / max(1, frames - 1))
+        yield (int(a[0] + (b[0] - a[0]) * t) | 1, int(a[1] + (b[1] - a[1]) * t) | 1)
+
+
+def bench_resize(args):
+    """毎フレームサイズが変わる合成ソースでパイプラインを回し、作業バッファの確保回数・
+    フレームあたりの一時確保量・処理時間を測る。出力は毎回作り直した変換結果と比べる"""
+    import buffers
+    (a,), (b,) = parse_res(args.src_from), parse_res(args.src_to)
+    for growth in [float(v) for v in args.growth.split(",")]:
+        buffers.GROWTH = growth
+        backend = SyntheticBackend(*a, fps=0, pattern="bars")
+        backend.open(); backend.start()
+        ring = FrameRing(3, merge=merge_masks)
+        pipe = FramePipeline(ring, diff=TileDiff(64), scaler=Scaler(args.scale))
+        pipe.set_output_size(args.view)
+        ref_scaler, conv = Scaler(args.scale), FrameConverter()
+        t_total, kb, bad, n = 0.0, 0.0, 0, 0
+        tracemalloc.start()
+        for size in _drag_sizes(a, b, args.frames):
+            backend.resize(*size)
+            f = backend.next_frame()
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            t = time.perf_counter()
+            idx = pipe.process(f)
+            t_total += time.perf_counter() - t
+            kb += (tracemalloc.get_traced_memory()[1] - base) / 1024
+            got = ring.borrow()
+            if idx is not None and got is not None:
+                src = f.bgra()
+                out = got[1]
+                ref = np.empty_like(out)
+                if out.shape[:2] == src.shape[:2]: conv.convert_array(src, ref)
+                else: ref_scaler.scale(src, ref)
+                bad += not np.array_equal(out, ref)
+                ring.release(got[0])
+            f.close()
+            n += 1
+        tracemalloc.stop()
+        backend.stop(); backend.close()
+        allocs = {"ring": ring.allocs, "diff": getattr(pipe.diff, "allocs", "-"),
+                  "scale": getattr(pipe.scaler, "allocs", "-")}
+        print(f"growth {growth:3.1f}: {t_total / n * 1e3:6.2f} ms/frame, transient {kb / n:8.1f} KB/frame,"
+              f" buffer allocs {allocs}, {bad} mismatched / {n} frames")
+
+
+# =======================================================
+# リードバックの並行数 (depth=0 は 1 フレームずつ同期で読み出す)
+# =======================================================
+def bench_readback(args):
+    for depth in (int(v) for v in args.depth.split(",")):
+        inner = make_backend(args.backend)
+        inner.readback_ms = args.readback_ms
+        coalesce = CapturePolicy.parse(args.policy).mode != "every"
+        backend = (PipelinedBackend(inner, depth, metrics=Metrics(), coalesce=coalesce and not args.no_coalesce)
+                   if depth else inner)
+        backend.open()
+        pipe = FramePipeline(FrameRing(3))
+        pipe.set_output_size(args.view)
+        sched = CaptureScheduler(args.policy)
+        timer = threading.Timer(args.seconds, sched.stop)
+        t0 = time.perf_counter()
+        timer.start()
+        run_capture(backend, pipe, sched)
+        dt = time.perf_counter() - t0
+        backend.close()
+        st = backend.stats()
+        stages = " | ".join(f"{k} {v['mean_ms']:5.2f}/{v['max_ms']:6.2f} ms"
+                            for k, v in st.get("stages", {}).items())
+        used = pipe.processed + pipe.skipped_frames
+        rb = (f", readbacks {st['readbacks']} (捨てた読み出し {st['readbacks'] - used}, 読まずに閉じた "
+              f"{st['superseded']})" if depth else "")
+        print(f"depth={depth}: {pipe.processed / dt:6.1f} fps, convert {pipe.stats()['cpu_ms_per_frame']:5.2f} ms{rb}"
+              f"{' | ' + stages + ' (mean/max)' if stages else ''}")
+
+
+# =======================================================
+# 読み出し前の縮小（--gpu-reduce）: 参照実装の検証と読み出し量・CPU 時間
+# =======================================================
+def _box_mean(src, level):
+    """2**level 四方の単純平均(float)。reduce_reference の各段の丸めはこれから ±level に収まる"""
+    f = 1 << level
+    h, w = src.shape[0] // f, src.shape[1] // f
+    return src[:h * f, :w * f].reshape(h, f, w, f, 4).mean(axis=(1, 3))
+
+
+def _area_weights(n_src, n_dst):
+    """(n_dst, n_src) の面積平均の重み(出力 1 画素が覆うソースの範囲を、端の画素は覆う割合で)"""
+    edges = np.arange(n_dst + 1) * (n_src / n_dst)
+    lo, hi = edges[:-1, None], edges[1:, None]
+    j = np.arange(n_src)[None, :]
+    return np.clip(np.minimum(hi, j + 1) - np.maximum(lo, j), 0, None) / (n_src / n_dst)
+
+
+def _area_mean(src, dw, dh):
+    """(dh, dw, 3) RGB の float。端数倍も含めた正確な面積平均(縮小結果の誤差を測る基準)"""
+    ry, rx = _area_weights(src.shape[0], dh), _area_weights(src.shape[1], dw)
+    return np.stack([ry @ src[:, :, c].astype(np.float64) @ rx.T for c in (2, 1, 0)], axis=-1)
+
+
+def _synthetic_frame(w, h, pattern, n=7):
+    """SyntheticBackend の n 枚目のフレーム(の写し)"""
+    b = SyntheticBackend(w, h, 0, pattern)
+    b.open(); b.start()
+    for _ in range(n):
+        f = b.next_frame(); img = f.bgra().copy(); f.close()
+    b.stop(); b.close()
+    return img
+
+
+def _run_reduce(spec, frames, view, crop, gpu_reduce, depth=0):
+    backend = make_backend(spec)
+    if depth: backend = PipelinedBackend(backend, depth)
+    backend.open()
+    pipe = FramePipeline(FrameRing(3), diff=TileDiff(64))
+    pipe.set_output_size(view)
+    pipe.set_crop(crop)
+    pipe.gpu_reduce = gpu_reduce
+    if depth and gpu_reduce: backend.plan = pipe.plan_reduce
+    sched = CaptureScheduler("every")
+    out = []
+    def emit(idx):
+        got = pipe.ring.borrow()
+        if got:
+            out[:] = [got[1].copy()]
+            pipe.ring.release(got[0])
+        if pipe.processed >= frames: sched.stop()
+    run_capture(backend, pipe, sched, emit)
+    backend.close()
+    return pipe, out[0]
+
+
+def _gpu_check(hwnd, view, crop, frames):
+    """WinRT の GPU 縮小結果を、同じフレームを全体読み出しして参照実装で縮めたものと比べる"""
+    from gpu_reduce import reduce_reference
+    from capture_backend import WinRTBackend
+    from pipeline import clamp_crop
+    b = WinRTBackend(hwnd, gpu_reduce=True)
+    b.open(); b.start()
+    if b.gpu is None:
+        print("GPU check skipped:", b.stats().get("gpu")); b.close(); return
+    pipe = FramePipeline(FrameRing(3))
+    pipe.set_output_size(view); pipe.set_crop(crop); pipe.gpu_reduce = True
+    worst, done, t_end = 0, 0, time.monotonic() + 10
+    while done < frames and time.monotonic() < t_end:
+        f = b.next_frame()
+        if f is None: time.sleep(0.005); continue
+        try:
+            rect, k = pipe.plan_reduce(f.width, f.height) or (clamp_crop(crop, f.width, f.height), 0)
+            gpu = b.loop.run(b.gpu.read(f._frame.surface, rect, k))
+            l, t, r, bt = rect
+            ref = reduce_reference(f.bgra()[t:bt, l:r], k)      # 同じサーフェスを全体読み出し
+            d = int(np.abs(gpu.astype(np.int16) - ref).max())
+            worst = max(worst, d); done += 1
+            print(f"  gpu {gpu.shape[1]}x{gpu.shape[0]} level {k}: max |gpu - reference| = {d}")
+        finally:
+            f.close()
+    b.stop(); b.close()
+    print(f"GPU check: {done} frames, max diff {worst} (allowed: level) | {b.stats().get('gpu')}")
+
+
+def bench_reduce(args):
+    from gpu_reduce import plan_reduce, reduce_reference
+    vw, vh = args.view
+    # 1) 参照実装: 段ごとの丸め誤差が段数以内か
+    for level in range(1, 5):
+        src = np.frombuffer(synthetic_bgra(64 << level, 32 << level, seed=level), np.uint8)
+        src = src.reshape(32 << level, 64 << level, 4)
+        d = np.abs(reduce_reference(src, level) - _box_mean(src, level)).max()
+        assert d <= level, (level, d)
+        print(f"reference level {level}: max |reference - box mean| = {d:.2f} (<= {level})")
+    # 2) パイプライン: 読み出し量と CPU 時間、出力の差(読み出し前に縮めない場合との比較)
+    for w, h in parse_res(args.res):
+        spec = f"synthetic:{w}x{h}@0:{args.pattern}"
+        crop = args.crop or (0, 0, w, h)
+        rect, k = plan_reduce(crop, (vw, vh))
+        l, t, r, b = rect
+        frame = np.frombuffer(synthetic_bgra(w, h), np.uint8).reshape(h, w, 4)
+        t_ref = timeit(lambda: reduce_reference(frame[t:b, l:r], k), 10)
+        print(f"{w}x{h} crop {crop} → view {vw}x{vh}: level {k}, read {r - l >> k}x{b - t >> k}"
+              f" | CPU reference reduce {t_ref * 1e3:.2f} ms/frame (done on the GPU with WinRT; included in 'on' cpu)")
+        for on in (False, True):
+            pipe, img = _run_reduce(spec, args.frames, (vw, vh), args.crop, on, args.depth)
+            s = pipe.stats()
+            print(f"  gpu_reduce {'on ' if on else 'off'} | readback {s['readback_bytes_per_frame'] / 1e6:6.2f} MB/frame"
+                  f" | cpu {s['cpu_ms_per_frame']:6.2f} ms/frame")
+        # 3) 画質: 読み出し前に縮めると Scaler が残り(2 倍未満)を縮めるので、縮めない場合と同じ画素にはならない
+        #    (fast の最近傍が拾う位置が変わり、細い線の縁では差が色の差そのものになる)。
+        #    どちらも正確な面積平均からの誤差で比べ、読み出し前に縮めても悪くならないことを確かめる
+        src = _synthetic_frame(w, h, args.pattern)[t:b, l:r]
+        ref = _area_mean(src, vw, vh)
+        for mode in args.scale_modes.split(","):
+            out, err = {}, {}
+            for on in (False, True):
+                out[on] = np.empty((vh, vw, 3), np.uint8)
+                Scaler(mode).scale(reduce_reference(src, k) if on else src, out[on])
+                err[on] = np.abs(out[on] - ref)
+            gap = np.abs(out[True].astype(np.int16) - out[False])
+            print(f"  {mode:7s} vs area mean: off mean {err[False].mean():.2f} max {err[False].max():5.1f}"
+                  f" | on mean {err[True].mean():.2f} max {err[True].max():5.1f}"
+                  f" | on vs off: mean {gap.mean():.2f} max {gap.max()}")
+            assert err[True].max() <= err[False].max() + k + 1, (mode, err[True].max(), err[False].max())
+            assert err[True].mean() <= err[False].mean() + 0.5, (mode, err[True].mean(), err[False].mean())
+    if args.hwnd:
+        _gpu_check(int(args.hwnd, 0), (vw, vh), args.crop, args.check_frames)
+
+
+# =======================================================
+# 計測のオーバーヘッド（無効時 / 有効時）
+# =======================================================
+def _run_frames(spec, frames, metrics, view=None):
+    backend = make_backend(spec)
+    backend.open()
+    pipe = FramePipeline(FrameRing(3), diff=TileDiff(64))
+    pipe.set_output_size(view)
+    pipe.metrics = metrics
+    if metrics:
+        metrics.gauge("bytes_read", lambda: pipe.readback_bytes)
+        metrics.gauge("bytes_written", lambda: pipe.bytes_written)
+    sched = CaptureScheduler("latest")
+    def emit(idx):
+        ring = pipe.ring
+        got = ring.borrow()                       # 表示側の代わりにすぐ返却する
+        if got:
+            if metrics:
+                metrics.add("handoff", metrics.clock() - ring.published_at(got[0]))
+                metrics.count("frames_out")
+            ring.release(got[0])
+        if pipe.processed >= frames: sched.stop()
+    run_capture(backend, pipe, sched, emit)
+    backend.close()
+    return pipe
+
+
+def bench_metrics(args):
+    n = 200000
+    h, off = Histogram(), None
+    t_add = timeit(lambda: h.add(0.0012), n)
+    def disabled():
+        m = off
+        if m: m.add("x", 0.0)
+    t_off = timeit(disabled, n)
+    print(f"Histogram.add {t_add * 1e9:6.0f} ns/call | disabled check {t_off * 1e9:5.0f} ns/call")
+    for _ in range(2):        # 1 回目は暖機
+        base = _run_frames(args.backend, args.frames, None, args.view)
+        m = Metrics()
+        log = MetricsLogger(m, args.log, interval=0.5).start() if args.log else None
+        inst = _run_frames(args.backend, args.frames, m, args.view)
+        if log: log.stop()
+    a, b = base.stats()["cpu_ms_per_frame"], inst.stats()["cpu_ms_per_frame"]
+    per_frame = sum(h.n for h in m.stages.values()) / max(1, inst.processed)
+    print(f"pipeline cpu/frame: disabled {a:6.3f} ms | enabled {b:6.3f} ms ({(b - a) * 1e3:+.1f} µs)"
+          f" | {per_frame:.1f} records/frame ≈ {per_frame * t_add * 1e6:.1f} µs")
+    for line in m.hud_lines(): print("  " + line)
+
+
+def add_commands(sub):
+    p = sub.add_parser("convert")
+    p.add_argument("--res", default=RESOLUTIONS)
+    p.add_argument("--frames", type=int, default=60)
+    p.set_defaults(fn=bench_convert)
+    p = sub.add_parser("pipeline")
+    p.add_argument("--backend", default="synthetic:1920x1080@0")
+    p.add_argument("--policy", default="latest")
+    p.add_argument("--slots", type=int, default=3)
+    p.add_argument("--frames", type=int, default=300)
+    p.add_argument("--consumer-ms", type=float, default=0.0)
+    p.add_argument("--tile", type=int, default=64, help="変化検出のタイルサイズ (0 で無効)")
+    p.add_argument("--crop", type=parse_crop, help="left,top,right,bottom")
+    p.add_argument("--view", type=lambda v: parse_res(v)[0], help="出力サイズ WxH (キャプチャスレッドで縮小)")
+    p.set_defaults(fn=bench_pipeline)
+    p = sub.add_parser("resize")
+    p.add_argument("--from", dest="src_from", default="1280x720")
+    p.add_argument("--to", dest="src_to", default="2560x1440")
+    p.add_argument("--frames", type=int, default=240)
+    p.add_argument("--view", type=lambda v: None if v == "off" else parse_res(v)[0], default=(800, 480),
+                   help="出力サイズ WxH (off で縮小せずソースサイズのまま)")
+    p.add_argument("--scale", default="fast", choices=["fast", "quality"])
+    p.add_argument("--growth", default="1.0,1.5", help="作業バッファの伸長率 (1.0 は毎回ぴったり確保し直す)")
+    p.set_defaults(fn=bench_resize)
+    p = sub.add_parser("readback")
+    p.add_argument("--depth", default="0,1,2,3")
+    p.add_argument("--readback-ms", type=float, default=8.0, help="1 フレームの読み出しにかかる時間 (模擬)")
+    p.add_argument("--backend", default="synthetic:1920x1080@240:bars")
+    p.add_argument("--policy", default="latest")
+    p.add_argument("--no-coalesce", action="store_true", help="\"latest\" でも古いフレームを読み出してから捨てる (旧動作)")
+    p.add_argument("--view", type=lambda v: parse_res(v)[0])
+    p.add_argument("--seconds", type=float, default=3.0)
+    p.set_defaults(fn=bench_readback)
+    p = sub.add_parser("reduce")
+    p.add_argument("--res", default="1920x1080,2560x1440,3840x2160")
+    p.add_argument("--view", type=lambda v: parse_res(v)[0], default=(800, 480))
+    p.add_argument("--crop", type=parse_crop)
+    p.add_argument("--pattern", default="bars", choices=["bars", "noise", "static"])
+    p.add_argument("--frames", type=int, default=120)
+    p.add_argument("--depth", type=int, default=0, help="PipelinedBackend の並行数 (0 で同期)")
+    p.add_argument("--hwnd", help="WinRT で GPU の縮小結果を参照実装と比べるウィンドウ (Windows のみ)")
+    p.add_argument("--check-frames", type=int, default=5)
+    p.add_argument("--scale-modes", default="fast,quality", help="画質を比べる Scaler の方式")
+    p.set_defaults(fn=bench_reduce)
+    p = sub.add_parser("metrics")
+    p.add_argument("--backend", default="synthetic:1920x1080@0:bars")
+    p.add_argument("--frames", type=int, default=300)
+    p.add_argument("--view", type=lambda v: parse_res(v)[0])
+    p.add_argument("--log", help="JSON Lines の出力先 (ログ書き出し中の計測)")
+    p.set_defaults(fn=bench_metrics)
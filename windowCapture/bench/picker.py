@@ -0,0 +1,270 @@
+"""ウィンドウ選択まわりのベンチマーク: 列挙・サムネイル・設定の保存"""
+import os, time, json, tempfile
+import numpy as np
+
+
+# =======================================================
+# ウィンドウ列挙: 毎回取り直す方式 / WindowIndex の差分更新
+# =======================================================
+def _fake_desktop(n_windows, n_procs, seed=0):
+    rng = np.random.default_rng(seed)
+    exes = ["chrome.exe", "Code.exe", "explorer.exe", "Discord.exe", "obs64.exe", "notepad.exe",
+            "Spotify.exe", "steam.exe", "python.exe", "Teams.exe"]
+    procs = {1000 + i: (1.7e9 + i, exes[i % len(exes)]) for i in range(n_procs)}
+    wins = {}
+    for i in range(n_windows):
+        pid = 1000 + int(rng.integers(n_procs))
+        wins[0x10000 + i] = {"pid": pid, "title": f"{procs[pid][1][:-4]} window {i}",
+                             "shown": rng.random() < 0.4, "size": (800, 600), "root": rng.random() < 0.9}
+    return wins, procs
+
+
+def _naive_list(p):
+    """旧 list_visible_windows と同じ: 表示中のウィンドウごとに毎回プロセス名を引く"""
+    out = []
+    for h in p.hwnds():
+        if not p.shown(h): continue
+        title = p.title(h)
+        if not title.strip(): continue
+        pid, _ = p.owner(h)
+        try: exe = p.process(pid)[1]
+        except Exception: exe = "Unknown"
+        out.append((h, exe, title))
+    return out
+
+
+def bench_windows(args):
+    from window_index import WindowIndex, FakeWindowProvider
+    wins, procs = _fake_desktop(args.windows, args.procs)
+    p = FakeWindowProvider(wins, procs, cost={"process": args.process_ms / 1e3,
+                                              "create_time": args.process_ms / 10e3})
+    rng = np.random.default_rng(1)
+    t0 = time.perf_counter()
+    for _ in range(args.refreshes): naive = _naive_list(p)
+    t_naive = (time.perf_counter() - t0) / args.refreshes
+    print(f"naive:  {t_naive * 1e3:7.2f} ms/list, {p.calls['process'] / args.refreshes:.0f} process lookups/list"
+          f" ({len(naive)} windows)")
+    p.calls.clear()
+    index = WindowIndex(p)
+    t0 = time.perf_counter()
+    index.refresh()
+    t_first = time.perf_counter() - t0
+    assert index.list() == naive, "index differs from naive enumeration"
+    t_inc, churn = 0.0, [0, 0, 0]
+    for r in range(args.refreshes):
+        # 数個のウィンドウが開閉・タイトル変更され、たまにプロセスが入れ替わる(pid 再利用)
+        for _ in range(3):
+            h = int(rng.choice(list(wins)))
+            wins[h] = dict(wins[h], title=wins[h]["title"] + "*")
+        h = 0x90000 + r
+        wins[h] = {"pid": int(rng.choice(list(procs))), "title": f"new {r}", "size": (800, 600)}
+        wins.pop(int(rng.choice(list(wins))))
+        if r % 5 == 0:
+            pid = int(rng.choice(list(procs)))     # プロセスが終了して同じ pid が別のプロセスに使われた
+            for h in [h for h, w in wins.items() if w["pid"] == pid]: del wins[h]
+            procs[pid] = (procs[pid][0] + 1, "reused.exe")
+            wins[0xA0000 + r] = {"pid": pid, "title": f"reused {r}"}
+        t0 = time.perf_counter()
+        a, d, c = index.refresh()
+        t_inc += time.perf_counter() - t0
+        churn = [churn[0] + len(a), churn[1] + len(d), churn[2] + len(c)]
+    assert index.list() == _naive_list(FakeWindowProvider(wins, procs)), "index differs after refresh"
+    print(f"index:  first {t_first * 1e3:7.2f} ms, incremental {t_inc / args.refreshes * 1e3:7.2f} ms/refresh"
+          f" | +{churn[0]} -{churn[1]} ~{churn[2]} | {index.stats()}")
+    q = "chr win 1"
+    t0 = time.perf_counter()
+    for _ in range(20): hits = index.search(q)
+    print(f"search: {(time.perf_counter() - t0) / 20 * 1e3:.2f} ms for {q!r} over {len(index.windows)} windows"
+          f" → {[t for _, _, t in hits[:3]]}")
+
+
+# =======================================================
+# ウィンドウ選択のサムネイル: 画素予算つき巡回取得と LRU キャッシュ
+# =======================================================
+def _thumb_desktop(n, seed=0):
+    from window_index import FakeWindowProvider
+    rng = np.random.default_rng(seed)
+    sizes = [(640, 480), (1280, 720), (1920, 1080), (2560, 1440), (800, 600)]
+    wins = {0x10000 + i: {"pid": 1000 + i % 7, "title": f"window {i}", "size": sizes[int(rng.integers(len(sizes)))]}
+            for i in range(n)}
+    return FakeWindowProvider(wins, {1000 + i: (1.7e9, f"app{i}.exe") for i in range(7)})
+
+
+def bench_thumbs(args):
+    """模擬時計で予算どおりに回るか・全部揃うまでの時間・1 枚あたりの更新間隔を見て、
+    閉じる/最小化で LRU の順が正しいか、開き直したときにすぐ並ぶか、実スレッドで GUI 側の処理時間を確かめる"""
+    from thumbnails import ThumbnailScheduler, ThumbnailCache
+    from window_index import WindowIndex
+    p = _thumb_desktop(args.windows)
+    index = WindowIndex(p)
+    index.refresh()
+    budget = args.budget * 1e6
+    now = [0.0]
+    sched = ThumbnailScheduler(p, ThumbnailCache(args.capacity), budget=budget, clock=lambda: now[0])
+    visible = index.order[:args.visible]
+    sched.set_targets(index.order, visible)
+    src_px = sum(w * h for w, h in (p.size(hh) for hh in index.order))
+    full, last, gaps = None, {}, []
+    while now[0] < args.seconds:
+        wait = sched.step()
+        if wait is None: break
+        if wait: now[0] += wait
+        else:
+            now[0] += src_px / len(index.order) * args.ns_per_px * 1e-9    # 取得にかかる時間(模擬)
+            t = max(sched.cache.changed(sched.cache.seq - 1), key=lambda t: t.seq, default=None)
+            if t is not None and t.hwnd in last: gaps.append(t.timestamp - last[t.hwnd])
+            if t is not None: last[t.hwnd] = t.timestamp
+        if full is None and all(h in sched.cache for h in index.order): full = now[0]
+    st = sched.stats()
+    gaps = np.array(gaps) if gaps else np.zeros(1)
+    print(f"-- 模擬 {args.seconds:g} 秒: {len(index.order)} ウィンドウ (表示 {len(visible)}), 予算 {args.budget:g} Mpx/s")
+    print(f"  取得 {st['grabs']} 枚, {st['mpx_per_s']:.2f} Mpx/s (予算比 {st['mpx_per_s'] / args.budget:.2f}), "
+          f"読み出し {st['thumb_kpx'] * 1e3 / max(sched.pixels, 1) * 100:.2f}% (縮小済み)")
+    print(f"  全部揃うまで {full if full is not None else float('nan'):.2f} s (一括なら {src_px / budget:.2f} s), "
+          f"表示中の更新間隔 p50 {np.percentile(gaps, 50):.2f} s max {gaps.max():.2f} s "
+          f"(予算どおりの巡回で {sum(p.size(h)[0] * p.size(h)[1] for h in visible) / budget:.2f} s)")
+    # 閉じる/最小化: 消えたものは古い側へ回り、溢れたときに先に捨てられる。最小化から戻ればそのまま使える
+    closed = index.order[-args.close:]
+    for h in closed: del p.windows[h]
+    mini = index.order[0]
+    p.windows[mini]["shown"] = False
+    index.refresh()
+    sched.set_targets(index.order, index.order[:args.visible])
+    p.windows[mini]["shown"] = True
+    index.refresh()
+    sched.set_targets(index.order, index.order[:args.visible])
+    back = mini in sched.cache
+    cached = [h for h in index.order if h in sched.cache]
+    extra = args.capacity - len(sched.cache) + sum(h in sched.cache for h in closed)   # ちょうど閉じた分だけ溢れさせる
+    for i in range(extra): sched.cache.put(0x90000 + i, np.zeros((75, 100, 4), np.uint8), (640, 480))
+    left = [h for h in closed if h in sched.cache]
+    alive_lost = [h for h in cached if h not in sched.cache]
+    print(f"-- 閉じた {len(closed)} + 最小化して戻した 1 (キャッシュのまま: {back}) → {extra} 枚足して溢れさせた後: "
+          f"閉じたもの残り {len(left)}, 捨てられた生存ウィンドウ {len(alive_lost)} | {sched.cache.stats()}")
+    assert back and not left and not alive_lost, "LRU evicted the wrong thumbnails"
+    # 開き直し: キャッシュがあればすぐ並ぶ
+    hit = sum(sched.cache.get(h) is not None for h in index.order[:args.visible])
+    print(f"-- 開き直し: 最初の表示 {hit}/{min(args.visible, len(index.order))} 枚がキャッシュから")
+    # 実スレッド: GUI 側は 100 ms ごとに changed() の差分をアイコン相当(コピー)にするだけ
+    p.cost["thumbnail"] = args.grab_ms / 1e3
+    sched = ThumbnailScheduler(p, ThumbnailCache(args.capacity), budget=budget).start()
+    sched.set_targets(index.order, index.order[:args.visible])
+    seq, ticks, t0 = 0, [], time.perf_counter()
+    while time.perf_counter() - t0 < args.live:
+        time.sleep(0.1)
+        s0 = time.perf_counter()
+        for t in sched.cache.changed(seq):
+            seq = max(seq, t.seq)
+            t.image.copy()
+        ticks.append(time.perf_counter() - s0)
+    st = sched.stats()
+    sched.close()
+    print(f"-- 実時間 {args.live:g} 秒 (1 枚 {args.grab_ms:g} ms): {st['mpx_per_s']:.2f} Mpx/s, 取得 {st['grabs']} 枚, "
+          f"GUI 側 1 回 p50 {np.percentile(ticks, 50) * 1e3:.3f} ms max {max(ticks) * 1e3:.3f} ms")
+
+
+# =======================================================
+# 設定の保存・読み込み: 旧形式(1 設定 1 JSON を 2 つずつ) / ConfigStore(1 ファイル＋メモリ)
+# =======================================================
+def _legacy_save(base, data, title, exe):
+    """旧 save_config と同じ: exe_config/<exe>.json と window_config/<title>.json を毎回書く"""
+    from config_store import legacy_name
+    for sub, name in (("exe_config", exe), ("window_config", title)):
+        path = os.path.join(base, sub, f"{legacy_name(name)}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _legacy_load(base, title, exe):
+    """旧 load_config と同じ: os.path.exists と JSON 全体の読み込みを引くたびに行う"""
+    from config_store import legacy_name
+    for sub, name in (("window_config", title), ("exe_config", exe)):
+        path = os.path.join(base, sub, f"{legacy_name(name)}.json")
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+    return {}
+
+
+def _dir_size(path):
+    n = size = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            n += 1; size += os.path.getsize(os.path.join(root, name))
+    return n, size
+
+
+def bench_config(args):
+    import shutil
+    from config_store import ConfigStore
+    rng = np.random.default_rng(0)
+    exes = [f"app{i}.exe" for i in range(max(1, args.profiles // 20))]
+    profiles = [(exes[int(rng.integers(len(exes)))], f"Document {i} - Editor") for i in range(args.profiles)]
+    data = lambda i: {"crop": [0, 0, 1280 + i % 7, 720], "pos": [i % 1900, 40], "size": [640, 360], "opacity": 0.85}
+    queries = [profiles[int(i)] for i in rng.integers(len(profiles), size=args.lookups)]
+    for label in ("legacy", "store"):
+        base = os.path.join(args.dir, label)
+        shutil.rmtree(base, ignore_errors=True)
+        t0 = time.perf_counter()
+        if label == "legacy":
+            for i, (exe, title) in enumerate(profiles): _legacy_save(base, data(i), title, exe)
+        else:
+            store = ConfigStore(os.path.join(base, "profiles.json"), delay=args.delay)
+            for i, (exe, title) in enumerate(profiles): store.put(exe, title, data(i))
+            store.close()
+        t_fill = time.perf_counter() - t0
+        # 起動(設定を使えるようになるまで)と参照
+        t0 = time.perf_counter()
+        if label == "store": store = ConfigStore(os.path.join(base, "profiles.json"), delay=args.delay)
+        t_open = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        for exe, title in queries:
+            got = _legacy_load(base, title, exe) if label == "legacy" else store.get(exe, title)
+            assert got, (exe, title)
+        t_lookup = (time.perf_counter() - t0) / len(queries)
+        # 閉じる・再選択のたびの保存(GUI スレッドが止まる時間)
+        t0 = time.perf_counter()
+        for i in range(args.saves):
+            exe, title = profiles[i % len(profiles)]
+            if label == "legacy": _legacy_save(base, data(i + 1), title, exe)
+            else: store.put(exe, title, data(i + 1))
+        t_save = (time.perf_counter() - t0) / args.saves
+        t0 = time.perf_counter()
+        writes = 0
+        if label == "store":
+            store.close(); writes = store.writes
+        t_close = time.perf_counter() - t0
+        files, size = _dir_size(base)
+        print(f"{label:6s} | fill {t_fill * 1e3:8.1f} ms | open {t_open * 1e3:6.1f} ms"
+              f" | lookup {t_lookup * 1e6:7.1f} µs | save {t_save * 1e6:8.1f} µs/call"
+              f" | close {t_close * 1e3:6.1f} ms ({writes} writes for {args.saves} saves)"
+              f" | {files} files, {size / 1024:.0f} KiB")
+    shutil.rmtree(args.dir, ignore_errors=True)
+
+
+def add_commands(sub):
+    p = sub.add_parser("windows")
+    p.add_argument("--windows", type=int, default=400, help="トップレベルウィンドウ数 (表示中は約 4 割)")
+    p.add_argument("--procs", type=int, default=60)
+    p.add_argument("--process-ms", type=float, default=0.5, help="プロセス名 1 回の取得時間 (模擬)")
+    p.add_argument("--refreshes", type=int, default=20)
+    p.set_defaults(fn=bench_windows)
+    p = sub.add_parser("thumbs")
+    p.add_argument("--windows", type=int, default=40)
+    p.add_argument("--visible", type=int, default=12, help="グリッドに見えている候補の数")
+    p.add_argument("--budget", type=float, default=20.0, help="元ウィンドウの Mpx/秒")
+    p.add_argument("--capacity", type=int, default=64)
+    p.add_argument("--close", type=int, default=5, help="途中で閉じるウィンドウの数")
+    p.add_argument("--seconds", type=float, default=10.0, help="模擬時計で回す秒数")
+    p.add_argument("--ns-per-px", type=float, default=1.0, help="取得のコスト (元ウィンドウ 1 画素あたり、模擬)")
+    p.add_argument("--live", type=float, default=2.0, help="実スレッドで回す秒数")
+    p.add_argument("--grab-ms", type=float, default=2.0, help="実スレッドでの 1 枚の取得時間 (模擬)")
+    p.set_defaults(fn=bench_thumbs)
+    p = sub.add_parser("config")
+    p.add_argument("--profiles", type=int, default=2000, help="保存済みのウィンドウ設定の数")
+    p.add_argument("--lookups", type=int, default=2000)
+    p.add_argument("--saves", type=int, default=200)
+    p.add_argument("--delay", type=float, default=1.0, help="ConfigStore の書き込み遅延 (秒)")
+    p.add_argument("--dir", default=os.path.join(tempfile.gettempdir(), "wc_config"))
+    p.set_defaults(fn=bench_config)
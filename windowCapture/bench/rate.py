@@ -0,0 +1,150 @@
+"""取得レートのベンチマーク: fps ガバナー・表示状態による間引き"""
+import os, time, threading
+from frame_ring import FrameRing
+from capture_scheduler import CaptureScheduler
+from capture_backend import make_backend
+from pipeline import FramePipeline, run_capture
+from dirty_tiles import TileDiff, merge_masks
+from metrics import Metrics
+from .common import parse_res
+
+
+# =======================================================
+# fps ガバナー: 変化トレースの再生で CPU 削減量と増えた遅延を比べる
+# =======================================================
+def bench_governor(args):
+    """記録した(か合成の)変化トレースを再生し、固定レートと比べた CPU 削減量と増えた遅延を出す。
+    --live では合成ソースの内容を台本どおりに切り替えて、実際のパイプラインで区間ごとの CPU と追従を見る"""
+    from governor import RateGovernor, simulate, make_trace, load_trace
+    if args.trace_file:
+        traces = [(os.path.basename(p), load_trace(p)) for p in args.trace_file]
+    else:
+        traces = [(k, make_trace(k, args.seconds, args.fps, seed=i)) for i, k in enumerate(args.traces.split(","))]
+    kw = dict(idle_fps=args.idle_fps)
+    cost = (args.cost_ms, args.cost_ms + args.convert_ms)
+    print(f"-- セッションごと (固定 {args.base} と比較。1 フレーム {cost[0]:g} ms、変化ありは {cost[1]:g} ms)")
+    for name, tr in traces:
+        (b,), _ = simulate([tr], cost_ms=cost, base=args.base)
+        (x,), gov = simulate([tr], lambda c: RateGovernor(clock=c, **kw), cost_ms=cost, base=args.base)
+        g = gov.stats()["sessions"][0]
+        print(f"  {name:10s} 取得 {b['fetches']:6d} → {x['fetches']:6d}, CPU {100 * (1 - x['cpu_s'] / max(b['cpu_s'], 1e-9)):5.1f}% 減 | "
+              f"遅延 p50 {x['latency_p50_ms']:6.1f} p95 {x['latency_p95_ms']:6.1f} max {x['latency_max_ms']:6.1f} ms "
+              f"(固定 p95 {b['latency_p95_ms']:.1f}) | 動き始め {g['attacks']} (一瞬 {g['blips']}), "
+              f"ポリシー変更 {g['policy_changes']}")
+    if args.budget and len(traces) > 1:
+        all_ = [tr for _, tr in traces]
+        dur = max(tr[0][-1] for tr in all_)
+        base, _ = simulate(all_, cost_ms=cost, base=args.base)
+        got, gov = simulate(all_, lambda c: RateGovernor(cpu_budget=args.budget, clock=c, **kw),
+                            cost_ms=cost, base=args.base)
+        print(f"-- 全トレースを同時に (CPU 予算 {args.budget:g} 個分): 使用量 "
+              f"{sum(b['cpu_s'] for b in base) / dur:.2f} → {sum(x['cpu_s'] for x in got) / dur:.2f} "
+              f"(予算で削った配分 {gov.limited} 回)")
+        for (name, _), b, x in zip(traces, base, got):
+            print(f"  {name:10s} CPU {b['cpu_s'] / dur:.3f} → {x['cpu_s'] / dur:.3f}, 遅延 p95 {x['latency_p95_ms']:6.1f} ms")
+    if not args.live: return
+    script = [(k, float(v)) for k, v in (p.split(":") for p in args.script.split(","))]
+    print(f"-- 実時間 ({args.backend}, 台本 {args.script})")
+    for use in (False, True):
+        backend = make_backend(args.backend)
+        backend.open()
+        pipe = FramePipeline(FrameRing(3, merge=merge_masks), diff=TileDiff(64))
+        pipe.set_output_size((800, 480))
+        sched = CaptureScheduler("latest")
+        gov = g = None
+        if use:
+            gov = RateGovernor(**kw)
+            g = gov.add(pipe, sched.set_policy, "latest", name="live")
+        th = threading.Thread(target=run_capture, args=(backend, pipe, sched), daemon=True)
+        th.start()
+        rows = []
+        for pattern, secs in script:
+            backend.pattern = pattern
+            n0, c0, t0 = pipe.processed + pipe.skipped_frames, pipe.cpu_time, time.perf_counter()
+            ramp = None
+            while time.perf_counter() - t0 < secs:
+                if g is not None and ramp is None and pattern != "static" and g.fps == g.policy.max_fps:
+                    ramp = time.perf_counter() - t0
+                time.sleep(0.002)
+            dt = time.perf_counter() - t0
+            rows.append(f"{pattern} {(pipe.processed + pipe.skipped_frames - n0) / dt:5.1f} fps "
+                        f"{100 * (pipe.cpu_time - c0) / dt:5.1f}% CPU" + (f" 追従 {1e3 * ramp:.0f} ms" if ramp else ""))
+        sched.stop(); th.join(); backend.close()
+        print(f"  {'governor' if use else '固定    '}: " + " | ".join(rows))
+        if gov: print("   ", gov.stats()["sessions"][0])
+
+
+# =======================================================
+# 表示状態による間引き: 状態を台本どおりに切り替えて各区間の処理量を比べる
+# =======================================================
+VIS_FLAGS = {"active": {}, "hidden": {"view_visible": False},
+             "minimized": {"target_minimized": True}, "gone": {"target_alive": False}}
+
+
+def bench_visibility(args):
+    from visibility import VisibilityThrottle, ACTIVE
+    backend = make_backend(args.backend)
+    backend.open()
+    pipe = FramePipeline(FrameRing(3, merge=merge_masks), diff=TileDiff(64))
+    pipe.set_output_size(args.view)
+    pipe.metrics = Metrics()
+    if args.sink:
+        pipe.sinks.append(lambda bgra, ts: None)
+    sched = CaptureScheduler(args.policy)
+    vis = VisibilityThrottle(sched, pipe, args.keepalive)
+    resumed = [None, []]          # active に戻った時刻, 再開までの遅延
+    def on_change(old, new):
+        if new == ACTIVE: resumed[0] = time.perf_counter()
+    vis.listeners.append(on_change)
+    def emit(idx):
+        if resumed[0] is not None:
+            resumed[1].append(time.perf_counter() - resumed[0]); resumed[0] = None
+    th = threading.Thread(target=run_capture, args=(backend, pipe, sched, emit), daemon=True)
+    th.start()
+    for step in args.script.split(","):
+        state, _, sec = step.partition(":")
+        flags = dict(target_alive=True, target_visible=True, target_minimized=False, view_visible=True)
+        flags.update(VIS_FLAGS[state])
+        c = pipe.metrics.counters
+        before = (c.get("frames_in", 0), pipe.processed, pipe.suppressed, pipe.cpu_time, sched.wakeups)
+        vis.update(**flags)
+        time.sleep(float(sec or 1.0))
+        fin, done, sup, cpu, wk = (a - b for a, b in zip(
+            (c.get("frames_in", 0), pipe.processed, pipe.suppressed, pipe.cpu_time, sched.wakeups), before))
+        dt = float(sec or 1.0)
+        print(f"{state:10s} {dt:4.1f}s: {fin / dt:6.1f} frames/s in, {done / dt:6.1f} converted/s,"
+              f" {sup} suppressed, {wk / dt:6.1f} wakeups/s | capture CPU {cpu / dt * 1e3:6.1f} ms/s"
+              f" [{sched.policy}]")
+    sched.stop(); th.join(); backend.close()
+    lat = resumed[1]
+    if lat:
+        print(f"resume → first frame: {', '.join(f'{v * 1e3:.1f}' for v in lat)} ms")
+    print(vis.stats())
+
+
+def add_commands(sub):
+    p = sub.add_parser("governor")
+    p.add_argument("--traces", default="static,video:24,clock,typing,scroll,game",
+                   help="合成トレース (static / video:N / clock / typing / scroll / game)")
+    p.add_argument("--trace-file", action="append", default=[],
+                   help="記録したトレース (windowCapture.py --trace-changes の出力か .wcap 録画)")
+    p.add_argument("--seconds", type=float, default=30.0)
+    p.add_argument("--fps", type=float, default=60.0, help="合成トレースのソース fps")
+    p.add_argument("--base", default="latest", help="固定レートのポリシー (比較の基準・ガバナーの上限)")
+    p.add_argument("--idle-fps", type=float, default=10.0)
+    p.add_argument("--cost-ms", type=float, default=2.0, help="1 フレームの読み出し＋変化検出 (模擬)")
+    p.add_argument("--convert-ms", type=float, default=3.0, help="変化したフレームの変換 (模擬)")
+    p.add_argument("--budget", type=float, default=0.5, help="同時再生での CPU 予算 (CPU 何個分)")
+    p.add_argument("--live", action="store_true", help="合成ソースで実時間でも比べる")
+    p.add_argument("--backend", default="synthetic:1920x1080@60:static")
+    p.add_argument("--script", default="static:2,bars:2,static:2", help="パターン:秒 の並び")
+    p.set_defaults(fn=bench_governor)
+    p = sub.add_parser("visibility")
+    p.add_argument("--backend", default="synthetic:1920x1080@60:bars")
+    p.add_argument("--policy", default="latest")
+    p.add_argument("--view", type=lambda v: parse_res(v)[0], default=(800, 480))
+    p.add_argument("--keepalive", type=float, default=1.0)
+    p.add_argument("--script", default="active:1,hidden:1,minimized:2,active:1",
+                   help="状態:秒 の並び (active / hidden / minimized / gone)")
+    p.add_argument("--sink", action="store_true", help="空のシンクを付ける (録画・共有がある場合)")
+    p.set_defaults(fn=bench_visibility)
@@ -0,0 +1,150 @@
+"""ROI 監視のベンチマーク"""
+import time, threading
+import numpy as np
+from frame_ring import FrameRing
+from capture_scheduler import CaptureScheduler
+from capture_backend import make_backend
+from pipeline import FramePipeline, run_capture
+from dirty_tiles import TileDiff, merge_masks
+from .common import parse_res, parse_crop, timeit
+
+
+# =======================================================
+# ROI 監視: まとめた判定と ROI ごとの素朴な判定の比較・合成フレームでの検出
+# =======================================================
+ROI_KINDS = ("mean", "change", "hist", "template")
+
+
+def _roi_specs(n, kinds, w, h, size, tpl):
+    """画面に格子状に並べた n 個の ROI (name, rect, predicate)"""
+    from roi_watch import MeanColor, AnyChange, HistogramDistance, TemplateMatch
+    make = {"mean": lambda: MeanColor((0, 255, 0), 30), "change": lambda: AnyChange(0.01),
+            "hist": lambda: HistogramDistance(0.3), "template": lambda: TemplateMatch(tpl, 0.9)}
+    cols = max(1, w // (size + 8))
+    out = []
+    for i in range(n):
+        x, y = (i % cols) * (size + 8), (i // cols) * (size + 8) % max(1, h - size)
+        out.append((f"roi{i}", (x, y, x + size, y + size), make[kinds[i % len(kinds)]]()))
+    return out
+
+
+def _naive_roi(frame, specs, state):
+    """ROI ごとに切り出して判定する(比較用)"""
+    from roi_watch import color_histogram, MEAN, CHANGE, HIST
+    out = []
+    for name, (l, t, r, b), pred in specs:
+        roi = frame[t:b, l:r]
+        if pred.kind == MEAN:
+            v = float(np.abs(roi[..., :3].mean(axis=(0, 1)) - pred.bgr).max())
+        elif pred.kind == CHANGE:
+            prev = state.get(name)
+            v = 0.0 if prev is None else float(np.any(roi != prev, axis=2).mean())
+            state[name] = roi.copy()
+        elif pred.kind == HIST:
+            hist = color_histogram(roi, pred.bins)
+            v = 0.5 * float(np.abs(hist - state.setdefault(name, hist)).sum())
+        else:
+            v = pred.score(roi)
+        out.append(pred.test(v))
+    return out
+
+
+def _roi_scene(w, h, frame_no, tpl):
+    """表示灯(20 で赤・60 で緑)・カウンタ(40 で変化)・アイコン(70 で出現)・パネル(90 で配色変更)"""
+    img = np.zeros((h, w, 4), np.uint8)
+    img[:, :, 0] = np.linspace(0, 255, w, dtype=np.uint8)[None, :]
+    img[:, :, 1] = 90
+    img[:, :, 3] = 255
+    img[100:120, 100:120, :3] = (0, 0, 230) if 20 <= frame_no < 60 else (0, 230, 0)
+    digits = 7 if frame_no < 40 else 8
+    for d in range(digits):
+        img[200:230, 300 + 12 * d:308 + 12 * d, :3] = 255
+    if frame_no >= 70: img[400:416, 600:616, :3] = tpl[..., ::-1]
+    img[500:580, 800:900, :3] = (40, 40, 40) if frame_no < 90 else (200, 220, 255)
+    return img
+
+
+def bench_roi(args):
+    """ROI の判定コスト(まとめた判定とROI ごとの判定)、合成フレームでの検出、キャプチャと並べたときの影響"""
+    from roi_watch import RoiWatcher, MeanColor, AnyChange, HistogramDistance, TemplateMatch
+    w, h = args.res
+    rng = np.random.default_rng(0)
+    tpl = rng.integers(0, 256, (16, 16, 3), np.uint8)
+    frames = [rng.integers(0, 256, (h, w, 4), np.uint8) for _ in range(2)]
+    kinds = args.kinds.split(",")
+    print(f"-- 判定コスト ({w}x{h}, ROI {args.size}x{args.size})")
+    for kind in kinds:
+        for n in args.rois:
+            specs = _roi_specs(n, [kind], w, h, args.size, tpl)
+            watcher = RoiWatcher()
+            for name, rect, pred in specs: watcher.add(name, rect, pred)
+            state = {}
+            for f in frames: watcher.evaluate(f); want = _naive_roi(f, specs, state)
+            agree = [watcher._rois[name].raw for name, _, _ in specs] == want
+            batched = timeit(lambda: [watcher.evaluate(f) for f in frames], args.frames) / 2
+            naive = timeit(lambda: [_naive_roi(f, specs, state) for f in frames], args.frames) / 2
+            print(f"  {kind:8s} {n:5d} ROI: batched {1e3 * batched:7.2f} ms/frame, per-ROI {1e3 * naive:7.2f} ms/frame "
+                  f"(x{naive / batched:4.1f}){'' if agree else '  ⚠ 判定が一致しない'}")
+
+    print("-- 合成フレームでの検出 (60 fps の時計, hold 2 フレーム)")
+    t = [0.0]
+    watcher = RoiWatcher(clock=lambda: t[0])
+    log = []
+    hold = 2 / 60 - 1e-6
+    watcher.add("light", (100, 100, 120, 120), MeanColor((255, 0, 0), 40), log.append, hold=hold)
+    watcher.add("counter", (296, 196, 420, 234), AnyChange(0.01), log.append, release=0.2)
+    watcher.add("icon", (580, 380, 640, 440), TemplateMatch(tpl, 0.9), log.append, hold=hold)
+    watcher.add("panel", (800, 500, 900, 580), HistogramDistance(0.3), log.append, hold=hold)
+    for name, rect, pred in _roi_specs(args.fillers, ("mean", "change"), w, h, args.size, tpl):
+        l, t0, r, b = rect
+        watcher.add(name, (l, 700 + t0 % 300, r, 700 + t0 % 300 + b - t0), pred, log.append)
+    for i in range(120):
+        t[0] = i / 60
+        watcher.evaluate(_roi_scene(w, h, i, tpl))
+    t[0] = 2.5
+    watcher.poll()
+    for ev in log:
+        print(f"  frame {ev.timestamp * 60:5.1f}: {ev.name:8s} {'ON ' if ev.active else 'OFF'} (value {ev.value:.3f})")
+    print("  期待: light ON 22 / OFF 62, counter ON 40 / OFF 53, icon ON 72, panel ON 92。"
+          f"フィラー {args.fillers} 個の誤検出 {sum(e.name.startswith('roi') for e in log)}")
+
+    print(f"-- キャプチャと並べる ({args.backend}, ROI {args.rois[-1]}, 予算 {args.budget_ms} ms)")
+    for watch in (False, True):
+        backend = make_backend(args.backend)
+        backend.open()
+        pipe = FramePipeline(FrameRing(3, merge=merge_masks), diff=TileDiff(64))
+        pipe.set_crop(args.crop)
+        pipe.set_output_size((800, 480))
+        watcher = None
+        if watch:
+            watcher = RoiWatcher(budget_ms=args.budget_ms).start()
+            for name, rect, pred in _roi_specs(args.rois[-1], kinds, w, h, args.size, tpl):
+                watcher.add(name, rect, pred)
+            watcher.attach(pipe)
+        sched = CaptureScheduler("latest")
+        th = threading.Thread(target=run_capture, args=(backend, pipe, sched), daemon=True)
+        th.start()
+        t0 = time.perf_counter()
+        time.sleep(args.seconds)
+        sched.stop(); th.join(); backend.close()
+        dt = time.perf_counter() - t0
+        print(f"  {'watch' if watch else 'none '}: capture {pipe.processed / dt:6.1f} fps, "
+              f"{1e3 * pipe.cpu_time / max(1, pipe.processed):5.2f} ms/frame on capture thread")
+        if watcher:
+            watcher.close()
+            print("   ", watcher.stats())
+
+
+def add_commands(sub):
+    p = sub.add_parser("roi")
+    p.add_argument("--res", type=lambda v: parse_res(v)[0], default=(1920, 1080))
+    p.add_argument("--rois", type=lambda v: [int(x) for x in v.split(",")], default=[16, 64, 256])
+    p.add_argument("--kinds", default="mean,change,hist,template", help="ROI に順番に割り当てる判定")
+    p.add_argument("--size", type=int, default=32, help="ROI の一辺")
+    p.add_argument("--frames", type=int, default=20)
+    p.add_argument("--fillers", type=int, default=64, help="検出の確認で置く、反応してはいけない ROI の数")
+    p.add_argument("--backend", default="synthetic:1920x1080@60:bars")
+    p.add_argument("--crop", type=parse_crop, help="left,top,right,bottom (ROI はソース座標のまま)")
+    p.add_argument("--budget-ms", type=float, default=2.0)
+    p.add_argument("--seconds", type=float, default=3.0)
+    p.set_defaults(fn=bench_roi)
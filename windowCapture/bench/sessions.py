@@ -0,0 +1,91 @@
+"""複数セッションのベンチマーク"""
+import os, time, threading
+import numpy as np
+from frame_ring import FrameRing
+from capture_scheduler import CaptureScheduler
+from capture_backend import make_backend
+from pipeline import FramePipeline, run_capture
+from dirty_tiles import TileDiff, merge_masks
+from capture_manager import CaptureManager
+from .common import parse_res
+
+
+# =======================================================
+# 複数セッション: オーバーレイごとのスレッド / CaptureManager のワーカープール
+# =======================================================
+def _latency_probe(backend):
+    """到着通知 → 公開までの遅延を測る emit を返す(両方式で同じ測り方をする)"""
+    arrived, lat = [None], []
+    def on_arrived():
+        if arrived[0] is None: arrived[0] = time.monotonic()
+    def emit(idx):
+        if arrived[0] is not None:
+            lat.append(time.monotonic() - arrived[0]); arrived[0] = None
+    backend.on_frame_arrived(on_arrived)
+    return emit, lat
+
+
+def _sessions(args):
+    out = []
+    for i in range(args.sessions):
+        backend = make_backend(args.backend)
+        pipe = FramePipeline(FrameRing(3, merge=merge_masks), diff=TileDiff(64))
+        pipe.set_output_size(args.view)
+        emit, lat = _latency_probe(backend)
+        out.append((backend, pipe, emit, lat))
+    return out
+
+
+def _report(label, sessions, dt):
+    frames = sum(p.processed for _, p, _, _ in sessions)
+    lat = np.array([v for *_, l in sessions for v in l] or [0.0]) * 1e3
+    fair = np.array([p.processed for _, p, _, _ in sessions], float)
+    jain = fair.sum() ** 2 / (len(fair) * (fair ** 2).sum()) if fair.any() else 0.0    # 1.0 で完全に公平
+    print(f"{label:12s}: {frames / dt:7.1f} fps total | latency p50 {np.percentile(lat, 50):6.2f} ms"
+          f" p99 {np.percentile(lat, 99):7.2f} ms | per session min/max {fair.min():.0f}/{fair.max():.0f}"
+          f" (fairness {jain:.3f})")
+
+
+def bench_manager(args):
+    cpus = os.cpu_count() or 1
+    print(f"-- {args.sessions} sessions {args.backend}, {cpus} CPU")
+    if cpus == 1:
+        print("   (CPU 1 個: ワーカー数は 1 に切り詰められるので、ワーカー数による伸びは測れない。"
+              "公平性と遅延だけを比べる)")
+    # オーバーレイごとに 1 スレッド (CaptureThread 相当)
+    sessions = _sessions(args)
+    scheds, threads = [], []
+    for backend, pipe, emit, _ in sessions:
+        backend.open()
+        sched = CaptureScheduler(args.policy)
+        scheds.append(sched)
+        threads.append(threading.Thread(target=run_capture, args=(backend, pipe, sched, emit), daemon=True))
+    t0 = time.perf_counter()
+    for th in threads: th.start()
+    time.sleep(args.seconds)
+    for s in scheds: s.stop()
+    for th in threads: th.join()
+    _report("threads", sessions, time.perf_counter() - t0)
+    for backend, *_ in sessions: backend.close()
+    # 共有ワーカープール
+    for n in (int(v) for v in args.workers.split(",")):
+        mgr = CaptureManager(n)
+        sessions = _sessions(args)
+        mgr.start()
+        t0 = time.perf_counter()
+        for backend, pipe, emit, _ in sessions:
+            mgr.open(backend, pipe, policy=args.policy, emit=emit)
+        time.sleep(args.seconds)
+        mgr.stop()
+        _report(f"workers={mgr.workers}", sessions, time.perf_counter() - t0)
+
+
+def add_commands(sub):
+    p = sub.add_parser("manager")
+    p.add_argument("--sessions", type=int, default=8)
+    p.add_argument("--workers", default="1,2,4")
+    p.add_argument("--backend", default="synthetic:1920x1080@60:bars")
+    p.add_argument("--policy", default="latest")
+    p.add_argument("--view", type=lambda v: parse_res(v)[0], default=(640, 360))
+    p.add_argument("--seconds", type=float, default=3.0)
+    p.set_defaults(fn=bench_manager)
@@ -0,0 +1,229 @@
+"""出力先のベンチマーク: 録画・共有メモリ公開・ネットワーク配信"""
+import os, time, threading
+import numpy as np
+from frame_ring import FrameRing
+from capture_scheduler import CaptureScheduler
+from capture_backend import make_backend
+from pipeline import FramePipeline, run_capture
+from dirty_tiles import TileDiff, merge_masks
+from metrics import Histogram
+from .common import parse_res, synthetic_bgra
+
+
+# =======================================================
+# 録画: パイプラインに録画シンクを付けて書き込み、読み直して内容とシーク時間を確かめる
+# =======================================================
+def bench_record(args):
+    """パイプラインに録画シンクを付けて記録し、読み直して内容とシーク時間を確かめる"""
+    import zlib
+    from recorder import FrameRecorder
+    from frame_file import FrameFileReader
+    backend = make_backend(args.backend)
+    backend.open()
+    pipe = FramePipeline(FrameRing(3), diff=TileDiff(64))
+    rec = FrameRecorder(args.out, args.queue, args.drop, codec=args.codec, compress=args.compress,
+                        keyint=args.keyint)
+    crcs = {}
+    pipe.sinks.append(rec)
+    pipe.sinks.append(lambda bgra, ts: crcs.__setitem__(ts, zlib.crc32(np.ascontiguousarray(bgra))))
+    sched = CaptureScheduler("every")
+    def emit(idx):
+        if pipe.processed >= args.frames: sched.stop()
+    t0 = time.perf_counter()
+    run_capture(backend, pipe, sched, emit)
+    t_cap = time.perf_counter() - t0
+    rec.close()
+    t_all = time.perf_counter() - t0
+    backend.close()
+    st = rec.stats()
+    print(f"{args.codec}/{args.compress or 'none'}: {st['written']} written, {st['dropped']} dropped"
+          f" (queue max {st['queue_max']}, {st['buffers']} buffers) | {st['bytes_out'] / 1e6:.1f} MB,"
+          f" ratio {st['ratio']:.1f}x | capture {pipe.processed / t_cap:.1f} fps, drain +{(t_all - t_cap) * 1e3:.0f} ms")
+    r = FrameFileReader(args.out)
+    bad = 0
+    t0 = time.perf_counter()
+    for i in range(len(r)):
+        data, w, h, stride, ts = r.frame(i)
+        img = np.ndarray((h, w, 4), np.uint8, data, strides=(stride, 4, 1))
+        if ts in crcs and zlib.crc32(np.ascontiguousarray(img)) != crcs[ts]: bad += 1
+        del img; data.release()
+    t_seq = (time.perf_counter() - t0) / max(1, len(r))
+    rng = np.random.default_rng(0)
+    t0 = time.perf_counter()
+    for ts in rng.uniform(r.timestamps[0], r.timestamps[-1], 50):
+        data = r.frame(r.seek(ts))[0]; data.release()
+    t_seek = (time.perf_counter() - t0) / 50
+    print(f"  read back {len(r)} frames, {bad} mismatched | sequential {t_seq * 1e3:.2f} ms/frame,"
+          f" random seek {t_seek * 1e3:.2f} ms ({len(r.keys)} keyframes)")
+    r.close()
+
+
+# =======================================================
+# 共有メモリ公開: 書き込み側 1 つ + 読み手プロセス N 個
+# =======================================================
+def _stamp(arr, seq):
+    """先頭と末尾の画素に seq を書く(読み手が破れを検出するため)"""
+    b = np.frombuffer(seq.to_bytes(4, "little"), np.uint8)
+    arr[0, 0] = b; arr[-1, -1] = b
+
+
+def _share_reader(name, seconds, out):
+    from shm_export import SharedFrameReader
+    end = time.monotonic() + seconds
+    while True:
+        try:
+            r = SharedFrameReader(name); break
+        except FileNotFoundError:
+            if time.monotonic() > end: out.put(None); return
+            time.sleep(0.01)
+    lat, seen, skipped, invalid, bad, last = Histogram(), 0, 0, 0, 0, 0
+    while time.monotonic() < end:
+        f = r.wait(0.1, poll=0.0002)
+        if f is None: continue
+        lat.add(time.monotonic() - f.timestamp)
+        a = f.array
+        head, tail = a[0, 0].tobytes(), a[-1, -1].tobytes()
+        a[::16, ::16, 1].mean()                 # ビューのまま軽く読む
+        if not f.valid():
+            invalid += 1
+        elif head != tail or int.from_bytes(head, "little") != f.seq:
+            bad += 1                            # seqlock をすり抜けた破れ(0 のはず)
+        if last: skipped += f.seq - last - 1
+        last = f.seq
+        seen += 1
+        del a, f
+    out.put({"seen": seen, "skipped": skipped, "invalid": invalid, "torn": r.torn, "bad": bad,
+             "lat_p50_ms": 1e3 * lat.percentile(50), "lat_p99_ms": 1e3 * lat.percentile(99)})
+    r.close()
+
+
+def bench_share(args):
+    """合成フレームを共有メモリに公開し、別プロセスの読み手がコピーなしで読む。
+    書き込み 1 回あたりのコストが読み手の数に依存しないこと・破れを seqlock で検出できることを確かめる"""
+    import multiprocessing as mp
+    from shm_export import SharedFramePublisher
+    (w, h), = parse_res(args.res)
+    ctx = mp.get_context("spawn")
+    for n in [int(v) for v in args.readers.split(",")]:
+        name = f"wcbench{os.getpid()}"
+        out = ctx.Queue()
+        procs = [ctx.Process(target=_share_reader, args=(name, args.seconds + 1.0, out)) for _ in range(n)]
+        for p in procs: p.start()
+        pub = SharedFramePublisher(name, args.slots)
+        arr = np.frombuffer(synthetic_bgra(w, h), np.uint8).reshape(h, w, 4).copy()
+        cost = Histogram()
+        time.sleep(0.5)                         # 読み手の起動待ち
+        interval = 1.0 / args.fps if args.fps else 0.0
+        t0 = time.monotonic()
+        nxt = t0
+        while time.monotonic() - t0 < args.seconds:
+            _stamp(arr, pub.seq + 1)
+            t = time.perf_counter()
+            pub.publish(arr, time.monotonic())
+            cost.add(time.perf_counter() - t)
+            if interval:
+                nxt += interval
+                time.sleep(max(0.0, nxt - time.monotonic()))
+        dt = time.monotonic() - t0
+        res = [out.get() for _ in procs]
+        for p in procs: p.join()
+        pub.close()
+        print(f"{n} readers: published {pub.seq} ({pub.seq / dt:.0f} fps) | publish p50"
+              f" {cost.percentile(50) * 1e3:.2f} ms p99 {cost.percentile(99) * 1e3:.2f} ms")
+        for i, r in enumerate(res):
+            if r is None:
+                print(f"  reader {i}: could not attach"); continue
+            print(f"  reader {i}: {r['seen'] / dt:6.0f} fps, skipped {r['skipped']}, invalid {r['invalid']},"
+                  f" torn {r['torn']}, undetected {r['bad']} | latency p50 {r['lat_p50_ms']:.2f}"
+                  f" ms p99 {r['lat_p99_ms']:.2f} ms")
+
+
+# =======================================================
+# ネットワーク配信: 速いクライアントと遅いクライアントを同時に繋ぐ（ループバック）
+# =======================================================
+async def _stream_client(addr, rate, rcvbuf, seconds, out):
+    from stream_server import StreamClient
+    c = await StreamClient(rate).connect(*addr, rcvbuf=rcvbuf)
+    lat = []
+    t0 = time.monotonic()
+    while time.monotonic() - t0 < seconds:
+        if await c.receive() is None: break
+        lat.append(time.monotonic() - c.decoder.timestamp)
+    await c.close()
+    d = c.decoder
+    out.append({"rate": rate, "messages": d.messages, "keyframes": d.keyframes, "level": d.level,
+                "fps": d.messages / seconds, "mbps": c.bytes * 8 / seconds / 1e6,
+                "lat_p50_ms": float(np.percentile(lat, 50)) * 1e3 if lat else 0.0})
+
+
+def bench_stream(args):
+    """キャプチャ → パイプライン → StreamServer を動かし、速い・遅いクライアントで受信する。
+    遅いクライアントがいてもキャプチャと速いクライアントの fps が落ちないこと、符号化が
+    クライアント数に比例しないこと、遅いクライアントの fps・品質段が下がることを確かめる"""
+    import asyncio
+    from stream_server import StreamServer
+    rows = []
+    for fast, slow in ((0, 0), (args.fast, 0), (args.fast, args.slow)):
+        backend = make_backend(args.backend)
+        backend.open()
+        pipe = FramePipeline(FrameRing(3, merge=merge_masks), diff=TileDiff(64))
+        pipe.set_output_size(args.view)
+        srv = StreamServer(levels=args.levels, max_fps=args.max_fps, sndbuf=args.sndbuf)
+        addr = srv.start()
+        pipe.sinks.append(srv)
+        sched = CaptureScheduler("latest")
+        th = threading.Thread(target=run_capture, args=(backend, pipe, sched), daemon=True)
+        th.start()
+        t0 = time.perf_counter()
+        out = []
+        async def clients():
+            await asyncio.gather(
+                *[_stream_client(addr, None, None, args.seconds, out) for _ in range(fast)],
+                *[_stream_client(addr, args.slow_rate, 32 * 1024, args.seconds, out) for _ in range(slow)],
+                asyncio.sleep(args.seconds))
+        asyncio.run(clients())
+        dt = time.perf_counter() - t0
+        sched.stop(); th.join(); backend.close()
+        st = srv.stats()
+        srv.close()
+        print(f"{fast} fast + {slow} slow: capture {pipe.processed / dt:6.1f} fps, "
+              f"{1e3 * pipe.cpu_time / max(1, pipe.processed):5.2f} ms/frame | encode {st['encoded']} frames "
+              f"({st['encode_ms_per_frame']:5.2f} ms/frame, {st['tiles_encoded']} tiles, replaced {st['replaced']})")
+        for r in sorted(out, key=lambda r: r["rate"] or 0):
+            kind = "slow" if r["rate"] else "fast"
+            print(f"  {kind}: {r['fps']:6.1f} fps, level {r['level']}, {r['mbps']:6.2f} Mbit/s, "
+                  f"{r['keyframes']} keyframes, latency p50 {r['lat_p50_ms']:7.1f} ms")
+        for c in srv.finished:
+            print(f"    server side: level {c['level']} fps cap {c['fps_cap']}, coalesced {c['coalesced']},"
+                  f" downgrades {c['downgrades']} upgrades {c['upgrades']}, drain wait {c['wait_s']:.2f} s")
+
+
+def add_commands(sub):
+    p = sub.add_parser("record")
+    p.add_argument("out")
+    p.add_argument("--backend", default="synthetic:1280x720@0:bars")
+    p.add_argument("--frames", type=int, default=120)
+    p.add_argument("--codec", default="raw", choices=["raw", "delta"])
+    p.add_argument("--compress", choices=["zlib"])
+    p.add_argument("--keyint", type=int, default=120)
+    p.add_argument("--queue", type=int, default=8)
+    p.add_argument("--drop", default="oldest", choices=["oldest", "newest"])
+    p.set_defaults(fn=bench_record)
+    p = sub.add_parser("share")
+    p.add_argument("--readers", default="1,4", help="読み手プロセス数 (カンマ区切りで掃引)")
+    p.add_argument("--res", default="1920x1080")
+    p.add_argument("--fps", type=float, default=240.0, help="公開レート (0 で最大)")
+    p.add_argument("--seconds", type=float, default=3.0)
+    p.add_argument("--slots", type=int, default=4)
+    p.set_defaults(fn=bench_share)
+    p = sub.add_parser("stream")
+    p.add_argument("--backend", default="synthetic:1920x1080@60:bars")
+    p.add_argument("--view", type=lambda v: parse_res(v)[0], help="表示サイズ (パイプラインの縮小。配信は縮小前)")
+    p.add_argument("--fast", type=int, default=2)
+    p.add_argument("--slow", type=int, default=2)
+    p.add_argument("--slow-rate", type=float, default=300e3, help="遅いクライアントの受信速度 (バイト/秒)")
+    p.add_argument("--levels", type=int, default=3)
+    p.add_argument("--max-fps", type=float, default=60.0)
+    p.add_argument("--sndbuf", type=int, default=64 * 1024, help="サーバー側の SO_SNDBUF (詰まりを早く検出する)")
+    p.add_argument("--seconds", type=float, default=8.0)
+    p.set_defaults(fn=bench_stream)
@@ -0,0 +1,173 @@
+"""起動時間のベンチマーク"""
+import sys, os, time, json, platform
+import numpy as np
+from .common import ROOT
+
+
+# =======================================================
+# 起動時間: import の内訳（-X importtime）と最初のフレームまで（先読みあり / なし）
+# =======================================================
+# 起動直後に読むもの(ウィンドウ選択まで)と、選んだ後に要るもの(キャプチャ側)
+STARTUP_LIGHT = ["PyQt5.QtWidgets", "window_index", "window_picker"]
+STARTUP_CAPTURE = ["numpy", "frame_ring", "pipeline", "dirty_tiles", "scale", "capture_backend",
+                   "capture_manager", "async_readback", "metrics", "visibility", "recorder", "shm_export"]
+
+# 子プロセスで実行する起動の模擬。ベンチ自体が numpy を読んでいるので別スクリプトにする
+_STARTUP_CHILD = r"""
+import sys, time, threading, json
+T0 = time.perf_counter()
+prewarm, pick_ms, device_ms, spec = sys.argv[1] == "1", float(sys.argv[2]), float(sys.argv[3]), sys.argv[4]
+marks = {}
+def mark(k): marks[k] = 1e3 * (time.perf_counter() - T0)
+from PyQt5 import QtWidgets
+from window_index import WindowIndex, FakeWindowProvider
+from window_picker import WindowPicker
+mark("light_imports")
+
+def capture_stack():
+    import numpy
+    from capture_manager import CaptureManager
+    import frame_ring, pipeline, dirty_tiles, scale, capture_backend, async_readback, metrics, visibility
+    manager = CaptureManager(0)
+    try: manager.prewarm()
+    except Exception: time.sleep(device_ms / 1e3)     # WinRT の無い環境ではデバイス作成を待ち時間で模擬
+    return manager
+
+box = {}
+th = threading.Thread(target=lambda: box.update(manager=capture_stack()), daemon=True)
+if prewarm: th.start()
+app = QtWidgets.QApplication(sys.argv[:1])
+wins = {0x10000 + i: {"pid": 1000 + i % 7, "title": f"window {i}"} for i in range(40)}
+procs = {1000 + i: (1.7e9, f"app{i}.exe") for i in range(7)}
+dlg = WindowPicker(WindowIndex(FakeWindowProvider(wins, procs)))
+dlg.show(); app.processEvents()
+mark("picker_shown")
+# ユーザーが選ぶ間イベントループを回し、先読みで GUI が止まった最長時間を測る
+stall, last, end = 0.0, time.perf_counter(), time.perf_counter() + pick_ms / 1e3
+while last < end:
+    app.processEvents(); time.sleep(0.002)
+    now = time.perf_counter(); stall = max(stall, now - last); last = now
+mark("picked")
+dlg.close()
+if prewarm: th.join()
+else: box["manager"] = capture_stack()
+mark("capture_ready")
+from frame_ring import FrameRing
+from pipeline import FramePipeline
+from dirty_tiles import TileDiff, merge_masks
+from scale import Scaler
+from capture_backend import make_backend
+backend = make_backend(spec)
+backend.open(); backend.start()
+pipe = FramePipeline(FrameRing(3, merge=merge_masks), diff=TileDiff(64), scaler=Scaler("fast"))
+pipe.set_output_size((800, 480))
+while True:
+    f = backend.next_frame()
+    if f is None: time.sleep(0.001); continue
+    try: idx = pipe.process(f)
+    finally: f.close()
+    if idx is not None: break
+mark("first_frame")
+backend.stop(); backend.close()
+marks["picker_stall"] = 1e3 * stall
+print(json.dumps(marks))
+"""
+
+
+def _importtime(modules):
+    """python -X importtime で modules を読み込み、(合計 ms, {字下げなしの import: 累計 ms})"""
+    import subprocess
+    code = "import " + ", ".join(modules) if modules else "pass"
+    r = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                       cwd=ROOT, capture_output=True, text=True)
+    if r.returncode:
+        raise RuntimeError(r.stderr.strip().splitlines()[-1])
+    top = {}
+    for line in r.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line: continue
+        _, cum, name = line[len("import time:"):].split("|")
+        name = name[1:]
+        if not name.startswith(" "):      # 字下げなし = 直接読み込んだもの(依存を含む累計)
+            top[name] = top.get(name, 0.0) + int(cum) / 1e3
+    return sum(top.values()), top
+
+
+def _startup_child(prewarm, args):
+    import subprocess
+    t0 = time.perf_counter()
+    r = subprocess.run([sys.executable, "-c", _STARTUP_CHILD, "1" if prewarm else "0", str(args.pick_ms),
+                        str(args.device_ms), args.backend],
+                       cwd=ROOT, capture_output=True, text=True,
+                       env=dict(os.environ, QT_QPA_PLATFORM=os.environ.get("QT_QPA_PLATFORM", "offscreen")))
+    if r.returncode:
+        raise RuntimeError(r.stderr.strip())
+    marks = json.loads(r.stdout.strip().splitlines()[-1])
+    marks["process"] = 1e3 * (time.perf_counter() - t0)
+    return marks
+
+
+def _startup_real(prewarm, args):
+    """windowCapture.py を合成ソースで起動して --trace-startup の出力を読む(Windows のみ)"""
+    import subprocess
+    cmd = [sys.executable, "windowCapture.py", "--backend", args.backend, "--trace-startup",
+           "--exit-after-first-frame"] + ([] if prewarm else ["--no-prewarm"])
+    t0 = time.perf_counter()
+    r = subprocess.run(cmd, cwd=ROOT, capture_output=True, text=True)
+    total = 1e3 * (time.perf_counter() - t0)
+    marks = {}
+    for line in r.stdout.splitlines():
+        if line.startswith("[startup]"):
+            ms, _, what = line[len("[startup]"):].strip().partition(" ms  ")
+            marks[what] = float(ms)
+    marks["process"] = total
+    return marks
+
+
+def bench_startup(args):
+    groups = [("picker", STARTUP_LIGHT), ("capture", STARTUP_CAPTURE),
+              ("all at top (old)", STARTUP_LIGHT + STARTUP_CAPTURE)]
+    if platform.system() == "Windows":
+        groups[1][1].append("overlay"); groups.append(("winrt", ["capture_backend"]))
+    startup = set(_importtime([])[1])     # インタプリタ起動時の分(site など)は除く
+    print(f"-X importtime (median of {args.repeat}):")
+    for label, mods in groups:
+        runs = [_importtime(mods) for _ in range(args.repeat)]
+        runs.sort(key=lambda r: r[0])
+        _, top = runs[len(runs) // 2]
+        top = {k: v for k, v in top.items() if k not in startup}
+        total = sum(top.values())
+        if label == "winrt":
+            from capture_backend import import_winrt
+            t0 = time.perf_counter(); import_winrt()
+            print(f"  {label:18s} {1e3 * (time.perf_counter() - t0):7.1f} ms (import_winrt in-process)")
+            continue
+        heavy = sorted(top.items(), key=lambda kv: -kv[1])[:args.top]
+        print(f"  {label:18s} {total:7.1f} ms | " + ", ".join(f"{k} {v:.0f}" for k, v in heavy))
+    keys = ["light_imports", "picker_shown", "picked", "capture_ready", "first_frame", "picker_stall", "process"]
+    print(f"time to first frame (simulated pick after {args.pick_ms:.0f} ms, device {args.device_ms:.0f} ms"
+          f" when WinRT is unavailable, median of {args.repeat}):")
+    for prewarm in (False, True):
+        runs = [_startup_child(prewarm, args) for _ in range(args.repeat)]
+        med = {k: float(np.median([r[k] for r in runs])) for k in keys}
+        after = med["first_frame"] - med["picked"]
+        print(f"  prewarm {'on ' if prewarm else 'off'} | " + " ".join(f"{k} {med[k]:.0f}" for k in keys)
+              + f" | pick→frame {after:.0f} ms")
+    if args.real:
+        for prewarm in (False, True):
+            runs = [_startup_real(prewarm, args) for _ in range(args.repeat)]
+            med = {k: float(np.median([r.get(k, np.nan) for r in runs])) for k in runs[0]}
+            print(f"  windowCapture.py prewarm {'on ' if prewarm else 'off'} | "
+                  + ", ".join(f"{k} {v:.0f}" for k, v in med.items()))
+
+
+def add_commands(sub):
+    p = sub.add_parser("startup")
+    p.add_argument("--pick-ms", type=float, default=800, help="ウィンドウを選ぶまでの時間 (模擬)")
+    p.add_argument("--device-ms", type=float, default=250,
+                   help="WinRT の無い環境で模擬する D3D デバイス・プール作成と winrt import の時間")
+    p.add_argument("--backend", default="synthetic:1920x1080@0:bars")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--top", type=int, default=8, help="内訳に出す import の数")
+    p.add_argument("--real", action="store_true",
+                   help="windowCapture.py --trace-startup も計測する (Windows・合成ソース)")
+    p.set_defaults(fn=bench_startup)
@@ -0,0 +1,293 @@
+"""ベンチマークスイート（回帰の検出）"""
+import sys, os, time, json, threading, platform, fnmatch, resource, tracemalloc
+import numpy as np
+from frame_ring import FrameRing
+from capture_scheduler import CaptureScheduler
+from capture_backend import SyntheticBackend
+from pipeline import FramePipeline, run_capture
+from dirty_tiles import TileDiff, tile_rects, merge_masks
+from metrics import Metrics
+from .common import RESOLUTIONS, parse_res, qt_app
+
+
+# =======================================================
+# ベンチマークスイート（解像度・形式・トリミング・縮小率・表示側速度の掃引）
+# =======================================================
+SUITE_QUICK = dict(res=RESOLUTIONS, formats="packed", crops="full,center50", scales="1,0.5",
+                   consumer_ms="0")
+SUITE_FULL = dict(res=RESOLUTIONS, formats="packed,padded", crops="full,center50",
+                  scales="1,0.5,0.25", consumer_ms="0,8")
+STRIDE_PAD = {"packed": 0, "padded": 256}     # padded: GPU の行ピッチ相当の余白付き BGRA
+
+
+def suite_cases(args):
+    for w, h in parse_res(args.res):
+        for fmt in args.formats.split(","):
+            for crop in args.crops.split(","):
+                for scale in (float(v) for v in args.scales.split(",")):
+                    for cms in (float(v) for v in args.consumer_ms.split(",")):
+                        yield {"id": f"{w}x{h}/{fmt}/{crop}/x{scale:g}/c{cms:g}", "res": (w, h),
+                               "format": fmt, "crop": crop, "scale": scale, "consumer_ms": cms}
+
+
+def _crop_rect(name, w, h):
+    if name == "full": return None
+    if name == "center50": return (w // 4, h // 4, w * 3 // 4, h * 3 // 4)
+    raise ValueError(f"unknown crop: {name}")
+
+
+def _reset_peak_rss():
+    try:
+        with open("/proc/self/clear_refs", "w") as f: f.write("5")   # VmHWM をリセット (Linux)
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"): return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class _Display:
+    """Overlay.on_frame + paintEvent 相当（変化タイルだけ pixmap に書き込み、ウィジェットに描画）"""
+    def __init__(self, metrics):
+        from PyQt5 import QtGui
+        self.m = metrics
+        self.pix = QtGui.QPixmap()
+        self.target = None
+
+    def show(self, ring, got):
+        from PyQt5 import QtCore, QtGui
+        m = self.m
+        idx, arr, _, mask = got
+        t = m.clock()
+        m.add("handoff", t - ring.published_at(idx))
+        m.count("frames_out")
+        try:
+            h, w, _ = arr.shape
+            img = QtGui.QImage(arr.data, w, h, arr.strides[0], QtGui.QImage.Format_RGB888)
+            if mask is None or self.pix.size() != QtCore.QSize(w, h):
+                self.pix = QtGui.QPixmap.fromImage(img)
+            else:
+                p = QtGui.QPainter(self.pix)
+                for r in tile_rects(mask, w, h, 64):
+                    r = QtCore.QRect(*r); p.drawImage(r, img, r)
+                p.end()
+        finally:
+            ring.release(idx)
+        t1 = m.clock()
+        m.add("upload", t1 - t)
+        if self.target is None or self.target.size() != self.pix.size():
+            self.target = QtGui.QImage(self.pix.size(), QtGui.QImage.Format_ARGB32_Premultiplied)
+        p = QtGui.QPainter(self.target)
+        p.drawPixmap(0, 0, self.pix)
+        p.end()
+        m.add("paint", m.clock() - t1)
+
+
+def _transient_kb(pipe, backend, frames):
+    """1 フレームの処理中に一時的に確保されたメモリ(tracemalloc のピーク - 開始時)の平均 KB"""
+    tracemalloc.start()
+    total = 0
+    try:
+        for _ in range(frames):
+            f = backend.next_frame()
+            if f is None: continue
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            try: pipe.process(f)
+            finally: f.close()
+            total += tracemalloc.get_traced_memory()[1] - base
+    finally:
+        tracemalloc.stop()
+    return total / max(1, frames) / 1024
+
+
+def run_case(c, frames, pattern="bars", timeout=30.0):
+    w, h = c["res"]
+    backend = SyntheticBackend(w, h, 0, pattern, stride_pad=STRIDE_PAD[c["format"]])
+    ring = FrameRing(3, merge=merge_masks)
+    pipe = FramePipeline(ring, diff=TileDiff(64))
+    crop = _crop_rect(c["crop"], w, h)
+    cw, ch = (w, h) if crop is None else (crop[2] - crop[0], crop[3] - crop[1])
+    pipe.set_crop(crop)
+    if c["scale"] < 1: pipe.set_output_size((int(cw * c["scale"]), int(ch * c["scale"])))
+    m = pipe.metrics = Metrics()
+    disp = _Display(m)
+    sched = CaptureScheduler("latest")
+    backend.open()
+    th = threading.Thread(target=run_capture, args=(backend, pipe, sched), daemon=True)
+    _reset_peak_rss()
+    t0 = time.perf_counter()
+    th.start()
+    out = 0
+    while out < frames and time.perf_counter() - t0 < timeout:
+        got = ring.borrow()
+        if got is None:
+            time.sleep(0.0002); continue
+        disp.show(ring, got)
+        out += 1
+        if c["consumer_ms"]: time.sleep(c["consumer_ms"] / 1e3)
+    dt = time.perf_counter() - t0
+    sched.stop(); th.join()
+    peak = _peak_rss_mb()
+    # 一時確保量は計測なし・単一スレッドで別に測る
+    pipe.metrics = None
+    allocs0 = ring.allocs
+    backend.start()
+    kb = _transient_kb(pipe, backend, 20)
+    backend.stop(); backend.close()
+    frames_in = pipe.processed + pipe.skipped_frames
+    r = {"fps_in": frames_in / dt, "fps_out": out / dt,
+         "dropped": ring.drops + ring.skipped + sched.coalesced,
+         "bytes_per_frame": pipe.bytes_written // max(1, pipe.processed),
+         "peak_rss_mb": peak, "alloc_kb_per_frame": kb, "slot_allocs": ring.allocs - allocs0}
+    for stage, hs in m.snapshot()["stages"].items():
+        for q in ("p50", "p95", "p99"):
+            r[f"{stage}_{q}_ms"] = hs[f"{q}_ms"]
+    return r
+
+
+def verify_case(c, frames=16, pattern="bars"):
+    """同じ設定で、変化タイルだけ変換するパイプラインと毎回全体を変換するパイプラインに同じフレームを流し、
+    スロットの内容が一致するかを見る。縮小しないときは numpy の並べ替え(BGRA → RGB)とも比べる。
+    (一致しなかったフレーム数, 最大の差)
+    """
+    w, h = c["res"]
+    backend = SyntheticBackend(w, h, 0, pattern, stride_pad=STRIDE_PAD[c["format"]])
+    crop = _crop_rect(c["crop"], w, h)
+    cw, ch = (w, h) if crop is None else (crop[2] - crop[0], crop[3] - crop[1])
+    pipes = []
+    for diff in (TileDiff(64), None):
+        p = FramePipeline(FrameRing(3, merge=merge_masks), diff=diff)
+        p.set_crop(crop)
+        if c["scale"] < 1: p.set_output_size((int(cw * c["scale"]), int(ch * c["scale"])))
+        pipes.append(p)
+    bad, worst = 0, 0
+    backend.open(); backend.start()
+    try:
+        for _ in range(frames):
+            f = backend.next_frame()
+            if f is None: continue
+            try:
+                for p in pipes: p.process(f)
+                l, t, r, b = pipes[1].crop_rect
+                ref = f.bgra()[t:b, l:r, 2::-1]
+                got = [p.ring.borrow(only_new=False) for p in pipes]
+                try:
+                    a, full = got[0][1], got[1][1]
+                    d = int(np.abs(a.astype(np.int16) - full).max()) if a.shape == full.shape else 255
+                    if full.shape == ref.shape:
+                        d = max(d, int(np.abs(full.astype(np.int16) - ref).max()))
+                finally:
+                    for p, g in zip(pipes, got): p.ring.release(g[0])
+            finally:
+                f.close()
+            bad += d > 0
+            worst = max(worst, d)
+    finally:
+        backend.stop(); backend.close()
+    return bad, worst
+
+
+# 比較時の向き: +1 は大きいほど良い、-1 は小さいほど良い、無いものは比較しない
+def _direction(key):
+    if key.startswith("fps_"): return +1
+    if key.endswith("_ms") or key in ("peak_rss_mb", "alloc_kb_per_frame", "bytes_per_frame"): return -1
+    return None
+
+
+def _threshold(key, thresholds, default):
+    for pat, v in thresholds:
+        if fnmatch.fnmatch(key, pat): return v
+    return default
+
+
+COMPARE_KEYS = "fps_*,*_p95_ms,peak_rss_mb,alloc_kb_per_frame"
+
+
+def compare(results, baseline, default=0.15, thresholds=(), min_delta_ms=0.05, keys=COMPARE_KEYS):
+    """baseline より悪化した (case, key, base, now, 変化率) のリスト。keys はカンマ区切りのパターン"""
+    pats = keys.split(",")
+    out = []
+    for cid, cur in results["cases"].items():
+        base = baseline.get("cases", {}).get(cid)
+        if not base: continue
+        for key, now in cur.items():
+            d = _direction(key)
+            if d is None or key not in base or not any(fnmatch.fnmatch(key, p) for p in pats): continue
+            b = base[key]
+            if key.endswith("_ms") and abs(now - b) < min_delta_ms: continue   # 測定誤差
+            if not b: continue
+            change = (now - b) / b
+            if d * change < -_threshold(key, thresholds, default):
+                out.append((cid, key, b, now, change))
+    return out
+
+
+def _parse_threshold(text):
+    if "=" not in text: return ("*", float(text))
+    pat, _, v = text.rpartition("=")
+    return (pat, float(v))
+
+
+def bench_suite(args):
+    app = qt_app()
+    for k, v in (SUITE_FULL if args.full else SUITE_QUICK).items():
+        if getattr(args, k) is None: setattr(args, k, v)
+    results = {"meta": {"python": platform.python_version(), "numpy": np.__version__,
+                        "platform": platform.platform(), "cpus": os.cpu_count(),
+                        "frames": args.frames, "repeat": args.repeat, "pattern": args.pattern,
+                        "time": time.time()},
+               "cases": {}}
+    mismatched = []
+    for c in suite_cases(args):
+        # 繰り返して項目ごとの中央値を取る(CPU を取り合う環境での揺れを抑える)
+        runs = [run_case(c, args.frames, args.pattern) for _ in range(args.repeat)]
+        r = results["cases"][c["id"]] = {k: float(np.median([x.get(k, 0) for x in runs])) for k in runs[0]}
+        # 内容の一致は速さと違って許容幅なしで判定する(ベースラインが無くても)
+        bad, worst = verify_case(c, pattern=args.pattern)
+        r["mismatch_frames"], r["mismatch_max"] = bad, worst
+        if bad: mismatched.append(c["id"])
+        print(f"{c['id']:36s} in {r['fps_in']:6.1f} out {r['fps_out']:6.1f} fps | "
+              f"paint p99 {r.get('paint_p99_ms', 0):6.2f} ms | handoff p99 {r.get('handoff_p99_ms', 0):6.2f} ms | "
+              f"rss {r['peak_rss_mb']:6.0f} MB | alloc {r['alloc_kb_per_frame']:7.1f} KB/frame")
+    if args.out:
+        with open(args.out, "w") as f: json.dump(results, f, indent=1)
+        print("saved", args.out)
+    for cid in mismatched:
+        r = results["cases"][cid]
+        print(f"MISMATCH {cid}: {r['mismatch_frames']} frame(s) differ from the full conversion "
+              f"(max |diff| {r['mismatch_max']})")
+    if args.baseline:
+        with open(args.baseline) as f: baseline = json.load(f)
+        thresholds = [t for t in args.threshold if t[0] != "*"]
+        default = next((t[1] for t in args.threshold if t[0] == "*"), 0.15)
+        bad = compare(results, baseline, default, thresholds, args.min_delta_ms, args.keys)
+        for cid, key, b, now, ch in bad:
+            print(f"REGRESSION {cid} {key}: {b:.3f} → {now:.3f} ({ch:+.0%})")
+        print(f"{len(bad)} regression(s) against {args.baseline}")
+        if bad: sys.exit(1)
+    if mismatched: sys.exit(1)
+
+
+def add_commands(sub):
+    p = sub.add_parser("suite")
+    p.add_argument("--out", help="結果 JSON の保存先 (そのままベースラインに使える)")
+    p.add_argument("--baseline", help="比較するベースライン JSON。悪化があれば終了コード 1")
+    p.add_argument("--threshold", type=_parse_threshold, action="append", default=[],
+                   help="許容する悪化率。'0.2' は全体、'*_p99_ms=0.3' のように項目ごとにも指定できる")
+    p.add_argument("--min-delta-ms", type=float, default=0.05, help="これ未満の時間差は比較しない")
+    p.add_argument("--keys", default=COMPARE_KEYS, help="比較する項目のパターン (カンマ区切り)")
+    p.add_argument("--repeat", type=int, default=3, help="各ケースの繰り返し回数 (中央値を使う)")
+    p.add_argument("--full", action="store_true", help="全組み合わせを掃引する")
+    p.add_argument("--res"); p.add_argument("--formats"); p.add_argument("--crops")
+    p.add_argument("--scales"); p.add_argument("--consumer-ms", dest="consumer_ms")
+    p.add_argument("--frames", type=int, default=60)
+    p.add_argument("--pattern", default="bars", choices=["bars", "noise", "static"])
+    p.set_defaults(fn=bench_suite)
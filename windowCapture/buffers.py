@@ -0,0 +1,54 @@
+import numpy as np
+
+GROWTH = 1.5    # 既定の伸長率
+
+
+# =======================================================
+# サイズ変更に強い作業バッファ
+# =======================================================
+class GrowBuffer:
+    """平坦な uint8 バッファから先頭の連続領域を任意の shape / dtype で切り出す。
+
+    足りなくなったら growth 倍ずつ伸ばすので、ドラッグでのリサイズ中も確保はたまにしか起きない。
+    必要量が容量の 1/shrink 未満になったら詰め直す(大きな解像度から戻ったときのため)。
+    shrink=0 なら縮めない(部分矩形ごとに大きさが変わる作業領域向け)。
+    切り出したビューは常に C 連続(部分矩形をスライスで作るより一時配列が出にくい)。
+    """
+    def __init__(self, growth=None, shrink=4):
+        self.growth, self.shrink = growth or GROWTH, shrink
+        self.buf = None
+        self.allocs = 0
+
+    @property
+    def capacity(self):
+        return 0 if self.buf is None else self.buf.size
+
+    def view(self, shape, dtype=np.uint8):
+        shape = tuple(int(v) for v in shape)
+        n = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        cap = self.capacity
+        if n > cap or (self.shrink and n and n * self.shrink < cap):
+            self.buf = np.empty(max(n, int(cap * self.growth)) if cap and n > cap else n, np.uint8)
+            self.allocs += 1
+        return self.buf[:n].view(dtype).reshape(shape)
+
+
+class BufferPool:
+    """名前ごとの GrowBuffer"""
+    def __init__(self, growth=None, shrink=4):
+        self.growth, self.shrink = growth, shrink
+        self._bufs = {}
+
+    def view(self, name, shape, dtype=np.uint8):
+        b = self._bufs.get(name)
+        if b is None:
+            b = self._bufs[name] = GrowBuffer(self.growth, self.shrink)
+        return b.view(shape, dtype)
+
+    @property
+    def allocs(self):
+        return sum(b.allocs for b in self._bufs.values())
+
+    @property
+    def capacity(self):
+        return sum(b.capacity for b in self._bufs.values())
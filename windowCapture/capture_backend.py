@@ -0,0 +1,577 @@
+import time, threading, asyncio
+import numpy as np
+from frame_convert import bgra_view
+from gpu_reduce import reduce_reference, gpu_support, disable_gpu
+
+
+# =======================================================
+# フレームとバックエンド共通インターフェース
+# =======================================================
+class Frame:
+    """BGRA フレーム。data はバッファプロトコル対応オブジェクト。使い終わったら close()
+
+    読み出し前に reduce(crop, level) を呼ぶと、bgra() は crop を 1/2**level に縮小したものになる。
+    width / height はソース全体の大きさのまま。
+    """
+    def __init__(self, data, width, height, stride=None, offset=0, timestamp=0.0, close=None):
+        self._data = data
+        self.width, self.height = width, height
+        self.stride = stride or width * 4
+        self.offset = offset
+        self.timestamp = timestamp
+        self._close = close
+        self.region = None      # reduce() で指定した ((l, t, r, b), level)
+        self._reduced = None
+
+    @property
+    def data(self):
+        return self._data
+
+    def reduce(self, crop, level):
+        """読み出す範囲と縮小段数を指定する。基底クラスは CPU 上の参照実装(reduce_reference)で縮める"""
+        self.region = (tuple(crop), level)
+
+    @property
+    def readback_bytes(self):
+        """GPU から読み出す(読み出した)バイト数"""
+        if self.region is None: return self.stride * self.height
+        (l, t, r, b), k = self.region
+        return ((r - l) >> k) * ((b - t) >> k) * 4
+
+    def bgra(self):
+        if self._reduced is not None: return self._reduced
+        v = bgra_view(self.data, self.width, self.height, self.stride, self.offset)
+        if self.region is None: return v
+        (l, t, r, b), k = self.region
+        self._reduced = reduce_reference(v[t:b, l:r], k)
+        return self._reduced
+
+    async def readback_async(self):
+        """data を使える状態にする。GPU からの読み出しが必要なフレームはここを非同期に実装する"""
+        self.data
+
+    def close(self):
+        if self._close:
+            self._close(); self._close = None
+
+
+class CaptureBackend:
+    """open → start → next_frame()... → stop → close
+
+    next_frame はブロックしない。フレームが無ければ None。
+    新しいフレームの到着は on_frame_arrived に登録したコールバックで通知する。
+    """
+    name = "base"
+
+    def __init__(self):
+        self.size = (0, 0)
+        self._arrived_cbs = []
+        self._resize_cbs = []
+        self.frames = 0
+        self.bytes_read = 0
+        self.resizes = 0
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._outstanding = False
+
+    def open(self): pass
+    def start(self): pass
+    def next_frame(self): raise NotImplementedError
+    def stop(self): pass
+    def close(self): pass
+
+    def on_frame_arrived(self, cb): self._arrived_cbs.append(cb)
+    def on_resize(self, cb): self._resize_cbs.append(cb)
+
+    def _notify_arrived(self):
+        for cb in self._arrived_cbs: cb()
+
+    def _set_size(self, w, h):
+        if (w, h) == self.size: return
+        old, self.size = self.size, (w, h)
+        if old != (0, 0):
+            self.resizes += 1
+            for cb in self._resize_cbs: cb(w, h)
+
+    def _take(self, free_running):
+        """(ロック内で呼ぶ) 今フレームを返してよいか。
+
+        free_running なら前のフレームが閉じられ次第、そうでなければ _tick が来た時だけ。
+        """
+        if free_running:
+            if self._outstanding: return False
+            self._outstanding = True
+            return True
+        if not self._pending: return False
+        self._pending = 0
+        return True
+
+    def _tick(self):
+        with self._lock: self._pending += 1
+        self._notify_arrived()
+
+    def _done(self):
+        with self._lock: self._outstanding = False
+        self._notify_arrived()
+
+    def _count(self, frame):
+        self.frames += 1
+        self.bytes_read += frame.stride * frame.height
+        return frame
+
+    def stats(self):
+        return {"backend": self.name, "size": self.size, "frames": self.frames,
+                "bytes_read": self.bytes_read, "resizes": self.resizes}
+
+
+class _Ticker:
+    """一定間隔で callback を呼ぶバックグラウンドスレッド"""
+    def __init__(self, interval, callback):
+        self.interval, self.callback = interval, callback
+        self._stop = threading.Event()
+        self._th = threading.Thread(target=self._run, daemon=True)
+
+    def start(self): self._th.start()
+
+    def _run(self):
+        t = time.monotonic()
+        while not self._stop.is_set():
+            t += self.interval()
+            self._stop.wait(max(0.0, t - time.monotonic()))
+            if not self._stop.is_set(): self.callback()
+
+    def stop(self):
+        self._stop.set()
+        if self._th.is_alive(): self._th.join()
+
+
+async def _await(aw):
+    return await aw
+
+
+class EventLoopThread:
+    """専用スレッドで asyncio イベントループを回し、任意のスレッドから run(awaitable) で待てるようにする。
+    複数の WinRTBackend・PipelinedBackend で 1 つを共有できる。
+    """
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._th = threading.Thread(target=self.loop.run_forever, name="winrt-loop", daemon=True)
+        self._th.start()
+
+    def submit(self, aw):
+        """awaitable をループで開始し、concurrent.futures.Future を返す"""
+        return asyncio.run_coroutine_threadsafe(_await(aw), self.loop)
+
+    def run(self, aw, timeout=None):
+        return self.submit(aw).result(timeout)
+
+    def close(self):
+        if self.loop.is_closed(): return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._th.join()
+        self.loop.close()
+
+
+class _SlowFrame(Frame):
+    """GPU リードバックの待ち時間を模したフレーム(SyntheticBackend の readback_ms)"""
+    def __init__(self, src, width, height, stride, timestamp, close, delay):
+        super().__init__(None, width, height, stride, 0, timestamp, close)
+        self._src, self._delay = src, delay
+
+    async def readback_async(self):
+        if self._data is None:
+            await asyncio.sleep(self._delay)
+            self._data = self._src
+
+    @property
+    def data(self):
+        if self._data is None:
+            time.sleep(self._delay)
+            self._data = self._src
+        return self._data
+
+
+# =======================================================
+# 合成パターン（ヘッドレスベンチマーク用）
+# =======================================================
+class SyntheticBackend(CaptureBackend):
+    """指定解像度・fps で生成パターンを出す。fps=0 なら待たずに毎回フレームを返す。
+
+    pattern: "bars"(横に動く縦帯) / "noise"(全画素変化) / "static"(変化なし)
+    readback_ms > 0 なら各フレームの data 取得にその時間がかかる(GPU リードバックの代わり)。
+    """
+    name = "synthetic"
+
+    def __init__(self, width=1920, height=1080, fps=60.0, pattern="bars", stride_pad=0, readback_ms=0.0):
+        super().__init__()
+        if pattern not in ("bars", "noise", "static"):
+            raise ValueError(f"unknown pattern: {pattern}")
+        self.fps, self.pattern, self.stride_pad = fps, pattern, stride_pad
+        self.readback_ms = readback_ms
+        self._ticker = None
+        self._n = 0
+        self._alloc(width, height)
+
+    def _alloc(self, w, h):
+        stride = w * 4 + self.stride_pad
+        self._buf = np.zeros(stride * h, np.uint8)
+        self._img = np.ndarray((h, w, 4), np.uint8, self._buf, strides=(stride, 4, 1))
+        # 背景は横方向のグラデーション
+        self._img[:, :, 0] = np.linspace(0, 255, w, dtype=np.uint8)[None, :]
+        self._img[:, :, 1] = np.linspace(0, 255, h, dtype=np.uint8)[:, None]
+        self._img[:, :, 2] = 64
+        self._img[:, :, 3] = 255
+        self._bg = self._img.copy()
+        self._rng = np.random.default_rng(0)
+        self._set_size(w, h)
+
+    def resize(self, w, h):
+        """ソースのサイズ変更をシミュレートする"""
+        with self._lock:
+            self._alloc(w, h)
+
+    def start(self):
+        if self.fps > 0:
+            self._ticker = _Ticker(lambda: 1.0 / self.fps, self._tick)
+            self._ticker.start()
+        else:
+            self._notify_arrived()
+
+    def _render(self):
+        w, h = self.size
+        if self.pattern == "noise":
+            self._img[:, :, :3] = self._rng.integers(0, 256, (h, w, 3), np.uint8)
+        elif self.pattern == "bars":
+            bw = max(1, w // 32)
+            x0 = (self._n * bw // 4) % w
+            px = ((self._n - 1) * bw // 4) % w
+            self._img[:, px:px + bw] = self._bg[:, px:px + bw]
+            self._img[:, x0:x0 + bw, :3] = 255
+        self._n += 1
+
+    def next_frame(self):
+        with self._lock:
+            if not self._take(self.fps <= 0): return None
+            self._render()
+            w, h = self.size
+            stride = self._img.strides[0]
+            # fps=0 では前のフレームを閉じた時点で次のフレームが用意できる
+            done = self._done if self.fps <= 0 else None
+            if self.readback_ms > 0:
+                # 読み出し中に次のフレームが描かれても壊れないよう、フレームごとに複製する
+                return self._count(_SlowFrame(self._buf.copy(), w, h, stride, time.monotonic(), done,
+                                              self.readback_ms / 1e3))
+            return self._count(Frame(self._buf, w, h, stride, 0, time.monotonic(), done))
+
+    def stop(self):
+        if self._ticker: self._ticker.stop(); self._ticker = None
+
+
+# =======================================================
+# 記録ファイルの再生
+# =======================================================
+class ReplayBackend(CaptureBackend):
+    """FrameFileReader で開いたファイルのフレームを順に返す。
+
+    realtime=True なら記録時のタイムスタンプ間隔で、False なら待たずに返す。
+    """
+    name = "replay"
+
+    def __init__(self, path, realtime=True, loop=True):
+        super().__init__()
+        self.path, self.realtime, self.loop = path, realtime, loop
+        self.reader = None
+        self._i = 0
+        self._ticker = None
+
+    def open(self):
+        from frame_file import FrameFileReader
+        self.reader = FrameFileReader(self.path)
+        if not len(self.reader):
+            raise ValueError(f"no frames in {self.path}")
+        self._set_size(*self.reader.frame_size(0))
+
+    def _interval(self):
+        ts = self.reader.timestamps
+        i = self._i % len(ts)
+        dt = ts[i] - ts[i - 1] if i > 0 else 0.0
+        return min(max(dt, 0.001), 1.0)
+
+    def start(self):
+        if self.realtime:
+            self._ticker = _Ticker(self._interval, self._tick)
+            self._ticker.start()
+        else:
+            self._notify_arrived()
+
+    def _release(self, data):
+        data.release()
+        if not self.realtime: self._done()
+
+    def next_frame(self):
+        with self._lock:
+            if not self._take(not self.realtime): return None
+            if self._i >= len(self.reader):
+                if not self.loop:
+                    self._outstanding = False
+                    return None
+                self._i = 0
+            data, w, h, stride, ts = self.reader.frame(self._i)
+            self._i += 1
+        self._set_size(w, h)
+        return self._count(Frame(data, w, h, stride, 0, ts, lambda: self._release(data)))
+
+    def stop(self):
+        if self._ticker: self._ticker.stop(); self._ticker = None
+
+    def close(self):
+        if self.reader: self.reader.close(); self.reader = None
+
+
+# =======================================================
+# WinRT (Windows.Graphics.Capture)
+# =======================================================
+def create_d3d_device_idirect3d():
+    import ctypes
+    from ctypes import c_void_p, c_uint, POINTER, byref
+    import winrt.windows.graphics.directx.direct3d11.interop as d3d11_interop
+    d3d11 = ctypes.windll.d3d11
+    D3D_DRIVER_TYPE_HARDWARE = 1
+    D3D11_CREATE_DEVICE_BGRA_SUPPORT = 0x20
+    D3D11_SDK_VERSION = 7
+    D3D11CreateDevice = d3d11.D3D11CreateDevice
+    D3D11CreateDevice.argtypes = [
+        c_void_p, c_uint, c_void_p, c_uint, c_void_p, c_uint, c_uint,
+        POINTER(c_void_p), POINTER(c_uint), POINTER(c_void_p)
+    ]
+    pDev, pCtx = c_void_p(), c_void_p()
+    feat = c_uint()
+    hr = D3D11CreateDevice(None, D3D_DRIVER_TYPE_HARDWARE, None,
+                           D3D11_CREATE_DEVICE_BGRA_SUPPORT,
+                           None, 0, D3D11_SDK_VERSION,
+                           byref(pDev), byref(feat), byref(pCtx))
+    if hr != 0:
+        raise OSError(f"D3D11CreateDevice failed (HRESULT=0x{hr:08X})")
+    return d3d11_interop.create_direct3d11_device_from_dxgi_device(pDev.value)
+
+
+def import_winrt():
+    """WinRT の名前空間をまとめて import する(初回は数百 ms かかるので先に済ませておける)"""
+    import winrt.windows.graphics.capture as wgc
+    import winrt.windows.graphics.capture.interop
+    import winrt.windows.graphics.imaging
+    import winrt.windows.graphics.directx.direct3d11.interop
+    from winrt.windows.graphics import SizeInt32
+    return wgc, SizeInt32
+
+
+def create_frame_pool(device, width=64, height=64, buffers=2):
+    """ターゲット未定のうちに作っておくフレームプール。WinRTBackend(pool=) が recreate して使う"""
+    wgc, SizeInt32 = import_winrt()
+    return wgc.Direct3D11CaptureFramePool.create_free_threaded(device, 87, buffers, SizeInt32(width, height))
+
+
+class WinRTFrame(Frame):
+    """GPU サーフェスのリードバックを data に最初に触れた時まで遅らせる。
+    "latest" ポリシーで読み飛ばされたフレームはリードバックされない。
+    """
+    def __init__(self, backend, frame, width, height):
+        super().__init__(None, width, height, timestamp=time.monotonic())
+        self._backend, self._frame = backend, frame
+        self._handles = []
+
+    def reduce(self, crop, level):
+        # GPU で縮められないなら何もしない(全体を読み出し、パイプラインがトリミング・縮小する)
+        if self._backend.gpu is not None and gpu_support()[0]:
+            super().reduce(crop, level)
+
+    async def readback_async(self):
+        if self._data is None:
+            gpu = self._backend.gpu
+            if self.region is not None and gpu is not None:
+                try:
+                    self._reduced = self._data = await gpu.read(self._frame.surface, *self.region)
+                    self._backend.bytes_read += self._data.nbytes
+                    return
+                except Exception as e:
+                    disable_gpu(f"read failed: {e}")     # このフレームだけ全体読み出し + CPU で縮小
+                    self._backend.gpu = None
+            imaging = self._backend.imaging
+            sb = await imaging.SoftwareBitmap.create_copy_from_surface_async(self._frame.surface)
+            self._lock(sb)
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._backend.loop.run(self.readback_async())
+        return self._data
+
+    def _lock(self, sb):
+        imaging = self._backend.imaging
+        if sb.bitmap_pixel_format != imaging.BitmapPixelFormat.BGRA8:
+            sb = imaging.SoftwareBitmap.convert(sb, imaging.BitmapPixelFormat.BGRA8)
+        bb = sb.lock_buffer(imaging.BitmapBufferAccessMode.READ)
+        ref = bb.create_reference()
+        self._handles = [ref, bb, sb]
+        plane = bb.get_plane_description(0)
+        self.stride, self.offset = plane.stride, plane.start_index
+        self.width = min(self.width, plane.width)
+        self.height = min(self.height, plane.height)
+        self._data = ref
+        self._backend.bytes_read += plane.stride * plane.height
+
+    def close(self):
+        for h in self._handles:
+            try: h.close()
+            except Exception: pass
+        self._handles = []
+        if self._frame is not None:
+            self._frame.close(); self._frame = None
+            self._backend._frame_closed()
+
+
+class WinRTBackend(CaptureBackend):
+    """ターゲットのリサイズはフレームの content_size で検出し、セッションを止めずに
+    フレームプールを recreate する。
+
+    大きくなったときはプールを growth 倍(縦横とも)余裕を持たせて作り直し、ドラッグ中の作り直しを
+    減らす。プールが内容より大きい間はフレームの左上 content_size 分だけを使う。サイズが settle 秒
+    変わらなければ内容ぴったりに作り直す(余分なリードバックをしないため)。
+    recreate は取り出したフレームがすべて閉じられてから行う(それまでは新しいフレームを返さない)。
+    """
+    name = "winrt"
+
+    def __init__(self, hwnd, device=None, loop=None, buffers=2, growth=1.25, settle=0.3, pool=None,
+                 gpu_reduce=False):
+        """device / loop(EventLoopThread) を渡すと共有し、close 時にも閉じない。
+        buffers はフレームプールのバッファ数(同時に保持できるフレーム数)。
+        pool は同じ device で先に作っておいたフレームプール(create_frame_pool)。open で recreate して使う。
+        gpu_reduce なら reduce() されたフレームをデバイス上で縮小してから読み出す(D3D11Reducer)。
+        gpu_support() が False なら reduce() を無視し、全体を読み出す(CPU で同じ縮小をし直すより安い)。
+        """
+        super().__init__()
+        self.hwnd, self.device, self.loop, self.buffers = hwnd, device, loop, buffers
+        self.growth, self.settle = growth, settle
+        self.gpu_reduce, self.gpu = gpu_reduce, None
+        self._own_loop = loop is None
+        self._spare = pool
+        self.pool = self.session = self.item = None
+        self.pool_size = (0, 0)
+        self._want = None           # 作り直したいプールのサイズ
+        self._content = (0, 0)
+        self._content_since = 0.0
+        self._open_frames = 0
+        self.recreates = 0
+
+    def open(self):
+        import winrt.windows.graphics.capture as wgc
+        import winrt.windows.graphics.capture.interop as capture_interop
+        import winrt.windows.graphics.imaging as imaging
+        self.imaging = imaging
+        if self.loop is None:
+            self.loop = EventLoopThread()
+        if self.device is None:
+            self.device = create_d3d_device_idirect3d()
+        if self.gpu_reduce and gpu_support()[0]:
+            try:
+                from gpu_reduce import D3D11Reducer
+                self.gpu = D3D11Reducer(self.device)
+            except Exception as e:
+                disable_gpu(f"D3D11Reducer: {e}")
+        self.item = capture_interop.create_for_window(self.hwnd)
+        size = self.item.size
+        self._set_size(size.width, size.height)
+        self.pool_size = self._content = (size.width, size.height)
+        # free-threaded プールなら frame_arrived がメッセージループ無しで届く
+        if self._spare is not None:
+            self.pool, self._spare = self._spare, None
+            self.pool.recreate(self.device, 87, self.buffers, size)
+        else:
+            self.pool = wgc.Direct3D11CaptureFramePool.create_free_threaded(self.device, 87, self.buffers, size)
+        self._token = self.pool.add_frame_arrived(lambda *_: self._notify_arrived())
+        self.session = self.pool.create_capture_session(self.item)
+        try:
+            self.session.is_cursor_capture_enabled = False
+            self.session.is_border_required = False
+        except Exception: pass
+
+    def start(self):
+        self.session.start_capture()
+
+    def _plan_pool(self, w, h, now):
+        """content_size から作り直すべきプールのサイズを決める。不要なら None"""
+        if w < 1 or h < 1: return None     # 最小化中など
+        if (w, h) != self._content:
+            self._content, self._content_since = (w, h), now
+        pw, ph = self.pool_size
+        if w > pw or h > ph:
+            return (max(w, min(int(pw * self.growth), w * 2)) if w > pw else pw,
+                    max(h, min(int(ph * self.growth), h * 2)) if h > ph else ph)
+        if (w, h) != (pw, ph) and now - self._content_since >= self.settle:
+            return (w, h)
+        return None
+
+    def _recreate(self):
+        from winrt.windows.graphics import SizeInt32
+        w, h = self._want
+        self.pool.recreate(self.device, 87, self.buffers, SizeInt32(w, h))
+        self.pool_size, self._want = (w, h), None
+        self.recreates += 1
+
+    def _frame_closed(self):
+        with self._lock:
+            self._open_frames -= 1
+            wake = self._want is not None and not self._open_frames
+        if wake: self._notify_arrived()      # 作り直しを待っているのでもう一度呼んでもらう
+
+    def next_frame(self):
+        if self._want is not None:
+            if self._open_frames: return None
+            self._recreate()
+        f = self.pool.try_get_next_frame()
+        if f is None:
+            if self._content != self.pool_size and self._want is None:
+                # 縮んだまま止まったウィンドウはフレームが来なくても詰め直す
+                self._want = self._plan_pool(*self._content, time.monotonic())
+            return None
+        cs = f.content_size
+        self._set_size(cs.width, cs.height)
+        self._want = self._plan_pool(cs.width, cs.height, time.monotonic())
+        self.frames += 1
+        with self._lock: self._open_frames += 1
+        return WinRTFrame(self, f, min(cs.width, self.pool_size[0]), min(cs.height, self.pool_size[1]))
+
+    def stats(self):
+        s = super().stats()
+        s.update(pool_size=self.pool_size, recreates=self.recreates)
+        if self.gpu is not None: s.update(gpu=self.gpu.stats())
+        elif self.gpu_reduce: s.update(gpu="off: " + gpu_support()[1])
+        return s
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.remove_frame_arrived(self._token)
+            self.session.close(); self.pool.close()
+            self.pool = self.session = None
+        if self._spare is not None:
+            self._spare.close(); self._spare = None
+        if self.gpu is not None:
+            self.gpu.close(); self.gpu = None
+        if self._own_loop and self.loop is not None:
+            self.loop.close(); self.loop = None
+
+
+def make_backend(spec):
+    """"synthetic:1920x1080@60[:bars]" / "replay:path[@fast]" / "winrt:<hwnd>" からバックエンドを作る"""
+    kind, _, arg = spec.partition(":")
+    if kind == "synthetic":
+        res, _, pattern = arg.partition(":")
+        res, _, fps = res.partition("@")
+        w, h = (int(v) for v in (res or "1920x1080").split("x"))
+        return SyntheticBackend(w, h, float(fps or 60), pattern or "bars")
+    if kind == "replay":
+        path, _, mode = arg.rpartition("@") if arg.endswith("@fast") else (arg, "", "")
+        return ReplayBackend(path, realtime=(mode != "fast"))
+    if kind == "winrt":
+        return WinRTBackend(int(arg, 0))
+    raise ValueError(f"unknown capture backend: {spec}")
@@ -0,0 +1,240 @@
+import os, time, threading, collections
+import numpy as np
+from capture_scheduler import CaptureScheduler
+
+
+# =======================================================
+# 複数キャプチャの多重化（共有デバイス・イベントループ＋ワーカープール）
+# =======================================================
+class CaptureSession:
+    """CaptureManager で動かす 1 つのキャプチャ (backend → pipeline → emit)。
+
+    priority は CPU 時間の配分の重み(2 なら 1 の倍)。fps の上限は policy "max:N" で指定する。
+    1 つのセッションを同時に処理するワーカーは常に 1 つなので、pipeline はスレッドセーフでなくてよい。
+    """
+    def __init__(self, manager, backend, pipeline, policy="latest", priority=1.0, emit=None, name=None):
+        self.manager, self.backend, self.pipeline = manager, backend, pipeline
+        self.sched = CaptureScheduler(policy, clock=manager.clock)
+        self.priority = float(priority)
+        self.emit = emit
+        self.name = name or backend.name
+        self.vtime = 0.0         # 仮想時間: 使った CPU 秒 / priority の累計
+        self.busy = False
+        self.closed = False
+        self.ready_at = None     # 未処理の到着通知のうち最も古い時刻
+        self.turns = 0
+        self.cpu_time = 0.0
+        self.latency = collections.deque(maxlen=1024)   # 到着通知から公開までの秒数
+
+    def set_priority(self, priority):
+        if priority <= 0:
+            raise ValueError("priority must be > 0")
+        self.priority = float(priority)
+
+    def set_policy(self, policy):
+        self.sched.set_policy(policy)
+        self.manager._wake()
+
+    def _notify(self):
+        if self.ready_at is None: self.ready_at = self.manager.clock()
+        self.sched.notify()
+        self.manager._wake()
+
+    def stats(self):
+        s = {"name": self.name, "priority": self.priority, "policy": repr(self.sched.policy),
+             "turns": self.turns, "processed": self.pipeline.processed,
+             "cpu_ms": 1e3 * self.cpu_time}
+        if self.latency:
+            p50, p99 = np.percentile(np.fromiter(self.latency, float), [50, 99])
+            s.update(latency_p50_ms=1e3 * float(p50), latency_p99_ms=1e3 * float(p99))
+        return s
+
+
+class CaptureManager:
+    """N 個の CaptureSession を固定数のワーカースレッドで処理する。
+
+    - WinRT セッションは D3D デバイスと asyncio イベントループ(EventLoopThread)を 1 つずつ共有する
+    - 処理できるセッション(到着通知あり・fps 上限内・他のワーカーが処理中でない)のうち、
+      仮想時間が最小のものを選ぶ(start-time fair queueing)
+    - workers=0 ならスレッドを作らず、step() を呼び出し側で回す(テスト・シミュレーション用)
+    - 既定は CPU 数。それより多く指定したら警告だけ出して指定どおりに作る
+    """
+    def __init__(self, workers=None, clock=time.monotonic, device_factory=None):
+        cpus = os.cpu_count() or 1
+        if workers is None: workers = cpus
+        elif int(workers) < 0: raise ValueError(f"workers must be >= 0 (got {workers})")
+        elif int(workers) > cpus:
+            print(f"⚠ ワーカー数 {workers} が CPU 数 {cpus} を超えています(処理は CPU を取り合います)")
+        self.workers = int(workers)
+        self.clock = clock
+        self.sessions = []
+        self.vclock = 0.0            # システム仮想時間(直近に選んだセッションの開始時刻)
+        self._cond = threading.Condition()
+        self._threads = []
+        self._closing = False
+        self._device_factory = device_factory
+        self._device = None
+        self._loop = None
+        self._pools = []             # prewarm で作っておいたフレームプール
+        # 統計
+        self.turns = 0
+        self.idle_waits = 0
+
+    # ----- 共有リソース -----
+    @property
+    def device(self):
+        """共有 D3D11 デバイス。最初に使われた時に 1 つだけ作る"""
+        with self._cond:
+            if self._device is None:
+                if self._device_factory is None:
+                    from capture_backend import create_d3d_device_idirect3d
+                    self._device_factory = create_d3d_device_idirect3d
+                self._device = self._device_factory()
+            return self._device
+
+    @property
+    def loop(self):
+        with self._cond:
+            if self._loop is None:
+                from capture_backend import EventLoopThread
+                self._loop = EventLoopThread()
+            return self._loop
+
+    def prewarm(self, pools=1, size=(64, 64)):
+        """デバイス・ループ・フレームプールを先に作っておく(ウィンドウ選択中に別スレッドで呼ぶ)。
+        プールは window_backend が 1 つずつ持っていき、ターゲットの大きさに recreate して使う。
+        """
+        from capture_backend import import_winrt, create_frame_pool
+        import_winrt()
+        device, _ = self.device, self.loop
+        made = [create_frame_pool(device, *size) for _ in range(pools)]
+        with self._cond: self._pools += made
+        return self
+
+    def window_backend(self, hwnd, **kw):
+        """共有デバイス・ループを使う WinRTBackend(kw はそのまま渡す)"""
+        from capture_backend import WinRTBackend
+        with self._cond:
+            pool = self._pools.pop() if self._pools else None
+        return WinRTBackend(hwnd, device=self.device, loop=self.loop, pool=pool, **kw)
+
+    # ----- セッション管理 -----
+    def open(self, backend, pipeline, **kw):
+        return self.add(CaptureSession(self, backend, pipeline, **kw))
+
+    def add(self, session):
+        session.backend.on_frame_arrived(session._notify)
+        session.backend.open()
+        with self._cond:
+            # 新しいセッションは現在の仮想時間から始める(過去の分をまとめて取らせない)
+            session.vtime = self.vclock
+            self.sessions.append(session)
+        session.backend.start()
+        self._wake()
+        return session
+
+    def remove(self, session):
+        with self._cond:
+            if session not in self.sessions: return
+            session.closed = True
+            self._cond.wait_for(lambda: not session.busy)
+            self.sessions.remove(session)
+        session.sched.stop()
+        session.backend.stop()
+        session.backend.close()
+
+    def start(self):
+        self._closing = False
+        for i in range(self.workers - len(self._threads)):
+            th = threading.Thread(target=self._worker, name=f"capture-{i}", daemon=True)
+            th.start()
+            self._threads.append(th)
+        return self
+
+    def stop(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+        for th in self._threads: th.join()
+        self._threads = []
+        for s in list(self.sessions): self.remove(s)
+        for pool in self._pools: pool.close()
+        self._pools = []
+        if self._loop is not None:
+            self._loop.close(); self._loop = None
+
+    def _wake(self):
+        with self._cond: self._cond.notify()
+
+    # ----- スケジューリング -----
+    def _pick(self, now):
+        """(ロック内) 処理するセッションと、無い場合に次に起きるべき時刻"""
+        best, wake = None, float("inf")
+        for s in self.sessions:
+            if s.busy or s.closed: continue
+            dl = s.sched.next_deadline(now)
+            if dl > now:
+                wake = min(wake, dl)
+            elif best is None or s.vtime < best.vtime:
+                best = s
+        return best, wake
+
+    def step(self, timeout=0.0):
+        """1 セッション分の処理を行えば True。timeout 秒以内に処理できるものが無ければ False"""
+        with self._cond:
+            end = None if timeout is None else self.clock() + timeout
+            while True:
+                if self._closing: return False
+                now = self.clock()
+                s, wake = self._pick(now)
+                if s is not None: break
+                if end is not None:
+                    if now >= end: return False
+                    wake = min(wake, end)
+                self.idle_waits += 1
+                self._cond.wait(None if wake == float("inf") else wake - now)
+            s.vtime = max(s.vtime, self.vclock)
+            self.vclock = s.vtime
+            s.busy = True
+        try:
+            self._turn(s)
+        finally:
+            with self._cond:
+                s.busy = False
+                self._cond.notify_all()
+        return True
+
+    def _turn(self, s):
+        ready, s.ready_at = s.ready_at, None
+        s.sched.begin()
+        t0 = time.thread_time()
+        m = s.pipeline.metrics
+        if m: ta = m.clock()
+        frames = s.sched.collect(s.backend.next_frame)
+        if m and frames: m.add("acquire", m.clock() - ta)
+        for frame in frames:
+            try:
+                idx = s.pipeline.process(frame)
+                if idx is not None:
+                    if ready is not None: s.latency.append(self.clock() - ready)
+                    if s.emit: s.emit(idx)
+            except Exception as e:
+                print(f"[{s.name}] frame error:", e)
+            finally:
+                frame.close()
+        s.sched.done(bool(frames))
+        cost = time.thread_time() - t0
+        s.cpu_time += cost
+        s.turns += 1
+        with self._cond:
+            s.vtime += cost / s.priority
+            self.turns += 1
+
+    def _worker(self):
+        while not self._closing:
+            self.step(timeout=0.1)
+
+    def stats(self):
+        with self._cond:
+            return {"workers": self.workers, "turns": self.turns, "idle_waits": self.idle_waits,
+                    "sessions": [s.stats() for s in self.sessions]}
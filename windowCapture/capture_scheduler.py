@@ -0,0 +1,122 @@
+import threading, time
+
+
+# =======================================================
+# キャプチャスケジューラ（到着通知駆動＋適応ポーリング）
+# =======================================================
+class CapturePolicy:
+    """フレーム取得ポリシー: "latest"(最新のみ) / "every"(全フレーム) / "max:N"(最大 N fps)"""
+    def __init__(self, mode="latest", fps=0.0):
+        if mode not in ("latest", "every", "max"):
+            raise ValueError(f"unknown capture policy: {mode}")
+        if mode == "max" and fps <= 0:
+            raise ValueError("max policy needs fps > 0")
+        self.mode, self.fps = mode, float(fps)
+
+    @classmethod
+    def parse(cls, text):
+        if isinstance(text, cls): return text
+        mode, _, fps = str(text).partition(":")
+        return cls(mode, float(fps) if fps else 0.0)
+
+    @property
+    def min_interval(self):
+        return 1.0 / self.fps if self.mode == "max" else 0.0
+
+    def __repr__(self):
+        return f"max:{self.fps:g}" if self.mode == "max" else self.mode
+
+
+class CaptureScheduler:
+    """frame_arrived 通知で起床し、通知が来ない間はポーリング間隔を伸ばしていく。
+
+    clock / sleep を差し替えればシミュレーション時計で動かせる。
+    """
+    def __init__(self, policy="latest", min_poll=0.004, max_poll=0.1,
+                 clock=time.monotonic, sleep=None):
+        self.policy = CapturePolicy.parse(policy)
+        self.min_poll, self.max_poll = min_poll, max_poll
+        self.poll = min_poll
+        self.clock = clock
+        self._event = threading.Event()
+        self._kick = threading.Event()    # fps 上限の待ちを停止・ポリシー変更で起こす
+        self._sleep = sleep   # None なら実時間で待つ
+        self.running = True
+        self.last_poll = clock()
+        self.last_fetch = float("-inf")
+        # 統計
+        self.notifies = 0
+        self.wakeups = 0
+        self.idle_wakeups = 0
+        self.coalesced = 0   # "latest" で読み飛ばしたフレーム数
+
+    def set_policy(self, policy):
+        self.policy = CapturePolicy.parse(policy)
+        self._kick.set(); self._event.set()
+
+    def notify(self):
+        """フレーム到着通知（任意のスレッドから呼んでよい）"""
+        self.notifies += 1
+        self._event.set()
+
+    def next_deadline(self, now):
+        """次にフレームを取りに行く時刻"""
+        t = now if self._event.is_set() else self.last_poll + self.poll
+        return max(t, self.last_fetch + self.policy.min_interval)
+
+    def wait(self):
+        """取得すべき時刻まで待つ。停止済みなら False"""
+        while self.running:
+            now = self.clock()
+            dl = self.next_deadline(now)
+            if dl <= now: break
+            if self._sleep:
+                self._sleep(dl - now)
+            elif self._event.is_set():
+                self._kick.wait(dl - now)     # fps 上限による待ち
+                self._kick.clear()
+            else:
+                self._event.wait(dl - now)    # 到着通知かポーリング期限まで
+        self.begin()
+        return self.running
+
+    def begin(self):
+        """取得開始を記録する。wait() を使わず外側で待つ場合(CaptureManager)はこれを直接呼ぶ"""
+        self._event.clear()
+        self.last_poll = self.clock()
+        self.wakeups += 1
+
+    def collect(self, try_get, close=lambda f: f.close()):
+        """ポリシーに従ってソースから処理対象のフレームを取り出す"""
+        if self.policy.mode == "every":
+            f = try_get()
+            return [] if f is None else [f]
+        latest = None
+        while True:
+            f = try_get()
+            if f is None: break
+            if latest is not None:
+                close(latest); self.coalesced += 1
+            latest = f
+        return [] if latest is None else [latest]
+
+    def done(self, got):
+        """取得結果を反映してポーリング間隔を調整する"""
+        if got:
+            self.last_fetch = self.last_poll
+            # 通知が届いている間のポーリングは保険なので最大間隔のまま
+            self.poll = self.max_poll if self.notifies else self.min_poll
+            if self.policy.mode == "every":
+                self._event.set()    # まだ残っているかもしれない
+        else:
+            self.idle_wakeups += 1
+            self.poll = min(self.poll * 2, self.max_poll)
+
+    def stop(self):
+        self.running = False
+        self._kick.set(); self._event.set()
+
+    def stats(self):
+        return {"policy": repr(self.policy), "poll": self.poll, "notifies": self.notifies,
+                "wakeups": self.wakeups, "idle_wakeups": self.idle_wakeups,
+                "coalesced": self.coalesced}
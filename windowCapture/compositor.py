@@ -0,0 +1,310 @@
+import math, time, threading
+import numpy as np
+from buffers import GrowBuffer
+from frame_ring import FrameRing
+from pipeline import FramePipeline, run_capture
+from dirty_tiles import TileDiff, tile_rects, merge_masks
+from scale import Scaler
+from capture_scheduler import CaptureScheduler
+from capture_manager import CaptureSession
+
+
+# =======================================================
+# 配置(sizes [(w, h)] → rects [(x, y, w, h)], キャンバスの (W, H))
+# =======================================================
+def shelf_layout(sizes, max_width=1920, gap=4):
+    """左から順に並べ、max_width を超えたら次の段へ(段の高さはその段で一番高いもの)"""
+    rects, x, y, row_h, width = [], 0, 0, 0, 0
+    for w, h in sizes:
+        if x and x + w > max_width:
+            x, y, row_h = 0, y + row_h + gap, 0
+        rects.append((x, y, w, h))
+        width, row_h = max(width, x + w), max(row_h, h)
+        x += w + gap
+    return rects, (width, y + row_h)
+
+
+def grid_layout(sizes, cols=None, cell=None, gap=4):
+    """cols 列(既定は √n)の同じ大きさのマスに縦横比を保って収め、マスの中央に置く(拡大はしない)。
+    cell (w, h) を省略すると一番大きいものに合わせる"""
+    n = len(sizes)
+    if not n: return [], (0, 0)
+    cols = min(cols or math.ceil(math.sqrt(n)), n)
+    cw, ch = cell or (max(w for w, _ in sizes), max(h for _, h in sizes))
+    rects = []
+    for i, (w, h) in enumerate(sizes):
+        s = min(cw / w, ch / h, 1.0)
+        tw, th = max(1, int(w * s)), max(1, int(h * s))
+        r, c = divmod(i, cols)
+        rects.append((c * (cw + gap) + (cw - tw) // 2, r * (ch + gap) + (ch - th) // 2, tw, th))
+    rows = -(-n // cols)
+    return rects, (cols * cw + (cols - 1) * gap, rows * ch + (rows - 1) * gap)
+
+
+LAYOUTS = {"shelf": shelf_layout, "grid": grid_layout}
+
+
+# =======================================================
+# 合成(1 枚のキャンバスを使い回す)
+# =======================================================
+class Compositor:
+    """ソースごとの BGRA 画像を 1 枚のキャンバス (H, W, 4) に並べる。Qt を使わない。
+
+    set_sizes(sizes) で各ソースの大きさを決めると layout(sizes) で配置し直す(キャンバスの大きさが
+    変わらなければ同じバッファのまま背景だけ塗り直す)。blit(i, img, mask) はソース i を rects[i] に書く。
+    mask(変化タイル)があれば変化したタイルだけ。img が矩形と違う大きさ(縮小の反映待ち・拡大しない場合)なら
+    中央に置き、はみ出した分は切る。書いた範囲は take_dirty() で [(x, y, w, h)] として取り出す(None は全体)。
+    キャンバスの読み書きは lock を持って行う(表示側も描画の間 lock を持つ)。
+    """
+    def __init__(self, layout=shelf_layout, background=(0, 0, 0, 0), max_rects=64):
+        self.layout = layout
+        self.background = np.array(background, np.uint8)     # B, G, R, A
+        self.max_rects = max_rects
+        self.lock = threading.Lock()
+        self._buf = GrowBuffer()
+        self.canvas = np.zeros((0, 0, 4), np.uint8)
+        self.sizes, self.rects = [], []
+        self._placed = []       # ソースごとに直近で書いた (w, h)。変われば矩形全体を塗り直す
+        self._dirty = None
+        # 統計
+        self.relayouts = 0
+        self.blits = 0
+        self.bytes_copied = 0
+
+    @property
+    def size(self):
+        return self.canvas.shape[1], self.canvas.shape[0]
+
+    def set_sizes(self, sizes):
+        """配置し直したら True"""
+        sizes = [(max(1, int(w)), max(1, int(h))) for w, h in sizes]
+        if sizes == self.sizes: return False
+        rects, (W, H) = self.layout(sizes)
+        with self.lock:
+            self.sizes, self.rects = sizes, [tuple(int(v) for v in r) for r in rects]
+            if self.canvas.shape[:2] != (H, W):
+                self.canvas = self._buf.view((max(H, 1), max(W, 1), 4))
+            self.canvas[:] = self.background
+            self._placed = [None] * len(sizes)
+            self._dirty = None
+            self.relayouts += 1
+        return True
+
+    def _mark(self, rect):
+        d = self._dirty
+        if d is None: return
+        d.append(rect)
+        if len(d) > self.max_rects:     # 細かすぎるときは外接矩形 1 つにする
+            x0 = min(r[0] for r in d); y0 = min(r[1] for r in d)
+            x1 = max(r[0] + r[2] for r in d); y1 = max(r[1] + r[3] for r in d)
+            d[:] = [(x0, y0, x1 - x0, y1 - y0)]
+
+    def blit(self, i, img, mask=None, tile=64):
+        """ソース i の画像 (h, w, 4) を書く。書いた画素数を返す"""
+        x, y, w, h = self.rects[i]
+        ih, iw = min(img.shape[0], h), min(img.shape[1], w)
+        ox, oy = x + (w - iw) // 2, y + (h - ih) // 2
+        n = 0
+        with self.lock:
+            c = self.canvas
+            if self._placed[i] != (iw, ih):
+                c[y:y + h, x:x + w] = self.background
+                self._placed[i] = (iw, ih)
+                mask = None
+            if mask is None:
+                c[oy:oy + ih, ox:ox + iw] = img[:ih, :iw]
+                self._mark((x, y, w, h))
+                n = iw * ih
+            else:
+                for tx, ty, tw, th in tile_rects(mask, img.shape[1], img.shape[0], tile):
+                    tw, th = min(tw, iw - tx), min(th, ih - ty)
+                    if tw <= 0 or th <= 0: continue
+                    c[oy + ty:oy + ty + th, ox + tx:ox + tx + tw] = img[ty:ty + th, tx:tx + tw]
+                    self._mark((ox + tx, oy + ty, tw, th))
+                    n += tw * th
+            self.blits += 1
+            self.bytes_copied += 4 * n
+        return n
+
+    def take_dirty(self):
+        """前回から書いた範囲 [(x, y, w, h)]。None はキャンバス全体"""
+        with self.lock:
+            d, self._dirty = self._dirty, []
+            return d
+
+    def stats(self):
+        return {"sources": len(self.sizes), "canvas": self.size, "relayouts": self.relayouts,
+                "blits": self.blits, "mb_copied": round(self.bytes_copied / 1e6, 2)}
+
+
+# =======================================================
+# ソース(backend → pipeline → ring)
+# =======================================================
+class CompositeSource:
+    """合成する 1 つのソース。crop はソース座標のトリミング、scale はその大きさに掛ける倍率。
+    pipeline は BGRA(アルファ 255)で出力し、出力サイズは CompositeRenderer が割り当てた矩形に合わせる。
+    start(manager, emit) で manager(CaptureManager)があればそのセッションとして、無ければ専用スレッドで回す。
+    hwnd はキャプチャ対象のウィンドウ(表示状態の判定用。合成ソースなら 0)。
+    """
+    def __init__(self, backend, crop=None, scale=0.5, tile=64, policy="latest", priority=1.0, name=None,
+                 hwnd=0, hint=(320, 180)):
+        self.backend, self.scale, self.tile, self.hint = backend, scale, tile, hint
+        self.hwnd = hwnd
+        self.policy, self.priority = policy, priority
+        self.name = name or backend.name
+        self.ring = FrameRing(3, merge=merge_masks)
+        self.pipeline = FramePipeline(self.ring, diff=TileDiff(tile) if tile else None, scaler=Scaler("fast"))
+        self.pipeline.pixel_format, self.pipeline.opaque = "bgra", True
+        self.pipeline.set_crop(crop)
+        self.sched = None
+        self.session = None
+        self._manager = None
+        self._thread = None
+
+    def size(self):
+        """合成後の大きさ (w, h)。最初のフレームまではトリミング範囲が分からないので hint"""
+        r = self.pipeline.crop_rect
+        if r is None: return self.hint
+        l, t, rr, b = r
+        return max(1, round((rr - l) * self.scale)), max(1, round((b - t) * self.scale))
+
+    def set_policy(self, policy):
+        (self.session or self.sched).set_policy(policy)
+
+    def start(self, manager=None, emit=None):
+        if manager is not None:
+            self._manager = manager
+            self.session = CaptureSession(manager, self.backend, self.pipeline, self.policy, self.priority,
+                                          emit=emit, name=self.name)
+            self.sched = self.session.sched
+            manager.add(self.session)
+            return self
+        self.sched = CaptureScheduler(self.policy)
+        def run():
+            self.backend.open()
+            try: run_capture(self.backend, self.pipeline, self.sched, emit)
+            finally: self.backend.close()
+        self._thread = threading.Thread(target=run, name=f"composite-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self.session is not None:
+            self._manager.remove(self.session)
+            self.session = None
+        elif self._thread is not None:
+            self.sched.stop()
+            self._thread.join()
+            self._thread = None
+
+
+# =======================================================
+# 合成スレッド
+# =======================================================
+class CompositeRenderer:
+    """ソースの capture スレッドから notify(i) を受け、interval 秒(表示のリフレッシュ間隔)に 1 回まで、
+    新しいフレームのあるソースをまとめて Compositor に書いて present() を呼ぶ。
+
+    前回の present() がまだ表示されていなければ(take() されていなければ)呼ばない。表示側は
+    present を受けたら take() で書いた範囲を受け取り、1 回だけ描画する。ソースの大きさ(トリミング×倍率)が
+    変わったら並べ直し、各 pipeline の出力サイズを割り当てた矩形に合わせる。
+    compose() は同期で 1 回(テスト・ベンチ用)。
+    """
+    def __init__(self, sources, compositor=None, interval=1 / 60, present=None, clock=time.monotonic):
+        self.sources = list(sources)
+        self.comp = compositor or Compositor()
+        self.interval, self.present, self.clock = interval, present, clock
+        self._cond = threading.Condition()
+        self._ready = set()
+        self._pending = False       # present 済みでまだ take されていない
+        self._closing = False
+        self._thread = None
+        # 統計
+        self.notifies = 0
+        self.composes = 0
+        self.presents = 0
+        self.frames = 0
+
+    def notify(self, i):
+        """ソース i に新しいフレームが公開された(どのスレッドからでもよい)"""
+        with self._cond:
+            self.notifies += 1
+            self._ready.add(i)
+            self._cond.notify()
+
+    def emitter(self, i):
+        return lambda _idx: self.notify(i)
+
+    def start_sources(self, manager=None):
+        for i, s in enumerate(self.sources):
+            s.start(manager, self.emitter(i))
+        return self
+
+    def compose(self, ready=None):
+        """ready(ソース番号の集合。None は全部)の最新フレームを書く。書いたフレーム数を返す"""
+        comp = self.comp
+        relayout = comp.set_sizes([s.size() for s in self.sources])
+        if relayout:
+            for s, r in zip(self.sources, comp.rects): s.pipeline.set_output_size(r[2:])
+        if relayout or ready is None: ready = range(len(self.sources))
+        n = 0
+        for i in ready:
+            ring = self.sources[i].ring
+            got = ring.borrow(only_new=not relayout)    # 並べ直したら背景で消えたので新しくなくても書く
+            if got is None: continue
+            idx, arr, _, mask = got
+            try:
+                comp.blit(i, arr, None if relayout else mask, self.sources[i].tile or 64)
+            finally:
+                ring.release(idx)
+            n += 1
+        self.composes += 1
+        self.frames += n
+        if (n or relayout) and self.present is not None:
+            with self._cond:
+                if self._pending: return n
+                self._pending = True
+            self.presents += 1
+            self.present()
+        return n
+
+    def take(self):
+        """表示側: 前回から書いた範囲 [(x, y, w, h)](None は全体)を受け取り、次の present を許す"""
+        with self._cond:
+            self._pending = False
+        return self.comp.take_dirty()
+
+    def start(self):
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="compositor", daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        due = 0.0
+        while True:
+            with self._cond:
+                while not self._closing and not self._ready:
+                    self._cond.wait()
+                while not self._closing and self.clock() < due:     # リフレッシュ間隔に 1 回まで
+                    self._cond.wait(due - self.clock())
+                if self._closing: return
+                ready, self._ready = self._ready, set()
+            due = self.clock() + self.interval
+            try:
+                self.compose(ready)
+            except Exception as e:
+                print("composite error:", e)
+
+    def close(self):
+        with self._cond:
+            self._closing = True
+            self._cond.notify_all()
+            th = self._thread
+        if th is not None: th.join()
+        for s in self.sources: s.stop()
+
+    def stats(self):
+        return {"notifies": self.notifies, "composes": self.composes, "presents": self.presents,
+                "frames": self.frames, **self.comp.stats()}
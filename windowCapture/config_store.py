@@ -0,0 +1,325 @@
+import os, re, json, time, fnmatch, threading
+
+VERSION = 1
+
+
+def legacy_name(name):
+    """旧形式(1 設定 1 ファイル)のファイル名。windowCapture_old の sanitize_filename と同じ"""
+    for ch in '<>:"/\\|?*':
+        name = name.replace(ch, "_")
+    return name.strip() or "noname"
+
+
+# =======================================================
+# 設定ストア（1 ファイル＋メモリ上の索引＋遅延・原子的な書き込み）
+# =======================================================
+class ConfigStore:
+    """オーバーレイの設定(位置・大きさ・トリミング等の dict)をすべてメモリに持ち、1 つの JSON に保存する。
+
+    設定の種類:
+      window  (exe, title) ごと。put() で保存する通常の設定
+      exe     exe ごとの既定値。put(..., exe_default=True) で window と一緒に更新される
+      pattern タイトルの glob パターン(と任意で exe)ごと。set_pattern() で登録する
+      legacy  旧形式(legacy_dir/window_config/<タイトル>.json, exe_config/<exe>.json)から取り込んだもの。
+              初めて開いたときに 1 回だけ取り込んで同じファイルに保存し、以後は旧形式のディレクトリを見ない
+    順番は lookup を参照。パターン以外は dict 1 回で引け、パターンの結果もキャッシュする。
+    exe は大文字小文字を区別しない。
+
+    書き込みは最後の変更から delay 秒(変更が続いても最初の変更から max_delay 秒)待ってまとめて行う。
+    一時ファイルに書いて os.replace で置き換えるので、途中で落ちても古い内容か新しい内容のどちらかが残る。
+    他のプロセスが同じファイルを書き換えていたら、読み直してこちらで変更した項目だけを上書きする。
+    delay=0 なら書き込みスレッドを作らず put のたびに書く。
+    """
+    def __init__(self, path, delay=1.0, max_delay=None, legacy_dir=None):
+        self.path, self.delay = path, delay
+        self.max_delay = max_delay if max_delay is not None else 5 * delay
+        self.legacy_dir = legacy_dir
+        self._lock = threading.Condition()
+        self._io = threading.Lock()     # ファイルの読み書き(flush)を 1 つずつ
+        self._entries = {}       # ("w", exe, title) / ("e", exe) / ("p", exe, pattern) / 旧形式 ("t", 名前) ("x", exe) -> dict
+        self._titles = {}        # title -> window のキー(最後に保存したもの)
+        self._patterns = []      # [(キー, 正規表現)] 登録順
+        self._pattern_hits = {}  # (exe, title) -> pattern のキー or None
+        self._imported = False   # 旧形式を取り込み済み(ファイルに記録する)
+        self._changed = set()    # 未保存のキー(削除したものも含む)
+        self._first_change = self._last_change = None
+        self._disk = None        # 最後に読み書きしたファイルの (mtime_ns, size)
+        self._thread = None
+        self._closing = False
+        # 統計
+        self.loads = 0
+        self.writes = 0
+        self.merges = 0
+        self.lookups = 0
+        self.load()
+
+    # ----- 読み込み -----
+    def _stat(self):
+        try:
+            st = os.stat(self.path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _read(self):
+        """(ファイルの {キー: dict}, 旧形式を取り込み済みか)。無ければ (None, False)"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except FileNotFoundError:
+            return None, False
+        except Exception as e:
+            print(f"⚠ 設定ファイルを読めません ({self.path}): {e}")
+            return None, False
+        out = {}
+        for e in doc.get("profiles", []):
+            kind = e.get("k")
+            if kind == "w": key = ("w", e["exe"].lower(), e["title"])
+            elif kind == "e": key = ("e", e["exe"].lower())
+            elif kind == "p": key = ("p", (e.get("exe") or "").lower(), e["pattern"])
+            elif kind == "t": key = ("t", e["name"])
+            elif kind == "x": key = ("x", e["name"].lower())
+            else: continue
+            out[key] = e.get("data") or {}
+        return out, bool(doc.get("legacy_imported"))
+
+    def load(self):
+        """ファイル全体を読み直す(起動時に 1 回)。未保存の変更は残す"""
+        entries, imported = self._read()
+        entries = entries or {}
+        with self._lock:
+            for key in self._changed:
+                if key in self._entries: entries[key] = self._entries[key]
+                else: entries.pop(key, None)
+            self._set_entries(entries)
+            self._imported = self._imported or imported
+            self._disk = self._stat()
+            self.loads += 1
+            found = self._import_legacy() if self.legacy_dir and not self._imported else 0
+        if found: self._schedule()
+
+    def _set_entries(self, entries):
+        self._entries = entries
+        self._titles = {k[2]: k for k in entries if k[0] == "w"}
+        self._rebuild_patterns()
+
+    def _rebuild_patterns(self):
+        self._patterns = [(k, re.compile(fnmatch.translate(k[2]))) for k in self._entries if k[0] == "p"]
+        self._pattern_hits = {}
+
+    def _import_legacy(self):
+        """(ロック内) 旧形式 window_config/*.json と exe_config/*.json を取り込み、未保存の変更にする。
+        取り込んだファイルの数を返す(0 ならファイルにも何も書かない)"""
+        found = 0
+        for kind, sub in (("t", "window_config"), ("x", "exe_config")):
+            d = os.path.join(self.legacy_dir, sub)
+            try: names = os.listdir(d)
+            except OSError: continue
+            for name in names:
+                if not name.endswith(".json"): continue
+                try:
+                    with open(os.path.join(d, name), "r", encoding="utf-8") as f:
+                        data = json.load(f)
+                except Exception:
+                    continue
+                stem = name[:-5]
+                key = (kind, stem.lower() if kind == "x" else stem)
+                found += 1
+                if key not in self._entries:
+                    self._entries[key] = data
+                    self._touch(key)
+        if found:
+            self._imported = True
+            print(f"設定: 旧形式の設定 {found} 件を {self.path} に取り込みました")
+        return found
+
+    # ----- 参照 -----
+    def lookup(self, exe, title):
+        """(種類, dict)。種類は "window" / "title" / "pattern" / "exe" / "legacy"。無ければ (None, None)
+
+        順番: window → 旧形式のタイトルの設定 → 同じタイトルの window(exe 違い。旧版はタイトルだけで引いていた)
+        → pattern → exe → 旧形式の exe の設定。
+        旧形式のタイトルの設定は set_pattern のパターンや、put() が同じ exe の別ウィンドウで書いた exe の既定値より
+        優先する。旧版ではそのウィンドウ専用に保存したものなので、より一般的な設定で隠さない
+        (置き換えたいときは put() でそのウィンドウの設定を保存するか、remove_legacy() で消す)。
+        """
+        exe = exe.lower()
+        with self._lock:
+            self.lookups += 1
+            e = self._entries
+            data = e.get(("w", exe, title))
+            if data is not None: return "window", data
+            # 旧版がこのタイトルに保存した設定は、同じ exe の別ウィンドウを保存した既定値より優先する
+            legacy = e.get(("t", legacy_name(title)))
+            if legacy is not None: return "legacy", legacy
+            key = self._titles.get(title)
+            if key is not None: return "title", e[key]
+            if self._patterns:
+                hit = self._pattern_hits.get((exe, title), False)
+                if hit is False:
+                    hit = next((k for k, rx in self._patterns
+                                if (not k[1] or k[1] == exe) and rx.match(title)), None)
+                    self._pattern_hits[exe, title] = hit
+                if hit is not None: return "pattern", e[hit]
+            data = e.get(("e", exe))
+            if data is not None: return "exe", data
+            legacy = e.get(("x", legacy_name(exe)))
+            if legacy is not None: return "legacy", legacy
+        return None, None
+
+    def get(self, exe, title, default=None):
+        """設定の写し。無ければ default(None なら {})"""
+        _, data = self.lookup(exe, title)
+        if data is None: return {} if default is None else default
+        return dict(data)
+
+    # ----- 更新 -----
+    def put(self, exe, title, data, exe_default=True):
+        """(exe, title) の設定を保存する。exe_default なら exe の既定値も同じ内容にする(旧版の save_config)"""
+        exe = exe.lower()
+        data = dict(data)
+        with self._lock:
+            key = ("w", exe, title)
+            self._entries[key] = data
+            self._titles[title] = key
+            self._touch(key)
+            if exe_default:
+                self._entries["e", exe] = data
+                self._touch(("e", exe))
+        self._schedule()
+
+    def set_pattern(self, pattern, data, exe=None):
+        """タイトルが glob パターン(例 "*YouTube*")に合うウィンドウの設定。exe を指定するとその exe に限る"""
+        key = ("p", (exe or "").lower(), pattern)
+        with self._lock:
+            self._entries[key] = dict(data)
+            self._rebuild_patterns()
+            self._touch(key)
+        self._schedule()
+
+    def remove(self, exe, title=None, pattern=None):
+        """title を渡せば window、pattern を渡せば pattern、どちらも無ければ exe の既定値を消す"""
+        exe = (exe or "").lower()
+        key = ("w", exe, title) if title is not None else ("p", exe, pattern) if pattern is not None else ("e", exe)
+        with self._lock:
+            if self._entries.pop(key, None) is None: return False
+            if key[0] == "w" and self._titles.get(title) == key:
+                del self._titles[title]
+                alt = next((k for k in self._entries if k[0] == "w" and k[2] == title), None)
+                if alt is not None: self._titles[title] = alt
+            if key[0] == "p": self._rebuild_patterns()
+            self._touch(key)
+        self._schedule()
+        return True
+
+    def remove_legacy(self, title=None, exe=None):
+        """取り込んだ旧形式のタイトル(または exe)の設定を消す"""
+        key = ("t", legacy_name(title)) if title is not None else ("x", legacy_name(exe.lower()))
+        with self._lock:
+            if self._entries.pop(key, None) is None: return False
+            self._touch(key)
+        self._schedule()
+        return True
+
+    def _touch(self, key):
+        """(ロック内) 未保存の変更として記録する"""
+        now = time.monotonic()
+        self._changed.add(key)
+        if self._first_change is None: self._first_change = now
+        self._last_change = now
+        self._lock.notify_all()
+
+    # ----- 書き込み -----
+    def _schedule(self):
+        if self.delay <= 0:
+            self.flush()
+            return
+        with self._lock:
+            if self._thread is None and not self._closing:
+                self._thread = threading.Thread(target=self._run, name="config-writer", daemon=True)
+                self._thread.start()
+
+    def _due(self):
+        """(ロック内) 書き込むまでの残り秒数。変更が無ければ None"""
+        if not self._changed: return None
+        now = time.monotonic()
+        return max(0.0, min(self._last_change + self.delay, self._first_change + self.max_delay) - now)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while True:
+                    wait = self._due()
+                    if self._closing or wait == 0.0: break
+                    self._lock.wait(wait)
+                if self._closing: return
+            self.flush()
+
+    def flush(self):
+        """未保存の変更があれば今すぐ書く"""
+        with self._io:
+            with self._lock:
+                if not self._changed: return False
+                stale = self._stat() != self._disk
+            # 他のプロセスが書き換えていたら読み直して、こちらで変えた項目だけを上書きする
+            disk = self._read()[0] if stale else None
+            with self._lock:
+                if disk is not None:
+                    for key in self._changed:
+                        if key in self._entries: disk[key] = self._entries[key]
+                        else: disk.pop(key, None)
+                    self._set_entries(disk)
+                    self.merges += 1
+                text, changed = self._dumps(), self._changed
+                self._changed = set()
+                self._first_change = self._last_change = None
+            try:
+                self._write(text)       # 書いている間も参照・更新は止めない
+            except OSError as e:
+                print(f"⚠ 設定を保存できません ({self.path}): {e}")
+                with self._lock:
+                    self._changed |= changed
+                return False
+            with self._lock:
+                self._disk = self._stat()
+                self.writes += 1
+        return True
+
+    def _dumps(self):
+        out = []
+        for key, data in self._entries.items():
+            if key[0] == "w": out.append({"k": "w", "exe": key[1], "title": key[2], "data": data})
+            elif key[0] == "e": out.append({"k": "e", "exe": key[1], "data": data})
+            elif key[0] == "p": out.append({"k": "p", "exe": key[1], "pattern": key[2], "data": data})
+            else: out.append({"k": key[0], "name": key[1], "data": data})
+        doc = {"version": VERSION, "profiles": out}
+        if self._imported: doc["legacy_imported"] = True
+        return json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
+
+    def _write(self, text):
+        d = os.path.dirname(self.path)
+        if d: os.makedirs(d, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def close(self):
+        """書き込みスレッドを止めて残りを書く"""
+        with self._lock:
+            self._closing = True
+            self._lock.notify_all()
+            th = self._thread
+        if th is not None: th.join()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            kinds = {"w": 0, "e": 0, "p": 0, "t": 0, "x": 0}
+            for k in self._entries: kinds[k[0]] += 1
+            return {"windows": kinds["w"], "exes": kinds["e"], "patterns": kinds["p"],
+                    "legacy": kinds["t"] + kinds["x"],
+                    "pending": len(self._changed), "loads": self.loads, "writes": self.writes,
+                    "merges": self.merges, "lookups": self.lookups}
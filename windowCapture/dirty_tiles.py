@@ -0,0 +1,98 @@
+import numpy as np
+from buffers import BufferPool
+
+
+# =======================================================
+# タイル単位の変化検出
+# =======================================================
+def tile_rects(mask, w, h, tile=64):
+    """タイルマスクを (x, y, w, h) の矩形リストにする。横に連続するタイルをまとめ、
+    同じ横幅の区間が縦に続く場合はさらに縦にまとめる。
+    """
+    rects, open_runs = [], {}
+    for ty, row in enumerate(mask):
+        xs = np.flatnonzero(row)
+        runs = {}
+        if len(xs):
+            for run in np.split(xs, np.flatnonzero(np.diff(xs) > 1) + 1):
+                key = (int(run[0]), int(run[-1]))
+                r = open_runs.pop(key, None)
+                runs[key] = (r[0], r[1] + 1) if r else (ty, 1)   # (開始タイル行, 行数)
+        for key, (ty0, n) in open_runs.items():
+            rects.append(_to_rect(key, ty0, n, w, h, tile))
+        open_runs = runs
+    for key, (ty0, n) in open_runs.items():
+        rects.append(_to_rect(key, ty0, n, w, h, tile))
+    return rects
+
+
+def _to_rect(key, ty0, n, w, h, tile):
+    x0, y0 = key[0] * tile, ty0 * tile
+    x1, y1 = min((key[1] + 1) * tile, w), min((ty0 + n) * tile, h)
+    return (x0, y0, x1 - x0, y1 - y0)
+
+
+def merge_masks(a, b):
+    """FrameRing の merge 用。None は「全体が変化」"""
+    if a is None or b is None or a.shape != b.shape:
+        return None
+    return a | b
+
+
+class TileDiff:
+    """直前フレームと比較して変化したタイルのマスクを返す。
+
+    BGRA の 1 画素を uint32 として比較するので変換前のフレームに使える。
+    最初のフレームとサイズ変更直後は None(全体が変化)を返す。
+    """
+    def __init__(self, tile=64):
+        self.tile = tile
+        self.prev = None
+        self._ne = None
+        self._bufs = BufferPool()
+        self.grid = (0, 0)
+        # 統計
+        self.frames = 0
+        self.unchanged_frames = 0
+        self.tiles_total = 0
+        self.tiles_dirty = 0
+
+    def _alloc(self, h, w):
+        T = self.tile
+        self.grid = (-(-h // T), -(-w // T))
+        self.prev = self._bufs.view("prev", (h, w), np.uint32)
+        self._ne = self._bufs.view("ne", (self.grid[0] * T, self.grid[1] * T), bool)
+        self._ne[:] = False
+
+    def reset(self):
+        self.prev = None
+
+    def update(self, src):
+        """src: (h, w, 4) uint8 の BGRA ビュー"""
+        h, w = src.shape[:2]
+        cur = src.view(np.uint32)[:, :, 0]
+        self.frames += 1
+        if self.prev is None or self.prev.shape != (h, w):
+            self._alloc(h, w)
+            self.prev[:] = cur
+            return None
+        T, (th, tw) = self.tile, self.grid
+        np.not_equal(cur, self.prev, out=self._ne[:h, :w])
+        mask = self._ne.reshape(th, T, tw * T).any(axis=1).reshape(th, tw, T).any(axis=2)
+        n = int(mask.sum())
+        self.tiles_total += th * tw
+        self.tiles_dirty += n
+        if not n:
+            self.unchanged_frames += 1
+            return mask
+        for x, y, rw, rh in tile_rects(mask, w, h, T):
+            self.prev[y:y + rh, x:x + rw] = cur[y:y + rh, x:x + rw]
+        return mask
+
+    def stats(self):
+        return {"frames": self.frames, "unchanged_frames": self.unchanged_frames,
+                "tiles_total": self.tiles_total, "tiles_dirty": self.tiles_dirty, "allocs": self.allocs}
+
+    @property
+    def allocs(self):
+        return self._bufs.allocs
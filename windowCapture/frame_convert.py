@@ -0,0 +1,57 @@
+import numpy as np
+
+
+# =======================================================
+# BGRA → RGB / BGRA 変換（バッファプロトコル経由・出力バッファ再利用）
+# =======================================================
+def bgra_view(buf, w, h, stride=None, offset=0):
+    """任意のバッファ(bytes / memoryview / WinRT バッファ)をコピーせず (h, w, 4) として見る"""
+    stride = stride or w * 4
+    mv = memoryview(buf).cast("B")
+    return np.ndarray((h, w, 4), np.uint8, buffer=mv, offset=offset,
+                      strides=(stride, 4, 1))
+
+
+class FrameConverter:
+    """BGRA フレームを再利用する出力配列へ 1 回のコピーで RGB に変換する。
+
+    out に (h, w, 4) を渡すと並べ替えずに BGRA のまま写す(QImage.Format_RGB32 でそのまま表示できる)。
+    """
+    def __init__(self):
+        self.out = None
+        self.bytes_copied = 0   # 直近フレームでコピーしたバイト数
+        self.total_bytes = 0
+        self.frames = 0
+
+    def convert(self, buf, w, h, stride=None, offset=0, out=None):
+        return self.convert_array(bgra_view(buf, w, h, stride, offset), out)
+
+    def convert_array(self, src, out=None):
+        h, w = src.shape[:2]
+        if out is None:
+            if self.out is None or self.out.shape != (h, w, 3):
+                self.out = np.empty((h, w, 3), np.uint8)
+            out = self.out
+        if out.shape[2] == 4:
+            np.copyto(out, src)
+        else:
+            # チャンネルごとのコピーでアルファ除去と BGR→RGB を同時に行う
+            # (src[:, :, 2::-1] を一括 copyto するより数倍速い)
+            out[:, :, 0] = src[:, :, 2]
+            out[:, :, 1] = src[:, :, 1]
+            out[:, :, 2] = src[:, :, 0]
+        self.bytes_copied = out.nbytes
+        self.total_bytes += out.nbytes
+        self.frames += 1
+        return out
+
+
+def rgb_sink(sink):
+    """BGRA を受け取るシンク(FramePipeline.sinks)を、RGB を要る処理(OCR 等)に変換して渡すものにする。
+    rgb は呼び出しの間だけ有効(出力配列は使い回す)
+    """
+    conv = FrameConverter()
+    def wrapped(bgra, timestamp):
+        return sink(conv.convert_array(bgra), timestamp)
+    wrapped.converter = conv
+    return wrapped
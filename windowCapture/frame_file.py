@@ -0,0 +1,164 @@
+import mmap, struct, bisect, zlib
+import numpy as np
+from dirty_tiles import TileDiff, tile_rects
+
+
+# =======================================================
+# フレームファイル（BGRA フレーム＋タイムスタンプ）
+# =======================================================
+# ヘッダ: magic(4) version(u16) reserved(u16)
+# v1 レコード: timestamp(f64) width(u32) height(u32) stride(u32) nbytes(u32) + 画素
+# v2 レコード: v1 のヘッダ + kind(u8) comp(u8) tile(u16) raw_size(u32) + ペイロード
+#   kind=KEY:   BGRA 画素 (stride = width * 4)
+#   kind=DELTA: 変化タイルのマスク(packbits) + tile_rects(mask) の順に各矩形の画素
+#   comp=ZLIB:  ペイロード全体を zlib 圧縮(raw_size は展開後のバイト数)
+MAGIC = b"WCAP"
+VERSION = 2
+FILE_HDR = struct.Struct("<4sHH")
+REC_HDR_V1 = struct.Struct("<dIIII")
+REC_HDR = struct.Struct("<dIIIIBBHI")
+KEY, DELTA = 0, 1
+COMP_NONE, COMP_ZLIB = 0, 1
+COMPRESSORS = {None: COMP_NONE, "zlib": COMP_ZLIB}   # 標準ライブラリに LZ4 は無い
+
+
+class FrameFileWriter:
+    """codec="raw" は全フレームを KEY、"delta" は keyint フレームごと(とサイズ変更時)だけ KEY で
+    残りは前フレームとの差分タイルだけを書く。compress="zlib" でレコードごとに圧縮する。
+    """
+    def __init__(self, path, codec="raw", compress=None, level=1, tile=64, keyint=120):
+        if codec not in ("raw", "delta"):
+            raise ValueError(f"unknown codec: {codec}")
+        if compress not in COMPRESSORS:
+            raise ValueError(f"unknown compression: {compress}")
+        self.f = open(path, "wb")
+        self.f.write(FILE_HDR.pack(MAGIC, VERSION, 0))
+        self.comp, self.level, self.tile, self.keyint = COMPRESSORS[compress], level, tile, keyint
+        self.diff = TileDiff(tile) if codec == "delta" else None
+        self._since_key = 0
+        self.frames = 0
+        self.keyframes = 0
+        self.bytes_frames = 0   # 元のフレームのバイト数合計(w * h * 4)
+        self.bytes_in = 0       # 展開後のペイロード合計
+        self.bytes_out = 0      # ファイルに書いたバイト数
+
+    def _delta(self, bgra, mask):
+        h, w = bgra.shape[:2]
+        parts = [np.packbits(mask).tobytes()]
+        for x, y, rw, rh in tile_rects(mask, w, h, self.tile):
+            parts.append(np.ascontiguousarray(bgra[y:y + rh, x:x + rw]).data)
+        return b"".join(parts)
+
+    def write(self, bgra, timestamp):
+        """bgra: (h, w, 4) uint8 配列"""
+        h, w = bgra.shape[:2]
+        kind = KEY
+        if self.diff is not None:
+            mask = self.diff.update(bgra)
+            if mask is not None and self._since_key < self.keyint:
+                kind = DELTA
+                payload = self._delta(bgra, mask)
+        if kind == KEY:
+            payload = memoryview(np.ascontiguousarray(bgra)).cast("B")
+            self._since_key = 0
+            self.keyframes += 1
+        self._since_key += 1
+        raw = len(payload)
+        if self.comp == COMP_ZLIB:
+            payload = zlib.compress(payload, self.level)
+        self.f.write(REC_HDR.pack(timestamp, w, h, w * 4, len(payload), kind, self.comp, self.tile, raw))
+        self.f.write(payload)
+        self.frames += 1
+        self.bytes_frames += w * h * 4
+        self.bytes_in += raw
+        self.bytes_out += REC_HDR.size + len(payload)
+
+    def close(self):
+        self.f.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *exc): self.close()
+
+
+class FrameFileReader:
+    """mmap でファイルを開き、フレームを memoryview として返す。
+
+    無圧縮の KEY はコピーせずファイルの領域をそのまま返す。DELTA や圧縮レコードは直前の KEY から
+    内部バッファに復元して返す(次に frame() を呼ぶまで有効)。順に読む場合は 1 レコード分だけ復元する。
+    """
+    def __init__(self, path):
+        self.f = open(path, "rb")
+        self.mm = mmap.mmap(self.f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, ver, _ = FILE_HDR.unpack_from(self.mm, 0)
+        if magic != MAGIC or ver not in (1, 2):
+            raise ValueError(f"not a frame file: {path}")
+        hdr = REC_HDR if ver == 2 else REC_HDR_V1
+        # (offset, timestamp, width, height, stride, nbytes, kind, comp, tile, raw_size)
+        self.index = []
+        pos = FILE_HDR.size
+        while pos + hdr.size <= len(self.mm):
+            rec = hdr.unpack_from(self.mm, pos)
+            if ver == 1: rec += (KEY, COMP_NONE, 0, rec[4])
+            pos += hdr.size
+            if pos + rec[4] > len(self.mm): break   # 書きかけの末尾は無視
+            self.index.append((pos,) + rec)
+            pos += rec[4]
+        self.timestamps = [r[1] for r in self.index]
+        self.keys = [i for i, r in enumerate(self.index) if r[6] == KEY]
+        self._img = None
+        self._cur = -1          # _img に復元済みのフレーム番号
+
+    def __len__(self): return len(self.index)
+
+    def frame_size(self, i):
+        return self.index[i][2], self.index[i][3]
+
+    def _payload(self, rec):
+        off, n, comp = rec[0], rec[5], rec[7]
+        data = memoryview(self.mm)[off:off + n]
+        if comp == COMP_NONE: return data
+        try: return zlib.decompress(data)
+        finally: data.release()
+
+    def _apply(self, j):
+        rec = self.index[j]
+        w, h, stride, kind, tile = rec[2], rec[3], rec[4], rec[6], rec[8]
+        data = self._payload(rec)
+        try:
+            if kind == KEY:
+                if self._img is None or self._img.shape != (h, w, 4):
+                    self._img = np.empty((h, w, 4), np.uint8)
+                np.copyto(self._img, np.ndarray((h, w, 4), np.uint8, data, strides=(stride, 4, 1)))
+                return
+            th, tw = -(-h // tile), -(-w // tile)
+            nm = -(-th * tw // 8)
+            mask = np.unpackbits(np.frombuffer(data, np.uint8, nm))[:th * tw].reshape(th, tw).astype(bool)
+            pos = nm
+            for x, y, rw, rh in tile_rects(mask, w, h, tile):
+                n = rw * rh * 4
+                self._img[y:y + rh, x:x + rw] = np.frombuffer(data, np.uint8, n, pos).reshape(rh, rw, 4)
+                pos += n
+        finally:
+            if isinstance(data, memoryview): data.release()
+
+    def frame(self, i):
+        """(memoryview, width, height, stride, timestamp)"""
+        rec = self.index[i]
+        off, ts, w, h, stride, n, kind, comp = rec[:8]
+        if kind == KEY and comp == COMP_NONE:
+            return memoryview(self.mm)[off:off + n], w, h, stride, ts
+        if self._cur != i:
+            key = self.keys[bisect.bisect_right(self.keys, i) - 1]
+            start = self._cur + 1 if key <= self._cur < i else key
+            for j in range(start, i + 1):
+                self._apply(j)
+            self._cur = i
+        return memoryview(self._img).cast("B"), w, h, w * 4, ts
+
+    def seek(self, timestamp):
+        """timestamp 以前で最も新しいフレームの番号"""
+        return max(0, bisect.bisect_right(self.timestamps, timestamp) - 1)
+
+    def close(self):
+        self._img = None
+        self.mm.close(); self.f.close()
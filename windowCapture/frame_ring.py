@@ -0,0 +1,146 @@
+import threading, time
+import numpy as np
+from buffers import GrowBuffer
+
+_NONE = object()
+
+
+# =======================================================
+# 事前確保フレームリング（キャプチャ → 表示の受け渡し）
+# =======================================================
+class FrameRing:
+    """固定数のフレームスロットを使い回す。表示が追いつかないフレームは捨てる。
+
+    書き込み側: acquire_write → (変換) → publish / abort
+    読み出し側: borrow → (使用) → release
+
+    publish にはフレームごとのメタデータ(変化タイル等)を付けられる。merge を渡すと、
+    捨てられたフレームのメタデータは次に公開するフレームのものと merge(old, new) で合成される。
+    """
+    def __init__(self, n=3, merge=None):
+        if n < 2:
+            raise ValueError("FrameRing needs at least 2 slots")
+        self.n = n
+        self._cond = threading.Condition()
+        self._bufs = [GrowBuffer() for _ in range(n)]   # スロットごとの平坦な uint8 バッファ
+        self._views = [None] * n
+        self._refs = [0] * n        # 貸出中の参照数
+        self._seqs = [0] * n
+        self._fresh = [False] * n   # 公開済みでまだ誰も借りていない
+        self._meta = [None] * n
+        self._times = [0.0] * n     # publish した時刻 (perf_counter)
+        self.merge = merge
+        self._carry = _NONE         # 捨てたフレームから引き継ぐメタデータ
+        self._writing = -1
+        self._latest = -1
+        self.seq = 0
+        # 統計
+        self.published = 0
+        self.drops = 0        # 一度も借りられずに次のフレームで置き換えられた
+        self.overwrites = 0   # 未読の最新フレームを上書きして書き込んだ
+        self.skipped = 0      # 空きスロットが無く書き込みを諦めた
+        self.wait_time = 0.0  # 書き込み側が空きスロットを待った合計秒数
+
+    @property
+    def allocs(self):
+        return sum(b.allocs for b in self._bufs)
+
+    def _slot(self, i, shape, dtype):
+        # サイズが変わってもバッファが足りていれば先頭を切り出し直すだけ(足りなければ伸ばす)
+        v = self._views[i]
+        if v is None or v.shape != shape or v.dtype != dtype:
+            self._views[i] = self._bufs[i].view(shape, dtype)
+        return self._views[i]
+
+    def _pick_free(self):
+        # 未読の最新フレームは最後の手段として残す
+        for i in range(self.n):
+            if self._refs[i] == 0 and i != self._latest and i != self._writing:
+                return i
+        if self._latest >= 0 and self._refs[self._latest] == 0:
+            return self._latest
+        return -1
+
+    def acquire_write(self, shape, dtype=np.uint8, timeout=0.05):
+        """書き込み用スロットを確保して (index, ndarray) を返す。確保できなければ None"""
+        with self._cond:
+            if self._writing >= 0:
+                raise RuntimeError("previous slot was not published or aborted")
+            t0 = time.perf_counter()
+            i = self._pick_free()
+            if i < 0:
+                self._cond.wait_for(lambda: self._pick_free() >= 0, timeout)
+                i = self._pick_free()
+                self.wait_time += time.perf_counter() - t0
+            if i < 0:
+                self.skipped += 1
+                return None
+            if i == self._latest:
+                if self._fresh[i]:
+                    self.overwrites += 1
+                    self._drop(i)
+                self._latest = -1
+            self._fresh[i] = False
+            self._writing = i
+            return i, self._slot(i, tuple(shape), dtype)
+
+    def _drop(self, i):
+        self.drops += 1
+        self._fresh[i] = False
+        if self.merge:
+            m = self._meta[i]
+            self._carry = m if self._carry is _NONE else self.merge(self._carry, m)
+
+    def publish(self, i, meta=None):
+        with self._cond:
+            if i != self._writing:
+                raise RuntimeError(f"slot {i} is not being written")
+            self._writing = -1
+            prev = self._latest
+            if prev >= 0 and self._fresh[prev]:
+                self._drop(prev)
+            if self._carry is not _NONE:
+                meta = self.merge(self._carry, meta)
+                self._carry = _NONE
+            self._meta[i] = meta
+            self._times[i] = time.perf_counter()
+            self.seq += 1
+            self._seqs[i] = self.seq
+            self._fresh[i] = True
+            self._latest = i
+            self.published += 1
+            self._cond.notify_all()
+            return self.seq
+
+    def abort(self, i):
+        with self._cond:
+            if i == self._writing:
+                self._writing = -1
+                self._cond.notify_all()
+
+    def borrow(self, only_new=True):
+        """最新フレームを借りて (index, ndarray, seq, meta) を返す。新しいフレームが無ければ None"""
+        with self._cond:
+            i = self._latest
+            if i < 0 or (only_new and not self._fresh[i]):
+                return None
+            self._refs[i] += 1
+            self._fresh[i] = False
+            return i, self._views[i], self._seqs[i], self._meta[i]
+
+    def published_at(self, i):
+        """スロット i が公開された時刻 (time.perf_counter)"""
+        return self._times[i]
+
+    def release(self, i):
+        with self._cond:
+            if self._refs[i] <= 0:
+                raise RuntimeError(f"slot {i} is not borrowed")
+            self._refs[i] -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {"published": self.published, "drops": self.drops,
+                    "overwrites": self.overwrites, "skipped": self.skipped,
+                    "allocs": self.allocs, "wait_time": self.wait_time}
@@ -0,0 +1,359 @@
+import math, time, threading, collections
+import numpy as np
+from capture_scheduler import CaptureScheduler, CapturePolicy
+from visibility import ACTIVE, HIDDEN
+
+STEP = 1.25     # fps はこの比ごとの段に丸める(細かなポリシー変更でスケジューラを起こさない)
+
+
+# =======================================================
+# 内容の変化からの fps 決定
+# =======================================================
+class ChangeRatePolicy:
+    """1 セッションの希望 fps を内容の変化から決める(CPU 予算を考える前)。
+
+    取得したフレームごとに on_frame(changed, now) を呼ぶ。直近 window 秒に見た変化の数から変化率を出し、
+    その headroom 倍を目標にする(idle_fps〜max_fps)。window 内のフレームがすべて変化していれば
+    取りこぼしているかもしれないので max_fps を目標にする。目標より高いときは half_life 秒ごとに半分ずつ
+    下げ、低いときはすぐ上げる。
+    quiet 秒以上変化が無かった後に変化を見たら次のフレームから max_fps にする(動き始め)。probe 秒以内に
+    もう一度変化しなければ一瞬の変化(時計の秒など)とみなして元の fps に戻す。
+    """
+    def __init__(self, max_fps=60.0, idle_fps=10.0, headroom=1.5, window=0.5, half_life=0.3,
+                 quiet=0.25, probe=0.1):
+        if window <= 0 or half_life <= 0:
+            raise ValueError("window and half_life must be > 0")
+        self.max_fps, self.idle_fps, self.headroom = max_fps, min(idle_fps, max_fps), headroom
+        self.window, self.half_life, self.quiet, self.probe = window, half_life, quiet, probe
+        self.fps = max_fps
+        self._frames = collections.deque()     # (時刻, changed)
+        self._changes = 0
+        self._last = None
+        self._last_change = None
+        self._probe = None                      # (上げる前の fps, 期限)
+        # 統計
+        self.attacks = 0
+        self.blips = 0
+
+    def reset(self, now, fps=None):
+        """変化の記録を捨てて fps(既定は max_fps)から始め直す"""
+        self.fps = self.max_fps if fps is None else fps
+        self._frames.clear()
+        self._changes = 0
+        self._last, self._probe = now, None
+
+    def on_frame(self, changed, now):
+        f = self._frames
+        f.append((now, changed))
+        self._changes += changed
+        while f[0][0] <= now - self.window:
+            self._changes -= f.popleft()[1]
+        dt = 0.0 if self._last is None else now - self._last
+        self._last = now
+        if self._probe is not None:
+            if changed: self._probe = None      # 動き始めが続いている
+            elif now < self._probe[1]: return self.fps
+            else:
+                self.fps, self._probe = self._probe[0], None
+                self.blips += 1
+                return self.fps
+        if changed:
+            quiet = self._last_change is None or now - self._last_change > self.quiet
+            self._last_change = now
+            if quiet and self.fps < self.max_fps:
+                self._probe, self.fps = (self.fps, now + self.probe), self.max_fps
+                self.attacks += 1
+                return self.fps
+        if len(f) > 1 and self._changes == len(f):
+            target = self.max_fps
+        else:
+            target = min(self.max_fps, max(self.idle_fps, self.headroom * self._changes / self.window))
+        if target >= self.fps: self.fps = target
+        else: self.fps = max(target, self.fps * 0.5 ** (dt / self.half_life))
+        return self.fps
+
+
+# =======================================================
+# 全セッションの fps 配分（CPU 予算・表示状態）
+# =======================================================
+class _Governed:
+    def __init__(self, name, pipeline, set_policy, base, priority, policy):
+        self.name, self.pipeline, self.set_policy = name, pipeline, set_policy
+        self.base, self.priority, self.policy = base, float(priority), policy
+        self.want = policy.fps      # 希望 fps
+        self.fps = None             # 反映した fps(段に丸めたもの)
+        self.cost = None            # 1 フレームあたりの CPU 秒(推定)
+        self.active = True
+        self.listener = None
+        self._cpu, self._seen = pipeline.cpu_time, self._frames_seen()
+        # 統計
+        self.frames = 0
+        self.changes = 0
+        self.policy_changes = 0
+
+    def _frames_seen(self):
+        p = self.pipeline
+        return p.processed + p.skipped_frames + p.suppressed
+
+
+class RateGovernor:
+    """セッションごとの ChangeRatePolicy の希望 fps を全体の CPU 予算に収め、各セッションのポリシーに反映する。
+
+    add() でパイプラインの change_listeners に加わり、取得したフレームごとに希望 fps を更新する。
+    cpu_budget は全セッション合計の CPU 使用量の上限(CPU 何個分。None なら無制限)。超えそうなら
+    priority に比例して CPU 時間を分け、希望を満たしたセッションの余りは他に回す。1 フレームあたりの
+    CPU 時間は pipeline.cpu_time から推定する。min_fps より下げない。
+    visibility(VisibilityThrottle)を渡すと、変換を止めている状態ではポリシーを VisibilityThrottle に任せて
+    予算の計算からも外す。戻ったときは全体を描き直すので max_fps から始める。
+    fps は STEP 倍ごとの段に丸め、段が変わったときだけ set_policy を呼ぶ。base が "max:N" なら N を上限にし、
+    上限で取るときは base のまま("latest" なら上限なし)にする。policy_kw は ChangeRatePolicy の引数。
+    clock を差し替えればシミュレーション時計で動く(simulate)。
+    """
+    def __init__(self, cpu_budget=None, min_fps=1.0, clock=time.monotonic, **policy_kw):
+        self.cpu_budget, self.min_fps, self.clock = cpu_budget, min_fps, clock
+        self.policy_kw = policy_kw
+        self.sessions = []
+        self._lock = threading.Lock()
+        # 統計
+        self.allocations = 0
+        self.limited = 0        # 予算で希望を削った回数
+
+    def add(self, pipeline, set_policy, base="latest", priority=1.0, visibility=None, name=None, **policy_kw):
+        base = CapturePolicy.parse(base)
+        kw = {**self.policy_kw, **policy_kw}
+        if base.mode == "max": kw["max_fps"] = min(kw.get("max_fps", base.fps), base.fps)
+        g = _Governed(name or f"session-{len(self.sessions)}", pipeline, set_policy, base, priority,
+                      ChangeRatePolicy(**kw))
+        g.listener = lambda changed, ts: self._on_frame(g, changed)
+        pipeline.change_listeners.append(g.listener)
+        if visibility is not None:
+            visibility.listeners.append(lambda old, new: self._on_visibility(g, new))
+            g.active = self._governs(visibility.state, pipeline)
+        with self._lock:
+            self.sessions.append(g)
+            todo = self._allocate()
+        self._apply(todo)
+        return g
+
+    def remove(self, g):
+        with self._lock:
+            if g not in self.sessions: return
+            self.sessions.remove(g)
+            todo = self._allocate()
+        if g.listener in g.pipeline.change_listeners: g.pipeline.change_listeners.remove(g.listener)
+        self._apply(todo)
+
+    @staticmethod
+    def _governs(state, pipeline):
+        # VisibilityThrottle が元のポリシーで取らせている状態
+        return state == ACTIVE or (state == HIDDEN and bool(pipeline.sinks))
+
+    def _on_visibility(self, g, new):
+        with self._lock:
+            g.active = self._governs(new, g.pipeline)
+            if g.active:
+                g.policy.reset(self.clock())
+                g.want, g.fps = g.policy.fps, None     # VisibilityThrottle が戻したポリシーを上書きする
+            todo = self._allocate()
+        self._apply(todo)
+
+    def _on_frame(self, g, changed):
+        """(キャプチャスレッド) 取得したフレームごと"""
+        now = self.clock()
+        with self._lock:
+            g.frames += 1
+            g.changes += changed
+            cpu, seen = g.pipeline.cpu_time, g._frames_seen()       # cpu_time は前のフレームまで
+            if seen > g._seen:
+                c = (cpu - g._cpu) / (seen - g._seen)
+                g.cost = c if g.cost is None else 0.8 * g.cost + 0.2 * c
+                g._cpu, g._seen = cpu, seen
+            want = g.policy.on_frame(changed, now)
+            if want == g.want: return
+            g.want = want
+            todo = self._allocate()
+        self._apply(todo)
+
+    def _allocate(self):
+        """(ロック内) 各セッションの fps を決め、段が変わったものの [(セッション, ポリシー)] を返す"""
+        self.allocations += 1
+        active = [g for g in self.sessions if g.active]
+        grant = {g: g.want for g in active}
+        limited = set()
+        if self.cpu_budget is not None:
+            costed = [g for g in active if g.cost]
+            if sum(g.want * g.cost for g in costed) > self.cpu_budget:
+                self.limited += 1
+                # priority 比例の水位合わせ: 希望の CPU 時間が少ない順に満たし、余りを残りで分ける
+                left = self.cpu_budget
+                todo = sorted(costed, key=lambda g: g.want * g.cost / g.priority)
+                weight = sum(g.priority for g in todo)
+                for g in todo:
+                    share = left * g.priority / weight
+                    use = min(g.want * g.cost, share)
+                    grant[g] = max(self.min_fps, min(g.want, use / g.cost))
+                    if use < g.want * g.cost: limited.add(g)
+                    left -= use
+                    weight -= g.priority
+        out = []
+        for g, fps in grant.items():
+            cap = g.policy.max_fps
+            if g in limited:     # 予算を超えないように切り下げる
+                q = min(cap, STEP ** math.floor(math.log(fps, STEP) + 1e-9))
+            elif fps >= cap / math.sqrt(STEP):
+                q = cap
+            else:
+                q = min(cap, STEP ** round(math.log(max(fps, 1e-3), STEP)))
+            if q == g.fps: continue
+            g.fps = q
+            g.policy_changes += 1
+            out.append((g, g.base if q >= cap and g.base.mode != "every" else CapturePolicy("max", q)))
+        return out
+
+    def _apply(self, todo):
+        for g, policy in todo:
+            g.set_policy(policy)
+
+    def stats(self):
+        with self._lock:
+            used = sum((g.fps or 0) * (g.cost or 0) for g in self.sessions if g.active)
+            return {"cpu_budget": self.cpu_budget, "cpu_used": round(used, 3), "allocations": self.allocations,
+                    "limited": self.limited,
+                    "sessions": [{"name": g.name, "active": g.active, "want": round(g.want, 1), "fps": g.fps and round(g.fps, 2),
+                                  "cost_ms": round(1e3 * g.cost, 2) if g.cost else None, "frames": g.frames,
+                                  "changes": g.changes, "policy_changes": g.policy_changes,
+                                  "attacks": g.policy.attacks, "blips": g.policy.blips} for g in self.sessions]}
+
+
+# =======================================================
+# 変化トレースの記録・再生（CPU 削減量と遅延の見積もり）
+# =======================================================
+class ChangeTraceWriter:
+    """pipeline.change_listeners に登録すると、取得したフレームごとに "時刻 変化(0/1)" を 1 行書く"""
+    def __init__(self, path):
+        self.f = open(path, "w", encoding="utf-8")
+        self.lines = 0
+
+    def __call__(self, changed, timestamp):
+        self.f.write(f"{timestamp:.6f} {int(changed)}\n")
+        self.lines += 1
+
+    def close(self):
+        self.f.close()
+
+
+def load_trace(path):
+    """(時刻の配列(0 始まり), 変化の配列)。ChangeTraceWriter のテキストか、録画(.wcap。変化したフレームだけが
+    入っているので、すべて変化したフレームとして読む)"""
+    if path.endswith(".wcap"):
+        from frame_file import FrameFileReader
+        r = FrameFileReader(path)
+        try: t = np.array(r.timestamps, np.float64)
+        finally: r.close()
+        changed = np.ones(len(t), bool)
+    else:
+        rows = np.loadtxt(path, ndmin=2)
+        t, changed = rows[:, 0], rows[:, 1] > 0
+    return t - (t[0] if len(t) else 0.0), changed
+
+
+def make_trace(kind, seconds=10.0, fps=60.0, seed=0):
+    """合成の変化トレース。ソースは fps で毎フレーム届く(固定間隔で取り続ける状況)。
+    static / video:N(N fps の動画) / clock(1 秒に 1 回) / typing(0.1〜0.4 秒おきの入力が数秒続いて止まる) /
+    scroll(ときどき 0.3〜2 秒の連続変化) / game(毎フレーム変化)"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * fps)) / fps
+    name, _, arg = kind.partition(":")
+    changed = np.zeros(len(t), bool)
+    if name == "video":
+        rate = float(arg or 24)
+        frame_no = np.floor(t * rate)
+        changed[1:] = frame_no[1:] != frame_no[:-1]
+    elif name == "clock":
+        changed[1:] = np.floor(t[1:]) != np.floor(t[:-1])
+    elif name == "typing":
+        at = 0.5
+        while at < seconds:
+            burst = at + rng.uniform(1.0, 4.0)
+            while at < min(burst, seconds):
+                changed[min(len(t) - 1, int(at * fps))] = True
+                at += rng.uniform(0.1, 0.4)
+            at += rng.uniform(1.0, 5.0)
+    elif name == "scroll":
+        at = 0.5
+        while at < seconds:
+            end = at + rng.uniform(0.3, 2.0)
+            changed[(t >= at) & (t < end)] = True
+            at = end + rng.uniform(1.0, 6.0)
+    elif name == "game":
+        changed[1:] = True
+    elif name != "static":
+        raise ValueError(f"unknown trace: {kind}")
+    return t, changed
+
+
+class _SimPipeline:
+    """simulate 用: RateGovernor が見る FramePipeline の属性だけ"""
+    def __init__(self):
+        self.change_listeners, self.sinks = [], []
+        self.cpu_time = 0.0
+        self.processed = self.skipped_frames = self.suppressed = 0
+
+
+def simulate(traces, governor=None, cost_ms=(2.0, 5.0), base="latest", priorities=None):
+    """traces([(時刻, 変化)])を同じシミュレーション時計で再生し、実物の CaptureScheduler でフレームを取る。
+
+    governor は clock を受け取って RateGovernor を返す関数(None なら base のままで取り続ける。比較の基準)。
+    cost_ms は (変化の無いフレーム, 変化したフレーム) 1 枚あたりの CPU ミリ秒。
+    セッションごとに取得数・CPU 秒・遅延(変化したソースフレームが取得されるまで)を返す。
+    """
+    now = [0.0]
+    clock = lambda: now[0]
+    gov = governor(clock) if governor else None
+    runs = []
+    for k, (t, changed) in enumerate(traces):
+        pipe = _SimPipeline()
+        sched = CaptureScheduler(base, clock=clock, sleep=lambda dt: None)
+        if gov: gov.add(pipe, sched.set_policy, base, (priorities or {}).get(k, 1.0), name=f"trace-{k}")
+        runs.append({"t": t, "changed": changed, "pipe": pipe, "sched": sched, "next": 0, "avail": -1,
+                     "seen": -1, "lat": [], "fetches": 0})
+    end = max((r["t"][-1] for r in runs if len(r["t"])), default=0.0)
+    while True:
+        best, when, arrive = None, float("inf"), False
+        for r in runs:
+            i = r["next"]
+            ta = r["t"][i] if i < len(r["t"]) else float("inf")
+            dl = r["sched"].next_deadline(now[0])
+            if ta <= dl and ta < when: best, when, arrive = r, ta, True
+            elif dl < when: best, when, arrive = r, dl, False
+        if when > end: break
+        now[0] = when
+        r, sched = best, best["sched"]
+        if arrive:
+            r["avail"] = r["next"]
+            r["next"] += 1
+            sched.notify()
+            continue
+        sched.begin()
+        got = r["avail"] > r["seen"]
+        if got:
+            span = slice(r["seen"] + 1, r["avail"] + 1)
+            hits = np.flatnonzero(r["changed"][span])
+            r["lat"].extend(when - r["t"][span][hits])
+            changed = bool(len(hits))
+            p = r["pipe"]
+            for fn in p.change_listeners: fn(changed, when)
+            p.cpu_time += cost_ms[changed] / 1e3
+            if changed: p.processed += 1
+            else: p.skipped_frames += 1
+            r["seen"] = r["avail"]
+            r["fetches"] += 1
+        sched.done(got)
+    out = []
+    for r in runs:
+        lat = np.array(r["lat"]) * 1e3
+        pct = np.percentile(lat, [50, 95]) if len(lat) else (0.0, 0.0)
+        out.append({"fetches": r["fetches"], "cpu_s": r["pipe"].cpu_time,
+                    "changes": int(r["changed"].sum()), "latency_p50_ms": float(pct[0]),
+                    "latency_p95_ms": float(pct[1]), "latency_max_ms": float(lat.max()) if len(lat) else 0.0})
+    return out, gov
@@ -0,0 +1,301 @@
+import sys, asyncio, threading, uuid, ctypes
+from ctypes import c_void_p, c_uint, c_long, c_ubyte, c_uint16, c_uint32, POINTER, byref
+import numpy as np
+
+MAX_LEVEL = 6       # 1/64 まで
+
+
+# =======================================================
+# 読み出し前の縮小（GPU: ミップマップ / CPU: NumPy の参照実装）
+# =======================================================
+def plan_reduce(rect, out_size, max_level=MAX_LEVEL):
+    """トリミング範囲 rect(l, t, r, b) と出力サイズ (w, h) から、読み出し前に縮小する段数を決める。
+
+    1 段ごとに縦横 1/2 にして、縮小後もまだ出力サイズ以上ある最大の段数を返す(残りは Scaler が縮める)。
+    段数 k のとき rect の幅・高さを 2**k の倍数に切り詰める(右端・下端で 2**k - 1 画素未満 = 出力 1 画素未満)。
+    戻り値 ((l, t, r, b), k)。縮小しないなら k = 0 で rect はそのまま。
+    """
+    if out_size is None: return rect, 0
+    ow, oh = out_size
+    l, t, r, b = rect
+    w, h = r - l, b - t
+    if ow < 1 or oh < 1: return rect, 0
+    k = 0
+    while k < max_level and (w >> (k + 1)) >= ow and (h >> (k + 1)) >= oh:
+        k += 1
+    if k == 0: return rect, 0
+    m = (1 << k) - 1
+    return (l, t, r - (w & m), b - (h & m)), k
+
+
+def reduce_reference(src, level):
+    """GPU 側(GenerateMips → level 段目を読み出し)と同じ縮小の NumPy 実装。
+
+    src (H, W, 4) を 2x2 の平均(四捨五入)で level 回縮める。H, W は 2**level の倍数であること。
+    GPU のミップ生成は段ごとに丸めるので、結果は各段 ±1 の範囲で一致する(equivalence の基準)。
+    """
+    a = src
+    for _ in range(level):
+        h, w = a.shape[0] // 2, a.shape[1] // 2
+        v = a[0::2].astype(np.uint16)       # 縦に 2 行ずつ足す
+        v += a[1::2]
+        # 1 画素の 4ch(uint16×4) を uint64 1 要素として横に 2 画素ずつ足す。各 ch の合計は 1020 以下なので
+        # 隣の ch に桁あふれしない。丸め・シフト後に隣から落ちてきたビットをマスクで消す
+        v64 = v.view(np.uint64).reshape(h, 2 * w)
+        s = v64[:, 0::2] + v64[:, 1::2]
+        s += np.uint64(0x0002000200020002)
+        s >>= np.uint64(2)
+        s &= np.uint64(0x00FF00FF00FF00FF)
+        a = s.view(np.uint16).reshape(h, w, 4).astype(np.uint8)
+    return a
+
+
+# =======================================================
+# GPU 縮小が使えるか（1 回だけ調べて表示する）
+# =======================================================
+INTEROP_FUNCS = ("get_dxgi_device_from_object", "get_dxgi_surface_from_object")
+_support = None             # (使えるか, 理由)。未確認なら None
+_support_lock = threading.Lock()
+
+
+def _probe():
+    if sys.platform != "win32": return False, "not Windows"
+    try:
+        import winrt.windows.graphics.directx.direct3d11.interop as interop
+    except ImportError as e:
+        return False, f"no Direct3D11 interop module ({e})"
+    missing = [n for n in INTEROP_FUNCS if not callable(getattr(interop, n, None))]
+    if missing: return False, "interop module lacks " + ", ".join(missing)
+    return True, "D3D11 interop available"
+
+
+def gpu_support():
+    """(使えるか, 理由)。D3D11Reducer が頼る WinRT の DXGI 相互運用関数があるかを調べる。
+    結果は全バックエンドで共有し、表示は最初の 1 回だけ
+    """
+    global _support
+    with _support_lock:
+        if _support is None:
+            _support = _probe()
+            print(f"GPU reduce: {'on' if _support[0] else 'off'} ({_support[1]})")
+        return _support
+
+
+def disable_gpu(reason):
+    """D3D11Reducer が作れない・読み出しに失敗したとき。以降は全バックエンドで読み出し前の縮小をやめる
+    (全体を読み出して通常の経路でトリミング・縮小する)。表示は最初の 1 回だけ
+    """
+    global _support
+    with _support_lock:
+        if _support is not None and not _support[0]: return
+        _support = (False, reason)
+        print(f"GPU reduce: off ({reason}); reading back full frames")
+
+
+# =======================================================
+# D3D11 (ctypes で COM の vtable を直接呼ぶ)
+# =======================================================
+class GUID(ctypes.Structure):
+    _fields_ = [("Data1", c_uint32), ("Data2", c_uint16), ("Data3", c_uint16), ("Data4", c_ubyte * 8)]
+
+
+def _guid(text):
+    return GUID.from_buffer_copy(uuid.UUID(text).bytes_le)
+
+
+IID_ID3D11Device = _guid("db6f6ddb-ac77-4e88-8253-819df9bbf140")
+IID_ID3D11Texture2D = _guid("6f15aaf2-d208-4e89-9ab4-489535d34f9c")
+IID_ID3D11Multithread = _guid("9b7e4e00-342c-4106-a19f-4f2704f689f0")
+
+
+class D3D11_TEXTURE2D_DESC(ctypes.Structure):
+    _fields_ = [("Width", c_uint), ("Height", c_uint), ("MipLevels", c_uint), ("ArraySize", c_uint),
+                ("Format", c_uint), ("SampleCount", c_uint), ("SampleQuality", c_uint),
+                ("Usage", c_uint), ("BindFlags", c_uint), ("CPUAccessFlags", c_uint), ("MiscFlags", c_uint)]
+
+
+class D3D11_BOX(ctypes.Structure):
+    _fields_ = [("left", c_uint), ("top", c_uint), ("front", c_uint),
+                ("right", c_uint), ("bottom", c_uint), ("back", c_uint)]
+
+
+class D3D11_MAPPED_SUBRESOURCE(ctypes.Structure):
+    _fields_ = [("pData", c_void_p), ("RowPitch", c_uint), ("DepthPitch", c_uint)]
+
+
+DXGI_FORMAT_B8G8R8A8_UNORM = 87
+D3D11_USAGE_DEFAULT, D3D11_USAGE_STAGING = 0, 3
+D3D11_BIND_SHADER_RESOURCE, D3D11_BIND_RENDER_TARGET = 0x8, 0x20
+D3D11_CPU_ACCESS_READ = 0x20000
+D3D11_RESOURCE_MISC_GENERATE_MIPS = 0x1
+D3D11_MAP_READ = 1
+D3D11_MAP_FLAG_DO_NOT_WAIT = 0x100000
+DXGI_ERROR_WAS_STILL_DRAWING = 0x887A000A - (1 << 32)
+
+# vtable の番号 (d3d11.h の宣言順)
+_QUERY_INTERFACE, _RELEASE = 0, 2
+_DEV_CREATE_TEXTURE2D, _DEV_CREATE_SRV, _DEV_GET_IMMEDIATE_CONTEXT = 5, 7, 40
+_CTX_MAP, _CTX_UNMAP, _CTX_COPY_SUBRESOURCE_REGION, _CTX_GENERATE_MIPS = 14, 15, 46, 54
+_MT_SET_MULTITHREAD_PROTECTED = 5
+
+
+def _method(ptr, index, restype, *argtypes):
+    fn = ctypes.cast(ptr, POINTER(POINTER(c_void_p)))[0][index]
+    proto = ctypes.WINFUNCTYPE(restype, c_void_p, *argtypes)(fn)
+    return lambda *args: proto(ptr, *args)
+
+
+def _check(hr, what):
+    if hr < 0: raise OSError(f"{what} failed (HRESULT=0x{hr & 0xFFFFFFFF:08X})")
+
+
+def _qi(ptr, iid):
+    out = c_void_p()
+    _check(_method(ptr, _QUERY_INTERFACE, c_long, POINTER(GUID), POINTER(c_void_p))(byref(iid), byref(out)),
+           "QueryInterface")
+    return out.value
+
+
+def _release(ptr):
+    if ptr: _method(ptr, _RELEASE, c_uint)()
+
+
+class D3D11Reducer:
+    """WinRT のフレームをデバイス上でトリミング・縮小してから読み出す(Windows のみ)。
+
+    フレームのテクスチャから crop 範囲を GenerateMips 用テクスチャへコピーしてミップマップを作り、
+    level 段目をステージングテクスチャへコピーして Map する。PCIe を渡るのは縮小後の画素だけ。
+    Map は DO_NOT_WAIT で試し、GPU が終わっていなければ await で待つ(イベントループを止めない)。
+    イミディエイトコンテキストは全オーバーレイで共有なので、コマンドの発行はロックで直列化する。
+    作る前に gpu_support() で相互運用関数があることを確かめること。
+    """
+    def __init__(self, device):
+        from winrt.windows.graphics.directx.direct3d11.interop import get_dxgi_device_from_object
+        dxgi = get_dxgi_device_from_object(device)
+        try: self.dev = _qi(dxgi, IID_ID3D11Device)
+        finally: _release(dxgi)
+        ctx = c_void_p()
+        _method(self.dev, _DEV_GET_IMMEDIATE_CONTEXT, None, POINTER(c_void_p))(byref(ctx))
+        self.ctx = ctx.value
+        try:
+            mt = _qi(self.ctx, IID_ID3D11Multithread)    # WGC のスレッドと同じコンテキストを使うため
+            _method(mt, _MT_SET_MULTITHREAD_PROTECTED, c_long, c_long)(1)
+            _release(mt)
+        except OSError:
+            pass
+        c = self.ctx
+        self._copy = _method(c, _CTX_COPY_SUBRESOURCE_REGION, None, c_void_p, c_uint, c_uint, c_uint, c_uint,
+                             c_void_p, c_uint, POINTER(D3D11_BOX))
+        self._gen_mips = _method(c, _CTX_GENERATE_MIPS, None, c_void_p)
+        self._map = _method(c, _CTX_MAP, c_long, c_void_p, c_uint, c_uint, c_uint,
+                            POINTER(D3D11_MAPPED_SUBRESOURCE))
+        self._unmap = _method(c, _CTX_UNMAP, None, c_void_p, c_uint)
+        self._create_tex = _method(self.dev, _DEV_CREATE_TEXTURE2D, c_long, POINTER(D3D11_TEXTURE2D_DESC),
+                                   c_void_p, POINTER(c_void_p))
+        self._create_srv = _method(self.dev, _DEV_CREATE_SRV, c_long, c_void_p, c_void_p, POINTER(c_void_p))
+        self._lock = threading.Lock()
+        self._mips = None           # (幅, 高さ, 段数, テクスチャ, SRV)
+        self._staging_size = None
+        self._free = []             # 使い回すステージングテクスチャ
+        # 統計
+        self.reads = 0
+        self.bytes_read = 0
+        self.waits = 0
+
+    def _texture(self, w, h, levels=1, staging=False):
+        d = D3D11_TEXTURE2D_DESC(w, h, levels, 1, DXGI_FORMAT_B8G8R8A8_UNORM, 1, 0,
+                                 D3D11_USAGE_STAGING if staging else D3D11_USAGE_DEFAULT,
+                                 0 if staging else D3D11_BIND_SHADER_RESOURCE | D3D11_BIND_RENDER_TARGET,
+                                 D3D11_CPU_ACCESS_READ if staging else 0,
+                                 0 if staging else D3D11_RESOURCE_MISC_GENERATE_MIPS)
+        out = c_void_p()
+        _check(self._create_tex(byref(d), None, byref(out)), "CreateTexture2D")
+        return out.value
+
+    def _mip_chain(self, w, h, levels):
+        """(ロック内) GenerateMips 用のテクスチャと SRV。大きさか段数が変わったら作り直す"""
+        if self._mips is None or self._mips[:3] != (w, h, levels):
+            if self._mips is not None:
+                _release(self._mips[4]); _release(self._mips[3])
+            tex = self._texture(w, h, levels)
+            srv = c_void_p()
+            hr = self._create_srv(tex, None, byref(srv))
+            if hr < 0: _release(tex)
+            _check(hr, "CreateShaderResourceView")
+            self._mips = (w, h, levels, tex, srv.value)
+        return self._mips[3], self._mips[4]
+
+    def _take_staging(self, w, h):
+        if self._staging_size != (w, h):
+            for st in self._free: _release(st)
+            self._free, self._staging_size = [], (w, h)
+        return self._free.pop() if self._free else self._texture(w, h, staging=True)
+
+    def _give_back(self, st, size):
+        with self._lock:
+            if size == self._staging_size and len(self._free) < 4: self._free.append(st)
+            else: _release(st)
+
+    def _issue(self, surface, crop, level):
+        """コピーとミップ生成を発行してステージングテクスチャを返す(待たない)"""
+        from winrt.windows.graphics.directx.direct3d11.interop import get_dxgi_surface_from_object
+        l, t, r, b = crop
+        cw, ch = r - l, b - t
+        w, h = cw >> level, ch >> level
+        surf = get_dxgi_surface_from_object(surface)
+        try: tex = _qi(surf, IID_ID3D11Texture2D)
+        finally: _release(surf)
+        try:
+            with self._lock:
+                st = self._take_staging(w, h)
+                box = D3D11_BOX(l, t, 0, r, b, 1)
+                if level == 0:
+                    self._copy(st, 0, 0, 0, 0, tex, 0, byref(box))
+                else:
+                    mip, srv = self._mip_chain(cw, ch, level + 1)
+                    self._copy(mip, 0, 0, 0, 0, tex, 0, byref(box))
+                    self._gen_mips(srv)
+                    self._copy(st, 0, 0, 0, 0, mip, level, None)
+        finally:
+            _release(tex)
+        return st, w, h
+
+    def _try_map(self, st, w, h):
+        m = D3D11_MAPPED_SUBRESOURCE()
+        with self._lock:
+            hr = self._map(st, 0, D3D11_MAP_READ, D3D11_MAP_FLAG_DO_NOT_WAIT, byref(m))
+            if hr == DXGI_ERROR_WAS_STILL_DRAWING: return None
+            _check(hr, "Map")
+            try:
+                rows = (c_ubyte * (m.RowPitch * h)).from_address(m.pData)
+                out = np.frombuffer(rows, np.uint8).reshape(h, m.RowPitch)[:, :w * 4].reshape(h, w, 4).copy()
+            finally:
+                self._unmap(st, 0)
+        return out
+
+    async def read(self, surface, crop, level):
+        """surface の crop(l, t, r, b) を 1/2**level に縮小した (h, w, 4) BGRA の ndarray"""
+        st, w, h = self._issue(surface, crop, level)
+        try:
+            while True:
+                out = self._try_map(st, w, h)
+                if out is not None: break
+                self.waits += 1
+                await asyncio.sleep(0.0005)
+        finally:
+            self._give_back(st, (w, h))
+        self.reads += 1
+        self.bytes_read += out.nbytes
+        return out
+
+    def close(self):
+        with self._lock:
+            for st in self._free: _release(st)
+            self._free = []
+            if self._mips is not None:
+                _release(self._mips[4]); _release(self._mips[3]); self._mips = None
+            _release(self.ctx); _release(self.dev)
+            self.ctx = self.dev = None
+
+    def stats(self):
+        return {"reads": self.reads, "bytes_read": self.bytes_read, "map_waits": self.waits}
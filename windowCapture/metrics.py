@@ -0,0 +1,149 @@
+import math, time, json, threading
+
+
+# =======================================================
+# ホットパス計測（ステージごとのヒストグラム＋カウンタ）
+# =======================================================
+class Histogram:
+    """対数バケットの所要時間ヒストグラム(1 µs 〜 約 16 s, 1 バケットあたり約 9%)。
+    add は O(1) でメモリも固定。パーセンタイルはバケットの上端を返す。
+    """
+    PER_OCTAVE = 8
+    MIN = 1e-6
+    N = 24 * PER_OCTAVE
+
+    def __init__(self):
+        self.counts = [0] * (self.N + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, dt):
+        i = int(math.log2(dt / self.MIN) * self.PER_OCTAVE) + 1 if dt > self.MIN else 0
+        self.counts[min(i, self.N)] += 1
+        self.n += 1
+        self.total += dt
+        if dt > self.max: self.max = dt
+
+    def _upper(self, i):
+        return self.MIN * 2.0 ** (i / self.PER_OCTAVE)
+
+    def percentile(self, p):
+        if not self.n: return 0.0
+        want, acc = p / 100.0 * self.n, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= want:
+                return min(self._upper(i), self.max)
+        return self.max
+
+    def summary(self):
+        return {"n": self.n, "mean_ms": 1e3 * self.total / max(1, self.n),
+                "p50_ms": 1e3 * self.percentile(50), "p95_ms": 1e3 * self.percentile(95),
+                "p99_ms": 1e3 * self.percentile(99), "max_ms": 1e3 * self.max}
+
+
+class Metrics:
+    """ステージ時間・カウンタ・ゲージをまとめる。
+
+    計測する側は `m = self.metrics; if m: ...` の形で書き、無効時は metrics=None にしておく
+    (属性参照と真偽判定 1 回だけのコストになる)。
+    gauge には既存の統計値を返す関数を登録する(snapshot 時にだけ呼ばれる)。
+    add / count は計測スレッドから、snapshot は別スレッドから呼んでよい(新しい名前を足すときだけロックを取る)。
+    """
+    STAGES = ("acquire", "readback_async", "queued", "readback", "diff", "convert", "scale",
+              "handoff", "upload", "paint")
+
+    def __init__(self, clock=time.perf_counter, rate_window=2.0):
+        self.clock = clock
+        self.rate_window = rate_window
+        self._lock = threading.Lock()
+        self._gauges = {}
+        self.reset()
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+        self.t_start = self.clock()
+        self.t_first = self.t_last = None    # 最初・最後に count した時刻(計測が動いていた区間)
+        self._history = []   # (時刻, 数値) 直近 rate_window 秒ぶん
+
+    def add(self, stage, dt):
+        h = self.stages.get(stage)
+        if h is None:
+            with self._lock: h = self.stages.setdefault(stage, Histogram())
+        h.add(dt)
+
+    def count(self, name, n=1):
+        c = self.counters
+        if name not in c:
+            with self._lock: c.setdefault(name, 0)
+        c[name] += n
+        t = self.t_last = self.clock()
+        if self.t_first is None: self.t_first = t
+
+    def gauge(self, name, fn):
+        self._gauges[name] = fn
+
+    def _values(self):
+        with self._lock: v = dict(self.counters)
+        for k, fn in self._gauges.items():
+            try: v[k] = fn()
+            except Exception: pass
+        return v
+
+    def snapshot(self):
+        """{"t", "elapsed", "stages": {名前: summary}, "values": {...}, "rates": {名前: 毎秒}}"""
+        now = self.clock()
+        values = self._values()
+        hist = self._history
+        hist.append((now, values))
+        while len(hist) > 2 and now - hist[1][0] >= self.rate_window:
+            hist.pop(0)
+        t0, v0 = hist[0]
+        dt = now - t0
+        if len(hist) == 1:
+            # 最初の snapshot(同期実行の最後に 1 回だけ呼ぶ場合など): 計測が動いていた区間で割る
+            v0 = {}
+            dt = self.t_last - self.t_first if self.t_first is not None else 0.0
+        rates = {k: (v - v0.get(k, 0)) / dt for k, v in values.items()
+                 if dt > 0 and isinstance(v, (int, float))}
+        order = {k: i for i, k in enumerate(self.STAGES)}
+        with self._lock: hs = dict(self.stages)
+        stages = {k: hs[k].summary() for k in sorted(hs, key=lambda k: (order.get(k, len(order)), k))}
+        return {"t": time.time(), "elapsed": now - self.t_start, "stages": stages,
+                "values": values, "rates": rates}
+
+    def hud_lines(self, snap=None):
+        """オーバーレイ表示用の短いテキスト"""
+        s = snap or self.snapshot()
+        r, v = s["rates"], s["values"]
+        lines = [f"in {r.get('frames_in', 0):5.1f} fps  out {r.get('frames_out', 0):5.1f} fps  "
+                 f"drop {v.get('dropped', 0)}  rd {r.get('bytes_read', 0) / 1e6:6.1f} wr "
+                 f"{r.get('bytes_written', 0) / 1e6:6.1f} MB/s  {v.get('state', '')}",
+                 f"{'stage':14s} {'p50':>6s} {'p95':>6s} {'p99':>6s} ms"]
+        for k, h in s["stages"].items():
+            lines.append(f"{k:14s} {h['p50_ms']:6.2f} {h['p95_ms']:6.2f} {h['p99_ms']:6.2f}")
+        return lines
+
+
+class MetricsLogger:
+    """interval 秒ごとに snapshot を JSON Lines でファイルに追記する"""
+    def __init__(self, metrics, path, interval=1.0, **extra):
+        self.metrics, self.path, self.interval, self.extra = metrics, path, interval, extra
+        self._stop = threading.Event()
+        self._th = threading.Thread(target=self._run, name="metrics-log", daemon=True)
+
+    def start(self):
+        self._th.start()
+        return self
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while not self._stop.wait(self.interval):
+                f.write(json.dumps({**self.extra, **self.metrics.snapshot()}) + "\n")
+                f.flush()
+
+    def stop(self):
+        self._stop.set()
+        if self._th.is_alive(): self._th.join()
@@ -0,0 +1,622 @@
+import ctypes
+import win32gui, win32con
+from PyQt5 import QtCore, QtGui, QtWidgets
+from frame_ring import FrameRing
+from capture_scheduler import CaptureScheduler, CapturePolicy
+from capture_backend import WinRTBackend
+from pipeline import FramePipeline, run_capture
+from dirty_tiles import TileDiff, tile_rects, merge_masks
+from scale import Scaler
+from capture_manager import CaptureSession
+from async_readback import PipelinedBackend
+from metrics import Metrics, MetricsLogger
+from visibility import VisibilityThrottle, ACTIVE
+from compositor import CompositeRenderer, Compositor, LAYOUTS
+from overlay_options import OverlayOptions
+
+
+def is_cloaked(hwnd):
+    """仮想デスクトップの切り替えなどで DWM に隠されているか"""
+    cloaked = ctypes.c_int(0)
+    try:
+        ctypes.windll.dwmapi.DwmGetWindowAttribute(hwnd, 14, ctypes.byref(cloaked), 4)   # DWMWA_CLOAKED
+    except Exception:
+        return False
+    return bool(cloaked.value)
+
+
+# 表示形式: (スロットの形式, アルファを 255 で埋めるか, QImage の形式)
+DISPLAY_FORMATS = {
+    "rgb": ("rgb", False, QtGui.QImage.Format_RGB888),         # 旧方式: RGB に並べ替えて QPixmap へコピー
+    "rgb32": ("bgra", False, QtGui.QImage.Format_RGB32),       # BGRA のままスロットを直接描画
+    "argb32": ("bgra", True, QtGui.QImage.Format_ARGB32_Premultiplied),
+}
+
+
+def make_pipeline(ring, tile=64, scale="fast"):
+    return FramePipeline(ring, diff=TileDiff(tile) if tile else None,
+                         scaler=Scaler(scale) if scale != "off" else None)
+
+
+# =======================================================
+# Capture thread (any CaptureBackend)
+# =======================================================
+class CaptureThread(QtCore.QThread):
+    new_frame = QtCore.pyqtSignal(int)   # 書き込み済みリングスロットの番号
+    def __init__(self, backend, ring, policy="latest", tile=64, scale="fast"):
+        super().__init__(); self.backend = backend; self.ring = ring
+        self.sched = CaptureScheduler(policy)
+        self.pipeline = make_pipeline(ring, tile, scale)
+        self.scale = scale
+    def run(self):
+        self.backend.open()
+        try:
+            run_capture(self.backend, self.pipeline, self.sched, self.new_frame.emit)
+        finally:
+            self.backend.close()
+    def stop(self): self.sched.stop()
+    def set_policy(self, policy): self.sched.set_policy(policy)
+
+
+# =======================================================
+# CaptureManager 上のセッション（CaptureThread と同じ使い方）
+# =======================================================
+class ManagedCapture(QtCore.QObject):
+    new_frame = QtCore.pyqtSignal(int)   # ワーカースレッドから emit → GUI スレッドへキュー接続
+    def __init__(self, manager, backend, ring, policy="latest", tile=64, scale="fast", priority=1.0):
+        super().__init__(); self.manager = manager; self.ring = ring
+        self.pipeline = make_pipeline(ring, tile, scale)
+        self.session = CaptureSession(manager, backend, self.pipeline, policy, priority,
+                                      emit=self.new_frame.emit)
+        self.sched = self.session.sched
+        self.scale = scale
+    def start(self): self.manager.add(self.session)
+    def stop(self): self.manager.remove(self.session)
+    def set_policy(self, policy): self.session.set_policy(policy)
+    def isRunning(self): return self.session in self.manager.sessions
+    def wait(self): return True
+
+
+# =======================================================
+# Overlay window (transparent capture display)
+# =======================================================
+class Overlay(QtWidgets.QWidget):
+    """hwnd のウィンドウ(backend を渡せばそのソース)をキャプチャして表示する。設定は opts(OverlayOptions)。
+    manager・governor・config は複数のオーバーレイで共有するもの、recorder・share・stream・watch は
+    このオーバーレイの出力(どれも None なら使わない)。
+    """
+    def __init__(self, hwnd, exe, title, opts=None, backend=None, manager=None, governor=None, config=None,
+                 recorder=None, share=None, stream=None, watch=None):
+        super().__init__()
+        self.hwnd, self.exe, self.title = hwnd, exe, title
+        o = self.opts = opts or OverlayOptions()
+        crop = o.crop
+        self.setWindowFlags(QtCore.Qt.FramelessWindowHint |
+                            QtCore.Qt.Tool |
+                            QtCore.Qt.WindowStaysOnTopHint)
+        self.setAttribute(QtCore.Qt.WA_TranslucentBackground)
+        # 常にユーザー操作をターゲットアプリへ通す
+        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents, True)
+        self.setGeometry(100, 100, 800, 480)
+        # 前回の位置・大きさ・トリミング(旧オーバーレイと同じ ConfigStore の設定)
+        self.config = config
+        self._cfg = config.get(exe, title) if config is not None else {}
+        if self._cfg:
+            x, y = self._cfg.get("pos", [100, 100])
+            w, h = self._cfg.get("size", [800, 480])
+            self.setGeometry(x, y, w, h)
+            if crop is None and self._cfg.get("crop"): crop = self._cfg["crop"]
+
+        # キャプチャ開始
+        self.frame_pix = QtGui.QPixmap()
+        self._held = None       # 表示中のスロット (index, ndarray, QImage)。BGRA 表示では借りたまま描画する
+        self.tile = o.tile
+        self.metrics = Metrics()
+        self.ring = FrameRing(o.ring_slots, merge=merge_masks)
+        if backend is None:
+            # manager があればデバイス・イベントループを他のオーバーレイと共有する
+            backend = (manager.window_backend(hwnd, gpu_reduce=o.gpu_reduce) if manager is not None
+                       else WinRTBackend(hwnd, gpu_reduce=o.gpu_reduce))
+        depth = o.readback_depth_for()
+        self._readback = None
+        if depth:
+            # GPU → CPU の読み出しを最大 depth 個並行に走らせ、変換と重ねる
+            backend = self._readback = PipelinedBackend(backend, depth,
+                                                        coalesce=CapturePolicy.parse(o.policy).mode != "every")
+        if manager is not None:
+            self.cap = ManagedCapture(manager, backend, self.ring, o.policy, o.tile, o.scale, o.priority)
+        else:
+            self.cap = CaptureThread(backend, self.ring, o.policy, o.tile, o.scale)
+        self.cap.pipeline.set_crop(crop)
+        fmt, opaque, self._qformat = DISPLAY_FORMATS[o.display_format]
+        self.cap.pipeline.pixel_format, self.cap.pipeline.opaque = fmt, opaque
+        # トリミングと縮小を読み出し前に(WinRT なら GPU 上で)行い、読み出し量を表示サイズに比例させる
+        self.cap.pipeline.gpu_reduce = o.gpu_reduce
+        if o.gpu_reduce and depth:
+            backend.plan = self.cap.pipeline.plan_reduce
+        self.recorder = recorder
+        if recorder is not None:
+            self.cap.pipeline.sinks.append(recorder)    # 表示と同じトリミング範囲を録画する
+        self.share = share
+        if share is not None:
+            self.cap.pipeline.sinks.append(share)       # 他プロセスへ共有メモリで公開する
+        self.stream = stream
+        if stream is not None:
+            self.cap.pipeline.sinks.append(stream)      # 別マシンへネットワークで配信する
+        self.watch = watch
+        if watch is not None:
+            watch.attach(self.cap.pipeline)             # ROI の判定(座標はトリミング前のソース座標)
+        self.resizeEvent(None)
+        # 誰も見ていない間は変換を止め、ターゲット最小化中は keepalive 間隔に落とす
+        self.visibility = VisibilityThrottle(self.cap.sched, self.cap.pipeline, o.keepalive,
+                                             set_policy=self.cap.set_policy)
+        self.visibility.listeners.append(self.on_visibility)
+        # 内容の変化率・表示状態・全体の CPU 予算から取得 fps を決める(複数のオーバーレイで共有)
+        self.governor = governor
+        self.governed = governor.add(self.cap.pipeline, self.cap.set_policy, o.policy, o.priority, self.visibility,
+                                     name=title) if governor is not None else None
+        self._vis_timer = QtCore.QTimer(self)
+        self._vis_timer.setInterval(250)
+        self._vis_timer.timeout.connect(self.check_visibility)
+        self._vis_timer.start()
+        # 計測: HUD かログが有効な間だけパイプライン(とリードバック)に metrics を渡す
+        m = self.metrics
+        m.gauge("dropped", lambda: self.ring.drops + self.ring.skipped + self.cap.sched.coalesced)
+        m.gauge("unchanged", lambda: self.cap.pipeline.skipped_frames)
+        m.gauge("bytes_read", lambda: self.cap.pipeline.readback_bytes)
+        m.gauge("bytes_written", lambda: self.cap.pipeline.bytes_written)
+        m.gauge("suppressed", lambda: self.cap.pipeline.suppressed)
+        m.gauge("state", lambda: self.visibility.state)
+        if self.governed: m.gauge("fps_target", lambda: self.governed.fps)
+        self._stats_log = MetricsLogger(m, o.stats_log, exe=exe, title=title).start() if o.stats_log else None
+        self._hud_lines = []
+        self._hud_timer = QtCore.QTimer(self)
+        self._hud_timer.setInterval(500)
+        self._hud_timer.timeout.connect(self.refresh_hud)
+        self.set_hud(o.hud)
+        self.cap.new_frame.connect(self.on_frame)
+        self.cap.start()
+
+        # 全体クリック透過ON
+        self.set_click_through(True)
+
+        # 操作用ボタンウィンドウを別ウィンドウとして生成
+        self.ctrl_window = ControlWindow(self)
+        self.ctrl_window.show()
+        self.ctrl_window.raise_()
+        # 赤四角のドラッグ: 通常は移動、Alt＋ドラッグでトリミング
+        self._drag_mode, self._start_pos, self._start_crop = None, QtCore.QPoint(), None
+        self.ctrl_window.dragStarted.connect(self.on_drag_started)
+        self.ctrl_window.dragUpdated.connect(self.on_drag_updated)
+        self.ctrl_window.dragFinished.connect(self.on_drag_updated)
+        self.ctrl_window.dragFinished.connect(lambda _: self.save_config())
+        self.ctrl_window.hudToggled.connect(lambda: self.set_hud(not self.hud))
+        print("[UI] ControlWindow created and raised to front")
+
+    def on_drag_started(self, _pos):
+        mods = QtWidgets.QApplication.queryKeyboardModifiers()
+        self._drag_mode = "trim" if mods == QtCore.Qt.AltModifier else "move"
+        self._start_pos = self.pos()
+        self._start_ctrl_pos = self.ctrl_window.pos()
+        self._start_crop = self.cap.pipeline.crop_rect
+
+    def on_drag_updated(self, delta):
+        if self._drag_mode == "move":
+            self.move(self._start_pos + delta)
+            self.ctrl_window.move(self._start_ctrl_pos + delta)
+        elif self._drag_mode == "trim" and self._start_crop:
+            self.adjust_crop(delta.x(), delta.y())
+
+    def adjust_crop(self, dx, dy):
+        # 旧オーバーレイと同じ操作: 右ドラッグで左を削り、左ドラッグで右を削る
+        left, top, right, bottom = self._start_crop
+        if dx > 0: left += dx
+        elif dx < 0: right += dx
+        if dy > 0: top += dy
+        elif dy < 0: bottom += dy
+        min_w, min_h = 50, 50
+        if right < left + min_w: right = left + min_w
+        if bottom < top + min_h: bottom = top + min_h
+        self.set_crop((left, top, right, bottom))
+
+    def set_crop(self, crop):
+        """(left, top, right, bottom) ソース座標。None でトリミング解除"""
+        self.cap.pipeline.set_crop(crop)
+
+    def save_config(self):
+        """位置・大きさ・トリミングを保存する(ファイルへの書き込みは ConfigStore がまとめて行う)"""
+        if self.config is None: return
+        data = dict(self._cfg)      # 旧オーバーレイの opacity などは残す
+        data.update(pos=[self.x(), self.y()], size=[self.width(), self.height()])
+        crop = self.cap.pipeline.crop
+        if crop is None: data.pop("crop", None)
+        else: data["crop"] = list(crop)
+        self._cfg = data
+        self.config.put(self.exe, self.title, data)
+
+    def set_hud(self, on):
+        """計測 HUD の表示切り替え(赤四角の右クリックでも切り替わる)"""
+        self.hud = bool(on)
+        enabled = self.hud or self._stats_log is not None
+        m = self.metrics if enabled else None
+        self.cap.pipeline.metrics = m
+        if self._readback is not None: self._readback.metrics = m
+        if self.hud:
+            self._hud_timer.start()
+        else:
+            self._hud_timer.stop(); self._hud_lines = []
+        self.update()
+
+    def refresh_hud(self):
+        self._hud_lines = self.metrics.hud_lines()
+        self.update(self.hud_rect())
+
+    def hud_rect(self):
+        return QtCore.QRect(40, 30, 360, 14 * len(self._hud_lines) + 6)
+
+    def check_visibility(self):
+        """旧オーバーレイの refresh() と同じ判定(IsIconic / IsWindowVisible)にオーバーレイ自身の可視状態を加える"""
+        flags = {}
+        if self.hwnd:
+            alive = bool(win32gui.IsWindow(self.hwnd))
+            flags.update(target_alive=alive,
+                         target_visible=alive and bool(win32gui.IsWindowVisible(self.hwnd)),
+                         target_minimized=alive and bool(win32gui.IsIconic(self.hwnd)))
+        on_screen = any(s.geometry().intersects(self.frameGeometry())
+                        for s in QtWidgets.QApplication.screens())
+        flags["view_visible"] = (self.isVisible() and not self.isMinimized() and on_screen
+                                 and not is_cloaked(int(self.winId())))
+        self.visibility.update(**flags)
+
+    def on_visibility(self, old, new):
+        if new == ACTIVE:
+            print(f"🟢 表示を再開します ({old} → {new})")
+        else:
+            print(f"🟡 {new}: 変換を一時停止中...")
+        m = self.cap.pipeline.metrics
+        if m: m.count("visibility_changes")
+
+    def showEvent(self, e):
+        if hasattr(self, "visibility"): self.check_visibility()
+
+    def hideEvent(self, e):
+        if hasattr(self, "visibility"): self.visibility.update(view_visible=False)
+
+    def set_click_through(self, enable: bool):
+        hwnd = int(self.winId())
+        GWL_EXSTYLE = -20
+        WS_EX_TRANSPARENT = 0x20
+        style = ctypes.windll.user32.GetWindowLongW(hwnd, GWL_EXSTYLE)
+        if enable:
+            style |= WS_EX_TRANSPARENT
+        else:
+            style &= ~WS_EX_TRANSPARENT
+        ctypes.windll.user32.SetWindowLongW(hwnd, GWL_EXSTYLE, style)
+
+    def on_frame(self, _idx):
+        # キューに溜まった古い通知は無視し、常に最新スロットだけを表示する
+        got = self.ring.borrow()
+        if got is None: return
+        idx, arr, _, mask = got
+        m = self.cap.pipeline.metrics
+        if m:
+            t = m.clock()
+            m.add("handoff", t - self.ring.published_at(idx))
+            m.count("frames_out")
+        h, w, c = arr.shape
+        if c == 4:
+            # スロットをコピーせずに QImage で包み、次のフレームを借りるまで返さない
+            # (QImage はメモリを所有しないので、ndarray ごと持っておく)
+            full = mask is None or self.frame_size() != QtCore.QSize(w, h)
+            img = QtGui.QImage(arr.data, w, h, arr.strides[0], self._qformat)
+            held, self._held = self._held, (idx, arr, img)
+            if held is not None: self.ring.release(held[0])
+            region = None if full else self.pixmap_region(
+                [QtCore.QRect(*r) for r in tile_rects(mask, w, h, self.tile)])
+            if m: m.add("upload", m.clock() - t)
+            self.update() if region is None else self.update(region)
+            return
+        try:
+            img = QtGui.QImage(arr.data, w, h, arr.strides[0], self._qformat)
+            if mask is None or self.frame_pix.size() != QtCore.QSize(w, h):
+                self.frame_pix = QtGui.QPixmap.fromImage(img)
+                self.release_held()
+                region = None
+            else:
+                # 変化したタイルだけ pixmap に書き込み、その範囲だけ再描画する
+                rects = [QtCore.QRect(*r) for r in tile_rects(mask, w, h, self.tile)]
+                p = QtGui.QPainter(self.frame_pix)
+                for r in rects: p.drawImage(r, img, r)
+                p.end()
+                region = self.pixmap_region(rects)
+        finally:
+            self.ring.release(idx)
+        if m: m.add("upload", m.clock() - t)
+        self.update() if region is None else self.update(region)
+
+    def frame_size(self):
+        return self._held[2].size() if self._held is not None else self.frame_pix.size()
+
+    def release_held(self):
+        if self._held is not None:
+            self.ring.release(self._held[0])
+            self._held = None
+
+    def pixmap_region(self, rects):
+        # pixmap 座標 → ウィジェット座標 (paintEvent は self.rect() 全体に拡大描画する)
+        size = self.frame_size()
+        sx = self.width() / max(1, size.width())
+        sy = self.height() / max(1, size.height())
+        region = QtGui.QRegion()
+        for r in rects:
+            region += QtCore.QRect(int(r.x() * sx) - 1, int(r.y() * sy) - 1,
+                                   int(r.width() * sx) + 3, int(r.height() * sy) + 3)
+        return region
+
+    def resizeEvent(self, e):
+        # キャプチャスレッド側で表示サイズまで縮小させる
+        if hasattr(self, "cap") and self.cap.scale != "off":
+            self.cap.pipeline.set_output_size((self.width(), self.height()))
+
+    def paintEvent(self, e):
+        m = self.cap.pipeline.metrics
+        if m: t = m.clock()
+        p = QtGui.QPainter(self)
+        if self._held is not None:
+            img = self._held[2]
+            if img.size() == self.size():
+                p.drawImage(0, 0, img)                 # 縮小済み: 転送のみ
+            else:
+                p.drawImage(self.rect(), img)
+        elif not self.frame_pix.isNull():
+            if self.frame_pix.size() == self.size():
+                p.drawPixmap(0, 0, self.frame_pix)     # 縮小済み: 転送のみ
+            else:
+                p.drawPixmap(self.rect(), self.frame_pix)
+        p.setPen(QtGui.QPen(QtGui.QColor("white")))
+        f = p.font(); f.setPointSize(8); p.setFont(f)
+        p.drawText(45, 25, f"[{self.exe}] {self.title[:40]}")
+        if self._hud_lines:
+            f.setFamily("Consolas"); p.setFont(f)
+            r = self.hud_rect()
+            p.fillRect(r, QtGui.QColor(0, 0, 0, 160))
+            for i, line in enumerate(self._hud_lines):
+                p.drawText(r.x() + 5, r.y() + 12 + 14 * i, line)
+        p.end()
+        if m: m.add("paint", m.clock() - t)
+
+    def closeEvent(self, e):
+        self._vis_timer.stop()
+        self.save_config()
+        if self.governed: self.governor.remove(self.governed)
+        if self.cap and self.cap.isRunning():
+            self.cap.stop(); self.cap.wait()
+        self.release_held()
+        if self._stats_log: self._stats_log.stop()
+        if self.recorder:
+            self.recorder.close()
+            print("[REC]", self.recorder.stats())
+        if self.share:
+            self.share.close()
+        if self.stream:
+            self.stream.close()
+            print("[STREAM]", self.stream.stats())
+        if self.watch:
+            self.watch.close()
+            print("[ROI]", self.watch.stats())
+        print("[VIS]", self.visibility.stats())
+        self.ctrl_window.close()
+        e.accept()
+
+
+# =======================================================
+# Composite overlay (複数ソースを 1 枚に並べて表示)
+# =======================================================
+class CompositeOverlay(QtWidgets.QWidget):
+    """CompositeSource を layout で 1 枚に並べて表示するオーバーレイ。ウィンドウ・操作用の赤四角・最前面化
+    タイマーはソースの数によらず 1 つずつ。合成は CompositeRenderer のスレッドで使い回しのキャンバスに行い、
+    ここでは present を受けて変わった範囲を 1 回描くだけ(present はリフレッシュ間隔に 1 回まで)。
+    表示状態の判定はソースごとの VisibilityThrottle に渡す(このウィンドウが見えなければ全部止まる)。
+    """
+    presented = QtCore.pyqtSignal()     # 合成スレッドから emit → GUI スレッドへキュー接続
+
+    def __init__(self, sources, opts=None, title="composite", manager=None, refresh=None):
+        super().__init__()
+        self.title = title
+        o = self.opts = opts or OverlayOptions()
+        self.setWindowFlags(QtCore.Qt.FramelessWindowHint |
+                            QtCore.Qt.Tool |
+                            QtCore.Qt.WindowStaysOnTopHint)
+        self.setAttribute(QtCore.Qt.WA_TranslucentBackground)
+        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents, True)
+        self.setGeometry(100, 100, 320, 180)
+        screen = QtWidgets.QApplication.primaryScreen()
+        hz = refresh or (screen.refreshRate() if screen is not None else 0) or 60.0
+        self.renderer = CompositeRenderer(sources, Compositor(LAYOUTS[o.layout]), 1.0 / hz,
+                                          present=self.presented.emit)
+        self.presented.connect(self.on_present)
+        self.paints = 0
+        self.renderer.start_sources(manager).start()
+        self.visibility = [VisibilityThrottle(s.sched, s.pipeline, o.keepalive, set_policy=s.set_policy)
+                           for s in sources]
+        self._vis_timer = QtCore.QTimer(self)
+        self._vis_timer.setInterval(250)
+        self._vis_timer.timeout.connect(self.check_visibility)
+        self._vis_timer.start()
+        self.set_click_through(True)
+        self.ctrl_window = ControlWindow(self)
+        self.ctrl_window.show()
+        self.ctrl_window.raise_()
+        self._start_pos = self._start_ctrl_pos = QtCore.QPoint()
+        self.ctrl_window.dragStarted.connect(self.on_drag_started)
+        self.ctrl_window.dragUpdated.connect(self.on_drag_updated)
+        self.ctrl_window.dragFinished.connect(self.on_drag_updated)
+
+    set_click_through = Overlay.set_click_through
+
+    def on_drag_started(self, _pos):
+        self._start_pos, self._start_ctrl_pos = self.pos(), self.ctrl_window.pos()
+
+    def on_drag_updated(self, delta):
+        self.move(self._start_pos + delta)
+        self.ctrl_window.move(self._start_ctrl_pos + delta)
+
+    def check_visibility(self):
+        on_screen = any(s.geometry().intersects(self.frameGeometry())
+                        for s in QtWidgets.QApplication.screens())
+        view = self.isVisible() and not self.isMinimized() and on_screen and not is_cloaked(int(self.winId()))
+        for src, vis in zip(self.renderer.sources, self.visibility):
+            flags = {"view_visible": view}
+            if src.hwnd:
+                alive = bool(win32gui.IsWindow(src.hwnd))
+                flags.update(target_alive=alive,
+                             target_visible=alive and bool(win32gui.IsWindowVisible(src.hwnd)),
+                             target_minimized=alive and bool(win32gui.IsIconic(src.hwnd)))
+            vis.update(**flags)
+
+    def on_present(self):
+        dirty = self.renderer.take()
+        w, h = self.renderer.comp.size
+        if (self.width(), self.height()) != (w, h):
+            self.resize(w, h)       # 並べ直した(resize 後に全体が描かれる)
+            return
+        if dirty is None:
+            self.update()
+            return
+        region = QtGui.QRegion()
+        for r in dirty: region += QtCore.QRect(*r)
+        self.update(region)
+
+    def paintEvent(self, e):
+        comp = self.renderer.comp
+        p = QtGui.QPainter(self)
+        r = e.rect()
+        with comp.lock:
+            c = comp.canvas
+            img = QtGui.QImage(c.data, c.shape[1], c.shape[0], c.strides[0],
+                               QtGui.QImage.Format_ARGB32_Premultiplied)
+            p.setCompositionMode(QtGui.QPainter.CompositionMode_Source)    # 隙間は透明のまま
+            p.drawImage(r, img, r)
+            rects = list(comp.rects)
+        p.setCompositionMode(QtGui.QPainter.CompositionMode_SourceOver)
+        p.setPen(QtGui.QPen(QtGui.QColor("white")))
+        f = p.font(); f.setPointSize(8); p.setFont(f)
+        for src, (x, y, w, h) in zip(self.renderer.sources, rects):
+            label = QtCore.QRect(x + 4, y + 2, w - 8, 14)
+            if label.intersects(r): p.drawText(label, QtCore.Qt.AlignLeft, src.name[:40])
+        p.end()
+        self.paints += 1
+
+    def closeEvent(self, e):
+        self._vis_timer.stop()
+        self.renderer.close()
+        print("[COMPOSITE]", self.renderer.stats(), "paints", self.paints)
+        self.ctrl_window.close()
+        e.accept()
+
+
+# =======================================================
+# Control Window (red square, independent, clickable)
+# =======================================================
+class ControlWindow(QtWidgets.QWidget):
+    dragStarted = QtCore.pyqtSignal(QtCore.QPoint)
+    dragUpdated = QtCore.pyqtSignal(QtCore.QPoint)
+    dragFinished = QtCore.pyqtSignal(QtCore.QPoint)
+    hudToggled = QtCore.pyqtSignal()
+
+    def __init__(self, overlay):
+        super().__init__()
+        self.overlay = overlay
+        self.setWindowFlags(QtCore.Qt.FramelessWindowHint |
+                            QtCore.Qt.Tool |
+                            QtCore.Qt.WindowStaysOnTopHint |
+                            QtCore.Qt.X11BypassWindowManagerHint)
+        self.setAttribute(QtCore.Qt.WA_TranslucentBackground)
+        self.setAttribute(QtCore.Qt.WA_ShowWithoutActivating)
+
+        # 表示矩形を操作ウィンドウの近くに配置
+        target_pos = overlay.frameGeometry().topLeft() + QtCore.QPoint(40, 40)
+        self.setGeometry(QtCore.QRect(target_pos, QtCore.QSize(36, 36)))
+        self.setFixedSize(36, 36)
+
+        # 実際に描画される赤い四角は子ウィジェットとして作成
+        self.square = QtWidgets.QFrame(self)
+        self.square.setObjectName("controlSquare")
+        self.square.setGeometry(self.rect())
+        self.square.setStyleSheet(
+            "#controlSquare {"
+            "background-color: rgba(255,60,60,220);"
+            "border-radius: 5px;"
+            "}"
+        )
+
+        # 最前面化を維持するため、一定間隔で SetWindowPos を呼び出す
+        self._raise_timer = QtCore.QTimer(self)
+        self._raise_timer.setInterval(750)
+        self._raise_timer.timeout.connect(self.raise_to_top)
+        self._raise_timer.start()
+        QtCore.QTimer.singleShot(0, self.raise_to_top)
+
+        self._dragging = False
+        self._press_global = QtCore.QPoint()
+        self.setFocusPolicy(QtCore.Qt.NoFocus)
+
+    def raise_to_top(self):
+        if not self.isVisible():
+            self.show()
+        self.raise_()
+        hwnd = int(self.winId())
+        ctypes.windll.user32.SetWindowPos(
+            hwnd,
+            win32con.HWND_TOPMOST,
+            0,
+            0,
+            0,
+            0,
+            win32con.SWP_NOMOVE | win32con.SWP_NOSIZE | win32con.SWP_NOACTIVATE,
+        )
+        self.ensure_clickable()
+        # 透明ウィンドウは描画更新を促さないと表示されない場合があるため
+        self.square.update()
+
+    def ensure_clickable(self):
+        hwnd = int(self.winId())
+        GWL_EXSTYLE = -20
+        WS_EX_TRANSPARENT = 0x20
+        style = ctypes.windll.user32.GetWindowLongW(hwnd, GWL_EXSTYLE)
+        if style & WS_EX_TRANSPARENT:
+            ctypes.windll.user32.SetWindowLongW(hwnd, GWL_EXSTYLE, style & ~WS_EX_TRANSPARENT)
+
+    def mousePressEvent(self, e):
+        if e.button() == QtCore.Qt.LeftButton:
+            self._dragging = True
+            self._press_global = e.globalPos()
+            print("🟥 操作用ドラッグ開始")
+            self.dragStarted.emit(self._press_global)
+        elif e.button() == QtCore.Qt.RightButton:
+            self.hudToggled.emit()
+        super().mousePressEvent(e)
+
+    def mouseMoveEvent(self, e):
+        if self._dragging and (e.buttons() & QtCore.Qt.LeftButton):
+            delta = e.globalPos() - self._press_global
+            self.dragUpdated.emit(delta)
+        super().mouseMoveEvent(e)
+
+    def mouseReleaseEvent(self, e):
+        if self._dragging and e.button() == QtCore.Qt.LeftButton:
+            self._dragging = False
+            delta = e.globalPos() - self._press_global
+            print("🟥 操作用ドラッグ終了")
+            self.dragFinished.emit(delta)
+        super().mouseReleaseEvent(e)
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if hasattr(self, "square"):
+            self.square.setGeometry(self.rect())
+
+    def closeEvent(self, event):
+        if hasattr(self, "_raise_timer") and self._raise_timer.isActive():
+            self._raise_timer.stop()
+        super().closeEvent(event)
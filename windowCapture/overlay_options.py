@@ -0,0 +1,40 @@
+import dataclasses
+
+
+# =======================================================
+# オーバーレイの設定（コマンドライン → Overlay / CompositeOverlay）
+# =======================================================
+@dataclasses.dataclass
+class OverlayOptions:
+    """Overlay / CompositeOverlay に渡す値の設定。共有するオブジェクト(manager・governor・config)と
+    オーバーレイごとの出力(録画・共有メモリ・配信・ROI)はここに入れず、それぞれ引数で渡す。
+    重い import をしないので、ウィンドウ選択前の windowCapture.py からも使える。
+    """
+    policy: str = "latest"              # latest / every / max:N
+    ring_slots: int = 3
+    tile: int = 64                      # 変化検出のタイル(0 で検出しない)
+    crop: tuple = None                  # (left, top, right, bottom) ソース座標
+    scale: str = "fast"                 # fast / quality / off
+    priority: float = 1.0
+    readback_depth: int = None          # None は policy から(readback_depth_for)
+    gpu_reduce: bool = False
+    display_format: str = "rgb32"       # rgb32 / argb32 / rgb
+    keepalive: float = 1.0
+    hud: bool = False
+    stats_log: str = None
+    layout: str = "shelf"               # CompositeOverlay の並べ方
+    composite_scale: float = 0.5        # CompositeOverlay での各ソースの倍率
+
+    def readback_depth_for(self):
+        """並行に走らせるリードバックの数。指定が無ければ "every" は 2、それ以外は 1
+        (最新しか使わないので、2 つ以上並べても読み終えたフレームを捨てるだけで遅くなる)"""
+        if self.readback_depth is not None: return self.readback_depth
+        return 2 if self.policy == "every" else 1
+
+    @classmethod
+    def from_args(cls, args, **overrides):
+        """argparse の結果から同じ名前の項目を拾う"""
+        names = {f.name for f in dataclasses.fields(cls)}
+        values = {k: v for k, v in vars(args).items() if k in names and v is not None}
+        values.update(overrides)
+        return cls(**values)
@@ -0,0 +1,266 @@
+import time
+import numpy as np
+from frame_convert import FrameConverter
+from dirty_tiles import tile_rects, merge_masks
+from scale import Scaler
+from gpu_reduce import plan_reduce
+
+_NONE = object()
+CHANNELS = {"rgb": 3, "bgra": 4}
+
+
+def clamp_crop(crop, w, h, min_size=1):
+    """(left, top, right, bottom) をソースサイズ内に収める。None はソース全体"""
+    if crop is None:
+        return (0, 0, w, h)
+    l, t, r, b = crop
+    l = max(0, min(l, w - min_size)); t = max(0, min(t, h - min_size))
+    r = max(l + min_size, min(r, w)); b = max(t + min_size, min(b, h))
+    return (l, t, r, b)
+
+
+def follow_resize(crop, old, new):
+    """ソースのリサイズ時、元の右端・下端に接していた辺は新しい端に追従させる"""
+    if crop is None or old == (0, 0):
+        return crop
+    l, t, r, b = crop
+    if r >= old[0]: r = new[0]
+    if b >= old[1]: b = new[1]
+    return (l, t, r, b)
+
+
+# =======================================================
+# キャプチャ → トリミング → 変化検出 → 縮小・変換 → リングスロット
+# =======================================================
+class FramePipeline:
+    """バックエンドの Frame を変換してリングスロットへ書き込む。
+
+    diff(TileDiff) を渡すと、変化の無いフレームは変換せずに捨て、変化したタイルだけを
+    変換する。スロットには変化タイルのマスクを付けて公開する(None は全体)。
+
+    crop (left, top, right, bottom) を設定すると、その範囲だけを変化検出・変換する。
+    set_output_size で表示サイズを設定すると、縮小してからスロットへ書き込む。
+    metrics(Metrics) を設定するとステージごとの時間を記録する(None なら計測しない)。
+    sinks には sink(bgra, timestamp) を登録できる(録画など)。トリミング後・縮小前のフレームが、
+    変化のあったフレームだけ渡される。bgra はこの呼び出しの間だけ有効。
+    change_listeners には変化検出まで進んだすべてのフレームについて fn(changed, timestamp) を呼ぶ
+    (RateGovernor の入力。diff が無ければ常に changed)。
+    display を False にすると変換・スロット書き込みを止める(誰も見ていないとき)。シンクが無ければ
+    リードバックもしない。True に戻した次のフレームは全体を描き直す。
+    gpu_reduce を True にすると、トリミングと 2 のべき乗分の縮小を読み出し前に行わせる(Frame.reduce)。
+    WinRT なら GPU 上で行うので読み出し量が表示サイズに比例する。シンクがある間は行わない(等倍が要る)。
+    残り(2 倍未満)は Scaler が縮めるので、行わない場合と同じ画素にはならない(fast の最近傍が拾う位置が
+    変わり、1 画素幅の線の縁では差が色の差そのものになる)。正確な面積平均からの誤差はどちらも同程度で、
+    quality なら差は小さい(python -m bench reduce で確かめる)。
+    pixel_format はスロットの形式: "rgb" は (h, w, 3) RGB、"bgra" は (h, w, 4) でソースの並びのまま
+    (並べ替えが無く、QImage.Format_RGB32 でコピーせずに表示できる)。opaque を True にするとアルファを
+    255 で埋める(Format_ARGB32_Premultiplied として表示する場合)。シンクには形式によらず BGRA が渡る。
+    """
+    def __init__(self, ring, conv=None, diff=None, scaler=None):
+        self.ring = ring
+        self.conv = conv or FrameConverter()
+        self.diff = diff
+        self.scaler = scaler or Scaler()
+        self.out_size = None
+        self._dest = None
+        self._stale = [None] * ring.n   # スロットごとの古いタイル(None は全体)
+        self._slot_ids = [None] * ring.n
+        self._pending = _NONE           # 公開できなかった変化
+        self.crop = None                # 要求されたトリミング(ソース座標)
+        self.crop_rect = None           # 直近フレームで実際に使った範囲
+        self.src_size = (0, 0)
+        self.processed = 0
+        self.skipped_frames = 0
+        self.suppressed = 0             # display=False で変換しなかったフレーム数
+        self.cpu_time = 0.0
+        self.bytes_written = 0          # スロットへ書き込んだバイト数の合計
+        self.metrics = None
+        self.sinks = []
+        self.change_listeners = []      # fn(changed, timestamp)。変化検出まで進んだフレームごと
+        self.display = True
+        self.gpu_reduce = False
+        self.readback_bytes = 0         # フレームの読み出し量の合計
+        self.pixel_format = "rgb"
+        self.opaque = False
+
+    def set_output_size(self, size):
+        """(w, h)。None なら縮小しない。ソースより大きい場合も縮小しない(拡大は表示側)"""
+        self.out_size = None if size is None else (int(size[0]), int(size[1]))
+
+    def _dest_shape(self, h, w):
+        if self.out_size is None: return h, w
+        dw, dh = self.out_size
+        if dw < 1 or dh < 1 or dw * dh >= w * h: return h, w
+        return min(dh, h), min(dw, w)
+
+    def set_crop(self, crop):
+        """任意のスレッドから呼んでよい。次のフレームから反映される"""
+        self.crop = None if crop is None else tuple(int(v) for v in crop)
+
+    def plan_reduce(self, w, h):
+        """ソースが (w, h) のフレームを読み出し前にどう縮めるか: ((l, t, r, b), 段数) か None。
+        PipelinedBackend.plan にも渡せる(先読みを始める前に範囲を決めるため)
+        """
+        if not self.gpu_reduce or self.sinks: return None
+        rect = clamp_crop(self.crop, w, h)
+        l, t, r, b = rect
+        dh, dw = self._dest_shape(b - t, r - l)
+        rect, k = plan_reduce(rect, (dw, dh) if (dh, dw) != (b - t, r - l) else None)
+        if k == 0 and rect == (0, 0, w, h): return None
+        return rect, k
+
+    def process(self, frame):
+        """書き込んだスロット番号を返す。変化が無い・空きスロットが無ければ None"""
+        t0 = time.thread_time()
+        try:
+            return self._process(frame)
+        finally:
+            self.cpu_time += time.thread_time() - t0
+
+    def _source(self, frame):
+        if self.gpu_reduce and frame.region is None:
+            plan = self.plan_reduce(frame.width, frame.height)
+            if plan: frame.reduce(*plan)
+        frame.data                 # ここで初めてリードバックされるバックエンドもある
+        self.readback_bytes += frame.readback_bytes
+        size = (frame.width, frame.height)
+        if size != self.src_size:
+            self.crop = follow_resize(self.crop, self.src_size, size)
+            self.src_size = size
+        if frame.region is not None:
+            self.crop_rect = frame.region[0]
+            return frame.bgra()         # トリミング・縮小済み
+        l, t, r, b = self.crop_rect = clamp_crop(self.crop, *size)
+        return frame.bgra()[t:b, l:r]   # コピーせずにトリミング
+
+    def _suppress(self, m):
+        self.suppressed += 1
+        self._pending = None            # 再開したら全体を描き直す
+        if m: m.count("suppressed")
+        return None
+
+    def _process(self, frame):
+        m = self.metrics
+        if m: m.count("frames_in")
+        if not self.display and not self.sinks:
+            return self._suppress(m)
+        if m: t = m.clock()
+        src = self._source(frame)
+        h, w = src.shape[:2]
+        dh, dw = self._dest_shape(h, w)
+        ch = CHANNELS[self.pixel_format]
+        if m:
+            t, t0 = m.clock(), t
+            m.add("readback", t - t0)
+        mask = None
+        if self.diff:
+            mask = self.diff.update(src)
+            if m:
+                t, t0 = m.clock(), t
+                m.add("diff", t - t0)
+        changed = mask is None or bool(mask.any())
+        for fn in self.change_listeners:
+            fn(changed, frame.timestamp)
+        if not changed and self._pending is _NONE:
+            self.skipped_frames += 1
+            return None
+        if changed:                     # 変化が無くても描き残し(_pending)があれば表示だけ進める
+            for sink in self.sinks:
+                sink(src, frame.timestamp)
+        if not self.display:
+            return self._suppress(m)
+        if self.diff:
+            if mask is not None and (dh, dw) != (h, w):
+                T = self.diff.tile
+                mask = self.scaler.map_mask(mask, (h, w), (dh, dw), T, T)
+            if self._pending is not _NONE:
+                mask = merge_masks(self._pending, mask)
+                self._pending = _NONE
+            if (dh, dw, ch) != self._dest:     # 出力サイズ・形式が変わったら全体を作り直す
+                mask = None
+        self._dest = (dh, dw, ch)
+        slot = self.ring.acquire_write((dh, dw, ch))
+        if slot is None:
+            self._pending = mask
+            return None
+        idx, out = slot
+        if m: t = m.clock()     # 空きスロット待ちは含めない
+        try:
+            if self.diff:
+                self._convert_tiles(src, idx, out, mask)
+            else:
+                self._render(src, out)
+        except Exception:
+            self.ring.abort(idx)
+            if self.diff: self._pending = mask
+            raise
+        if m: m.add("scale" if (dh, dw) != (h, w) else "convert", m.clock() - t)
+        self.ring.publish(idx, mask)
+        self.processed += 1
+        return idx
+
+    def _convert_tiles(self, src, idx, out, mask):
+        if self._slot_ids[idx] != (out.ctypes.data, out.shape):    # スロットが再確保された
+            self._slot_ids[idx] = (out.ctypes.data, out.shape)
+            self._stale[idx] = None
+        stale = self._stale[idx]
+        todo = None if mask is None or stale is None else (mask | stale)
+        h, w = out.shape[:2]
+        if todo is None:
+            self._render(src, out)
+        else:
+            for rect in tile_rects(todo, w, h, self.diff.tile):
+                self._render(src, out, rect)
+        # 書き込んだスロットは最新になり、他のスロットには今回の変化が残る
+        for j in range(self.ring.n):
+            if j != idx and self._stale[j] is not None:
+                self._stale[j] = merge_masks(self._stale[j], mask)
+        T = self.diff.tile
+        self._stale[idx] = np.zeros((-(-h // T), -(-w // T)), bool)
+
+    def _render(self, src, out, rect=None):
+        """out の rect(x, y, w, h) 範囲を src から作る。サイズが違えば縮小も行う"""
+        self.bytes_written += out.nbytes if rect is None else rect[2] * rect[3] * out.shape[2]
+        if src.shape[:2] != out.shape[:2]:
+            self.scaler.scale(src, out, rect)
+        elif rect is None:
+            self.conv.convert_array(src, out)
+        else:
+            x, y, w, h = rect
+            self.conv.convert_array(src[y:y + h, x:x + w], out[y:y + h, x:x + w])
+        if self.opaque and out.shape[2] == 4:
+            x, y, w, h = rect or (0, 0, out.shape[1], out.shape[0])
+            px = out[y:y + h, x:x + w].view(np.uint32)     # 1 画素 = uint32 (リトルエンディアンで A が最上位)
+            px |= np.uint32(0xFF000000)
+
+    def stats(self):
+        s = {"processed": self.processed, "skipped_frames": self.skipped_frames,
+             "suppressed": self.suppressed,
+             "cpu_ms_per_frame": 1e3 * self.cpu_time / max(1, self.processed + self.skipped_frames),
+             "bytes_per_frame": self.bytes_written // max(1, self.processed),
+             "readback_bytes_per_frame": self.readback_bytes // max(1, self.processed + self.skipped_frames)}
+        if self.diff: s.update(self.diff.stats())
+        return s
+
+
+def run_capture(backend, pipeline, sched, emit=None):
+    """sched.stop() が呼ばれるまでバックエンドからフレームを取り出して処理する"""
+    backend.on_frame_arrived(sched.notify)
+    backend.start()
+    try:
+        while sched.wait():
+            m = pipeline.metrics
+            if m: ta = m.clock()
+            frames = sched.collect(backend.next_frame)
+            if m and frames: m.add("acquire", m.clock() - ta)
+            for frame in frames:
+                try:
+                    idx = pipeline.process(frame)
+                    if idx is not None and emit: emit(idx)
+                except Exception as e:
+                    print("frame error:", e)
+                finally:
+                    frame.close()
+            sched.done(bool(frames))
+    finally:
+        backend.stop()
@@ -0,0 +1,93 @@
+import threading, collections
+import numpy as np
+from frame_file import FrameFileWriter
+
+
+# =======================================================
+# 録画シンク（バックグラウンド書き込み・有界キュー）
+# =======================================================
+class FrameRecorder:
+    """FramePipeline のシンク。フレームを複製してキューに入れ、書き込みスレッドがファイルへ書く。
+
+    キューは queue_size フレームまで。満杯のときは drop="oldest"(未書き込みの最も古いフレームを捨てる)
+    か "newest"(届いたフレームを捨てる)。キャプチャ側の仕事は複製 1 回だけで、ディスクが遅くても待たない。
+    差分・圧縮(writer_opts: codec / compress / keyint ...)は書き込みスレッドで行う。
+    """
+    def __init__(self, path, queue_size=8, drop="oldest", **writer_opts):
+        if drop not in ("oldest", "newest"):
+            raise ValueError(f"unknown drop policy: {drop}")
+        if queue_size < 1:
+            raise ValueError("queue_size must be >= 1")
+        self.writer = FrameFileWriter(path, **writer_opts)
+        self.path, self.queue_size, self.drop = path, queue_size, drop
+        self._queue = collections.deque()      # (バッファ, タイムスタンプ)
+        self._free = []                        # 書き込み済みで再利用できるバッファ
+        self._cond = threading.Condition()
+        self._closed = False
+        # 統計
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.allocs = 0
+        self.queue_max = 0
+        self._th = threading.Thread(target=self._run, name="recorder", daemon=True)
+        self._th.start()
+
+    def __call__(self, bgra, timestamp):
+        return self.submit(bgra, timestamp)
+
+    def _take_buf(self, shape):
+        while self._free:
+            buf = self._free.pop()
+            if buf.shape == shape: return buf
+        self.allocs += 1
+        return np.empty(shape, np.uint8)
+
+    def submit(self, bgra, timestamp):
+        """(h, w, 4) BGRA を録画キューに入れる。捨てた場合は False"""
+        with self._cond:
+            if self._closed: return False
+            self.submitted += 1
+            if len(self._queue) >= self.queue_size:
+                self.dropped += 1
+                if self.drop == "newest": return False
+                self._free.append(self._queue.popleft()[0])
+            buf = self._take_buf(bgra.shape)
+        np.copyto(buf, bgra)
+        with self._cond:
+            self._queue.append((buf, timestamp))
+            self.queue_max = max(self.queue_max, len(self._queue))
+            self._cond.notify()
+        return True
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._queue or self._closed)
+                if not self._queue: return
+                buf, ts = self._queue.popleft()
+            try:
+                self.writer.write(buf, ts)
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                print("record error:", e)
+            with self._cond:
+                self._free.append(buf)
+
+    def close(self):
+        """キューに残ったフレームを書き終えてからファイルを閉じる"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._th.join()
+        self.writer.close()
+
+    def stats(self):
+        w = self.writer
+        return {"path": self.path, "submitted": self.submitted, "written": self.written,
+                "dropped": self.dropped, "errors": self.errors, "queue_max": self.queue_max,
+                "buffers": self.allocs, "keyframes": w.keyframes,
+                "bytes_in": w.bytes_in, "bytes_out": w.bytes_out,
+                "ratio": w.bytes_frames / max(1, w.bytes_out)}
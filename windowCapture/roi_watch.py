@@ -0,0 +1,511 @@
+import json, time, threading, collections
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from metrics import Histogram
+
+RoiEvent = collections.namedtuple("RoiEvent", "name active value timestamp")
+
+# 判定の種類。バッファ上もこの順に並べ、同じ種類の ROI をまとめて判定する
+MEAN, CHANGE, HIST, TEMPLATE = range(4)
+# 判定コストの見積もりは「画素換算の単位」(約 1 ns)。ROI 1 個あたりの固定分(Python 側の切り出し・状態更新)
+ROI_OVERHEAD = 2000
+FRAME_OVERHEAD = 20000     # 1 フレームあたりの固定分(種類ごとの NumPy 呼び出し)
+MAX_ROI_PIXELS = 1 << 24   # 平均色の合計を uint32 で取れる大きさ
+
+
+def _bgr(img):
+    """RGB (h, w, 3) / BGRA (h, w, 4) → BGR の 3 チャンネル"""
+    img = np.asarray(img)
+    if img.ndim != 3 or img.shape[2] not in (3, 4):
+        raise ValueError(f"RGB (h, w, 3) か BGRA (h, w, 4) の画像が要ります: {img.shape}")
+    return img[..., 2::-1] if img.shape[2] == 3 else img[..., :3]
+
+
+def _gray(bgr):
+    return bgr[..., 0] * np.float32(0.114) + bgr[..., 1] * np.float32(0.587) + bgr[..., 2] * np.float32(0.299)
+
+
+def _color_codes(px, bins):
+    """BGRA を uint32 で見た画素 → 色の番号 (r, g, b の上位ビットを並べたもの。0〜bins**3-1)"""
+    k = bins.bit_length() - 1
+    s, m = 8 - k, bins - 1
+    code = (px >> s) & m
+    code |= (px >> (8 + s - k)) & (m << k)
+    code |= (px >> (16 + s - 2 * k)) & (m << 2 * k)
+    return code
+
+
+def color_histogram(img, bins=8):
+    """各チャンネル bins 段階の色ヒストグラム(合計 1)"""
+    bgr = _bgr(img)
+    px = np.zeros(bgr.shape[:2] + (4,), np.uint8)
+    px[..., :3] = bgr
+    h = np.bincount(_color_codes(px.view(np.uint32).reshape(-1), bins), minlength=bins ** 3)
+    return h / max(1, px.shape[0] * px.shape[1])
+
+
+# =======================================================
+# 判定(ROI ごとの値と、成立するかどうか)
+# =======================================================
+class MeanColor:
+    """平均色が rgb から各チャンネル tol 以内なら成立。value は最も離れたチャンネルの差(0〜255)"""
+    kind = MEAN
+
+    def __init__(self, rgb, tol=40):
+        self.bgr = np.array(rgb[::-1], np.float64)
+        self.tol = tol
+
+    def test(self, value): return value <= self.tol
+    def cost(self, w, h): return 3 * w * h // 2
+
+
+class AnyChange:
+    """前回判定したときから変わった画素の割合が fraction を超えたら成立。value はその割合。
+    最初の判定(とトリミング範囲から外れた後の最初の判定)は比べる相手が無いので 0"""
+    kind = CHANGE
+
+    def __init__(self, fraction=0.0):
+        self.fraction = fraction
+
+    def test(self, value): return value > self.fraction
+    def cost(self, w, h): return 2 * w * h
+
+
+class HistogramDistance:
+    """色ヒストグラムの基準からの距離(全変動距離 0〜1)が threshold を超えたら成立。
+    reference は RGB か BGRA の画像。None なら最初に判定したときの ROI を基準にする。bins は 2 のべき(≦16)"""
+    kind = HIST
+
+    def __init__(self, threshold=0.25, reference=None, bins=8):
+        if bins not in (2, 4, 8, 16): raise ValueError(f"bins は 2, 4, 8, 16 のどれか: {bins}")
+        self.threshold, self.bins = threshold, bins
+        self.reference = None if reference is None else color_histogram(reference, bins)
+
+    def test(self, value): return value > self.threshold
+    def cost(self, w, h): return 16 * w * h
+
+
+class TemplateMatch:
+    """ROI の中で template を探し、正規化相互相関の最大(-1〜1)が threshold 以上なら成立。
+    template は RGB (h, w, 3) か BGRA (h, w, 4)。輝度で比べる。ROI が template と同じ大きさならその位置だけを比べる"""
+    kind = TEMPLATE
+
+    def __init__(self, template, threshold=0.8):
+        g = _gray(_bgr(template).astype(np.float32)).astype(np.float64)
+        self.shape = g.shape
+        t = g - g.mean()
+        n = np.sqrt((t * t).sum())
+        self.t = (t / n if n > 0 else t).astype(np.float32)    # 平坦な template は常に 0 点
+        self.threshold = threshold
+
+    def test(self, value): return value >= self.threshold
+
+    def cost(self, w, h):
+        th, tw = self.shape
+        return 2 * (w - tw + 1) * (h - th + 1) * th * tw + 4 * w * h
+
+    def score(self, bgra):
+        g = _gray(bgra[..., :3].astype(np.float32))
+        return float(_ncc_max(g[None], _toeplitz(self.t[None], g.shape[1]), self.shape)[0])
+
+
+def _toeplitz(t, W):
+    """template (n, th, tw) → 幅 W の行を横にずらして掛ける行列 (n, th*W, W-tw+1)。
+    窓の位置 j の列は t[k, l] を行 k*W + j + l に置いたもの"""
+    n, th, tw = t.shape
+    wo = W - tw + 1
+    T = np.zeros((n, th, W, wo), np.float32)
+    j = np.arange(wo)
+    for l in range(tw): T[:, :, j + l, j] = t[:, :, l, None]
+    return T.reshape(n, th * W, wo)
+
+
+def _ncc_max(g, T, shape):
+    """輝度 (n, H, W) と _toeplitz した template から、ROI ごとの正規化相互相関の最大 (n,)"""
+    th, tw = shape
+    n, H, W = g.shape
+    # Σ(x - x̄)(t - t̄) = Σ x t (t は平均 0)。縦 th 行を並べた (n, ho, th*W) と T の積 1 回で全部の窓
+    rows = sliding_window_view(g, th, axis=1).transpose(0, 1, 3, 2).reshape(n, H - th + 1, th * W)
+    num = np.matmul(rows, T)
+    # 窓ごとの Σx, Σx² は積分画像から
+    ii = np.zeros((n, H + 1, W + 1)); ii2 = ii.copy()
+    np.cumsum(np.cumsum(g, 1), 2, out=ii[:, 1:, 1:])
+    np.cumsum(np.cumsum(np.square(g, dtype=np.float64), 1), 2, out=ii2[:, 1:, 1:])
+    box = lambda a: a[:, th:, tw:] - a[:, :-th, tw:] - a[:, th:, :-tw] + a[:, :-th, :-tw]
+    s = box(ii)
+    var = box(ii2) - s * s / (th * tw)
+    den = np.sqrt(np.maximum(var, 0))
+    ok = den > 1e-3
+    r = np.where(ok, num / np.where(ok, den, 1), -np.inf).reshape(n, -1).max(axis=1)
+    r[np.isneginf(r)] = 0.0
+    return r
+
+
+def predicate_from_spec(spec):
+    """設定ファイルの 1 項目から判定を作る。
+    {"mean": [r, g, b], "tol": 40} / {"change": 0.01} / {"hist": 0.25, "bins": 8} /
+    {"template": "icon.npy", "threshold": 0.8}(np.save した RGB か BGRA 配列)"""
+    if "mean" in spec: return MeanColor(spec["mean"], spec.get("tol", 40))
+    if "change" in spec: return AnyChange(spec["change"])
+    if "hist" in spec: return HistogramDistance(spec["hist"], bins=spec.get("bins", 8))
+    if "template" in spec: return TemplateMatch(np.load(spec["template"]), spec.get("threshold", 0.8))
+    raise ValueError(f"判定の種類がありません: {spec}")
+
+
+class _Roi:
+    def __init__(self, name, rect, pred, callback, hold, release, cooldown):
+        self.name, self.rect, self.pred, self.callback = name, rect, pred, callback
+        self.hold, self.release, self.cooldown = hold, release, cooldown
+        self.raw = self.active = False
+        self.since = self.last_on = None
+        self.value = 0.0
+        self.learned = None     # HistogramDistance(reference=None) が最初の判定で覚えた基準
+        self.evals = 0
+        self.last_eval = None
+
+    def settle(self, now, events):
+        """判定結果が hold / release 秒続いていれば確定させる。まだなら確定できる時刻(変化が無ければ None)"""
+        if self.raw == self.active: return None
+        due = self.since + (self.hold if self.raw else self.release)
+        if self.raw and self.last_on is not None: due = max(due, self.last_on + self.cooldown)
+        if now < due: return due
+        self.active = self.raw
+        if self.active: self.last_on = now
+        events.append((self, RoiEvent(self.name, self.active, self.value, now)))
+        return None
+
+
+def _subkey(roi):
+    p = roi.pred
+    if p.kind == HIST: return p.bins
+    if p.kind == TEMPLATE:
+        l, t, r, b = roi.rect
+        return (b - t, r - l, *p.shape)
+    return 0
+
+
+class _Layout:
+    """ROI の並び(種類ごと)と、画素を詰めるバッファ上の位置。
+    ROI の追加・削除で作り直すときは old(前のレイアウト)から AnyChange の前回の画素を引き継ぐ"""
+    def __init__(self, rois, old=None):
+        self.rois = sorted(rois, key=lambda r: (r.pred.kind, _subkey(r)))
+        n = len(self.rois)
+        self.rects = [r.rect for r in self.rois]
+        self.dims = [(b - t, r - l) for l, t, r, b in self.rects]
+        self.sizes = np.array([h * w for h, w in self.dims], np.int64)
+        self.off = np.zeros(n + 1, np.int64)
+        np.cumsum(self.sizes, out=self.off[1:])
+        self.offl = self.off.tolist()
+        cost = np.array([r.pred.cost(w, h) + ROI_OVERHEAD for r, (h, w) in zip(self.rois, self.dims)], np.float64)
+        self.cost = np.zeros(2 * n + 1)        # 一周分つなげた累積(ラップする範囲の選択用)
+        np.cumsum(np.concatenate([cost, cost]), out=self.cost[1:])
+        # 同じ判定方法のまとまり (種類, 細分, 先頭, 末尾)。細分はヒストグラムなら bins、
+        # template なら (ROI の高さ, 幅, template の高さ, 幅)で、同じ形どうしを 1 回の積で判定する
+        self.groups = []
+        for i, r in enumerate(self.rois):
+            key = (r.pred.kind, _subkey(r))
+            if self.groups and tuple(self.groups[-1][:2]) == key: self.groups[-1][3] = i + 1
+            else: self.groups.append([*key, i, i + 1])
+        self.target = np.array([r.pred.bgr if r.pred.kind == MEAN else (0, 0, 0) for r in self.rois],
+                               np.float64).reshape(n, 3)
+        # ヒストグラム: 画素 → まとまりの中での ROI 番号 * bins**3 と、ROI ごとの基準(未設定は NaN)
+        self.hseg = np.zeros(int(self.off[-1]), np.intp)
+        self.href = {}
+        self.toep = {}
+        for kind, sub, a, b in self.groups:
+            if kind == TEMPLATE:
+                self.toep[a] = _toeplitz(np.stack([r.pred.t for r in self.rois[a:b]]), sub[1])
+            if kind != HIST: continue
+            B3 = sub ** 3
+            self.hseg[self.offl[a]:self.offl[b]] = np.repeat(np.arange(b - a) * B3, self.sizes[a:b])
+            self.href[a] = np.array([r.pred.reference if r.pred.reference is not None else
+                                     r.learned if r.learned is not None else np.full(B3, np.nan)
+                                     for r in self.rois[a:b]])
+        self.primed = np.zeros(n, bool)        # AnyChange の比較相手があるか
+        total = int(self.off[-1])
+        self.prev = np.zeros(total, np.uint32)
+        if old is not None:
+            where = {r: j for j, r in enumerate(old.rois)}
+            for i, r in enumerate(self.rois):
+                j = where.get(r)
+                if r.pred.kind != CHANGE or j is None or not old.primed[j]: continue
+                self.prev[self.offl[i]:self.offl[i + 1]] = old.prev[old.offl[j]:old.offl[j + 1]]
+                self.primed[i] = True
+        self.free = [np.zeros((total, 4), np.uint8) for _ in range(3)]     # 詰める・待つ・判定中
+
+
+# =======================================================
+# ROI の監視（キャプチャスレッドで詰める → ワーカーでまとめて判定）
+# =======================================================
+class RoiWatcher:
+    """キャプチャしたウィンドウ上の多数の ROI を判定し、確定した状態が変わったらコールバックする。
+
+    ROI の矩形は旧オーバーレイの crop と同じ (left, top, right, bottom)。ソースウィンドウ上の画素座標で、
+    right / bottom は含まない。attach した FramePipeline のシンクとしてはトリミング後のフレームを受け取るので、
+    pipeline.crop_rect の左上の分ずらして読む。トリミング範囲からはみ出した ROI はそのフレームでは判定しない。
+
+    キャプチャスレッドは選んだ ROI の画素を 1 本のバッファに詰めるだけで、判定はワーカースレッドが種類ごとに
+    まとめて行う(平均色は np.add.reduceat、ヒストグラムは np.bincount、変化は前回の詰め合わせとの比較を
+    それぞれ 1 回。template は ROI と template の形が同じものどうしで行列積 1 回)。ワーカーが追いつかなければ古いフレームは捨てる。
+    budget_ms を超えそうなら ROI を順番に回し、1 フレームではその一部だけを判定する
+    (1 画素あたりの所要時間は実測から推定)。
+    判定結果が hold 秒続いたら成立、release 秒続いたら解除を確定し、callback(RoiEvent) を呼ぶ。
+    前回の成立から cooldown 秒経つまでは次の成立を遅らせる。コールバックはワーカースレッド
+    (evaluate / poll では呼び出し元)から呼ばれる。clock は確定の時刻(テストでは差し替える)。
+    """
+    def __init__(self, budget_ms=None, clock=time.monotonic):
+        self.budget_ms, self.clock = budget_ms, clock
+        self._lock = threading.Condition()
+        self._rois = {}
+        self._layout = None
+        self._retired = None    # ROI の追加・削除で外したレイアウト(次のレイアウトに状態を引き継ぐ)
+        self._pending = None    # (layout, buf, ranges, outside, gather 秒)
+        self._next = 0          # 予算で回すときの次の先頭
+        self._due = None        # 確定待ちの最も早い時刻
+        self._origin = None
+        self._thread = None
+        self._closing = False
+        self.ns_per_unit = 1.0  # 画素換算 1 単位あたりの所要時間(推定)
+        # 統計
+        self.frames = 0
+        self.dropped = 0
+        self.evaluated = 0
+        self.roi_evals = 0
+        self.skipped = 0
+        self.outside = 0
+        self.events = 0
+        self.eval_time = Histogram()
+
+    # ----- ROI の登録 -----
+    def add(self, name, rect, predicate, callback=None, hold=0.0, release=None, cooldown=0.0):
+        """rect = (left, top, right, bottom)。release を省くと hold と同じ"""
+        l, t, r, b = (int(v) for v in rect)
+        if r <= l or b <= t or l < 0 or t < 0 or (r - l) * (b - t) > MAX_ROI_PIXELS:
+            raise ValueError(f"ROI の矩形が不正です: {rect}")
+        if predicate.kind == TEMPLATE and (b - t < predicate.shape[0] or r - l < predicate.shape[1]):
+            raise ValueError(f"ROI {name} が template より小さい")
+        roi = _Roi(name, (l, t, r, b), predicate, callback, hold, hold if release is None else release, cooldown)
+        with self._lock:
+            if name in self._rois: raise ValueError(f"ROI {name} は登録済みです")
+            self._rois[name] = roi
+            self._retire()
+        return roi
+
+    def _retire(self):
+        """(ロック内) レイアウトを作り直させる"""
+        if self._layout is not None: self._retired = self._layout
+        self._layout = None
+
+    def add_spec(self, spec, callback=None):
+        """{"name": ..., "rect": [l, t, r, b], "hold": 0.2, ...判定(predicate_from_spec)}"""
+        return self.add(spec["name"], spec["rect"], predicate_from_spec(spec), callback,
+                        spec.get("hold", 0.0), spec.get("release"), spec.get("cooldown", 0.0))
+
+    def load(self, path, callback=None):
+        """ROI の設定(add_spec の dict の JSON 配列)を読む"""
+        with open(path, "r", encoding="utf-8") as f:
+            for spec in json.load(f): self.add_spec(spec, callback)
+
+    def remove(self, name):
+        with self._lock:
+            if self._rois.pop(name, None) is None: return False
+            self._retire()
+        return True
+
+    def state(self, name):
+        """(確定した状態, 直近の値)"""
+        roi = self._rois[name]
+        return roi.active, roi.value
+
+    # ----- フレームの受け取り(キャプチャスレッド) -----
+    def attach(self, pipeline):
+        """pipeline のシンクになり、トリミング範囲の左上を ROI 座標の原点にする"""
+        self._origin = lambda: (pipeline.crop_rect or (0, 0))[:2]
+        pipeline.sinks.append(self)
+
+    def __call__(self, bgra, timestamp=None):
+        self.submit(bgra, self._origin() if self._origin else (0, 0))
+
+    def _select(self, L):
+        """(ロック内) 今回判定する ROI の範囲 [(先頭, 末尾)]。予算内なら全部"""
+        n = len(L.rois)
+        units = self.budget_ms * 1e6 / self.ns_per_unit - FRAME_OVERHEAD if self.budget_ms is not None else None
+        if units is None or L.cost[n] <= units:
+            return [(0, n)]
+        a = self._next % n
+        end = int(np.searchsorted(L.cost, L.cost[a] + units, "right")) - 1
+        m = max(1, min(n, end - a))
+        self._next = (a + m) % n
+        return [(a, a + m)] if a + m <= n else [(a, n), (0, a + m - n)]
+
+    def _gather(self, bgra, origin):
+        """選んだ ROI の画素をバッファに詰める。ROI が無ければ None"""
+        with self._lock:
+            if self._layout is None:
+                if not self._rois: return None
+                self._layout = _Layout(self._rois.values(), self._retired)
+                self._retired = None
+                self._next = 0
+            L = self._layout
+            ranges = self._select(L)
+            buf = L.free.pop()      # 詰める・判定待ち・判定中の 3 本で足りる
+            self.frames += 1
+        t0 = time.perf_counter()
+        ox, oy = origin
+        H, W = bgra.shape[:2]
+        off, outside = L.offl, []
+        for a, b in ranges:
+            for i in range(a, b):
+                l, t, r, bt = L.rects[i]
+                l -= ox; t -= oy; r -= ox; bt -= oy
+                if l < 0 or t < 0 or r > W or bt > H:
+                    outside.append(i)
+                    continue
+                buf[off[i]:off[i + 1]].reshape(bt - t, r - l, 4)[...] = bgra[t:bt, l:r]
+        return L, buf, ranges, outside, time.perf_counter() - t0
+
+    def submit(self, bgra, origin=(0, 0)):
+        """フレーム(BGRA)を渡す。origin はフレーム左上のソース座標。判定はワーカースレッドで"""
+        job = self._gather(bgra, origin)
+        if job is None: return
+        with self._lock:
+            if self._closing or job[0] is not self._layout:
+                return
+            if self._pending is not None:       # 判定が追いつかなかったフレームは捨てる
+                if self._pending[0] is job[0]: job[0].free.append(self._pending[1])
+                self.dropped += 1
+            self._pending = job
+            self._lock.notify_all()
+
+    # ----- 判定 -----
+    def _evaluate(self, L, buf, ranges, outside, gather_s, now, events):
+        t0 = time.perf_counter()
+        n = len(L.rois)
+        out = np.zeros(n, bool)
+        out[outside] = True
+        picked = 0
+        for a, b in ranges:
+            picked += b - a
+            for kind, sub, ga, gb in L.groups:
+                s, e = max(a, ga), min(b, gb)
+                if s >= e: continue
+                p0, p1 = L.offl[s], L.offl[e]
+                px = buf[p0:p1]
+                starts = L.off[s:e] - p0
+                sizes = L.sizes[s:e]
+                if kind == MEAN:
+                    sums = np.add.reduceat(px, starts, axis=0, dtype=np.uint32)[:, :3]
+                    values = np.abs(sums / sizes[:, None] - L.target[s:e]).max(axis=1)
+                elif kind == CHANGE:
+                    cur, prev = px.view(np.uint32).reshape(-1), L.prev[p0:p1]
+                    values = np.add.reduceat(cur != prev, starts, dtype=np.int64) / sizes
+                    values[~L.primed[s:e]] = 0.0
+                    np.copyto(prev, cur)
+                    L.primed[s:e] = ~out[s:e]     # はみ出した ROI は次に入ったとき比べ直す
+                elif kind == HIST:
+                    B3 = sub ** 3
+                    code = L.hseg[p0:p1] + _color_codes(px.view(np.uint32).reshape(-1), sub)
+                    hist = np.bincount(code, minlength=(e - ga) * B3)[(s - ga) * B3:].reshape(e - s, B3)
+                    hist = hist / sizes[:, None]
+                    ref = L.href[ga][s - ga:e - ga]
+                    unset = np.isnan(ref[:, 0]) & ~out[s:e]
+                    ref[unset] = hist[unset]
+                    for j in np.flatnonzero(unset): L.rois[s + j].learned = hist[j]
+                    values = 0.5 * np.abs(hist - ref).sum(axis=1)
+                else:
+                    h, w, th, tw = sub
+                    g = _gray(px.reshape(e - s, h, w, 4)[..., :3].astype(np.float32))
+                    values = _ncc_max(g, L.toep[ga][s - ga:e - ga], (th, tw))
+                for i, v in zip(range(s, e), values):
+                    if out[i]: continue
+                    roi = L.rois[i]
+                    v = float(v)
+                    raw = roi.pred.test(v)
+                    roi.value, roi.evals, roi.last_eval = v, roi.evals + 1, now
+                    if raw != roi.raw: roi.raw, roi.since = raw, now
+        dt = time.perf_counter() - t0
+        units = FRAME_OVERHEAD + sum(L.cost[b] - L.cost[a] for a, b in ranges)
+        with self._lock:
+            self.ns_per_unit = 0.8 * self.ns_per_unit + 0.2 * (dt + gather_s) * 1e9 / units
+            self.evaluated += 1
+            self.roi_evals += picked - len(outside)
+            self.skipped += n - picked
+            self.outside += len(outside)
+            self.eval_time.add(dt + gather_s)
+            if L is self._layout: L.free.append(buf)
+        self._settle(L, now, events)
+
+    def _settle(self, L, now, events):
+        due = [d for d in (r.settle(now, events) for r in L.rois) if d is not None]
+        self._due = min(due) if due else None
+
+    def _fire(self, events):
+        for roi, ev in events:
+            self.events += 1
+            if roi.callback is None: continue
+            try:
+                roi.callback(ev)
+            except Exception as e:
+                print(f"⚠ ROI {roi.name} のコールバックで例外: {e!r}")
+
+    def evaluate(self, bgra, origin=(0, 0)):
+        """ワーカーを使わずにその場で判定する(合成フレームでの確認用)。確定したイベントのリストを返す"""
+        job = self._gather(bgra, origin)
+        if job is None: return []
+        events = []
+        self._evaluate(*job, self.clock(), events)
+        self._fire(events)
+        return [ev for _, ev in events]
+
+    def poll(self):
+        """フレームが来なくても時間で確定するものを確定させる(evaluate と組で使う)"""
+        events = []
+        if self._layout is not None: self._settle(self._layout, self.clock(), events)
+        self._fire(events)
+        return [ev for _, ev in events]
+
+    # ----- ワーカー -----
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="roi-watch", daemon=True)
+                self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            with self._lock:
+                while not self._closing and self._pending is None:
+                    if self._due is not None:
+                        wait = self._due - self.clock()
+                        if wait <= 0: break
+                        self._lock.wait(wait)
+                    else:
+                        self._lock.wait()
+                if self._closing: return
+                job, self._pending = self._pending, None
+                L = self._layout
+            events = []
+            if job is not None: self._evaluate(*job, self.clock(), events)
+            elif L is not None: self._settle(L, self.clock(), events)
+            else: self._due = None
+            self._fire(events)
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+            self._lock.notify_all()
+            th = self._thread
+        if th is not None: th.join()
+
+    def stats(self):
+        with self._lock:
+            now = self.clock()
+            ages = [now - r.last_eval for r in self._rois.values() if r.last_eval is not None]
+            return {"rois": len(self._rois), "frames": self.frames, "dropped": self.dropped,
+                    "evaluated": self.evaluated, "roi_evals": self.roi_evals, "skipped": self.skipped,
+                    "outside": self.outside, "events": self.events,
+                    "eval_ms_p50": round(1e3 * self.eval_time.percentile(50), 3),
+                    "eval_ms_p99": round(1e3 * self.eval_time.percentile(99), 3),
+                    "ns_per_unit": round(float(self.ns_per_unit), 3),
+                    "max_age_s": round(max(ages), 3) if ages else None}
@@ -0,0 +1,171 @@
+import numpy as np
+from buffers import BufferPool
+
+
+# =======================================================
+# キャプチャスレッド側での縮小（BGRA → RGB 変換も同時に行う。BGRA のままも可）
+# =======================================================
+def _axis_plan(n_src, n_dst, mode):
+    """1 軸分の計画: 整数倍のボックス縮小 f のあと、必要なら補間で n_dst に合わせる。
+
+    戻り値 (f, i0, i1, w): i0/i1/w が None なら f 倍縮小だけで n_dst になる。
+    """
+    f = max(1, n_src // n_dst)
+    n_mid = n_src // f
+    if n_mid == n_dst:
+        return f, None, None, None
+    centers = (np.arange(n_dst) + 0.5) * (n_mid / n_dst) - 0.5
+    if mode == "fast":
+        i0 = np.clip(np.rint(centers), 0, n_mid - 1).astype(np.intp)
+        return f, i0, i0, None
+    i0 = np.clip(np.floor(centers), 0, n_mid - 1).astype(np.intp)
+    i1 = np.minimum(i0 + 1, n_mid - 1)
+    w = np.clip(centers - i0, 0.0, 1.0).astype(np.float32)
+    return f, i0, i1, w
+
+
+class Scaler:
+    """BGRA ソースを指定サイズの RGB (出力が 4ch なら BGRA のまま) に縮小する。
+
+    mode="fast":    整数倍はボックスフィルタ、端数は最近傍
+    mode="quality": 整数部分をボックスフィルタで縮小し、端数をバイリニア補間
+    作業バッファは BufferPool から必要な大きさの連続領域を切り出して使う(サイズが変わっても
+    足りていれば確保し直さない。これまでで最大の大きさを持ち続ける)。
+    """
+    def __init__(self, mode="fast"):
+        if mode not in ("fast", "quality"):
+            raise ValueError(f"unknown scale mode: {mode}")
+        self.mode = mode
+        self._key = None
+        self._bufs = BufferPool(shrink=0)   # タイルごとに大きさが変わるので縮めない
+
+    @property
+    def allocs(self):
+        return self._bufs.allocs
+
+    def _plan(self, sh, sw, dh, dw):
+        key = (sh, sw, dh, dw)
+        if key == self._key: return
+        self._key = key
+        self.fy, self.iy0, self.iy1, self.wy = _axis_plan(sh, dh, self.mode)
+        self.fx, self.ix0, self.ix1, self.wx = _axis_plan(sw, dw, self.mode)
+        self.n = self.fy * self.fx
+        self.acc_dtype = np.uint16 if self.n <= 257 else np.uint32
+        self._tile_maps = {}
+
+    def _span(self, f, i0, i1, d0, d1):
+        """出力 [d0, d1) が参照する中間座標の範囲"""
+        if i0 is None: return d0, d1
+        return int(i0[d0:d1].min()), int(i1[d0:d1].max()) + 1
+
+    def scale(self, src, out, rect=None):
+        """src: (H, W, 4) BGRA, out: (h, w, 3) RGB か (h, w, 4) BGRA。rect=(x, y, w, h) なら出力のその範囲だけ計算する"""
+        sh, sw = src.shape[:2]
+        dh, dw = out.shape[:2]
+        self._plan(sh, sw, dh, dw)
+        x, y, w, h = rect or (0, 0, dw, dh)
+        fy, fx = self.fy, self.fx
+        m0, m1 = self._span(fy, self.iy0, self.iy1, y, y + h)
+        n0, n1 = self._span(fx, self.ix0, self.ix1, x, x + w)
+        # 1) 整数倍のボックス縮小（合計のみ。割り算は最後にまとめて行う）
+        blk = src[m0 * fy:m1 * fy, n0 * fx:n1 * fx]
+        exact = self.iy0 is None and self.ix0 is None
+        if self.n > 1:
+            blk = self._box(blk, m1 - m0, n1 - n0)
+        if not exact:
+            # 補間は float32 で行う
+            mid = self._bufs.view("mid", (m1 - m0, n1 - n0, 4), np.float32)
+            np.copyto(mid, blk)
+            blk = mid
+        dst = out[y:y + h, x:x + w]
+        if exact:
+            self._store(blk, dst)
+            return out
+        # 2) 端数分の補間（縦 → 横）
+        v = self._bufs.view
+        rows = self._lerp(blk, self.iy0, self.iy1, self.wy, y, h, m0, 0,
+                          v("ra", (h, n1 - n0, 4), np.float32), v("rb", (h, n1 - n0, 4), np.float32))
+        cols = self._lerp(rows, self.ix0, self.ix1, self.wx, x, w, n0, 1,
+                          v("ca", (h, w, 4), np.float32), v("cb", (h, w, 4), np.float32))
+        self._store(cols, dst)
+        return out
+
+    def _box(self, blk, mh, mw):
+        # 縦に fy 行、横に fx 列ずつ足し込む（間引きスライスの加算なので一時配列を作らない）
+        fy, fx = self.fy, self.fx
+        rows = self._bufs.view("rows", (mh, blk.shape[1], 4), self.acc_dtype)
+        np.copyto(rows, blk[0::fy])
+        for i in range(1, fy):
+            np.add(rows, blk[i::fy], out=rows)
+        acc = self._bufs.view("acc", (mh, mw, 4), self.acc_dtype)
+        if self.acc_dtype == np.uint16:
+            # 1 画素の 4ch(uint16×4) を uint64 1 要素として足す。各 ch の合計は
+            # 65535 を超えないので桁あふれが隣の ch に波及しない
+            r64, a64 = rows.view(np.uint64), acc.view(np.uint64)
+        else:
+            r64, a64 = rows, acc
+        np.copyto(a64, r64[:, 0::fx])
+        for j in range(1, fx):
+            np.add(a64, r64[:, j::fx], out=a64)
+        return acc
+
+    @staticmethod
+    def _lerp(a, i0, i1, wt, d0, n, base, axis, buf_a, buf_b):
+        if i0 is None:
+            return a
+        np.take(a, i0[d0:d0 + n] - base, axis=axis, out=buf_a, mode="clip")
+        if wt is None:
+            return buf_a
+        np.take(a, i1[d0:d0 + n] - base, axis=axis, out=buf_b, mode="clip")
+        w = wt[d0:d0 + n]
+        w = w[:, None, None] if axis == 0 else w[None, :, None]
+        np.subtract(buf_b, buf_a, out=buf_b)
+        np.multiply(buf_b, w, out=buf_b)
+        np.add(buf_a, buf_b, out=buf_a)
+        return buf_a
+
+    def _store(self, v, dst):
+        # ボックス合計を平均に戻しつつ BGR → RGB に並べ替える(BGRA 出力なら並べ替えない)
+        if self.n > 1:
+            if v.dtype == np.float32:
+                np.multiply(v, 1.0 / self.n, out=v)
+            elif self.n & (self.n - 1) == 0 and v.dtype == np.uint16:
+                # 2 のべき乗なら uint64 にまとめて丸め・シフトし、隣の ch から落ちてきた
+                # ビットをマスクで消す
+                v64 = v.view(np.uint64)
+                v64 += np.uint64((self.n // 2) * 0x0001000100010001)
+                np.right_shift(v64, np.uint64(self.n.bit_length() - 1), out=v64)
+                v64 &= np.uint64(0x00FF00FF00FF00FF)
+            else:
+                v += self.n // 2
+                np.floor_divide(v, self.n, out=v)
+        if v.dtype == np.float32:
+            v += 0.5
+        if dst.shape[2] == 4:
+            np.copyto(dst, v, casting="unsafe")
+            return
+        dst[:, :, 0] = v[:, :, 2]
+        dst[:, :, 1] = v[:, :, 1]
+        dst[:, :, 2] = v[:, :, 0]
+
+    # ----- 変化タイルの写像 -----
+    def _axis_tile_map(self, n_dst, f, i0, i1, src_tile, dst_tile, n_src):
+        td = -(-n_dst // dst_tile)
+        ts = -(-n_src // src_tile)
+        m = np.zeros((td, ts), np.int32)
+        for t in range(td):
+            a, b = self._span(f, i0, i1, t * dst_tile, min((t + 1) * dst_tile, n_dst))
+            m[t, (a * f) // src_tile:min(ts, -(-(b * f) // src_tile))] = 1
+        return m
+
+    def map_mask(self, mask, src_shape, dst_shape, src_tile, dst_tile):
+        """ソース側の変化タイルマスクを出力側のタイルマスクに写す"""
+        (sh, sw), (dh, dw) = src_shape, dst_shape
+        self._plan(sh, sw, dh, dw)
+        key = (src_tile, dst_tile)
+        if key not in self._tile_maps:
+            self._tile_maps[key] = (
+                self._axis_tile_map(dh, self.fy, self.iy0, self.iy1, src_tile, dst_tile, sh),
+                self._axis_tile_map(dw, self.fx, self.ix0, self.ix1, src_tile, dst_tile, sw))
+        ry, cx = self._tile_maps[key]
+        return (ry @ mask.astype(np.int32) @ cx.T) > 0
@@ -0,0 +1,226 @@
+import struct, time, threading
+import numpy as np
+from multiprocessing import shared_memory
+
+
+# =======================================================
+# 共有メモリへのフレーム公開（他プロセスからコピーなしで読む）
+# =======================================================
+# 制御セグメント "<name>":        magic(4) version(u16) reserved(u16) generation(u32)
+# データセグメント "<name>.g<gen>": magic(4) version(u16) nslots(u16) slot_bytes(u64) latest_seq(u64)
+#   スロットヘッダ (64 バイトずつ): lock(u64) seq(u64) timestamp(f64) width height stride format nbytes(u32)
+#   画素データ (スロットごとに slot_bytes)
+# フレームが slot_bytes に収まらなくなったら、より大きいデータセグメントを作って generation を進める。
+# lock は seqlock: 書き込み中は奇数。読む側は前後で lock が同じなら破れていない。
+CTRL_MAGIC, DATA_MAGIC, VERSION = b"WCSM", b"WCSD", 1
+CTRL_HDR = struct.Struct("<4sHHI")
+DATA_HDR = struct.Struct("<4sHHQ")
+LATEST = struct.Struct("<Q")
+LATEST_OFF = DATA_HDR.size
+SLOT_HDR = struct.Struct("<QQdIIIII")
+SLOT_HDR_SIZE = 64
+LOCK = struct.Struct("<Q")
+FMT_BGRA, FMT_RGB = 0, 1
+FMT_CHANNELS = {FMT_BGRA: 4, FMT_RGB: 3}
+
+
+def _align(n, a=64):
+    return -(-n // a) * a
+
+
+_attach_lock = threading.Lock()
+
+
+def _attach(name):
+    """既存セグメントを開く。読む側は resource_tracker に登録しない(終了時に消されないように)"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)     # Python 3.13+
+    except TypeError:
+        pass
+    from multiprocessing import resource_tracker
+    with _attach_lock:
+        register = resource_tracker.register
+        resource_tracker.register = lambda *a: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+def _create(name, size):
+    """セグメントを作る。前回異常終了した書き込み側の同名セグメントが残っていれば消して作り直す"""
+    try:
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        pass
+    stale = shared_memory.SharedMemory(name=name)
+    stale.close(); stale.unlink()
+    print(f"shm: removed stale segment {name}")
+    return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+
+class _Layout:
+    def __init__(self, nslots, slot_bytes):
+        self.nslots, self.slot_bytes = nslots, slot_bytes
+        self.data_off = _align(LATEST_OFF + LATEST.size + SLOT_HDR_SIZE * nslots)
+        self.size = self.data_off + nslots * slot_bytes
+
+    def hdr(self, i): return 64 + SLOT_HDR_SIZE * i
+    def data(self, i): return self.data_off + i * self.slot_bytes
+
+
+class SharedFramePublisher:
+    """フレームを共有メモリのスロットリングに書き込む。FramePipeline のシンクとしても使える。
+
+    書き込み側は読み手の数に関係なく 1 フレーム 1 回のコピーだけで、読み手を待たない。
+    capacity(バイト)を指定すると最初からその大きさのスロットを確保する。
+    """
+    def __init__(self, name, slots=4, capacity=0):
+        if slots < 2:
+            raise ValueError("slots must be >= 2")
+        self.name, self.slots, self.capacity = name, slots, capacity
+        self.ctrl = _create(name, 64)
+        self.gen = 0
+        self.data = None
+        self.layout = None
+        self.seq = 0
+        self._write_ctrl()
+
+    def _write_ctrl(self):
+        CTRL_HDR.pack_into(self.ctrl.buf, 0, CTRL_MAGIC, VERSION, 0, self.gen)
+
+    def _ensure(self, nbytes):
+        if self.layout is not None and nbytes <= self.layout.slot_bytes: return
+        old = self.data
+        grown = int(self.layout.slot_bytes * 1.5) if self.layout else 0   # リサイズ中の作り直しを減らす
+        self.gen += 1
+        self.layout = _Layout(self.slots, _align(max(nbytes, self.capacity, grown)))
+        self.data = _create(f"{self.name}.g{self.gen}", self.layout.size)
+        DATA_HDR.pack_into(self.data.buf, 0, DATA_MAGIC, VERSION, self.slots, self.layout.slot_bytes)
+        LATEST.pack_into(self.data.buf, LATEST_OFF, 0)
+        self._write_ctrl()       # 読み手は次の latest() で新しいセグメントに付け替える
+        if old is not None:
+            old.close(); old.unlink()
+
+    def publish(self, arr, timestamp, fmt=FMT_BGRA):
+        """arr: (h, w, c) uint8。書き込んだ seq を返す"""
+        h, w, c = arr.shape
+        if FMT_CHANNELS[fmt] != c:
+            raise ValueError(f"format {fmt} needs {FMT_CHANNELS[fmt]} channels")
+        self._ensure(h * w * c)
+        self.seq += 1
+        i = self.seq % self.slots
+        buf, hdr = self.data.buf, self.layout.hdr(i)
+        lock = LOCK.unpack_from(buf, hdr)[0]
+        LOCK.pack_into(buf, hdr, lock + 1)                      # 書き込み中(奇数)
+        dst = np.ndarray((h, w, c), np.uint8, buf, self.layout.data(i))
+        np.copyto(dst, arr)
+        del dst
+        SLOT_HDR.pack_into(buf, hdr, lock + 1, self.seq, timestamp, w, h, w * c, fmt, h * w * c)
+        LOCK.pack_into(buf, hdr, lock + 2)
+        LATEST.pack_into(buf, LATEST_OFF, self.seq)
+        return self.seq
+
+    def __call__(self, bgra, timestamp):
+        self.publish(bgra, timestamp)
+
+    def close(self):
+        for shm in (self.data, self.ctrl):
+            if shm is not None:
+                shm.close(); shm.unlink()
+        self.data = None
+
+    def stats(self):
+        return {"name": self.name, "seq": self.seq, "generation": self.gen,
+                "slot_bytes": self.layout.slot_bytes if self.layout else 0}
+
+
+class SharedFrame:
+    """共有メモリ上のフレーム。array はコピーしない NumPy ビュー。
+
+    書き込み側は待たないので、slots - 1 フレーム分より長く使うと上書きされうる。
+    使い終わった時点で valid() が True なら内容は破れていない。
+    """
+    def __init__(self, reader, slot, lock, seq, timestamp, width, height, stride, fmt, array):
+        self.reader, self.slot, self.lock = reader, slot, lock
+        self.seq, self.timestamp = seq, timestamp
+        self.width, self.height, self.stride, self.format = width, height, stride, fmt
+        self.array = array
+
+    def valid(self):
+        return self.reader._lock(self.slot) == self.lock
+
+    def copy(self):
+        """破れていないコピーを返す。上書きされていたら None"""
+        a = self.array.copy()
+        return a if self.valid() else None
+
+
+class SharedFrameReader:
+    """SharedFramePublisher が書いたフレームを読む。何プロセスでも同時に付けられる"""
+    def __init__(self, name):
+        self.name = name
+        self.ctrl = _attach(name)
+        magic, ver, _, _ = CTRL_HDR.unpack_from(self.ctrl.buf, 0)
+        if magic != CTRL_MAGIC or ver != VERSION:
+            raise ValueError(f"not a frame export: {name}")
+        self.gen = 0
+        self.data = None
+        self.last_seq = 0
+        self.torn = 0          # 読んでいる間に上書きされた回数
+
+    def _sync(self):
+        gen = CTRL_HDR.unpack_from(self.ctrl.buf, 0)[3]
+        if gen == self.gen: return self.data is not None
+        if self.data is not None:
+            try: self.data.close()
+            except BufferError: pass       # 古いビューが残っている(プロセス終了時に解放される)
+        self.data, self.gen = None, gen
+        if gen == 0: return False
+        self.data = _attach(f"{self.name}.g{gen}")
+        magic, _, n, slot_bytes = DATA_HDR.unpack_from(self.data.buf, 0)
+        if magic != DATA_MAGIC:
+            raise ValueError(f"broken frame export: {self.name}-{gen}")
+        self.layout = _Layout(n, slot_bytes)
+        return True
+
+    def _lock(self, i):
+        return LOCK.unpack_from(self.data.buf, self.layout.hdr(i))[0]
+
+    def latest(self):
+        """最新フレームの SharedFrame。まだ何も書かれていなければ None"""
+        for _ in range(4):
+            if not self._sync(): return None
+            buf = self.data.buf
+            seq = LATEST.unpack_from(buf, LATEST_OFF)[0]
+            if not seq: return None
+            i = seq % self.layout.nslots
+            lock, s, ts, w, h, stride, fmt, n = SLOT_HDR.unpack_from(buf, self.layout.hdr(i))
+            if lock & 1 or s != seq:     # 書き込み中に追い越された
+                self.torn += 1
+                continue
+            c = FMT_CHANNELS[fmt]
+            arr = np.ndarray((h, w, c), np.uint8, buf, self.layout.data(i), (stride, c, 1))
+            self.last_seq = seq
+            return SharedFrame(self, i, lock, seq, ts, w, h, stride, fmt, arr)
+        return None
+
+    def wait(self, timeout=1.0, poll=0.001):
+        """last_seq より新しいフレームが出るまで待つ。timeout なら None"""
+        end = time.monotonic() + timeout
+        while True:
+            f = self.latest_new()
+            if f is not None or time.monotonic() >= end: return f
+            time.sleep(poll)
+
+    def latest_new(self):
+        if not self._sync(): return None
+        if LATEST.unpack_from(self.data.buf, LATEST_OFF)[0] == self.last_seq: return None
+        return self.latest()
+
+    def close(self):
+        for shm in (self.data, self.ctrl):
+            if shm is None: continue
+            try: shm.close()
+            except BufferError: pass       # SharedFrame のビューが残っている(プロセス終了時に解放される)
+        self.data = self.ctrl = None
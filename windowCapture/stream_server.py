@@ -0,0 +1,478 @@
+import asyncio, collections, socket, struct, threading, time, zlib
+import numpy as np
+from dirty_tiles import TileDiff
+from gpu_reduce import reduce_reference
+
+
+# =======================================================
+# ネットワーク配信（キーフレーム＋変化タイル・クライアントごとの品質調整）
+# =======================================================
+# 接続直後にサーバーが HELLO: magic(4) version(u16) reserved(u16)
+# サーバー → クライアント: nbytes(u32, 以降のバイト数) kind(u8) level(u8) comp(u8) pad(1) tile(u32)
+#   width(u32) height(u32) seq(u64) timestamp(f64) ntiles(u32)
+#   + ntiles 個の index(u32) size(u32) + タイルの BGRA 画素(comp=ZLIB なら zlib 圧縮。端のタイルは切れた大きさ)
+#   kind=KEY:   全タイル(接続直後・品質段やサイズが変わったとき)。DELTA: 前回送ってから変わったタイルだけ
+#   level:      1/2**level に縮小した画像
+# クライアント → サーバー(任意): op(u8) arg(u8)。CTRL_MIN_LEVEL で品質段の下限(これより良くしない)を指定
+MAGIC, VERSION = b"WCST", 1
+HELLO = struct.Struct("<4sHH")
+FRAME_HDR = struct.Struct("<IBBBxIIIQdI")
+TILE_HDR = struct.Struct("<II")
+CTRL = struct.Struct("<BB")
+KEY, DELTA = 0, 1
+COMP_NONE, COMP_ZLIB = 0, 1
+CTRL_MIN_LEVEL = 1
+
+Snapshot = collections.namedtuple("Snapshot", "seq timestamp width height ver blobs")
+
+
+class QualityController:
+    """送信バッファの詰まり具合から、クライアントごとの fps 上限と品質段(縮小段数)を決める。
+
+    送るたびに on_sent(wait, backlog) を呼ぶ。backlog は書き込む前に前回分が送りきれずに残っていたバイト数、
+    wait は書き込んだ後に送信バッファが空くまで待った秒数。backlog が low_water を超えるか、wait が
+    1 フレーム間隔の半分を超えれば詰まっているとみなす。詰まっていれば fps を down 倍に下げ、min_fps の 2 倍以下でも
+    詰まりが続けば(詰まりで 1 + 待ったフレーム数、空きで -1 して patience に達したら)品質を 1 段下げて
+    fps を 4 倍に戻す。空いていれば fps を up ずつ上げ、max_fps のまま
+    patience * 4 回続けば品質を 1 段上げる。品質段が変わったら True を返す。
+    """
+    def __init__(self, levels=3, max_fps=60.0, min_fps=5.0, low_water=64 * 1024, patience=3,
+                 down=0.7, up=2.0, min_level=0):
+        self.levels, self.max_fps, self.min_fps = levels, max_fps, min_fps
+        self.low_water, self.patience, self.down, self.up = low_water, patience, down, up
+        self.min_level = self.level = min(min_level, levels - 1)
+        self.fps = max_fps
+        self._busy = self._clear = 0
+        # 統計
+        self.downgrades = 0
+        self.upgrades = 0
+
+    def set_min_level(self, level):
+        self.min_level = max(0, min(level, self.levels - 1))
+        if self.level < self.min_level:
+            self.level = self.min_level
+            return True
+        return False
+
+    def on_sent(self, wait, backlog):
+        if backlog > self.low_water or wait * self.fps > 0.5:
+            self._clear = 0
+            # 送るのにかかった時間が分かっていれば、それが間隔の半分に収まる fps まで一気に下げる
+            fps = self.fps * self.down if wait <= 0 else min(self.fps * self.down, 0.5 / wait)
+            self.fps = max(self.min_fps, fps)
+            if self.fps > 2 * self.min_fps: return False
+            self._busy += 1 + int(wait * self.fps)     # 長く詰まったら止まっていたフレーム数だけ数える
+            if self._busy < self.patience or self.level >= self.levels - 1: return False
+            self.level += 1
+            self.fps, self._busy = min(self.max_fps, 4 * self.fps), 0  # 1 段下げると画素数は 1/4
+            self.downgrades += 1
+            return True
+        self._busy = max(0, self._busy - 1)
+        if self.fps < self.max_fps:
+            self.fps = min(self.max_fps, self.fps + self.up)
+            return False
+        self._clear += 1
+        if self._clear < 4 * self.patience or self.level <= self.min_level: return False
+        self.level -= 1
+        self.fps, self._clear = max(self.min_fps, self.max_fps / 2), 0     # 上げた直後は控えめに
+        self.upgrades += 1
+        return True
+
+
+class _Layer:
+    """1 つの品質段の最新画像。変化したタイルだけを圧縮し直し、全クライアントで使い回す"""
+    def __init__(self, level, tile, zlevel):
+        self.level, self.tile, self.zlevel = level, tile, zlevel
+        self.diff = TileDiff(tile)
+        self.snap = None
+        self.stale = False       # 新しいフレームをまだ反映していない
+        self.due = 0.0           # 次に作り直してよい時刻 (time.monotonic)
+        self.tiles_encoded = 0
+
+    def update(self, img, seq, timestamp):
+        """img はこの段の大きさに縮小済みの画像。新しいスナップショットを作ったら True(変化が無ければ False)"""
+        T = self.tile
+        mask = self.diff.update(img)
+        h, w = img.shape[:2]
+        tw = -(-w // T)
+        n = -(-h // T) * tw
+        snap = self.snap
+        if mask is None or snap is None or (snap.width, snap.height) != (w, h):
+            ver, blobs, todo = np.full(n, seq, np.int64), [None] * n, range(n)
+        else:
+            todo = np.flatnonzero(mask.ravel())
+            if not len(todo): return False
+            # 送信中のクライアントが古いスナップショットを参照しているので書き換えずに作り直す
+            ver, blobs = snap.ver.copy(), list(snap.blobs)
+            ver[todo] = seq
+        for i in todo:
+            ty, tx = divmod(int(i), tw)
+            px = np.ascontiguousarray(img[ty * T:(ty + 1) * T, tx * T:(tx + 1) * T])
+            z = zlib.compress(px, self.zlevel) if self.zlevel else px.tobytes()
+            blobs[i] = TILE_HDR.pack(int(i), len(z)) + z
+        self.tiles_encoded += len(todo)
+        self.snap = Snapshot(seq, timestamp, w, h, ver, blobs)
+        return True
+
+
+class _Client:
+    def __init__(self, writer, ctl):
+        self.writer, self.ctl = writer, ctl
+        self.peer = writer.get_extra_info("peername")
+        self.wake = asyncio.Event()
+        self.task = None
+        self.closed = False      # 切断・停止済み(送信タスクを cancel 以外でも止める)
+        self.ver = None          # 送ったタイルの版(スナップショットの ver をそのまま参照する)
+        self.shape = None        # 送った (level, width, height)
+        self.seq = 0
+        self.last_send = 0.0
+        self.connected = time.monotonic()
+        # 統計
+        self.messages = 0
+        self.keyframes = 0
+        self.coalesced = 0       # 送らずにまとめたフレーム数
+        self.bytes = 0
+        self.wait_time = 0.0
+
+    def stats(self):
+        dt = max(1e-9, time.monotonic() - self.connected)
+        c = self.ctl
+        return {"peer": str(self.peer), "level": c.level, "fps_cap": round(c.fps, 1),
+                "fps": self.messages / dt, "mbps": self.bytes * 8 / dt / 1e6, "messages": self.messages,
+                "keyframes": self.keyframes, "coalesced": self.coalesced, "wait_s": self.wait_time,
+                "downgrades": c.downgrades, "upgrades": c.upgrades}
+
+
+class StreamServer:
+    """FramePipeline のシンク。受け取った BGRA を TCP(または Unix ソケット)で複数のクライアントへ配信する。
+
+    キャプチャ側の仕事は、クライアントがいるときに最新フレーム用のバッファへ 1 回コピーするだけ
+    (符号化が追いつかなければ未符号化のフレームを上書きする)。符号化スレッドが使われている品質段ごとに
+    1 回だけ変化タイルを圧縮し、送信はクライアントごとの asyncio タスクがそれを共有して行う。
+    遅いクライアントしか使っていない段は、そのクライアントの fps 上限でしか作り直さない。
+    遅いクライアントは自分の drain で待つだけで、キャプチャ・符号化・他のクライアントを止めない。
+    待っている間に届いたフレームは、次に送るときに変化タイルの和としてまとめて送る。
+    fps 上限と品質段は QualityController が送信バッファの詰まり具合から決める。
+    start() で専用のイベントループ(スレッド)を立てる。port=0 なら空いているポートを使う(address で分かる)。
+    """
+    def __init__(self, host="127.0.0.1", port=0, path=None, tile=64, levels=3, compress=1,
+                 max_fps=60.0, min_fps=5.0, high_water=64 * 1024, sndbuf=None, stall_timeout=10.0):
+        self.host, self.port, self.path = host, port, path
+        self.tile, self.levels, self.compress = tile, levels, compress
+        self.max_fps, self.min_fps = max_fps, min_fps
+        self.high_water, self.sndbuf, self.stall_timeout = high_water, sndbuf, stall_timeout
+        self.address = None
+        self._cond = threading.Condition()
+        self._in = None          # キャプチャ側が書くバッファ
+        self._src = None         # 符号化スレッドが読むバッファ(最後に符号化したフレーム)
+        self._pending = None     # 未符号化フレームのタイムスタンプ
+        self._ts = 0.0           # _src のタイムスタンプ
+        self._want = {}          # クライアントが使っている品質段 -> その段のクライアントの最大 fps 上限
+        self._layers = {}        # 品質段 -> _Layer (符号化スレッドだけが触る)
+        self._snaps = {}         # 品質段 -> Snapshot (ループ側が読む。丸ごと差し替える)
+        self._clients = []
+        self._closed = False
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self.seq = 0
+        # 統計
+        self.submitted = 0
+        self.replaced = 0        # 符号化前に次のフレームで上書きされた
+        self.encoded = 0
+        self.encode_time = 0.0
+        self.tiles_encoded = 0
+        self.finished = []       # 切断したクライアントの stats()
+
+    # ----- キャプチャ側 -----
+    def __call__(self, bgra, timestamp):
+        return self.submit(bgra, timestamp)
+
+    def submit(self, bgra, timestamp):
+        """(h, w, 4) BGRA を配信用に預ける。クライアントがいなければ何もしない"""
+        if not self._clients: return False
+        with self._cond:
+            if self._closed: return False
+            self.submitted += 1
+            if self._pending is not None: self.replaced += 1
+            if self._in is None or self._in.shape != bgra.shape:
+                self._in = np.empty(bgra.shape, np.uint8)
+            np.copyto(self._in, bgra)
+            self._pending = timestamp
+            self._cond.notify()
+        return True
+
+    # ----- 符号化スレッド -----
+    def _next(self):
+        """(ロック内) 符号化する理由ができるまで待つ。閉じたら False"""
+        while not self._closed:
+            if self._pending is not None: return True
+            if self._src is not None and self._want.keys() != self._layers.keys(): return True
+            due = [l.due for l in self._layers.values() if l.stale]
+            timeout = min(due) - time.monotonic() if due else None
+            if timeout is not None and timeout <= 0: return True
+            self._cond.wait(timeout)
+        return False
+
+    def _encode_loop(self):
+        while True:
+            with self._cond:
+                if not self._next(): return
+                fresh = self._pending is not None
+                if fresh:
+                    self._in, self._src = self._src, self._in
+                    self._ts, self._pending = self._pending, None
+                    self.seq += 1
+                want = self._want
+            now = time.monotonic()
+            t0 = time.perf_counter()
+            for level in [k for k in self._layers if k not in want]:
+                del self._layers[level]
+            # 遅いクライアントしかいない段は、その fps でしか作り直さない(間の変化は次の TileDiff にまとまる)
+            todo = set()
+            for level in want:
+                layer = self._layers.get(level)
+                if layer is None:
+                    layer = self._layers[level] = _Layer(level, self.tile, self.compress)
+                elif fresh:
+                    layer.stale = True
+                if layer.snap is None or (layer.stale and now >= layer.due):
+                    todo.add(level)
+            changed = False
+            img = self._src
+            for level in range(max(todo, default=-1) + 1):
+                if level:       # 1 つ上の段から 2x2 平均で作る(縮小は段ごとに 1 回だけ)
+                    h, w = img.shape[0] & ~1, img.shape[1] & ~1
+                    if h == 0 or w == 0: break
+                    img = reduce_reference(img[:h, :w], 1)
+                if level not in todo: continue
+                layer = self._layers[level]
+                n = layer.tiles_encoded
+                changed |= layer.update(img, self.seq, self._ts)
+                self.tiles_encoded += layer.tiles_encoded - n
+                fps = want[level]
+                layer.stale = False
+                layer.due = now + 0.9 / fps if fps < self.max_fps else 0.0
+            if todo:
+                self.encoded += 1
+                self.encode_time += time.perf_counter() - t0
+            if changed:
+                snaps = {k: l.snap for k, l in self._layers.items() if l.snap is not None}
+                self._loop.loop.call_soon_threadsafe(self._publish, snaps)
+
+    # ----- イベントループ側 -----
+    def _publish(self, snaps):
+        self._snaps = snaps
+        for c in self._clients:
+            c.wake.set()
+
+    def _set_want(self):
+        with self._cond:
+            want = {}
+            for c in self._clients:
+                want[c.ctl.level] = max(want.get(c.ctl.level, 0.0), c.ctl.fps)
+            self._want = want
+            self._cond.notify()
+
+    def _update(self, c, snap):
+        """c に送るメッセージ(バイト列のリスト)。送るものが無ければ None"""
+        shape = (c.ctl.level, snap.width, snap.height)
+        if c.ver is None or c.shape != shape:
+            kind, idx = KEY, range(len(snap.blobs))
+        else:
+            if snap.seq == c.seq: return None
+            kind, idx = DELTA, np.flatnonzero(snap.ver > c.ver)
+        if snap.seq > c.seq + 1 and c.ver is not None: c.coalesced += snap.seq - c.seq - 1
+        c.ver, c.shape, c.seq = snap.ver, shape, snap.seq
+        if not len(idx): return None
+        blobs = [snap.blobs[i] for i in idx]
+        size = FRAME_HDR.size - 4 + sum(map(len, blobs))
+        comp = COMP_ZLIB if self.compress else COMP_NONE
+        hdr = FRAME_HDR.pack(size, kind, c.ctl.level, comp, self.tile, snap.width, snap.height,
+                             snap.seq, snap.timestamp, len(blobs))
+        c.messages += 1
+        c.bytes += 4 + size
+        if kind == KEY: c.keyframes += 1
+        return [hdr] + blobs
+
+    async def _send_loop(self, c):
+        loop = asyncio.get_running_loop()
+        w = c.writer
+        try:
+            # wait_for(drain) 中の cancel は drain の完了と重なると握りつぶされる(3.11 以前)ので、closed でも止める
+            while not c.closed:
+                await c.wake.wait()
+                c.wake.clear()
+                if c.closed: break
+                delay = c.last_send + 1.0 / c.ctl.fps - loop.time()
+                if delay > 0: await asyncio.sleep(delay)     # fps 上限。待つ間のフレームはまとめて送る
+                snap = self._snaps.get(c.ctl.level)
+                if snap is None: continue        # 新しい品質段の符号化待ち(できたら _publish で起こされる)
+                parts = self._update(c, snap)
+                if parts is None: continue
+                backlog = w.transport.get_write_buffer_size()
+                w.writelines(parts)
+                t = loop.time()
+                await asyncio.wait_for(w.drain(), self.stall_timeout)
+                c.last_send = now = loop.time()
+                c.wait_time += now - t
+                if c.ctl.on_sent(now - t, backlog): c.wake.set()
+                self._set_want()        # 品質段・fps 上限を符号化側へ
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            print(f"⚠ 配信先 {c.peer} を切断します: {e!r}")
+            w.close()       # 受信側の _handle が後始末する
+
+    async def _handle(self, reader, writer):
+        sock = writer.get_extra_info("socket")
+        if self.sndbuf and sock is not None and sock.family != getattr(socket, "AF_UNIX", None):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+        # high_water を超えて書いたら drain で空になるまで待つ(待った時間が詰まり具合になる)
+        writer.transport.set_write_buffer_limits(high=self.high_water, low=0)
+        writer.write(HELLO.pack(MAGIC, VERSION, 0))
+        c = _Client(writer, QualityController(self.levels, self.max_fps, self.min_fps,
+                                              low_water=self.high_water // 4))
+        self._clients.append(c)
+        self._set_want()
+        c.wake.set()
+        task = c.task = asyncio.create_task(self._send_loop(c))
+        try:
+            while True:
+                op, arg = CTRL.unpack(await reader.readexactly(CTRL.size))
+                if op == CTRL_MIN_LEVEL and c.ctl.set_min_level(arg):
+                    self._set_want()
+                    c.wake.set()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            c.closed = True
+            c.wake.set()
+            task.cancel()
+            self._clients.remove(c)
+            self._set_want()
+            self.finished.append(c.stats())
+            writer.close()
+
+    async def _start(self):
+        if self.path:
+            self._server = await asyncio.start_unix_server(self._handle, self.path)
+            return self.path
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        return self._server.sockets[0].getsockname()[:2]
+
+    def start(self):
+        """サーバーと符号化スレッドを開始して待ち受けアドレスを返す"""
+        from capture_backend import EventLoopThread
+        self._loop = EventLoopThread()
+        self.address = self._loop.run(self._start())
+        self._thread = threading.Thread(target=self._encode_loop, name="stream-encoder", daemon=True)
+        self._thread.start()
+        return self.address
+
+    async def _stop(self):
+        self._server.close()
+        tasks = [c.task for c in self._clients]
+        for c in list(self._clients):
+            c.closed = True
+            c.wake.set()
+            c.writer.close()
+        for t in tasks: t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None: self._thread.join()
+        if self._loop is not None:
+            self._loop.run(self._stop(), timeout=5.0)
+            self._loop.close()
+            self._loop = None
+
+    def stats(self):
+        return {"address": self.address, "clients": [c.stats() for c in list(self._clients)],
+                "submitted": self.submitted, "replaced": self.replaced, "encoded": self.encoded,
+                "encode_ms_per_frame": 1e3 * self.encode_time / max(1, self.encoded),
+                "tiles_encoded": self.tiles_encoded}
+
+
+# =======================================================
+# 受信側（別マシンでの表示・テスト・ベンチマーク）
+# =======================================================
+class StreamDecoder:
+    """受信したメッセージを BGRA 画像(image)に反映する"""
+    def __init__(self):
+        self.image = None
+        self.level = None
+        self.seq = 0
+        self.timestamp = 0.0
+        self.messages = 0
+        self.keyframes = 0
+
+    def apply(self, hdr, payload):
+        kind, level, comp, tile, w, h, seq, ts, n = hdr
+        if kind == KEY:
+            if self.image is None or self.image.shape != (h, w, 4):
+                self.image = np.zeros((h, w, 4), np.uint8)
+            self.keyframes += 1
+        elif self.image is None or self.image.shape != (h, w, 4):
+            raise ValueError("delta before keyframe")
+        tw = -(-w // tile)
+        mv, pos = memoryview(payload), 0
+        for _ in range(n):
+            i, size = TILE_HDR.unpack_from(mv, pos)
+            pos += TILE_HDR.size
+            data = mv[pos:pos + size]
+            pos += size
+            if comp == COMP_ZLIB: data = zlib.decompress(data)
+            ty, tx = divmod(i, tw)
+            y, x = ty * tile, tx * tile
+            rh, rw = min(tile, h - y), min(tile, w - x)
+            self.image[y:y + rh, x:x + rw] = np.frombuffer(data, np.uint8, rh * rw * 4).reshape(rh, rw, 4)
+        self.level, self.seq, self.timestamp = level, seq, ts
+        self.messages += 1
+        return self.image
+
+
+class StreamClient:
+    """StreamServer に接続して受信する。rate(バイト/秒)を指定すると読む速さを絞る(遅い回線の模擬)"""
+    def __init__(self, rate=None):
+        self.rate = rate
+        self.decoder = StreamDecoder()
+        self.reader = self.writer = None
+        self.bytes = 0
+
+    async def connect(self, host="127.0.0.1", port=0, path=None, rcvbuf=None):
+        if path:
+            self.reader, self.writer = await asyncio.open_unix_connection(path)
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            if rcvbuf: sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+            sock.setblocking(False)
+            await asyncio.get_running_loop().sock_connect(sock, (host, port))
+            self.reader, self.writer = await asyncio.open_connection(sock=sock)
+        magic, ver, _ = HELLO.unpack(await self.reader.readexactly(HELLO.size))
+        if magic != MAGIC or ver != VERSION:
+            raise ValueError("not a stream server")
+        return self
+
+    async def receive(self):
+        """次のメッセージを反映して画像を返す。切断されたら None"""
+        try:
+            head = await self.reader.readexactly(FRAME_HDR.size)
+            hdr = FRAME_HDR.unpack(head)
+            payload = await self.reader.readexactly(hdr[0] - (FRAME_HDR.size - 4))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return None
+        self.bytes += hdr[0] + 4
+        if self.rate: await asyncio.sleep((hdr[0] + 4) / self.rate)
+        return self.decoder.apply(hdr[1:], payload)
+
+    def set_min_level(self, level):
+        """品質段の下限(1 なら 1/2 以下の解像度で受け取る)"""
+        self.writer.write(CTRL.pack(CTRL_MIN_LEVEL, level))
+
+    async def close(self):
+        if self.writer is None: return
+        self.writer.close()
+        try: await self.writer.wait_closed()
+        except ConnectionError: pass
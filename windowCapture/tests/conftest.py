@@ -0,0 +1,4 @@
+import os, sys
+
+# モジュールはフラットに置いてあるので、親ディレクトリから import する
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,94 @@
+import time
+import numpy as np
+import pytest
+from async_readback import PipelinedBackend
+from capture_backend import CaptureBackend, Frame
+
+
+class _Frame(Frame):
+    def __init__(self, n, fail=False):
+        super().__init__(np.zeros(16, np.uint8), 2, 2)
+        self.n, self.fail, self.closed = n, fail, False
+
+    async def readback_async(self):
+        if self.fail: raise OSError("device lost")
+
+    def close(self): self.closed = True
+
+
+class _Inner(CaptureBackend):
+    def __init__(self, frames):
+        super().__init__()
+        self.queue = list(frames)
+        self.buffers = 2
+
+    def next_frame(self):
+        return self.queue.pop(0) if self.queue else None
+
+
+def _next(b, timeout=2.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        f = b.next_frame()
+        if f is not None: return f
+        time.sleep(0.001)
+    return None
+
+
+def _drain(b):
+    out = []
+    while True:
+        f = _next(b, 0.2)
+        if f is None: return out
+        out.append(f)
+
+
+def test_depth_must_be_positive():
+    with pytest.raises(ValueError):
+        PipelinedBackend(_Inner([]), depth=0)
+
+
+def test_frames_come_back_in_order_within_depth():
+    frames = [_Frame(i) for i in range(6)]
+    inner = _Inner(frames)
+    b = PipelinedBackend(inner, depth=3)
+    assert inner.buffers == 4                       # 読み出し中の分だけプールを増やす
+    b.open()
+    try:
+        assert [f.n for f in _drain(b)] == list(range(6))
+        assert b.max_inflight == 3 and b.readbacks == 6 and b.superseded == 0
+        assert not any(f.closed for f in frames)
+    finally:
+        b.close()
+
+
+def test_coalesce_reads_back_only_the_newest():
+    frames = [_Frame(i) for i in range(5)]
+    b = PipelinedBackend(_Inner(frames), depth=1, coalesce=True)
+    b.open()
+    try:
+        assert [f.n for f in _drain(b)] == [4]
+        assert b.readbacks == 1 and b.superseded == 4
+        assert [f.closed for f in frames] == [True] * 4 + [False]
+    finally:
+        b.close()
+
+
+def test_failed_readback_is_skipped_and_closed():
+    frames = [_Frame(0), _Frame(1, fail=True), _Frame(2)]
+    b = PipelinedBackend(_Inner(frames), depth=2)
+    b.open()
+    try:
+        assert [f.n for f in _drain(b)] == [0, 2]
+        assert b.errors == 1 and frames[1].closed
+    finally:
+        b.close()
+
+
+def test_stop_closes_frames_still_in_flight():
+    frames = [_Frame(i) for i in range(3)]
+    b = PipelinedBackend(_Inner(frames), depth=3)
+    b.open()
+    b._fill()
+    b.stop(); b.close()
+    assert all(f.closed for f in frames)
@@ -0,0 +1,29 @@
+from bench import suite
+
+
+def _case(scale, crop="full", fmt="padded"):
+    return {"res": (320, 200), "format": fmt, "crop": crop, "scale": scale}
+
+
+def test_tile_path_matches_full_conversion():
+    for scale in (1, 0.5, 0.3):
+        for crop in ("full", "center50"):
+            assert suite.verify_case(_case(scale, crop), frames=12) == (0, 0)
+
+
+def test_verify_case_detects_stale_tiles(monkeypatch):
+    # 他のスロットに変化を残さないと、古いスロットを使い回したときに内容がずれる
+    monkeypatch.setattr(suite.FramePipeline, "_convert_tiles",
+                        lambda self, src, idx, out, mask: self._render(src, out, (0, 0, 1, 1))
+                        if mask is not None else self._render(src, out))
+    bad, worst = suite.verify_case(_case(1), frames=12)
+    assert bad > 0 and worst > 0
+
+
+def test_compare_flags_regressions_only_past_threshold():
+    base = {"cases": {"a": {"fps_in": 100.0, "paint_p95_ms": 1.0, "mismatch_frames": 0}}}
+    now = {"cases": {"a": {"fps_in": 90.0, "paint_p95_ms": 1.5, "mismatch_frames": 3}}}
+    bad = suite.compare(now, base, default=0.15)
+    assert [(cid, key) for cid, key, *_ in bad] == [("a", "paint_p95_ms")]
+    bad = suite.compare(now, base, default=0.15, thresholds=[("*_ms", 0.6)])
+    assert bad == []
@@ -0,0 +1,69 @@
+import numpy as np
+from buffers import GrowBuffer, BufferPool
+from capture_backend import SyntheticBackend, WinRTBackend
+from frame_ring import FrameRing
+from pipeline import FramePipeline
+
+
+def test_grow_buffer_grows_geometrically():
+    b = GrowBuffer(growth=1.5)
+    for n in range(100, 1001):                      # ドラッグで 1 ずつ大きくなる
+        v = b.view((n,))
+        assert v.shape == (n,) and v.flags.c_contiguous
+    assert b.allocs <= 1 + int(np.ceil(np.log(10) / np.log(1.5)))
+    assert b.capacity >= 1000
+
+
+def test_grow_buffer_views_share_memory_and_dtype():
+    b = GrowBuffer()
+    a = b.view((4, 4), np.float32)
+    a[...] = 1.5
+    c = b.view((2, 8), np.float32)
+    assert c.dtype == np.float32 and (c == 1.5).all() and b.allocs == 1
+
+
+def test_grow_buffer_shrinks_only_when_far_below_capacity():
+    b = GrowBuffer(shrink=4)
+    b.view((1000,))
+    b.view((300,))
+    assert b.capacity == 1000
+    b.view((200,))                                  # 1/4 未満になったら詰め直す
+    assert b.capacity == 200 and b.allocs == 2
+    keep = GrowBuffer(shrink=0)
+    keep.view((1000,)); keep.view((1,))
+    assert keep.capacity == 1000 and keep.allocs == 1
+
+
+def test_buffer_pool_keeps_one_buffer_per_name():
+    p = BufferPool()
+    p.view("a", (10,)); p.view("b", (20,)); p.view("a", (5,))
+    assert p.allocs == 2 and p.capacity == 30
+
+
+def test_pipeline_follows_resize_without_reallocating_each_step():
+    b = SyntheticBackend(200, 100, fps=0, pattern="noise")
+    b.start()
+    ring = FrameRing(3)
+    p = FramePipeline(ring)
+    for w in range(200, 400, 2):                    # ドラッグ中のリサイズ
+        b.resize(w, w // 2)
+        f = b.next_frame()
+        idx = p.process(f)
+        f.close()
+        i, out, _, _ = ring.borrow()
+        assert i == idx and out.shape[:2] == (w // 2, w)
+        ring.release(i)
+    assert b.resizes == 99 and ring.allocs <= 3 * 5
+
+
+def test_winrt_pool_plan_grows_with_margin_and_settles():
+    b = WinRTBackend(0, growth=1.25, settle=0.3)
+    b.pool_size = b._content = (800, 600)
+    assert b._plan_pool(800, 600, 0.0) is None
+    assert b._plan_pool(0, 0, 0.0) is None          # 最小化中は作り直さない
+    assert b._plan_pool(820, 600, 0.0) == (1000, 600)
+    assert b._plan_pool(2000, 700, 0.0) == (2000, 750)  # 余裕は最大でも必要量の 2 倍まで
+    b.pool_size = (1000, 750)
+    assert b._plan_pool(900, 700, 1.0) is None      # 小さくなっても落ち着くまでは余裕を残す
+    assert b._plan_pool(900, 700, 1.2) is None
+    assert b._plan_pool(900, 700, 1.3) == (900, 700)
@@ -0,0 +1,114 @@
+import threading
+import numpy as np
+import pytest
+from capture_backend import SyntheticBackend, ReplayBackend, make_backend
+from frame_file import FrameFileWriter
+
+
+def _grab(b):
+    f = b.next_frame()
+    img = f.bgra().copy()
+    f.close()
+    return img
+
+
+def test_synthetic_free_running_waits_for_close():
+    b = SyntheticBackend(64, 32, fps=0, stride_pad=12)
+    arrived = []
+    b.on_frame_arrived(lambda: arrived.append(1))
+    b.open(); b.start()
+    assert arrived == [1]
+    f = b.next_frame()
+    assert (f.width, f.height, f.stride) == (64, 32, 64 * 4 + 12)
+    assert f.bgra().shape == (32, 64, 4)
+    assert b.next_frame() is None                   # 前のフレームを閉じるまで次は無い
+    f.close()
+    assert arrived == [1, 1] and b.next_frame() is not None
+    assert b.stats()["frames"] == 2 and b.stats()["bytes_read"] == 2 * 32 * (64 * 4 + 12)
+
+
+@pytest.mark.parametrize("pattern,changes", [("static", False), ("noise", True), ("bars", True)])
+def test_synthetic_patterns(pattern, changes):
+    b = SyntheticBackend(256, 16, fps=0, pattern=pattern)
+    b.start()
+    a, c = _grab(b), _grab(b)
+    assert (a[..., 3] == 255).all()
+    assert (not np.array_equal(a, c)) == changes
+
+
+def test_synthetic_bars_change_only_a_band():
+    b = SyntheticBackend(256, 16, fps=0)
+    b.start()
+    a, c = _grab(b), _grab(b)
+    cols = np.flatnonzero((a != c).any(axis=(0, 2)))
+    assert 0 < len(cols) <= 2 * (256 // 32)
+
+
+def test_synthetic_resize_notifies():
+    b = SyntheticBackend(64, 32, fps=0)
+    sizes = []
+    b.on_resize(lambda w, h: sizes.append((w, h)))
+    b.start()
+    b.resize(80, 40)
+    assert _grab(b).shape == (40, 80, 4)
+    assert sizes == [(80, 40)] and b.resizes == 1
+
+
+def test_synthetic_ticker_paces_frames():
+    b = SyntheticBackend(16, 16, fps=200)
+    got = threading.Event()
+    b.on_frame_arrived(got.set)
+    assert b.next_frame() is None                   # 通知が来るまでは無い
+    b.start()
+    try:
+        assert got.wait(2.0)
+        f = b.next_frame()
+        assert f is not None
+        f.close()
+    finally:
+        b.stop()
+
+
+def _write(path, frames):
+    w = FrameFileWriter(path)
+    for img, ts in frames: w.write(img, ts)
+    w.close()
+
+
+def test_replay_loops_and_reports_size_changes(tmp_path):
+    path = str(tmp_path / "a.wcap")
+    rng = np.random.default_rng(0)
+    frames = [(rng.integers(0, 256, (h, w, 4), np.uint8), 0.01 * i)
+              for i, (w, h) in enumerate([(32, 16), (32, 16), (48, 24)])]
+    _write(path, frames)
+    b = make_backend(f"replay:{path}@fast")
+    assert isinstance(b, ReplayBackend) and not b.realtime
+    sizes = []
+    b.on_resize(lambda w, h: sizes.append((w, h)))
+    b.open(); b.start()
+    assert b.size == (32, 16)
+    got = [_grab(b) for _ in range(5)]              # 最後まで行ったら先頭に戻る
+    for g, i in zip(got, [0, 1, 2, 0, 1]):
+        np.testing.assert_array_equal(g, frames[i][0])
+    assert sizes == [(48, 24), (32, 16)]
+    b.stop(); b.close()
+
+
+def test_replay_without_loop_ends(tmp_path):
+    path = str(tmp_path / "a.wcap")
+    _write(path, [(np.zeros((8, 8, 4), np.uint8), 0.0)])
+    b = ReplayBackend(path, realtime=False, loop=False)
+    b.open(); b.start()
+    _grab(b)
+    assert b.next_frame() is None and b.next_frame() is None
+    b.close()
+
+
+def test_make_backend_specs():
+    b = make_backend("synthetic:320x200@0:noise")
+    assert (b.size, b.fps, b.pattern) == ((320, 200), 0.0, "noise")
+    assert make_backend("synthetic:").size == (1920, 1080)
+    with pytest.raises(ValueError):
+        make_backend("nope:1")
+    with pytest.raises(ValueError):
+        SyntheticBackend(8, 8, pattern="plaid")
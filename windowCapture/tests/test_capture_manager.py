@@ -0,0 +1,77 @@
+import os
+import pytest
+from capture_manager import CaptureManager
+
+
+def test_workers_validation(capsys):
+    with pytest.raises(ValueError):
+        CaptureManager(-1)
+    assert CaptureManager(0).workers == 0           # スレッド無し(step() を呼び出し側で回す)
+    assert CaptureManager().workers == (os.cpu_count() or 1)
+    many = (os.cpu_count() or 1) + 3
+    assert CaptureManager(many).workers == many     # 黙って減らさない
+    assert "⚠" in capsys.readouterr().out
+
+
+# ----- 公平な割り当て(start-time fair queueing) -----
+class Clock:
+    def __init__(self): self.t = 0.0
+    def __call__(self): return self.t
+
+
+class _Pipe:
+    """1 フレームごとに cost 秒の CPU を使ったことにする"""
+    metrics = None
+
+    def __init__(self, cpu, cost):
+        self.cpu, self.cost, self.processed = cpu, cost, 0
+
+    def process(self, frame):
+        self.cpu.t += self.cost
+        self.processed += 1
+        return 0
+
+
+def _manager(monkeypatch):
+    import capture_manager
+    cpu = Clock()
+    monkeypatch.setattr(capture_manager.time, "thread_time", cpu)
+    return CaptureManager(0, clock=Clock()), cpu
+
+
+def _open(mgr, cpu, cost=0.01, **kw):
+    from capture_backend import SyntheticBackend
+    return mgr.open(SyntheticBackend(8, 8, fps=0), _Pipe(cpu, cost), **kw)
+
+
+def test_cpu_time_is_shared_by_priority(monkeypatch):
+    mgr, cpu = _manager(monkeypatch)
+    a = _open(mgr, cpu, priority=1)
+    b = _open(mgr, cpu, priority=3)
+    c = _open(mgr, cpu, cost=0.02, priority=1)      # 1 フレームが倍重い
+    for _ in range(600): assert mgr.step()
+    assert b.turns == pytest.approx(3 * a.turns, abs=3)
+    assert c.cpu_time == pytest.approx(a.cpu_time, abs=0.03)
+    assert c.turns == pytest.approx(a.turns / 2, abs=2)
+    assert mgr.turns == 600
+
+
+def test_new_session_does_not_catch_up_on_past_time(monkeypatch):
+    mgr, cpu = _manager(monkeypatch)
+    a = _open(mgr, cpu)
+    for _ in range(100): mgr.step()
+    b = _open(mgr, cpu)
+    for _ in range(40): mgr.step()
+    assert b.turns == pytest.approx(20, abs=1) and a.turns == pytest.approx(120, abs=1)
+
+
+def test_removed_and_rate_limited_sessions_are_skipped(monkeypatch):
+    mgr, cpu = _manager(monkeypatch)
+    a = _open(mgr, cpu)
+    b = _open(mgr, cpu, policy="max:10")
+    for _ in range(10): mgr.step()
+    assert b.turns == 1                             # 時計が進まないので fps 上限で 1 回だけ
+    mgr.remove(a)
+    assert not mgr.step() and a.backend.stats()["frames"] == a.turns
+    mgr.clock.t += 0.1
+    assert mgr.step() and b.turns == 2
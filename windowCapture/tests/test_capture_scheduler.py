@@ -0,0 +1,89 @@
+import pytest
+from capture_scheduler import CapturePolicy, CaptureScheduler
+
+
+class Clock:
+    def __init__(self): self.t = 0.0
+    def __call__(self): return self.t
+
+
+class _Frame:
+    def __init__(self, n): self.n, self.closed = n, False
+    def close(self): self.closed = True
+
+
+def _source(frames):
+    frames = list(frames)
+    return lambda: frames.pop(0) if frames else None
+
+
+def test_policy_parse():
+    assert repr(CapturePolicy.parse("max:30")) == "max:30"
+    assert CapturePolicy.parse("max:30").min_interval == pytest.approx(1 / 30)
+    assert CapturePolicy.parse("latest").min_interval == 0.0
+    for bad in ("max", "max:0", "fastest"):
+        with pytest.raises(ValueError):
+            CapturePolicy.parse(bad)
+
+
+def test_latest_keeps_newest_and_closes_the_rest():
+    s = CaptureScheduler("latest")
+    fs = [_Frame(i) for i in range(4)]
+    assert s.collect(_source(fs)) == [fs[3]]
+    assert [f.closed for f in fs] == [True, True, True, False] and s.coalesced == 3
+    assert s.collect(_source([])) == []
+
+
+def test_every_takes_one_and_asks_for_more():
+    clock = Clock()
+    s = CaptureScheduler("every", clock=clock)
+    fs = [_Frame(i) for i in range(3)]
+    src = _source(fs)
+    s.begin()
+    assert s.collect(src) == [fs[0]] and not fs[0].closed
+    s.done(True)
+    assert s.next_deadline(clock.t) == clock.t      # 残りをすぐ取りに行く
+
+
+def test_poll_backs_off_without_notifications():
+    clock = Clock()
+    s = CaptureScheduler(min_poll=0.01, max_poll=0.08, clock=clock)
+    polls = []
+    for _ in range(5):
+        s.begin(); s.done(False)
+        polls.append(s.poll)
+    assert polls == [0.02, 0.04, 0.08, 0.08, 0.08] and s.idle_wakeups == 5
+    assert s.next_deadline(clock.t) == pytest.approx(0.08)
+    s.notify()                                      # 通知が来たらすぐ起きる
+    assert s.next_deadline(clock.t) == clock.t
+    s.begin(); s.done(True)
+    assert s.poll == 0.08                           # 通知が届くならポーリングは保険
+
+
+def test_max_fps_spaces_fetches():
+    clock = Clock()
+    sleeps = []
+
+    def sleep(dt):
+        sleeps.append(dt); clock.t += dt
+
+    s = CaptureScheduler("max:10", clock=clock, sleep=sleep)
+    fetches = []
+    for _ in range(5):
+        s.notify()
+        assert s.wait()
+        fetches.append(clock.t)
+        s.done(True)
+    assert fetches == pytest.approx([0.0, 0.1, 0.2, 0.3, 0.4])
+    s.stop()
+    assert not s.wait()
+
+
+def test_set_policy_takes_effect_immediately():
+    clock = Clock()
+    s = CaptureScheduler("max:1", clock=clock)
+    s.begin(); s.done(True)
+    s.notify()
+    assert s.next_deadline(clock.t) == pytest.approx(1.0)
+    s.set_policy("latest")
+    assert s.next_deadline(clock.t) == clock.t
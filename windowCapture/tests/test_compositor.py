@@ -0,0 +1,149 @@
+import numpy as np
+import pytest
+from compositor import Compositor, CompositeRenderer, shelf_layout, grid_layout
+from frame_ring import FrameRing
+from dirty_tiles import merge_masks
+
+
+def _overlap(a, b):
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def _random_sizes(seed, n):
+    rng = np.random.default_rng(seed)
+    return [(int(rng.integers(1, 700)), int(rng.integers(1, 500))) for _ in range(n)]
+
+
+# ----- 配置 -----
+@pytest.mark.parametrize("seed", range(5))
+def test_shelf_layout_no_overlap_and_fits(seed):
+    sizes = _random_sizes(seed, 30)
+    rects, (W, H) = shelf_layout(sizes, max_width=1280, gap=4)
+    assert [r[2:] for r in rects] == sizes
+    for i, a in enumerate(rects):
+        assert a[0] >= 0 and a[1] >= 0 and a[0] + a[2] <= W and a[1] + a[3] <= H
+        assert a[0] + a[2] <= 1280
+        assert not any(_overlap(a, b) for b in rects[i + 1:])
+
+
+def test_shelf_layout_wide_source_gets_its_own_row():
+    rects, (W, H) = shelf_layout([(100, 50), (3000, 40), (100, 60)], max_width=1000, gap=0)
+    assert rects == [(0, 0, 100, 50), (0, 50, 3000, 40), (0, 90, 100, 60)]
+    assert (W, H) == (3000, 150)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_grid_layout_cells_keep_aspect_and_never_enlarge(seed):
+    sizes = _random_sizes(seed, 11)
+    rects, (W, H) = grid_layout(sizes, cell=(200, 150), gap=4)
+    assert (W, H) == (4 * 200 + 3 * 4, 3 * 150 + 2 * 4)
+    for i, ((x, y, w, h), (sw, sh)) in enumerate(zip(rects, sizes)):
+        r, c = divmod(i, 4)
+        assert c * 204 <= x and x + w <= c * 204 + 200     # 自分のマスの中
+        assert r * 154 <= y and y + h <= r * 154 + 150
+        assert w <= sw and h <= sh
+        assert abs(w / h - sw / sh) <= sw / sh * (1 / min(w, h)) + 1e-9
+        assert not any(_overlap(rects[i], b) for b in rects[i + 1:])
+
+
+def test_grid_layout_empty():
+    assert grid_layout([]) == ([], (0, 0))
+
+
+# ----- 合成 -----
+def _img(w, h, seed):
+    return np.random.default_rng(seed).integers(0, 256, (h, w, 4), np.uint8)
+
+
+def test_blit_full_then_masked_tiles_only():
+    comp = Compositor(layout=lambda s: shelf_layout(s, gap=0))
+    comp.set_sizes([(64, 32), (48, 48)])
+    assert comp.take_dirty() is None                # 並べ直した直後は全体
+    a0, b = _img(64, 32, 0), _img(48, 48, 1)
+    assert comp.blit(0, a0) == 64 * 32 and comp.blit(1, b) == 48 * 48
+    assert comp.take_dirty() == [(0, 0, 64, 32), (64, 0, 48, 48)]
+    before = comp.canvas.copy()
+    a1 = _img(64, 32, 2)
+    mask = np.zeros((2, 4), bool); mask[1, 2] = True    # タイル 16: (32, 16) から 16x16
+    assert comp.blit(0, a1, mask, tile=16) == 256
+    assert comp.take_dirty() == [(32, 16, 16, 16)]
+    expect = before.copy()
+    expect[16:32, 32:48] = a1[16:32, 32:48]
+    np.testing.assert_array_equal(comp.canvas, expect)
+    assert comp.take_dirty() == []
+
+
+def test_blit_smaller_image_is_centered_and_size_change_repaints():
+    comp = Compositor(layout=lambda s: shelf_layout(s, gap=0), background=(1, 2, 3, 4))
+    comp.set_sizes([(40, 20)])
+    comp.blit(0, _img(40, 20, 0))
+    comp.take_dirty()
+    small = _img(20, 10, 1)
+    mask = np.zeros((1, 2), bool)                   # 大きさが変わったら mask は使わず矩形全体
+    assert comp.blit(0, small, mask, tile=16) == 200
+    assert comp.take_dirty() == [(0, 0, 40, 20)]
+    np.testing.assert_array_equal(comp.canvas[5:15, 10:30], small)
+    assert (comp.canvas[:5] == (1, 2, 3, 4)).all() and (comp.canvas[:, :10] == (1, 2, 3, 4)).all()
+    big = _img(80, 30, 2)                           # 矩形より大きい分は切る
+    comp.blit(0, big)
+    np.testing.assert_array_equal(comp.canvas, big[:20, :40])
+
+
+def test_many_dirty_rects_collapse_to_bounding_box():
+    comp = Compositor(layout=lambda s: shelf_layout(s, gap=0), max_rects=3)
+    comp.set_sizes([(128, 16)])
+    comp.blit(0, _img(128, 16, 0))
+    comp.take_dirty()
+    mask = np.zeros((1, 8), bool); mask[0, 1::2] = True
+    comp.blit(0, _img(128, 16, 1), mask, tile=16)
+    assert comp.take_dirty() == [(16, 0, 112, 16)]
+
+
+def test_set_sizes_keeps_buffer_when_canvas_size_unchanged():
+    comp = Compositor(layout=lambda s: shelf_layout(s, gap=0))
+    comp.set_sizes([(32, 16), (32, 16)])
+    canvas = comp.canvas
+    assert not comp.set_sizes([(32, 16), (32, 16)])
+    assert comp.set_sizes([(32, 8), (32, 16)]) and comp.canvas is canvas
+
+
+# ----- 合成スレッド(同期の compose) -----
+class _Pipe:
+    def __init__(self): self.out = None
+    def set_output_size(self, size): self.out = size
+
+
+class _Source:
+    def __init__(self, w, h):
+        self.w, self.h, self.tile = w, h, 16
+        self.ring = FrameRing(3, merge=merge_masks)
+        self.pipeline = _Pipe()
+
+    def size(self): return self.w, self.h
+
+    def push(self, img, mask=None):
+        i, arr = self.ring.acquire_write(img.shape)
+        arr[...] = img
+        self.ring.publish(i, mask)
+
+
+def test_renderer_composes_only_ready_sources_and_waits_for_take():
+    srcs = [_Source(32, 16), _Source(16, 16)]
+    presented = []
+    r = CompositeRenderer(srcs, Compositor(layout=lambda s: shelf_layout(s, gap=0)),
+                          present=lambda: presented.append(1))
+    a, b = _img(32, 16, 0), _img(16, 16, 1)
+    srcs[0].push(a); srcs[1].push(b)
+    assert r.compose() == 2 and presented == [1]
+    assert [s.pipeline.out for s in srcs] == [(32, 16), (16, 16)]
+    assert r.take() is None
+    a2 = _img(32, 16, 2)
+    mask = np.zeros((1, 2), bool); mask[0, 1] = True
+    srcs[0].push(a2, mask)
+    assert r.compose({0, 1}) == 1                   # 1 は新しいフレームが無い
+    np.testing.assert_array_equal(r.comp.canvas[:, 16:32], a2[:, 16:32])
+    np.testing.assert_array_equal(r.comp.canvas[:, :16], a[:, :16])
+    srcs[0].push(a)
+    r.compose({0})
+    assert presented == [1, 1]                      # take されるまで次の present はしない
+    assert r.take() == [(16, 0, 16, 16), (0, 0, 32, 16)]
@@ -0,0 +1,83 @@
+import json, os
+from config_store import ConfigStore
+
+
+def _legacy(base, sub, name, data):
+    os.makedirs(os.path.join(base, sub), exist_ok=True)
+    with open(os.path.join(base, sub, name + ".json"), "w", encoding="utf-8") as f:
+        json.dump(data, f)
+
+
+def test_lookup_precedence(tmp_path):
+    base = str(tmp_path)
+    _legacy(base, "window_config", "Old Title", {"v": "legacy-window"})
+    _legacy(base, "exe_config", "app.exe", {"v": "legacy-exe"})
+    s = ConfigStore(os.path.join(base, "profiles.json"), delay=0, legacy_dir=base)
+    assert s.lookup("App.exe", "Old Title") == ("legacy", {"v": "legacy-window"})
+    assert s.lookup("App.exe", "Other") == ("legacy", {"v": "legacy-exe"})
+    # 同じ exe の別ウィンドウを保存すると exe の既定値ができるが、旧版のタイトルの設定は隠さない
+    s.put("app.exe", "Sibling", {"v": "sibling"})
+    assert s.lookup("app.exe", "Old Title") == ("legacy", {"v": "legacy-window"})
+    assert s.lookup("app.exe", "Other") == ("exe", {"v": "sibling"})
+    s.set_pattern("*Video*", {"v": "pattern"})
+    assert s.lookup("app.exe", "A Video") == ("pattern", {"v": "pattern"})
+    # 別の exe で保存した同じタイトルはパターンより優先、旧版のタイトルの設定よりは後
+    s.put("other.exe", "A Video", {"v": "other"}, exe_default=False)
+    assert s.lookup("app.exe", "A Video") == ("title", {"v": "other"})
+    s.put("x.exe", "Old Title", {"v": "x"}, exe_default=False)
+    assert s.lookup("app.exe", "Old Title") == ("legacy", {"v": "legacy-window"})
+    # 新しい形式で保存したら、それが一番
+    s.put("app.exe", "Old Title", {"v": "window"})
+    assert s.lookup("app.exe", "Old Title") == ("window", {"v": "window"})
+    assert s.lookup("nothing.exe", "none") == (None, None)
+    s.close()
+
+
+def test_saved_settings_survive_reload(tmp_path):
+    path = str(tmp_path / "profiles.json")
+    s = ConfigStore(path, delay=0)
+    s.put("App.exe", "T", {"pos": [1, 2]})
+    s.set_pattern("*x*", {"a": 1}, exe="app.exe")
+    s.close()
+    t = ConfigStore(path, delay=0)
+    assert t.lookup("app.exe", "T") == ("window", {"pos": [1, 2]})
+    assert t.lookup("APP.EXE", "zxz") == ("pattern", {"a": 1})
+    assert t.lookup("b.exe", "zxz") == (None, None)
+    t.close()
+
+
+def test_legacy_is_imported_once(tmp_path, monkeypatch):
+    base = str(tmp_path)
+    path = os.path.join(base, "profiles.json")
+    _legacy(base, "window_config", "Old Title", {"v": "legacy-window"})
+    _legacy(base, "exe_config", "App.exe", {"v": "legacy-exe"})
+    s = ConfigStore(path, delay=0, legacy_dir=base)
+    assert s.stats()["legacy"] == 2 and s.writes == 1        # 取り込んだらすぐ保存する
+    s.close()
+    # 取り込んだ後は旧形式のディレクトリを見ない(消しても同じ結果)
+    import shutil
+    shutil.rmtree(os.path.join(base, "window_config")); shutil.rmtree(os.path.join(base, "exe_config"))
+    listed = []
+    real = os.listdir
+    monkeypatch.setattr(os, "listdir", lambda d: listed.append(d) or real(d))
+    t = ConfigStore(path, delay=0, legacy_dir=base)
+    assert t.lookup("app.exe", "Old Title") == ("legacy", {"v": "legacy-window"})
+    assert t.lookup("app.exe", "x") == ("legacy", {"v": "legacy-exe"})
+    assert listed == [] and t.stats()["pending"] == 0
+    assert t.remove_legacy(title="Old Title")
+    assert t.lookup("app.exe", "Old Title") == ("legacy", {"v": "legacy-exe"})
+    t.close()
+
+
+def test_new_entries_win_over_legacy_files(tmp_path):
+    base = str(tmp_path)
+    path = os.path.join(base, "profiles.json")
+    s = ConfigStore(path, delay=0)
+    s.put("app.exe", "T", {"v": "new"})
+    s.close()
+    _legacy(base, "exe_config", "app.exe", {"v": "legacy-exe"})
+    t = ConfigStore(path, delay=0, legacy_dir=base)
+    assert t.lookup("app.exe", "other") == ("exe", {"v": "new"})
+    t.close()
+    with open(path, encoding="utf-8") as f:
+        assert json.load(f)["legacy_imported"] is True
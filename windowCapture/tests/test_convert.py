@@ -0,0 +1,34 @@
+import numpy as np
+from frame_convert import FrameConverter, bgra_view, rgb_sink
+
+
+def _frame(w, h, stride, seed=0):
+    buf = np.random.default_rng(seed).integers(0, 256, stride * h, np.uint8)
+    return buf, np.ndarray((h, w, 4), np.uint8, buf, strides=(stride, 4, 1))
+
+
+def test_convert_matches_numpy_reorder_with_row_padding():
+    w, h = 37, 11
+    buf, img = _frame(w, h, w * 4 + 24)
+    conv = FrameConverter()
+    out = conv.convert(buf.tobytes(), w, h, stride=w * 4 + 24)
+    assert np.array_equal(out, img[:, :, 2::-1])
+    assert conv.bytes_copied == w * h * 3
+
+
+def test_convert_reuses_output_and_keeps_bgra_for_4ch():
+    w, h = 16, 8
+    buf, img = _frame(w, h, w * 4)
+    conv = FrameConverter()
+    a = conv.convert(buf, w, h)
+    b = conv.convert(buf, w, h)
+    assert a is b
+    out = np.empty((h, w, 4), np.uint8)
+    assert np.array_equal(conv.convert_array(bgra_view(buf, w, h), out), img)
+
+
+def test_rgb_sink_passes_rgb():
+    _, img = _frame(8, 4, 32)
+    got = []
+    rgb_sink(lambda rgb, ts: got.append((rgb.copy(), ts)))(img, 1.5)
+    assert np.array_equal(got[0][0], img[:, :, 2::-1]) and got[0][1] == 1.5
@@ -0,0 +1,39 @@
+import numpy as np
+from capture_backend import Frame
+from dirty_tiles import TileDiff
+from frame_ring import FrameRing
+from pipeline import FramePipeline, clamp_crop, follow_resize
+
+
+def test_clamp_crop():
+    assert clamp_crop(None, 100, 50) == (0, 0, 100, 50)
+    assert clamp_crop((-5, -5, 200, 80), 100, 50) == (0, 0, 100, 50)
+    assert clamp_crop((120, 10, 130, 20), 100, 50) == (99, 10, 100, 20)   # 最低 1 画素は残す
+    assert clamp_crop((30, 20, 10, 5), 100, 50) == (30, 20, 31, 21)
+
+
+def test_follow_resize_moves_edges_touching_the_border():
+    assert follow_resize((10, 10, 100, 50), (100, 50), (160, 90)) == (10, 10, 160, 90)
+    assert follow_resize((10, 10, 60, 40), (100, 50), (160, 90)) == (10, 10, 60, 40)
+    assert follow_resize(None, (100, 50), (160, 90)) is None
+
+
+def test_pipeline_crop_matches_slice():
+    rng = np.random.default_rng(1)
+    img = rng.integers(0, 256, (60, 90, 4), np.uint8)
+    p = FramePipeline(FrameRing(3), diff=TileDiff(16))
+    p.set_crop((10, 5, 70, 45))
+    p.process(Frame(img, 90, 60))
+    i, out, _, _ = p.ring.borrow()
+    assert np.array_equal(out, img[5:45, 10:70, 2::-1])
+    p.ring.release(i)
+    assert p.crop_rect == (10, 5, 70, 45)
+    assert p.diff.grid == (3, 4)      # 変化検出もトリミング後の範囲だけ
+
+
+def test_crop_follows_source_resize():
+    p = FramePipeline(FrameRing(3))
+    p.set_crop((10, 10, 90, 60))
+    p.process(Frame(np.zeros((60, 90, 4), np.uint8), 90, 60))
+    p.process(Frame(np.zeros((80, 120, 4), np.uint8), 120, 80))
+    assert p.crop_rect == (10, 10, 120, 80)
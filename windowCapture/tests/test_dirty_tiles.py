@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+from capture_backend import Frame
+from dirty_tiles import TileDiff, tile_rects, merge_masks
+from frame_ring import FrameRing
+from pipeline import FramePipeline
+
+
+def _frames(w, h, n, seed=0):
+    """ランダムな背景に、毎フレームいくつかの小さな矩形を描き足していく"""
+    rng = np.random.default_rng(seed)
+    img = rng.integers(0, 256, (h, w, 4), np.uint8)
+    yield img.copy()
+    for _ in range(n - 1):
+        for _ in range(rng.integers(0, 4)):
+            x, y = rng.integers(0, w - 8), rng.integers(0, h - 8)
+            img[y:y + rng.integers(1, 8), x:x + rng.integers(1, 8)] = rng.integers(0, 256, 4, np.uint8)
+        yield img.copy()
+
+
+def _pipes(pixel_format="rgb", out_size=None):
+    pipes = []
+    for diff in (TileDiff(16), None):
+        p = FramePipeline(FrameRing(3, merge=merge_masks), diff=diff)
+        p.pixel_format = pixel_format
+        p.set_output_size(out_size)
+        pipes.append(p)
+    return pipes
+
+
+@pytest.mark.parametrize("pixel_format", ["rgb", "bgra"])
+@pytest.mark.parametrize("out_size", [None, (40, 30)])
+def test_dirty_tile_output_equals_full_conversion(pixel_format, out_size):
+    h, w = 75, 101
+    tiled, full = _pipes(pixel_format, out_size)
+    held = None
+    for i, img in enumerate(_frames(w, h, 40)):
+        f = Frame(img, w, h)
+        tiled.process(f); full.process(f)
+        # 時々スロットを借りたままにして、使い回しの順序を変える
+        if held is not None and i % 3 == 0:
+            tiled.ring.release(held); held = None
+        a = tiled.ring.borrow(only_new=False)
+        b = full.ring.borrow(only_new=False)
+        assert np.array_equal(a[1], b[1]), f"frame {i}"
+        full.ring.release(b[0])
+        if held is None and i % 5 == 0: held = a[0]
+        else: tiled.ring.release(a[0])
+    assert tiled.bytes_written < full.bytes_written
+
+
+def test_unchanged_frames_are_skipped():
+    img = np.zeros((32, 32, 4), np.uint8)
+    p = FramePipeline(FrameRing(3), diff=TileDiff(16))
+    assert p.process(Frame(img, 32, 32)) is not None
+    assert p.process(Frame(img, 32, 32)) is None
+    assert p.skipped_frames == 1
+
+
+def test_tile_diff_mask_and_rects():
+    d = TileDiff(16)
+    a = np.zeros((40, 70, 4), np.uint8)
+    assert d.update(a) is None
+    b = a.copy()
+    b[3, 5] = 1; b[20, 66] = 1; b[39, 69] = 1
+    mask = d.update(b)
+    assert mask.shape == (3, 5)
+    assert sorted(zip(*np.nonzero(mask))) == [(0, 0), (1, 4), (2, 4)]
+    # 縦に続く同じ列はまとめられ、端のタイルはフレームの大きさで切られる
+    assert sorted(tile_rects(mask, 70, 40, 16)) == [(0, 0, 16, 16), (64, 16, 6, 24)]
+    assert not d.update(b).any()
+
+
+def test_merge_masks():
+    a = np.array([[True, False]]); b = np.array([[False, False]])
+    assert merge_masks(a, b).tolist() == [[True, False]]
+    assert merge_masks(a, None) is None
+    assert merge_masks(a, np.zeros((2, 2), bool)) is None
+
+
+def test_sinks_get_only_changed_frames_while_display_catches_up():
+    seen = []
+    p = FramePipeline(FrameRing(2), diff=TileDiff(16))
+    p.sinks.append(lambda bgra, ts: seen.append(ts))
+    a = np.zeros((32, 32, 4), np.uint8)
+    b = a.copy(); b[0, 0] = 9
+    held = []
+    for ts, img in enumerate((a, b)):
+        p.process(Frame(img, 32, 32, timestamp=ts))
+        held.append(p.ring.borrow()[0])
+    c = b.copy(); c[20, 20] = 9
+    assert p.process(Frame(c, 32, 32, timestamp=2)) is None     # 空きスロットが無い
+    for i in held: p.ring.release(i)
+    assert p.process(Frame(c, 32, 32, timestamp=3)) is not None    # 変化は無いが描き残しを描く
+    assert seen == [0, 1, 2]
+    assert p.process(Frame(c, 32, 32, timestamp=4)) is None and seen == [0, 1, 2]
@@ -0,0 +1,97 @@
+import threading, time
+import numpy as np
+import pytest
+from capture_backend import ReplayBackend
+from frame_file import FrameFileReader, FrameFileWriter
+from recorder import FrameRecorder
+
+
+def _frames(n, sizes=((64, 48),), seed=0):
+    """(bgra, timestamp)。途中でサイズが変わり、毎フレーム一部だけ変わる"""
+    rng = np.random.default_rng(seed)
+    img = None
+    for i in range(n):
+        w, h = sizes[i * len(sizes) // n]
+        if img is None or img.shape != (h, w, 4):
+            img = rng.integers(0, 256, (h, w, 4), np.uint8)
+        x, y = rng.integers(0, w - 4), rng.integers(0, h - 4)
+        img[y:y + 4, x:x + 4] = rng.integers(0, 256, 4, np.uint8)
+        yield img.copy(), 0.01 * i
+
+
+def _read(r, i):
+    data, w, h, stride, ts = r.frame(i)
+    img = np.ndarray((h, w, 4), np.uint8, data, strides=(stride, 4, 1)).copy()
+    data.release()
+    return img, ts
+
+
+@pytest.mark.parametrize("codec,compress", [("raw", None), ("raw", "zlib"), ("delta", None), ("delta", "zlib")])
+def test_recorder_round_trip(tmp_path, codec, compress):
+    path = str(tmp_path / "a.wcap")
+    frames = list(_frames(30, ((64, 48), (80, 40))))
+    rec = FrameRecorder(path, queue_size=64, codec=codec, compress=compress, keyint=7, tile=16)
+    for img, ts in frames: assert rec(img, ts)
+    rec.close()
+    assert rec.stats()["written"] == 30 and rec.stats()["dropped"] == 0
+    r = FrameFileReader(path)
+    assert len(r) == 30
+    for i, (img, ts) in enumerate(frames):
+        got, t = _read(r, i)
+        assert t == ts and np.array_equal(got, img), i
+    # 差分でも任意の位置から読める(直前の KEY から復元する)
+    for i in (29, 3, 17, 16, 0):
+        assert np.array_equal(_read(r, i)[0], frames[i][0]), i
+    assert r.seek(0.105) == 10 and r.seek(-1) == 0
+    r.close()
+
+
+def test_truncated_tail_is_ignored(tmp_path):
+    path = str(tmp_path / "a.wcap")
+    with FrameFileWriter(path) as w:
+        for img, ts in _frames(3): w.write(img, ts)
+    with open(path, "r+b") as f:
+        f.truncate(f.seek(0, 2) - 10)
+    r = FrameFileReader(path)
+    assert len(r) == 2
+    r.close()
+
+
+def test_replay_backend_returns_recorded_frames(tmp_path):
+    path = str(tmp_path / "a.wcap")
+    frames = list(_frames(5))
+    with FrameFileWriter(path, codec="delta") as w:
+        for img, ts in frames: w.write(img, ts)
+    b = ReplayBackend(path, realtime=False, loop=False)
+    b.open(); b.start()
+    got = []
+    while True:
+        f = b.next_frame()
+        if f is None: break
+        got.append((f.bgra().copy(), f.timestamp))
+        f.close()
+    b.stop(); b.close()
+    assert len(got) == 5
+    for (a, ta), (e, te) in zip(got, frames):
+        assert ta == te and np.array_equal(a, e)
+
+
+@pytest.mark.parametrize("drop,kept", [("oldest", [0, 3, 4]), ("newest", [0, 1, 2])])
+def test_drop_policy_bounds_queue(tmp_path, drop, kept):
+    path = str(tmp_path / "a.wcap")
+    rec = FrameRecorder(path, queue_size=2, drop=drop)
+    gate = threading.Event()
+    write = rec.writer.write
+    rec.writer.write = lambda bgra, ts: (gate.wait(), write(bgra, ts))
+    frames = list(_frames(5))
+    rec(*frames[0])
+    while rec._queue: time.sleep(0.001)      # 1 枚目を書き込み中で止める
+    for img, ts in frames[1:]: rec(img, ts)
+    gate.set()
+    rec.close()
+    assert rec.dropped == 2 and rec.stats()["queue_max"] == 2
+    r = FrameFileReader(path)
+    assert [round(t * 100) for t in r.timestamps] == kept
+    r.close()
+    with pytest.raises(ValueError):
+        FrameRecorder(str(tmp_path / "b.wcap"), drop="bogus")
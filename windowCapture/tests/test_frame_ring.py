@@ -0,0 +1,109 @@
+import threading
+import numpy as np
+import pytest
+from frame_ring import FrameRing
+from dirty_tiles import merge_masks
+
+
+def _push(ring, value, meta=None, shape=(4, 4, 4)):
+    i, arr = ring.acquire_write(shape)
+    arr[...] = value
+    return ring.publish(i, meta)
+
+
+def test_needs_two_slots():
+    with pytest.raises(ValueError):
+        FrameRing(1)
+
+
+def test_borrow_returns_latest_once():
+    ring = FrameRing(3)
+    assert ring.borrow() is None
+    _push(ring, 1)
+    seq = _push(ring, 2)
+    i, arr, s, _ = ring.borrow()
+    assert s == seq and (arr == 2).all()
+    assert ring.borrow() is None                    # 同じフレームは 2 度来ない
+    assert ring.borrow(only_new=False)[2] == seq
+    ring.release(i); ring.release(i)
+    assert ring.stats()["drops"] == 1               # 1 は読まれずに置き換えられた
+    with pytest.raises(RuntimeError):
+        ring.release(i)
+
+
+def test_borrowed_slot_is_never_written():
+    ring = FrameRing(2)
+    _push(ring, 7)
+    i, arr, _, _ = ring.borrow()
+    for v in range(10):                             # 読み出し中でも書き込みは止まらない
+        _push(ring, v)
+    assert (arr == 7).all()
+    # 2 スロットとも塞がると書き込みを諦める
+    j, _, _, _ = ring.borrow()
+    assert ring.acquire_write((4, 4, 4), timeout=0.0) is None and ring.skipped == 1
+    ring.release(i); ring.release(j)
+    assert ring.acquire_write((4, 4, 4), timeout=0.0) is not None
+
+
+def test_write_must_be_published_or_aborted():
+    ring = FrameRing(2)
+    i, _ = ring.acquire_write((2, 2))
+    with pytest.raises(RuntimeError):
+        ring.acquire_write((2, 2))
+    ring.abort(i)
+    i, _ = ring.acquire_write((2, 2))
+    with pytest.raises(RuntimeError):
+        ring.publish(1 - i)
+
+
+def test_dropped_frame_masks_are_merged():
+    ring = FrameRing(3, merge=merge_masks)
+    a = np.zeros((2, 2), bool); a[0, 0] = True
+    b = np.zeros((2, 2), bool); b[1, 1] = True
+    _push(ring, 1, a)
+    _push(ring, 2, b)                               # a は読まれずに捨てられる
+    *_, meta = ring.borrow()
+    np.testing.assert_array_equal(meta, a | b)
+
+
+def test_slots_are_reused_without_allocating():
+    ring = FrameRing(3)
+    for v in range(20):
+        _push(ring, v)
+        i, *_ = ring.borrow()
+        ring.release(i)
+    allocs = ring.allocs
+    for v in range(20):
+        _push(ring, v, shape=(2, 4, 4))             # 小さくなっても同じバッファから切り出す
+        i, *_ = ring.borrow()
+        ring.release(i)
+    assert ring.allocs == allocs <= 3
+
+
+def test_concurrent_reader_sees_complete_frames():
+    ring = FrameRing(3)
+    stop = threading.Event()
+    torn = []
+
+    def writer():
+        v = 0
+        while not stop.is_set():
+            r = ring.acquire_write((64, 64))
+            if r is None: continue
+            i, arr = r
+            v = (v + 1) % 256
+            arr[...] = v
+            ring.publish(i)
+
+    th = threading.Thread(target=writer)
+    th.start()
+    try:
+        for _ in range(2000):
+            got = ring.borrow()
+            if got is None: continue
+            i, arr, _, _ = got
+            if not (arr == arr.flat[0]).all(): torn.append(i)
+            ring.release(i)
+    finally:
+        stop.set(); th.join()
+    assert torn == [] and ring.published > 0
@@ -0,0 +1,67 @@
+import pytest
+from governor import ChangeRatePolicy, ChangeTraceWriter, RateGovernor, load_trace, make_trace, simulate
+
+
+@pytest.mark.parametrize("kw", [dict(window=0), dict(window=-1), dict(half_life=0)])
+def test_change_rate_policy_rejects_non_positive_windows(kw):
+    with pytest.raises(ValueError):
+        ChangeRatePolicy(**kw)
+
+
+def test_quiet_source_drops_to_idle_and_a_blip_does_not_stick():
+    p = ChangeRatePolicy(max_fps=60, idle_fps=10, half_life=0.3, quiet=0.25, probe=0.1)
+    t = 0.0
+    while t < 3.0:                                  # 変化なし
+        p.on_frame(False, t)
+        t += 1 / p.fps
+    assert p.fps == 10
+    assert p.on_frame(True, t) == 60 and p.attacks == 1     # 動き始めはすぐ上げる
+    t += 1 / 60
+    while t < 3.2:
+        p.on_frame(False, t)
+        t += 1 / 60
+    assert p.fps == 10 and p.blips == 1             # 1 回きりの変化なら元に戻す
+
+
+def test_make_trace_kinds():
+    t, c = make_trace("static", seconds=2, fps=60)
+    assert len(t) == 120 and not c.any()
+    assert make_trace("video:24", seconds=10)[1].sum() == 239
+    assert make_trace("clock", seconds=10)[1].sum() == 9
+    assert make_trace("game", seconds=1)[1][1:].all()
+    with pytest.raises(ValueError):
+        make_trace("film")
+
+
+def test_trace_file_round_trip(tmp_path):
+    path = str(tmp_path / "c.txt")
+    w = ChangeTraceWriter(path)
+    for i, changed in enumerate([0, 1, 1, 0]): w(bool(changed), 100.0 + i / 60)
+    w.close()
+    t, c = load_trace(path)
+    assert t[0] == 0.0 and abs(t[-1] - 3 / 60) < 1e-6 and list(c) == [False, True, True, False]
+
+
+def _governed(cpu_budget=None):
+    return lambda clock: RateGovernor(cpu_budget=cpu_budget, clock=clock, max_fps=60, idle_fps=10)
+
+
+def test_simulate_saves_cpu_on_static_content_only():
+    static = [make_trace("static", seconds=10)]
+    base, _ = simulate(static)
+    gov, _ = simulate(static, _governed())
+    assert base[0]["fetches"] == 600 and gov[0]["fetches"] < 600 / 4
+    game = [make_trace("game", seconds=10)]
+    base, _ = simulate(game)
+    gov, _ = simulate(game, _governed())
+    assert gov[0]["fetches"] >= 0.98 * base[0]["fetches"]   # 毎フレーム変わるなら間引かない
+    video, _ = simulate([make_trace("video:24", seconds=10)], _governed())
+    assert video[0]["fetches"] < 600 and video[0]["latency_max_ms"] < 1e3 / 24    # 動画のコマは落とさない
+
+
+def test_simulate_keeps_cpu_budget_and_priority():
+    traces = [make_trace("game", seconds=10), make_trace("game", seconds=10)]
+    out, gov = simulate(traces, _governed(cpu_budget=0.1), cost_ms=(2.0, 5.0), priorities={1: 3.0})
+    assert sum(r["cpu_s"] for r in out) / 10 <= 0.1 * 1.1     # 最初のコストが分かるまでの分だけ超える
+    assert out[1]["fetches"] > 2 * out[0]["fetches"]
+    assert gov.stats()["limited"] > 0
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+import gpu_reduce
+from gpu_reduce import plan_reduce, reduce_reference
+
+
+def test_plan_reduce_keeps_output_size_reachable():
+    assert plan_reduce((0, 0, 2560, 1440), (800, 480)) == ((0, 0, 2560, 1440), 1)
+    assert plan_reduce((0, 0, 3840, 2160), (800, 480)) == ((0, 0, 3840, 2160), 2)
+    assert plan_reduce((3, 5, 1003, 1006), (200, 100)) == ((3, 5, 1003, 1005), 2)   # 4 の倍数に切り詰める
+    assert plan_reduce((0, 0, 900, 500), (800, 480)) == ((0, 0, 900, 500), 0)
+    assert plan_reduce((0, 0, 900, 500), None) == ((0, 0, 900, 500), 0)
+
+
+@pytest.mark.parametrize("level", [1, 2, 3])
+def test_reference_is_within_level_of_box_mean(level):
+    f = 1 << level
+    src = np.random.default_rng(level).integers(0, 256, (8 * f, 12 * f, 4), np.uint8)
+    box = src.reshape(8, f, 12, f, 4).mean(axis=(1, 3))
+    assert np.abs(reduce_reference(src, level) - box).max() <= level
+
+
+def test_gpu_support_is_probed_and_reported_once(monkeypatch, capsys):
+    monkeypatch.setattr(gpu_reduce, "_support", None)
+    calls = []
+    monkeypatch.setattr(gpu_reduce, "_probe", lambda: calls.append(1) or (True, "ok"))
+    assert gpu_reduce.gpu_support() == (True, "ok")
+    assert gpu_reduce.gpu_support() == (True, "ok")
+    gpu_reduce.disable_gpu("read failed")
+    gpu_reduce.disable_gpu("read failed again")
+    assert gpu_reduce.gpu_support() == (False, "read failed")
+    assert len(calls) == 1
+    assert capsys.readouterr().out.count("GPU reduce:") == 2    # 確認時と無効にしたときの 1 回ずつ
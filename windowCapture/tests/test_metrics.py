@@ -0,0 +1,106 @@
+import threading
+from metrics import Histogram, Metrics, MetricsLogger
+
+
+class Clock:
+    def __init__(self): self.t = 0.0
+    def __call__(self): return self.t
+
+
+def test_histogram_percentiles_within_bucket():
+    h = Histogram()
+    for i in range(1, 1001): h.add(i * 1e-5)        # 10 µs 〜 10 ms
+    for p in (50, 95, 99):
+        want = p * 10 * 1e-5
+        assert want <= h.percentile(p) <= want * 2 ** (1 / Histogram.PER_OCTAVE) + 1e-12
+    assert h.percentile(100) == h.max == 1e-2
+    s = h.summary()
+    assert s["n"] == 1000 and abs(s["mean_ms"] - 5.005) < 1e-9
+
+
+def test_histogram_extremes():
+    h = Histogram()
+    assert h.percentile(50) == 0.0
+    h.add(0.0); h.add(1e9)                          # 範囲外も端のバケットに入る
+    assert h.n == 2 and h.max == 1e9 and h.counts[0] == h.counts[-1] == 1
+    assert h.percentile(50) == 1e-6
+
+
+def test_snapshot_rates_and_stage_order():
+    clock = Clock()
+    m = Metrics(clock=clock, rate_window=2.0)
+    m.gauge("state", lambda: "active")
+    m.gauge("broken", lambda: 1 / 0)                # 例外のゲージは飛ばす
+    m.add("zz_custom", 0.001); m.add("convert", 0.002); m.add("acquire", 0.003)
+    for _ in range(10):
+        clock.t += 0.1
+        m.count("frames_in")
+    s = m.snapshot()
+    assert list(s["stages"]) == ["acquire", "convert", "zz_custom"]
+    assert abs(s["rates"]["frames_in"] - 10 / 0.9) < 1e-9     # 最初は count していた区間で割る
+    assert s["values"]["state"] == "active" and "broken" not in s["values"]
+    clock.t += 1.0
+    m.count("frames_in", 5)
+    assert abs(m.snapshot()["rates"]["frames_in"] - 5.0) < 1e-9
+
+
+def test_snapshot_while_another_thread_adds_new_names():
+    m = Metrics()
+    stop = threading.Event()
+    errors = []
+    def writer():
+        i = 0
+        while not stop.is_set():
+            m.add(f"stage{i % 5000}", 1e-4)
+            m.count(f"c{i % 5000}")
+            i += 1
+            if i % 5000 == 0: m.reset()
+    th = threading.Thread(target=writer)
+    th.start()
+    try:
+        for _ in range(300):
+            try: m.snapshot()
+            except RuntimeError as e: errors.append(e)
+    finally:
+        stop.set(); th.join()
+    assert errors == []
+
+
+def test_pipeline_records_stages_only_when_enabled():
+    from capture_backend import SyntheticBackend
+    from dirty_tiles import TileDiff
+    from frame_ring import FrameRing
+    from pipeline import FramePipeline
+    b = SyntheticBackend(64, 32, fps=0, pattern="static")
+    b.start()
+    p = FramePipeline(FrameRing(3), diff=TileDiff(16))
+
+    def run():
+        f = b.next_frame()
+        try: return p.process(f)
+        finally: f.close()
+
+    assert run() is not None                        # metrics=None でも動く
+    m = p.metrics = Metrics()
+    run()                                           # 変化なし: 変換しない
+    p.set_output_size((32, 16))
+    b.pattern = "noise"
+    run()
+    s = m.snapshot()
+    assert s["values"]["frames_in"] == 2
+    assert s["stages"]["readback"]["n"] == s["stages"]["diff"]["n"] == 2
+    assert s["stages"]["scale"]["n"] == 1 and "convert" not in s["stages"]
+    lines = m.hud_lines(s)
+    assert lines[0].startswith("in ") and any(l.startswith("scale") for l in lines[2:])
+
+
+def test_logger_appends_json_lines(tmp_path):
+    import json, time
+    m = Metrics()
+    m.count("frames_in", 3)
+    path = tmp_path / "m.jsonl"
+    log = MetricsLogger(m, str(path), interval=0.01, run="a").start()
+    time.sleep(0.1)
+    log.stop()
+    rows = [json.loads(l) for l in path.read_text(encoding="utf-8").splitlines()]
+    assert rows and all(r["run"] == "a" and r["values"]["frames_in"] == 3 for r in rows)
@@ -0,0 +1,26 @@
+import argparse
+from overlay_options import OverlayOptions
+
+
+def test_from_args_picks_matching_names():
+    ns = argparse.Namespace(policy="max:30", crop=(1, 2, 3, 4), scale="quality", hud=True, readback_depth=2,
+                            stats_log=None, record="a.wcap", composite="grid")
+    o = OverlayOptions.from_args(ns, layout=ns.composite)
+    assert (o.policy, o.crop, o.scale, o.hud, o.readback_depth) == ("max:30", (1, 2, 3, 4), "quality", True, 2)
+    assert o.layout == "grid" and o.stats_log is None and o.keepalive == 1.0
+    assert not hasattr(o, "record")
+
+
+def test_numbered_output_paths():
+    from windowCapture import numbered
+    assert numbered("out.wcap", 0) == "out.wcap"
+    assert numbered("out.wcap", 2) == "out-2.wcap"
+    assert numbered("logs.d/trace", 1) == "logs.d/trace-1"
+
+
+def test_readback_depth_defaults_from_policy():
+    assert OverlayOptions().readback_depth_for() == 1
+    assert OverlayOptions(policy="max:30").readback_depth_for() == 1
+    assert OverlayOptions(policy="every").readback_depth_for() == 2
+    assert OverlayOptions(policy="latest", readback_depth=0).readback_depth_for() == 0
+    assert OverlayOptions(policy="latest", readback_depth=3).readback_depth_for() == 3
@@ -0,0 +1,197 @@
+import numpy as np
+import pytest
+from roi_watch import (RoiWatcher, MeanColor, AnyChange, HistogramDistance, TemplateMatch,
+                       color_histogram, predicate_from_spec)
+
+
+class Clock:
+    def __init__(self): self.t = 0.0
+    def __call__(self): return self.t
+
+
+def _frame(w=64, h=48, bgr=(0, 0, 0)):
+    img = np.zeros((h, w, 4), np.uint8)
+    img[..., :3] = bgr
+    img[..., 3] = 255
+    return img
+
+
+# ----- 確定(hold / release / cooldown) -----
+def test_hold_and_release():
+    clock = Clock()
+    w = RoiWatcher(clock=clock)
+    w.add("red", (0, 0, 8, 8), MeanColor((255, 0, 0), tol=10), hold=0.1, release=0.2)
+    red, black = _frame(bgr=(0, 0, 255)), _frame()
+    assert w.evaluate(red) == []                 # 成立したが hold 前
+    clock.t = 0.05; assert w.poll() == []
+    clock.t = 0.1
+    ev, = w.poll()
+    assert ev.name == "red" and ev.active and ev.timestamp == 0.1
+    clock.t = 0.2; assert w.evaluate(black) == []
+    clock.t = 0.3; assert w.evaluate(black) == []   # release 0.2 秒まではまだ成立
+    clock.t = 0.4
+    ev, = w.evaluate(black)
+    assert not ev.active and w.state("red") == (False, 255.0)
+
+
+def test_short_blip_is_ignored():
+    clock = Clock()
+    w = RoiWatcher(clock=clock)
+    w.add("red", (0, 0, 8, 8), MeanColor((255, 0, 0), tol=10), hold=0.1)
+    w.evaluate(_frame(bgr=(0, 0, 255)))
+    clock.t = 0.05; w.evaluate(_frame())
+    clock.t = 0.5
+    assert w.evaluate(_frame()) == [] and w.poll() == []
+
+
+def test_cooldown_delays_next_activation():
+    clock = Clock()
+    seen = []
+    w = RoiWatcher(clock=clock)
+    w.add("red", (0, 0, 8, 8), MeanColor((255, 0, 0), tol=10), callback=seen.append, cooldown=1.0)
+    red, black = _frame(bgr=(0, 0, 255)), _frame()
+    w.evaluate(red)
+    clock.t = 0.1; w.evaluate(black)
+    clock.t = 0.2; assert w.evaluate(red) == []
+    clock.t = 0.9; assert w.poll() == []
+    clock.t = 1.0; w.poll()
+    assert [(e.active, e.timestamp) for e in seen] == [(True, 0.0), (False, 0.1), (True, 1.0)]
+
+
+def test_callback_exception_does_not_stop_others():
+    clock = Clock()
+    seen = []
+    w = RoiWatcher(clock=clock)
+    w.add("a", (0, 0, 8, 8), AnyChange(), callback=lambda e: 1 / 0)
+    w.add("b", (8, 0, 16, 8), AnyChange(), callback=seen.append)
+    w.evaluate(_frame())
+    w.evaluate(_frame(bgr=(9, 9, 9)))
+    assert [e.name for e in seen] == ["b"] and w.stats()["events"] == 2
+
+
+# ----- まとめた判定と ROI ごとの判定が一致する -----
+def _naive(pred, roi, prev):
+    if isinstance(pred, MeanColor):
+        return float(np.abs(roi[..., :3].mean(axis=(0, 1)) - pred.bgr).max())
+    if isinstance(pred, AnyChange):
+        return 0.0 if prev is None else float(np.any(roi != prev, axis=2).mean())
+    if isinstance(pred, HistogramDistance):
+        h = color_histogram(roi, pred.bins)
+        return 0.5 * float(np.abs(h - (color_histogram(prev, pred.bins) if prev is not None else h)).sum())
+    return pred.score(roi)
+
+
+def test_batched_values_match_per_roi():
+    rng = np.random.default_rng(0)
+    tpl = lambda shape: rng.integers(0, 256, (*shape, 3), np.uint8)
+    rois = []
+    for i in range(36):
+        l, t = int(rng.integers(0, 100)), int(rng.integers(0, 60))
+        w, h = int(rng.integers(8, 20)), int(rng.integers(8, 20))
+        pred = [MeanColor((10, 200, 30)), AnyChange(), HistogramDistance(bins=4), HistogramDistance(bins=8),
+                TemplateMatch(tpl((6, 6))), TemplateMatch(tpl((4, 8)))][i % 6]
+        if isinstance(pred, TemplateMatch) and i % 3 == 1: w, h = 12, 12     # 同じ形のまとまりも作る
+        rois.append((f"r{i}", (l, t, l + w, t + h), pred))
+    watcher = RoiWatcher()
+    for name, rect, pred in rois: watcher.add(name, rect, pred)
+    frames = [rng.integers(0, 256, (96, 128, 4), np.uint8) for _ in range(3)]
+    frames[1][:40] = frames[0][:40]             # 変化の無い ROI も混ぜる
+    crop = lambda f: {n: f[t:b, l:r] for n, (l, t, r, b), _ in rois}
+    prev, first = {}, crop(frames[0])          # 変化は前のフレーム、ヒストグラムは最初のフレームと比べる
+    for f in frames:
+        watcher.evaluate(f)
+        for name, _, pred in rois:
+            ref = first[name] if isinstance(pred, HistogramDistance) else prev.get(name)
+            assert watcher.state(name)[1] == pytest.approx(_naive(pred, crop(f)[name], ref), abs=1e-4), name
+        prev = crop(f)
+
+
+def test_template_found_anywhere_in_roi():
+    rng = np.random.default_rng(1)
+    tpl = rng.integers(0, 256, (8, 8, 3), np.uint8)
+    img = _frame(bgr=(40, 40, 40))
+    img[20:28, 33:41, :3] = tpl[..., ::-1]
+    w = RoiWatcher()
+    w.add("hit", (30, 15, 50, 35), TemplateMatch(tpl, 0.95))
+    w.add("miss", (0, 0, 20, 20), TemplateMatch(tpl, 0.95))
+    w.evaluate(img)
+    assert w.state("hit") == (True, pytest.approx(1.0, abs=1e-4))
+    assert w.state("miss") == (False, 0.0)      # 平坦な ROI は 0 点
+
+
+def test_template_larger_than_roi_is_rejected():
+    w = RoiWatcher()
+    with pytest.raises(ValueError):
+        w.add("small", (0, 0, 4, 4), TemplateMatch(np.zeros((6, 6, 3), np.uint8)))
+
+
+# ----- トリミング範囲からはみ出した ROI -----
+def test_outside_roi_is_skipped_and_reprimed():
+    w = RoiWatcher()
+    w.add("c", (40, 0, 48, 8), AnyChange())
+    full = _frame()
+    w.evaluate(full)
+    w.evaluate(full[:, :32])                    # はみ出したので判定しない
+    assert w.stats()["outside"] == 1 and w.state("c") == (False, 0.0)
+    w.evaluate(_frame(bgr=(200, 0, 0)))         # 戻った最初は比べる相手が無い
+    assert w.state("c") == (False, 0.0)
+    w.evaluate(_frame(bgr=(0, 200, 0)))
+    assert w.state("c") == (True, 1.0)
+
+
+def test_origin_shifts_roi_coordinates():
+    w = RoiWatcher()
+    w.add("m", (20, 10, 28, 18), MeanColor((0, 255, 0), tol=5))
+    img = _frame(32, 32)
+    img[5:13, 10:18, 1] = 255
+    w.evaluate(img, origin=(10, 5))
+    assert w.state("m")[0]
+
+
+# ----- 予算 -----
+def test_budget_rotates_through_all_rois():
+    w = RoiWatcher(budget_ms=1e-6)              # 1 フレームに 1 個しか入らない
+    for i in range(5): w.add(f"r{i}", (i * 8, 0, i * 8 + 8, 8), MeanColor((0, 0, 0)))
+    img = _frame()
+    for _ in range(4): w.evaluate(img)
+    evals = [w._rois[f"r{i}"].evals for i in range(5)]
+    assert evals == [1, 1, 1, 1, 0]
+    w.evaluate(img)
+    assert [w._rois[f"r{i}"].evals for i in range(5)] == [1] * 5
+    s = w.stats()
+    assert s["roi_evals"] == 5 and s["skipped"] == 20
+
+
+def test_unlimited_budget_evaluates_everything():
+    w = RoiWatcher()
+    for i in range(5): w.add(f"r{i}", (i * 8, 0, i * 8 + 8, 8), MeanColor((0, 0, 0)))
+    w.evaluate(_frame())
+    assert w.stats()["roi_evals"] == 5 and w.stats()["skipped"] == 0
+
+
+def test_predicate_from_spec(tmp_path):
+    np.save(tmp_path / "icon.npy", np.zeros((4, 4, 3), np.uint8))
+    assert isinstance(predicate_from_spec({"mean": [1, 2, 3]}), MeanColor)
+    assert predicate_from_spec({"hist": 0.3, "bins": 4}).bins == 4
+    assert predicate_from_spec({"template": str(tmp_path / "icon.npy")}).shape == (4, 4)
+    with pytest.raises(ValueError):
+        predicate_from_spec({"nope": 1})
+
+
+# ----- ROI の追加・削除で他の ROI の基準が変わらない -----
+def test_learned_reference_survives_adding_rois():
+    seen = []
+    w = RoiWatcher()
+    w.add("hist", (0, 0, 16, 16), HistogramDistance(0.5), callback=seen.append)
+    w.add("chg", (16, 0, 32, 16), AnyChange())
+    w.evaluate(_frame())                        # 黒を基準に覚える
+    w.evaluate(_frame(bgr=(0, 0, 255)))
+    assert w.state("hist") == (True, 1.0)
+    w.add("other", (32, 0, 40, 8), MeanColor((0, 0, 0)))
+    w.evaluate(_frame(bgr=(0, 0, 255)))
+    assert w.state("hist") == (True, 1.0)       # 赤の今を基準に覚え直さない
+    assert w.state("chg") == (False, 0.0)       # 前回(赤)と同じ
+    w.remove("other")
+    w.evaluate(_frame(bgr=(0, 255, 0)))
+    assert w.state("chg") == (True, 1.0)        # 前回の画素も引き継ぐ
+    assert [e.active for e in seen] == [True]
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from scale import Scaler
+
+
+def _box_mean(src, fy, fx):
+    """fy x fx 四方の単純平均(float)"""
+    h, w = src.shape[0] // fy, src.shape[1] // fx
+    return src[:h * fy, :w * fx].reshape(h, fy, w, fx, 4).mean(axis=(1, 3))
+
+
+def _src(h, w, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, (h, w, 4), np.uint8)
+
+
+@pytest.mark.parametrize("f", [(2, 2), (4, 4), (3, 3), (2, 5), (17, 17)])
+@pytest.mark.parametrize("mode", ["fast", "quality"])
+def test_integer_factor_matches_box_mean(f, mode):
+    fy, fx = f
+    src = _src(12 * fy, 10 * fx)
+    out = np.empty((12, 10, 3), np.uint8)
+    Scaler(mode).scale(src, out)
+    ref = _box_mean(src, fy, fx)[:, :, 2::-1]
+    assert np.abs(out - ref).max() <= 0.5      # 四捨五入の差だけ
+
+
+def test_bgra_output_keeps_channel_order():
+    src = _src(40, 40)
+    out = np.empty((20, 20, 4), np.uint8)
+    Scaler().scale(src, out)
+    assert np.abs(out - _box_mean(src, 2, 2)).max() <= 0.5
+
+
+@pytest.mark.parametrize("mode", ["fast", "quality"])
+def test_fractional_scale_stays_in_source_range(mode):
+    # 端数は補間なので、出力は対応する 2x2 ブロック平均の周辺に収まる
+    src = np.zeros((90, 120, 4), np.uint8)
+    src[:, 60:] = 200
+    out = np.empty((40, 50, 3), np.uint8)
+    Scaler(mode).scale(src, out)
+    assert out[:, :20].max() == 0 and out[:, 30:].min() == 200
+
+
+@pytest.mark.parametrize("mode", ["fast", "quality"])
+@pytest.mark.parametrize("dst", [(30, 40), (25, 33)])
+def test_rect_update_equals_full_scale(mode, dst):
+    src = _src(100, 130, 3)
+    full = np.empty(dst + (3,), np.uint8)
+    s = Scaler(mode)
+    s.scale(src, full)
+    part = np.zeros_like(full)
+    for rect in [(0, 0, 16, 16), (16, 0, dst[1] - 16, 16), (0, 16, dst[1], dst[0] - 16)]:
+        s.scale(src, part, rect)
+    assert np.array_equal(part, full)
+
+
+def test_map_mask_covers_changed_source_tiles():
+    s = Scaler()
+    mask = np.zeros((4, 4), bool)
+    mask[2, 3] = True
+    m = s.map_mask(mask, (256, 256), (128, 128), 64, 16)
+    src = _src(256, 256)
+    a, b = np.empty((128, 128, 3), np.uint8), np.empty((128, 128, 3), np.uint8)
+    s.scale(src, a)
+    src[128:192, 192:256] ^= 0xFF
+    s.scale(src, b)
+    changed = np.abs(a.astype(int) - b).any(axis=2)
+    ty, tx = np.nonzero(changed)
+    assert m[ty // 16, tx // 16].all() and m.sum() == 4     # 64 四方 → 32 四方 = 出力 2x2 タイル
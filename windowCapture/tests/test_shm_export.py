@@ -0,0 +1,104 @@
+import os, time
+import multiprocessing as mp
+import numpy as np
+import pytest
+from multiprocessing import shared_memory
+from shm_export import SharedFramePublisher, SharedFrameReader, FMT_RGB
+
+
+def _name(tag):
+    return f"wctest{os.getpid()}{tag}"
+
+
+def _writer(name, seconds, ready):
+    """全画素を seq の下位バイトで埋めたフレームを、待たずに書き続ける"""
+    pub = SharedFramePublisher(name, slots=2)
+    arr = np.empty((120, 160, 4), np.uint8)
+    ready.set()
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        arr.fill((pub.seq + 1) & 0xFF)
+        pub.publish(arr, time.monotonic())
+    time.sleep(0.2)             # 読み手が最後の付け替えを終えるまで消さない
+    pub.close()
+
+
+def test_reader_never_sees_a_torn_frame():
+    name = _name("torn")
+    ctx = mp.get_context("fork")
+    ready = ctx.Event()
+    p = ctx.Process(target=_writer, args=(name, 1.5, ready))
+    p.start()
+    try:
+        assert ready.wait(10)
+        r = SharedFrameReader(name)
+        ok = rejected = 0
+        end = time.monotonic() + 1.0
+        while time.monotonic() < end:
+            f = r.latest()
+            if f is None: continue
+            a = f.copy()
+            if a is None:
+                rejected += 1
+            else:
+                # seqlock を通ったコピーは 1 フレーム分だけで、seq とも一致する
+                assert a.min() == a.max() == f.seq & 0xFF, (f.seq, a.min(), a.max())
+                ok += 1
+            del f
+        r.close()
+    finally:
+        p.join(10)
+    assert ok > 0
+    assert p.exitcode == 0
+
+
+def test_overwritten_frame_is_invalid():
+    name = _name("ovr")
+    pub = SharedFramePublisher(name, slots=2)
+    try:
+        r = SharedFrameReader(name)
+        pub.publish(np.full((4, 4, 3), 1, np.uint8), 1.0, FMT_RGB)
+        f = r.latest()
+        assert f.valid() and f.seq == 1 and f.copy()[0, 0, 0] == 1
+        pub.publish(np.full((4, 4, 3), 2, np.uint8), 2.0, FMT_RGB)
+        assert f.valid()                     # 別のスロットに書かれた
+        pub.publish(np.full((4, 4, 3), 3, np.uint8), 3.0, FMT_RGB)
+        assert not f.valid() and f.copy() is None
+        del f
+        r.close()
+    finally:
+        pub.close()
+
+
+def test_reader_follows_segment_growth_and_closes_with_live_views():
+    name = _name("grow")
+    pub = SharedFramePublisher(name)
+    try:
+        r = SharedFrameReader(name)
+        pub.publish(np.zeros((8, 8, 4), np.uint8), 0.0)
+        small = r.latest()
+        pub.publish(np.ones((64, 64, 4), np.uint8), 1.0)
+        f = r.latest()
+        assert pub.gen == 2 and f.array.shape == (64, 64, 4) and f.array.all()
+        r.close()                            # ビューが残っていても例外にしない
+        assert r.ctrl is None and r.data is None
+        del small, f
+    finally:
+        pub.close()
+
+
+def test_publisher_replaces_stale_segments():
+    name = _name("stale")
+    # 異常終了した書き込み側が残したセグメント(制御・データとも)
+    left = [shared_memory.SharedMemory(name=n, create=True, size=64) for n in (name, f"{name}.g1")]
+    for shm in left: shm.close()
+    pub = SharedFramePublisher(name)
+    try:
+        pub.publish(np.full((4, 4, 4), 7, np.uint8), 0.0)
+        r = SharedFrameReader(name)
+        assert r.latest().array[0, 0, 0] == 7
+        r.close()
+    finally:
+        pub.close()
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
@@ -0,0 +1,36 @@
+import argparse
+from windowCapture import Prewarm, capture_stack
+
+
+def _args(**kw):
+    a = dict(no_prewarm=False, governor=False, cpu_budget=None, idle_fps=10.0)
+    a.update(kw)
+    return argparse.Namespace(**a)
+
+
+def _stack(prewarm, args):
+    quit = []
+    manager, governor = capture_stack(prewarm, args, quit.append)
+    try:
+        assert manager.workers == 1 and len(manager._threads) == 1
+        assert quit[0] == manager.stop
+    finally:
+        for fn in quit: fn()
+    return manager, governor
+
+
+def test_no_prewarm_builds_stack_synchronously():
+    prewarm = Prewarm(workers=1, device=False)      # start しない
+    manager, governor = _stack(prewarm, _args(no_prewarm=True))
+    assert governor is None and not prewarm.is_alive()
+
+
+def test_prewarm_thread_result_is_reused():
+    prewarm = Prewarm(workers=1, device=False)
+    prewarm.start()
+    manager, governor = _stack(prewarm, _args(governor=True, cpu_budget=2.0))
+    assert prewarm.manager is manager and governor is not None
+
+
+def test_result_without_run_still_returns_manager():
+    assert Prewarm(workers=1, device=False).result().workers == 1
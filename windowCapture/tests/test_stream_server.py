@@ -0,0 +1,93 @@
+import asyncio, threading, time
+import numpy as np
+from stream_server import StreamServer, StreamClient, QualityController, KEY, DELTA
+
+
+def _img(w, h, seed):
+    return np.random.default_rng(seed).integers(0, 256, (h, w, 4), np.uint8)
+
+
+async def _receive(c, timeout=5.0):
+    return await asyncio.wait_for(c.receive(), timeout)
+
+
+def test_quality_controller_downgrades_and_recovers():
+    q = QualityController(levels=3, max_fps=60, min_fps=5, low_water=1000, patience=3)
+    changed = [q.on_sent(0.0, 10_000) for _ in range(30)]        # 詰まり続ける
+    assert q.level == 2 and q.downgrades == 2 and changed.count(True) == 2
+    assert 5 <= q.fps <= 60
+    changed = [q.on_sent(0.0, 0) for _ in range(200)]           # 空いた
+    assert q.level == 0 and q.upgrades == 2 and q.fps == 60
+    assert q.set_min_level(1) and q.level == 1
+    for _ in range(200): q.on_sent(0.0, 0)
+    assert q.level == 1                             # 下限より良くはしない
+
+
+def test_keyframe_then_changed_tiles_only():
+    srv = StreamServer(tile=16, compress=1)
+    addr = srv.start()
+    a = _img(40, 24, 0)
+
+    async def run():
+        c = await StreamClient().connect(*addr)
+        while not srv._clients: await asyncio.sleep(0.01)
+        srv.submit(a, 1.0)
+        img = await _receive(c)
+        assert c.decoder.keyframes == 1 and np.array_equal(img, a)
+        b = a.copy()
+        b[20, 35] ^= 0xFF                           # 右下の切れたタイル 1 つだけ
+        srv.submit(b, 2.0)
+        n = c.bytes
+        img = await _receive(c)
+        assert np.array_equal(img, b) and c.decoder.timestamp == 2.0
+        assert c.decoder.keyframes == 1 and c.bytes - n < 16 * 16 * 4
+        c.set_min_level(1)                          # 品質段を変えたら新しい段のキーフレーム
+        img = await _receive(c)
+        assert c.decoder.level == 1 and img.shape == (12, 20, 4) and c.decoder.keyframes == 2
+        await c.close()
+
+    try:
+        asyncio.run(run())
+    finally:
+        srv.close()
+    assert srv.stats()["encoded"] >= 3
+
+
+def test_slow_client_is_downgraded_without_blocking_fast_one():
+    srv = StreamServer(tile=32, levels=3, compress=0, max_fps=30, sndbuf=32 * 1024, high_water=32 * 1024)
+    addr = srv.start()
+    stop = threading.Event()
+    frames = [_img(320, 192, 0) for _ in range(4)]
+    for s, f in enumerate(frames): f[:96, :160] = _img(160, 96, s + 1)     # 毎フレーム 1/4 が変わる
+
+    def feed():
+        i = 0
+        while not stop.is_set():
+            srv.submit(frames[i % 4], time.monotonic())
+            i += 1
+            time.sleep(1 / 30)
+
+    async def client(rate, rcvbuf, seconds, out):
+        c = await StreamClient(rate).connect(*addr, rcvbuf=rcvbuf)
+        t0 = time.monotonic()
+        while time.monotonic() - t0 < seconds:
+            if await _receive(c) is None: break
+        out[rate] = c.decoder
+        await c.close()
+
+    out = {}
+    th = threading.Thread(target=feed, daemon=True)
+    th.start()
+    try:
+        async def both():
+            await asyncio.gather(client(None, None, 3.0, out), client(200e3, 16 * 1024, 3.0, out))
+        asyncio.run(both())
+    finally:
+        stop.set(); th.join()
+        srv.close()
+    fast, slow = out[None], out[200e3]
+    assert fast.level == 0 and fast.messages >= 3 * 10     # 遅いクライアントに引きずられない
+    assert slow.level > 0 and slow.messages < fast.messages
+    fast_side, slow_side = sorted(srv.finished, key=lambda c: c["downgrades"])
+    assert fast_side["downgrades"] == 0 and fast_side["level"] == 0
+    assert slow_side["downgrades"] >= 1 and slow_side["coalesced"] > 0     # 待つ間のフレームはまとめた
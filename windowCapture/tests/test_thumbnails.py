@@ -0,0 +1,115 @@
+import numpy as np
+from thumbnails import ThumbnailCache, ThumbnailScheduler, fit_size
+from window_index import FakeWindowProvider
+
+
+class Clock:
+    def __init__(self): self.t = 0.0
+    def __call__(self): return self.t
+
+
+def _provider(n, size=(1000, 1000)):
+    return FakeWindowProvider({h: {"size": size} for h in range(1, n + 1)})
+
+
+def _run(s, clock, seconds):
+    """step() を回し、待てと言われた分だけ時計を進める。取った hwnd の順を返す"""
+    order = []
+    end = clock.t + seconds
+    for _ in range(10000):                         # 予算が効かず時計が進まなくても止まるように
+        if clock.t >= end: break
+        seq = s.cache.seq
+        wait = s.step()
+        if wait is None: break
+        if s.cache.seq != seq: order.append(s.cache.changed(seq)[0].hwnd)
+        clock.t += wait
+    return order
+
+
+def test_fit_size_keeps_aspect_and_never_enlarges():
+    assert fit_size(1600, 900, 160, 100) == (160, 90)
+    assert fit_size(400, 1000, 160, 100) == (40, 100)
+    assert fit_size(50, 20, 160, 100) == (50, 20)
+
+
+# ----- 予算 -----
+def test_pixel_rate_stays_within_budget():
+    clock = Clock()
+    s = ThumbnailScheduler(_provider(12), budget=4e6, burst=0.25, min_interval=0.0, clock=clock)
+    s.set_targets(range(1, 13), visible=range(1, 13))
+    _run(s, clock, 5.0)
+    # 最初に貯まっている burst 分 + 1 秒あたり budget
+    assert s.pixels <= 4e6 * clock.t + 4e6 * 0.25 + 1
+    assert s.pixels >= 4e6 * (clock.t - 0.5)
+    assert s.thumb_pixels == s.grabs * 100 * 100
+
+
+def test_window_larger_than_burst_is_taken_when_bucket_full():
+    clock = Clock()
+    s = ThumbnailScheduler(_provider(2, size=(4000, 3000)), budget=1e6, burst=0.25, min_interval=0.0, clock=clock)
+    s.set_targets([1, 2], visible=[1, 2])
+    assert s.step() == 0.0 and s.grabs == 1         # 満タンなら 1 枚は取れる
+    wait = s.step()
+    assert wait > 0 and s.grabs == 1                # 借りを返すまで次は取らない
+    assert _run(s, clock, 12.1 + 0.25) == [2]
+
+
+# ----- 順番 -----
+def test_visible_windows_come_first():
+    clock = Clock()
+    s = ThumbnailScheduler(_provider(20, size=(100, 100)), budget=1e9, clock=clock)
+    s.set_targets(range(1, 21), visible=[15, 7])
+    order = _run(s, clock, 0.1)
+    assert order[:2] == [15, 7] and sorted(order) == list(range(1, 21))
+
+
+def test_prefetch_stops_when_cache_is_full():
+    clock = Clock()
+    s = ThumbnailScheduler(_provider(10, size=(100, 100)), cache=ThumbnailCache(4), budget=1e9,
+                           min_interval=1.0, clock=clock)
+    s.set_targets(range(1, 11), visible=[9, 10])
+    order = _run(s, clock, 0.5)
+    assert order == [9, 10, 1, 2]                   # 表示中 2 枚 + 空きの分だけ先読み
+    assert 9 in s.cache and 10 in s.cache
+
+
+def test_visible_rotate_oldest_first_with_min_interval():
+    clock = Clock()
+    s = ThumbnailScheduler(_provider(3, size=(100, 100)), budget=1e9, min_interval=0.5, clock=clock)
+    s.set_targets([1, 2, 3], visible=[1, 2, 3])
+    assert _run(s, clock, 0.01) == [1, 2, 3]
+    assert clock.t == 0.5                           # 揃ったら min_interval 待つ
+    assert _run(s, clock, 1.0) == [1, 2, 3, 1, 2, 3]
+
+
+def test_failed_grab_is_counted_and_not_retried_immediately():
+    clock = Clock()
+    p = _provider(2, size=(100, 100))
+    s = ThumbnailScheduler(p, budget=1e9, min_interval=1.0, clock=clock)
+    s.set_targets([1, 2], visible=[1, 2])
+    del p.windows[1]                                # 一覧を取った後に閉じた
+    assert _run(s, clock, 0.5) == [2]
+    assert s.failures == 1 and p.calls["size"] == 2
+
+
+def test_targets_removed_are_forgotten():
+    clock = Clock()
+    s = ThumbnailScheduler(_provider(3, size=(100, 100)), budget=1e9, clock=clock)
+    s.set_targets([1, 2, 3], visible=[1, 2, 3])
+    _run(s, clock, 0.01)
+    s.set_targets([1], visible=[1, 3])              # 一覧に無いものは表示中にも入れない
+    assert s._visible == [1] and set(s._tried) == {1}
+
+
+# ----- キャッシュ -----
+def test_cache_lru_and_retain():
+    c = ThumbnailCache(3)
+    img = np.zeros((2, 2, 4), np.uint8)
+    for h in (1, 2, 3): c.put(h, img, (2, 2))
+    assert c.get(1) is not None                     # 1 が新しい側へ
+    c.put(4, img, (2, 2))
+    assert 2 not in c and c.evicted == 1
+    assert c.retain([1, 4]) == [3]                  # 消えた 3 は一番古い側へ
+    c.put(5, img, (2, 2))
+    assert 3 not in c and 1 in c and 4 in c
+    assert [t.hwnd for t in c.changed(c.seq - 1)] == [5]
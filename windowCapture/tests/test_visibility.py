@@ -0,0 +1,73 @@
+import pytest
+from capture_scheduler import CaptureScheduler
+from visibility import VisibilityThrottle, classify, ACTIVE, HIDDEN, MINIMIZED, GONE
+
+
+class Clock:
+    def __init__(self): self.t = 0.0
+    def __call__(self): return self.t
+
+
+class _Pipe:
+    def __init__(self): self.display, self.sinks = True, []
+
+
+def _throttle(policy="latest", **kw):
+    clock = Clock()
+    sched = CaptureScheduler(policy, clock=clock)
+    return VisibilityThrottle(sched, _Pipe(), clock=clock, **kw), sched, clock
+
+
+def test_classify_precedence():
+    assert classify() == ACTIVE
+    assert classify(view_visible=False) == HIDDEN
+    assert classify(target_minimized=True, view_visible=False) == MINIMIZED
+    assert classify(target_visible=False) == MINIMIZED
+    assert classify(target_alive=False, target_minimized=True) == GONE
+
+
+def test_hidden_stops_display_and_falls_back_to_keepalive():
+    v, sched, _ = _throttle(keepalive=2.0)
+    assert v.update(view_visible=False) == HIDDEN
+    assert not v.pipeline.display and repr(sched.policy) == "max:0.5"
+    assert v.update(view_visible=True) == ACTIVE
+    assert v.pipeline.display and repr(sched.policy) == "latest"
+
+
+def test_hidden_with_sinks_keeps_capturing():
+    v, sched, _ = _throttle("every")
+    v.pipeline.sinks.append(lambda img, ts: None)
+    v.update(view_visible=False)
+    assert not v.pipeline.display and repr(sched.policy) == "every"
+    v.update(target_minimized=True)                 # 最小化ならシンクがあっても keepalive
+    assert repr(sched.policy) == "max:1"
+
+
+def test_keepalive_never_raises_a_lower_fps_cap():
+    v, sched, _ = _throttle("max:0.2", keepalive=1.0)
+    v.update(target_visible=False)
+    assert repr(sched.policy) == "max:0.2"
+
+
+def test_policy_changed_while_active_is_restored():
+    v, sched, _ = _throttle()
+    sched.set_policy("max:30")
+    v.update(target_alive=False)
+    v.update(target_alive=True)
+    assert repr(sched.policy) == "max:30"
+
+
+def test_listeners_and_time_in_state():
+    v, _, clock = _throttle()
+    seen = []
+    v.listeners.append(lambda old, new: seen.append((old, new)))
+    clock.t = 3.0
+    v.update(view_visible=False)
+    v.update(view_visible=False)                    # 変わらなければ何もしない
+    clock.t = 4.5
+    v.update(view_visible=True)
+    clock.t = 5.0
+    assert seen == [(ACTIVE, HIDDEN), (HIDDEN, ACTIVE)]
+    assert v.stats() == {"state": ACTIVE, "transitions": 2, "seconds": {ACTIVE: 3.5, HIDDEN: 1.5}}
+    with pytest.raises(TypeError):
+        v.update(focused=True)
@@ -0,0 +1,77 @@
+from window_index import WindowIndex, FakeWindowProvider, fuzzy_score
+
+
+def _index(**kw):
+    p = FakeWindowProvider({1: {"pid": 10, "title": "Editor - a.txt"},
+                            2: {"pid": 10, "title": "Editor - b.txt"},
+                            3: {"pid": 20, "title": "Browser"}},
+                           {10: (1.0, "editor.exe"), 20: (2.0, "browser.exe")})
+    return WindowIndex(p, **kw), p
+
+
+def test_refresh_reports_added_removed_changed():
+    idx, p = _index()
+    assert idx.refresh() == ([1, 2, 3], [], [])
+    assert idx.list() == [(1, "editor.exe", "Editor - a.txt"), (2, "editor.exe", "Editor - b.txt"),
+                          (3, "browser.exe", "Browser")]
+    assert idx.refresh() == ([], [], [])
+    p.windows[2]["title"] = "Editor - c.txt"
+    del p.windows[3]
+    p.windows[4] = {"pid": 20, "title": "Browser 2"}
+    p.windows[1]["shown"] = False                   # 最小化・非表示は一覧から外れる
+    assert idx.refresh() == ([4], [1, 3], [2])
+    assert [w[0] for w in idx.list()] == [2, 4]
+
+
+def test_process_is_looked_up_once_per_pid():
+    idx, p = _index()
+    idx.refresh()
+    assert p.calls["process"] == 2 and p.calls["owner"] == 3
+    for _ in range(5): idx.refresh()
+    assert p.calls["process"] == 2 and p.calls["owner"] == 3
+    p.windows[5] = {"pid": 10, "title": "Editor - d.txt"}
+    idx.refresh()                                   # 既知の pid の新しいウィンドウは作成時刻だけ確かめる
+    assert p.calls["process"] == 2 and p.calls["create_time"] == 1
+    assert idx.windows[5].exe == "editor.exe"
+
+
+def test_reused_pid_is_detected_by_create_time():
+    idx, p = _index()
+    idx.refresh()
+    # pid 20 のプロセスが終わり、同じ pid の別のプロセスがウィンドウを出した(同じ refresh 間隔の中で)
+    del p.windows[3]
+    p.procs[20] = (9.0, "game.exe")
+    p.windows[6] = {"pid": 20, "title": "Game"}
+    assert idx.refresh() == ([6], [3], [])
+    assert idx.windows[6].exe == "game.exe"
+    assert p.calls["process"] == 3
+
+
+def test_vanished_process_and_window_closed_during_scan():
+    idx, p = _index()
+    p.windows[7] = {"pid": 99, "title": "Orphan"}   # プロセス情報が取れない
+    real = p.title
+    p.title = lambda h: real(h) if h != 2 else (_ for _ in ()).throw(OSError("gone"))
+    idx.refresh()
+    assert idx.windows[7].exe == "Unknown" and 2 not in idx.windows
+
+
+def test_filters_and_unique():
+    idx, p = _index(min_size=100, roots_only=True)
+    p.windows[8] = {"pid": 20, "title": "Tooltip", "size": (40, 20)}
+    p.windows[9] = {"pid": 20, "title": "Child", "root": False}
+    p.windows[10] = {"pid": 20, "title": "Browser"}
+    p.windows[11] = {"pid": 30, "title": "   "}     # タイトルが空白だけ
+    idx.refresh()
+    assert sorted(idx.windows) == [1, 2, 3, 10]
+    assert [w[0] for w in idx.list(unique=True)] == [1, 2, 3]
+
+
+def test_search_ranks_word_matches_first():
+    idx, _ = _index()
+    idx.refresh()
+    assert [w[0] for w in idx.search("brow")] == [3]
+    assert [w[0] for w in idx.search("b.txt")][0] == 2
+    assert idx.search("zzz") == [] and len(idx.search("  ")) == 3
+    assert fuzzy_score("ed", "editor") > fuzzy_score("ed", "shed")
+    assert fuzzy_score("edr", "editor") is not None and fuzzy_score("xq", "editor") is None
@@ -0,0 +1,49 @@
+import os
+import pytest
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+QtWidgets = pytest.importorskip("PyQt5.QtWidgets")
+from thumbnails import ThumbnailScheduler
+from window_index import WindowIndex, FakeWindowProvider
+from window_picker import WindowPicker
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+
+
+class _Sched(ThumbnailScheduler):
+    def set_targets(self, alive, visible=()):
+        self.last = list(alive), list(visible)
+        super().set_targets(alive, visible)
+
+
+def test_only_rows_in_viewport_are_visible_targets(app):
+    n = 200
+    p = FakeWindowProvider({h: {"pid": 1, "title": f"w{h}", "size": (800, 600)} for h in range(1, n + 1)},
+                           {1: (0.0, "app.exe")})
+    p.windows[150]["title"] = "Needle"
+    thumbs = _Sched(p, budget=1e9)
+    dlg = WindowPicker(WindowIndex(p), thumbs=thumbs, interval=60000)
+    try:
+        dlg.show()
+        app.processEvents()
+        dlg.update_targets()
+        alive, visible = thumbs.last
+        assert len(alive) == n
+        assert 0 < len(visible) < n and visible == [w[0] for w in dlg._wins[:len(visible)]]
+        # 一番下までスクロールすると、見えている行が入れ替わる
+        sb = dlg.listbox.verticalScrollBar()
+        sb.setValue(sb.maximum())
+        app.processEvents()
+        dlg.update_targets()
+        _, bottom = thumbs.last
+        assert bottom[-1] == dlg._wins[-1][0] and not set(bottom) & set(visible)
+        # 絞り込むと見えるのはヒットした行だけ
+        dlg.query.setText("needle")
+        app.processEvents()
+        dlg.update_targets()
+        assert thumbs.last[1] == [150] and len(thumbs.last[0]) == n
+    finally:
+        dlg.reject()
+        thumbs.close()
@@ -0,0 +1,222 @@
+import time, threading, collections
+from metrics import Histogram
+
+Thumb = collections.namedtuple("Thumb", "hwnd image source seq timestamp")   # image: (h, w, 4) BGRA, source: 元の (w, h)
+
+
+def fit_size(w, h, max_w, max_h):
+    """(w, h) を縦横比を保って max_w x max_h に収める(拡大はしない)"""
+    s = min(max_w / w, max_h / h, 1.0)
+    return max(1, round(w * s)), max(1, round(h * s))
+
+
+# =======================================================
+# サムネイルのキャッシュ(LRU)
+# =======================================================
+class ThumbnailCache:
+    """hwnd -> Thumb。get / put で新しい側に移り、capacity を超えたら古い側から捨てる。
+
+    retain(alive) は一覧から消えたウィンドウ(閉じた・最小化した)をすぐには捨てずに一番古い側へ回す。
+    最小化から戻ればそのまま使え、本当に閉じたものは次に溢れたときに先に捨てられる。
+    seq は put ごとに増え、changed(since) でそれより新しいものだけ取れる(GUI 側の差分更新用)。
+    """
+    def __init__(self, capacity=256):
+        self.capacity = capacity
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.seq = 0
+        # 統計
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, hwnd):
+        return hwnd in self._items
+
+    def get(self, hwnd):
+        with self._lock:
+            t = self._items.get(hwnd)
+            if t is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(hwnd)
+            return t
+
+    def put(self, hwnd, image, source, timestamp=0.0):
+        with self._lock:
+            self.seq += 1
+            t = self._items[hwnd] = Thumb(hwnd, image, source, self.seq, timestamp)
+            self._items.move_to_end(hwnd)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+                self.evicted += 1
+            return t
+
+    def retain(self, alive):
+        """alive に無いものを一番古い側へ回し、その hwnd のリストを返す"""
+        alive = set(alive)
+        with self._lock:
+            gone = [h for h in self._items if h not in alive]
+            for h in reversed(gone): self._items.move_to_end(h, last=False)
+            return gone
+
+    def changed(self, since):
+        """seq が since より新しいもの"""
+        with self._lock:
+            if self.seq <= since: return []
+            return [t for t in self._items.values() if t.seq > since]
+
+    def stats(self):
+        with self._lock:
+            return {"thumbs": len(self._items), "kb": sum(t.image.nbytes for t in self._items.values()) // 1024,
+                    "hits": self.hits, "misses": self.misses, "evicted": self.evicted}
+
+
+# =======================================================
+# 画素予算つきの巡回取得
+# =======================================================
+class ThumbnailScheduler:
+    """候補ウィンドウのサムネイルを順に取り直す。provider.thumbnail(hwnd, w, h) は縮小済みの画像を返す
+    (GDI で縮めてから読み出すので、Python 側に来るのは縮小後の画素だけ)。
+
+    取得のコストは元ウィンドウの画素数(w*h)で数え、1 秒あたり budget 画素を超えないように待つ
+    (トークンバケツ。burst 秒分まで貯まる。1 枚がそれより大きくても満タンなら取り、後で借りを返す)。
+    set_targets(alive, visible) で対象を決める。まだ無いものを visible → alive(キャッシュに空きがある間だけ)の順に先に取り、
+    揃ったら visible の中で一番古いものから(= 巡回)。同じウィンドウは min_interval 秒より頻繁には取らない。
+    start() でワーカースレッド、pause() / resume() で止めたり再開したりする。step() は同期で 1 回(テスト用)。
+    """
+    def __init__(self, provider, cache=None, budget=20e6, max_size=(160, 100), burst=0.25,
+                 min_interval=0.5, clock=time.monotonic):
+        self.provider = provider
+        self.cache = cache if cache is not None else ThumbnailCache()
+        self.budget, self.max_size, self.burst, self.min_interval = budget, max_size, burst, min_interval
+        self.clock = clock
+        self._lock = threading.Condition()
+        self._alive, self._visible = [], []
+        self._tried = {}        # hwnd -> 最後に取ろうとした時刻(失敗も含む)
+        self._tokens = budget * burst
+        self._last = None
+        self._thread = None
+        self._active = False
+        self._closing = False
+        # 統計
+        self.grabs = 0
+        self.failures = 0
+        self.pixels = 0         # 元ウィンドウの画素数の合計(予算で数える量)
+        self.thumb_pixels = 0   # 読み出した(縮小後の)画素数の合計
+        self.grab_time = Histogram()
+        self._t0 = None
+
+    def set_targets(self, alive, visible=()):
+        """alive: 今あるウィンドウすべて、visible: そのうち画面に出ている候補(優先して回す)"""
+        alive = list(alive)
+        keep = set(alive)
+        self.cache.retain(alive)
+        with self._lock:
+            self._alive, self._visible = alive, [h for h in visible if h in keep]
+            for h in [h for h in self._tried if h not in keep]: del self._tried[h]
+            self._lock.notify_all()
+
+    def _refill(self, now):
+        if self._last is not None:
+            self._tokens = min(self.budget * self.burst, self._tokens + (now - self._last) * self.budget)
+        self._last = now
+
+    def _next(self, now):
+        """(hwnd, 待ち秒数)。取るものが無ければ (None, None)"""
+        tried = self._tried
+        for h in self._visible:
+            if h not in tried and h not in self.cache: return h, 0.0
+        if len(self.cache) < self.cache.capacity:      # 先読みで表示中のものを追い出さない
+            for h in self._alive:
+                if h not in tried and h not in self.cache: return h, 0.0
+        if not self._visible: return None, None
+        h = min(self._visible, key=lambda h: tried.get(h, 0.0))
+        return h, max(0.0, tried.get(h, 0.0) + self.min_interval - now)
+
+    def step(self):
+        """1 枚取れれば取って 0 を、待つなら待つ秒数を、対象が無ければ None を返す"""
+        now = self.clock()
+        if self._t0 is None: self._t0 = now
+        with self._lock:
+            self._refill(now)
+            hwnd, wait = self._next(now)
+            if hwnd is None or wait > 0: return wait
+            prev, self._tried[hwnd] = self._tried.get(hwnd), now
+        try:
+            w, h = self.provider.size(hwnd)
+        except Exception:
+            self.failures += 1
+            return 0.0
+        if w <= 0 or h <= 0: return 0.0
+        cost = w * h
+        with self._lock:
+            need = min(cost, self.budget * self.burst) - 1.0     # 1 画素分は丸め誤差として許す
+            if self._tokens < need:
+                if prev is None: del self._tried[hwnd]     # 順番はそのまま、予算が貯まるのを待つ
+                else: self._tried[hwnd] = prev
+                return (need + 1.0 - self._tokens) / self.budget
+            self._tokens -= cost
+        tw, th = fit_size(w, h, *self.max_size)
+        t0 = time.perf_counter()
+        try:
+            img = self.provider.thumbnail(hwnd, tw, th)
+        except Exception:
+            img = None
+        self.grab_time.add(time.perf_counter() - t0)
+        if img is None:
+            self.failures += 1
+            return 0.0
+        self.cache.put(hwnd, img, (w, h), now)
+        self.grabs += 1
+        self.pixels += cost
+        self.thumb_pixels += img.shape[0] * img.shape[1]
+        return 0.0
+
+    # ----- ワーカー -----
+    def start(self):
+        with self._lock:
+            self._active = True
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="thumbnails", daemon=True)
+                self._thread.start()
+            self._lock.notify_all()
+        return self
+
+    def pause(self):
+        with self._lock:
+            self._active = False
+
+    resume = start
+
+    def _run(self):
+        wait = 0.0
+        while True:
+            with self._lock:
+                # step() の最中に close() されていたら待たない(通知はもう来ない)
+                if (wait != 0.0 or not self._active) and not self._closing:
+                    self._lock.wait(None if wait is None or not self._active else wait)
+                if self._closing: return
+                if not self._active:
+                    wait = None
+                    continue
+            wait = self.step()
+
+    def close(self):
+        with self._lock:
+            self._closing = True
+            self._lock.notify_all()
+            th = self._thread
+        if th is not None: th.join()
+
+    def stats(self):
+        el = self.clock() - self._t0 if self._t0 is not None else 0.0
+        return {"targets": len(self._alive), "visible": len(self._visible), "grabs": self.grabs,
+                "failures": self.failures, "mpx_per_s": round(self.pixels / el / 1e6, 3) if el > 0 else 0.0,
+                "thumb_kpx": self.thumb_pixels // 1000,
+                "grab_ms_p50": round(1e3 * self.grab_time.percentile(50), 3),
+                "grab_ms_p99": round(1e3 * self.grab_time.percentile(99), 3), **self.cache.stats()}
@@ -0,0 +1,79 @@
+import time
+from capture_scheduler import CapturePolicy
+
+
+# =======================================================
+# 表示状態に応じたキャプチャの間引き
+# =======================================================
+# active:    ターゲットもオーバーレイも見えている → 通常どおり
+# hidden:    オーバーレイが非表示・最小化・画面外 → 変換しない(シンクがあればシンクだけ動かす)
+# minimized: ターゲットが最小化・非表示 → 古いフレームしか来ないので keepalive 間隔で 1 枚だけ取る
+# gone:      ターゲットが無くなった → minimized と同じ扱い
+ACTIVE, HIDDEN, MINIMIZED, GONE = "active", "hidden", "minimized", "gone"
+
+
+def classify(target_alive=True, target_visible=True, target_minimized=False, view_visible=True):
+    if not target_alive: return GONE
+    if target_minimized or not target_visible: return MINIMIZED
+    if not view_visible: return HIDDEN
+    return ACTIVE
+
+
+class VisibilityThrottle:
+    """update() で受け取った可視状態から状態を決め、スケジューラとパイプラインに反映する。
+
+    active 以外では pipeline.display を False にして変換を止め、スケジューラを keepalive
+    (既定 1 fps)に落とす。hidden でもシンク(録画・共有)があれば元のポリシーのまま取り続ける。
+    active に戻るとすぐ元のポリシーに戻し、次のフレームは全体を描き直す。
+    set_policy を省略すると sched.set_policy を使う(CaptureManager では session.set_policy を渡す)。
+    clock を差し替えれば状態ごとの滞在時間もシミュレーション時計で数えられる。
+    """
+    def __init__(self, sched, pipeline, keepalive=1.0, set_policy=None, clock=time.monotonic):
+        self.sched, self.pipeline = sched, pipeline
+        self.keepalive = keepalive
+        self._set_policy = set_policy or sched.set_policy
+        self.clock = clock
+        self.flags = dict(target_alive=True, target_visible=True, target_minimized=False, view_visible=True)
+        self.state = ACTIVE
+        self.base_policy = sched.policy
+        self.since = clock()
+        self.time_in = {}
+        self.transitions = 0
+        self.listeners = []     # fn(old, new)
+
+    def update(self, **flags):
+        """target_alive / target_visible / target_minimized / view_visible のうち変わったものを渡す。
+        現在の状態を返す"""
+        unknown = set(flags) - set(self.flags)
+        if unknown:
+            raise TypeError(f"unknown visibility flags: {sorted(unknown)}")
+        self.flags.update(flags)
+        new = classify(**self.flags)
+        if new != self.state:
+            self._enter(new)
+        return self.state
+
+    def _policy_for(self, state):
+        if state == ACTIVE or (state == HIDDEN and self.pipeline.sinks):
+            return self.base_policy
+        fps = 1.0 / self.keepalive
+        if self.base_policy.mode == "max": fps = min(fps, self.base_policy.fps)
+        return CapturePolicy("max", fps)
+
+    def _enter(self, new):
+        old, now = self.state, self.clock()
+        self.time_in[old] = self.time_in.get(old, 0.0) + now - self.since
+        if old == ACTIVE:
+            self.base_policy = self.sched.policy   # active 中に変えられたポリシーを覚えておく
+        self.state, self.since = new, now
+        self.transitions += 1
+        self.pipeline.display = new == ACTIVE
+        self._set_policy(self._policy_for(new))   # 待機中のスケジューラもすぐ起きる
+        for fn in self.listeners:
+            fn(old, new)
+
+    def stats(self):
+        t = dict(self.time_in)
+        t[self.state] = t.get(self.state, 0.0) + self.clock() - self.since
+        return {"state": self.state, "transitions": self.transitions,
+                "seconds": {k: round(v, 3) for k, v in t.items()}}
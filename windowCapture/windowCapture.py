@@ -1,284 +1,255 @@
-import sys, ctypes, asyncio, numpy as np
-import win32gui, win32process, psutil, win32con
-from PyQt5 import QtCore, QtGui, QtWidgets
-from ctypes import wintypes
-import winrt.windows.graphics.capture as wgc
-import winrt.windows.graphics.directx.direct3d11.interop as d3d11_interop
-import winrt.windows.graphics.capture.interop as capture_interop
-import winrt.windows.graphics.imaging as imaging
-import winrt.windows.storage.streams as streams
+import sys, os, time
+T0 = time.perf_counter()     # 起動時刻(--trace-startup の基準)
+import threading
+from PyQt5 import QtCore, QtWidgets
+from window_index import WindowIndex
+from window_picker import pick_window
+from overlay_options import OverlayOptions
 
+# numpy・winrt・キャプチャ側のモジュール(overlay)はウィンドウを選んでいる間に Prewarm が読み込む
+TRACE = False
 
-# =======================================================
-# D3D / WinRT capture
-# =======================================================
-def create_d3d_device_idirect3d():
-    from ctypes import c_void_p, c_uint, POINTER, byref
-    d3d11 = ctypes.windll.d3d11
-    D3D_DRIVER_TYPE_HARDWARE = 1
-    D3D11_CREATE_DEVICE_BGRA_SUPPORT = 0x20
-    D3D11_SDK_VERSION = 7
-    D3D11CreateDevice = d3d11.D3D11CreateDevice
-    D3D11CreateDevice.argtypes = [
-        c_void_p, c_uint, c_void_p, c_uint, c_void_p, c_uint, c_uint,
-        POINTER(c_void_p), POINTER(c_uint), POINTER(c_void_p)
-    ]
-    pDev, pCtx = c_void_p(), c_void_p()
-    feat = c_uint()
-    hr = D3D11CreateDevice(None, D3D_DRIVER_TYPE_HARDWARE, None,
-                           D3D11_CREATE_DEVICE_BGRA_SUPPORT,
-                           None, 0, D3D11_SDK_VERSION,
-                           byref(pDev), byref(feat), byref(pCtx))
-    if hr != 0:
-        raise OSError(f"D3D11CreateDevice failed (HRESULT=0x{hr:08X})")
-    return d3d11_interop.create_direct3d11_device_from_dxgi_device(pDev.value)
-
-
-def softwarebitmap_to_numpy(sb: imaging.SoftwareBitmap):
-    try:
-        if sb.bitmap_pixel_format != imaging.BitmapPixelFormat.BGRA8:
-            sb = imaging.SoftwareBitmap.convert(sb, imaging.BitmapPixelFormat.BGRA8)
-        h, w = sb.pixel_height, sb.pixel_width
-        buf = streams.Buffer(w * h * 4)
-        sb.copy_to_buffer(buf)
-        sb.close()
-        reader = streams.DataReader.from_buffer(buf)
-        ibuf = reader.read_buffer(int(buf.length))
-        reader2 = streams.DataReader.from_buffer(ibuf)
-        data_bytes = bytearray(int(ibuf.length))
-        reader2.read_bytes(data_bytes)
-        arr = np.frombuffer(data_bytes, dtype=np.uint8).reshape((h, w, 4))
-        return arr[:, :, :3][:, :, ::-1].copy()
-    except Exception as e:
-        print("bitmap convert error:", e)
-        return np.zeros((100, 100, 3), np.uint8)
 
-
-class WinRTCapture(QtCore.QThread):
-    new_frame = QtCore.pyqtSignal(np.ndarray)
-    def __init__(self, hwnd): super().__init__(); self.hwnd = hwnd; self.running = True
-    def run(self):
-        asyncio.set_event_loop(asyncio.new_event_loop())
-        device = create_d3d_device_idirect3d()
-        item = capture_interop.create_for_window(self.hwnd)
-        size = item.size
-        pool = wgc.Direct3D11CaptureFramePool.create(device, 87, 2, size)
-        session = pool.create_capture_session(item)
-        try:
-            session.is_cursor_capture_enabled = False
-            session.is_border_required = False
-        except: pass
-        session.start_capture()
-        while self.running:
-            frame = pool.try_get_next_frame()
-            if frame:
-                try:
-                    op = imaging.SoftwareBitmap.create_copy_from_surface_async(frame.surface)
-                    sb = asyncio.get_event_loop().run_until_complete(op)
-                    img = softwarebitmap_to_numpy(sb)
-                    self.new_frame.emit(img)
-                except Exception as e:
-                    print("frame error:", e)
-                finally:
-                    frame.close()
-            self.msleep(16)
-        session.close(); pool.close()
-    def stop(self): self.running = False
+def trace(msg):
+    if TRACE: print(f"[startup] {1e3 * (time.perf_counter() - T0):8.1f} ms  {msg}", flush=True)
 
 
 # =======================================================
-# Overlay window (transparent capture display)
+# Startup prewarm (runs while the picker is open)
 # =======================================================
-class Overlay(QtWidgets.QWidget):
-    def __init__(self, hwnd, exe, title):
-        super().__init__()
-        self.hwnd, self.exe, self.title = hwnd, exe, title
-        self.setWindowFlags(QtCore.Qt.FramelessWindowHint |
-                            QtCore.Qt.Tool |
-                            QtCore.Qt.WindowStaysOnTopHint)
-        self.setAttribute(QtCore.Qt.WA_TranslucentBackground)
-        # 常にユーザー操作をターゲットアプリへ通す
-        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents, True)
-        self.setGeometry(100, 100, 800, 480)
-
-        # キャプチャ開始
-        self.frame_pix = QtGui.QPixmap()
-        self.cap = WinRTCapture(hwnd)
-        self.cap.new_frame.connect(self.on_frame)
-        self.cap.start()
+class Prewarm(threading.Thread):
+    """ウィンドウ選択中に重い import と共有 D3D デバイス・イベントループ・フレームプールの作成を済ませる。
+    device=False なら import と CaptureManager の作成だけ。失敗しても選択後に通常の経路で作るだけ。
+    """
+    def __init__(self, workers=None, device=True, pools=1):
+        super().__init__(name="prewarm", daemon=True)
+        self.workers, self.device, self.pools = workers, device, pools
+        self.manager = None
+        self.error = None
 
-        # 全体クリック透過ON
-        self.set_click_through(True)
-
-        # 操作用ボタンウィンドウを別ウィンドウとして生成
-        self.ctrl_window = ControlWindow(self)
-        self.ctrl_window.show()
-        self.ctrl_window.raise_()
-        print("[UI] ControlWindow created and raised to front")
-
-    def set_click_through(self, enable: bool):
-        hwnd = int(self.winId())
-        GWL_EXSTYLE = -20
-        WS_EX_TRANSPARENT = 0x20
-        style = ctypes.windll.user32.GetWindowLongW(hwnd, GWL_EXSTYLE)
-        if enable:
-            style |= WS_EX_TRANSPARENT
-        else:
-            style &= ~WS_EX_TRANSPARENT
-        ctypes.windll.user32.SetWindowLongW(hwnd, GWL_EXSTYLE, style)
-
-    def on_frame(self, arr):
-        h, w, _ = arr.shape
-        img = QtGui.QImage(arr.tobytes(), w, h, 3*w, QtGui.QImage.Format_RGB888)
-        self.frame_pix = QtGui.QPixmap.fromImage(img)
-        self.update()
-
-    def paintEvent(self, e):
-        p = QtGui.QPainter(self)
-        if not self.frame_pix.isNull():
-            p.drawPixmap(self.rect(), self.frame_pix)
-        p.setPen(QtGui.QPen(QtGui.QColor("white")))
-        f = p.font(); f.setPointSize(8); p.setFont(f)
-        p.drawText(45, 25, f"[{self.exe}] {self.title[:40]}")
-
-    def closeEvent(self, e):
-        if self.cap and self.cap.isRunning():
-            self.cap.stop(); self.cap.wait()
-        self.ctrl_window.close()
-        e.accept()
+    def run(self):
+        try:
+            import overlay      # numpy, PyQt5 以外のキャプチャ側モジュール一式
+            from capture_manager import CaptureManager
+            self.manager = CaptureManager(self.workers)
+            trace("prewarm: imports done")
+            if self.device:
+                self.manager.prewarm(self.pools)
+                trace("prewarm: device ready")
+        except Exception as e:
+            self.error = e
+            trace(f"prewarm failed: {e}")
+
+    def result(self):
+        """終わるのを待って CaptureManager を返す(start せずに run() を直接呼んだ場合も)"""
+        if self.is_alive() or self.ident: self.join()
+        if self.manager is None:
+            from capture_manager import CaptureManager
+            self.manager = CaptureManager(self.workers)
+        return self.manager
+
+
+def capture_stack(prewarm, args, on_quit=lambda fn: None):
+    """選択後: 先読みの完了を待って (CaptureManager, RateGovernor か None) を揃える。
+    --no-prewarm なら先読みをここで同期に行う。on_quit(fn) で終了時に呼ぶものを登録する"""
+    if args.no_prewarm: prewarm.run()
+    manager = prewarm.result().start()
+    on_quit(manager.stop)
+    governor = None
+    if args.governor:
+        from governor import RateGovernor
+        governor = RateGovernor(cpu_budget=args.cpu_budget, idle_fps=args.idle_fps)
+        on_quit(lambda: print("[GOV]", governor.stats()))
+    trace("capture stack ready")
+    return manager, governor
 
 
 # =======================================================
-# Control Window (red square, independent, clickable)
+# Window list & entry point
 # =======================================================
-class ControlWindow(QtWidgets.QWidget):
-    dragStarted = QtCore.pyqtSignal(QtCore.QPoint)
-    dragUpdated = QtCore.pyqtSignal(QtCore.QPoint)
-    dragFinished = QtCore.pyqtSignal(QtCore.QPoint)
-
-    def __init__(self, overlay):
-        super().__init__()
-        self.overlay = overlay
-        self.setWindowFlags(QtCore.Qt.FramelessWindowHint |
-                            QtCore.Qt.Tool |
-                            QtCore.Qt.WindowStaysOnTopHint |
-                            QtCore.Qt.X11BypassWindowManagerHint)
-        self.setAttribute(QtCore.Qt.WA_TranslucentBackground)
-        self.setAttribute(QtCore.Qt.WA_ShowWithoutActivating)
-
-        # 表示矩形を操作ウィンドウの近くに配置
-        target_pos = overlay.frameGeometry().topLeft() + QtCore.QPoint(40, 40)
-        self.setGeometry(QtCore.QRect(target_pos, QtCore.QSize(36, 36)))
-        self.setFixedSize(36, 36)
-
-        # 実際に描画される赤い四角は子ウィジェットとして作成
-        self.square = QtWidgets.QFrame(self)
-        self.square.setObjectName("controlSquare")
-        self.square.setGeometry(self.rect())
-        self.square.setStyleSheet(
-            "#controlSquare {"
-            "background-color: rgba(255,60,60,220);"
-            "border-radius: 5px;"
-            "}"
-        )
-
-        # 最前面化を維持するため、一定間隔で SetWindowPos を呼び出す
-        self._raise_timer = QtCore.QTimer(self)
-        self._raise_timer.setInterval(750)
-        self._raise_timer.timeout.connect(self.raise_to_top)
-        self._raise_timer.start()
-        QtCore.QTimer.singleShot(0, self.raise_to_top)
-
-        self._dragging = False
-        self._press_global = QtCore.QPoint()
-        self.setFocusPolicy(QtCore.Qt.NoFocus)
-
-    def raise_to_top(self):
-        if not self.isVisible():
-            self.show()
-        self.raise_()
-        hwnd = int(self.winId())
-        ctypes.windll.user32.SetWindowPos(
-            hwnd,
-            win32con.HWND_TOPMOST,
-            0,
-            0,
-            0,
-            0,
-            win32con.SWP_NOMOVE | win32con.SWP_NOSIZE | win32con.SWP_NOACTIVATE,
-        )
-        self.ensure_clickable()
-        # 透明ウィンドウは描画更新を促さないと表示されない場合があるため
-        self.square.update()
+_index = None
 
-    def ensure_clickable(self):
-        hwnd = int(self.winId())
-        GWL_EXSTYLE = -20
-        WS_EX_TRANSPARENT = 0x20
-        style = ctypes.windll.user32.GetWindowLongW(hwnd, GWL_EXSTYLE)
-        if style & WS_EX_TRANSPARENT:
-            ctypes.windll.user32.SetWindowLongW(hwnd, GWL_EXSTYLE, style & ~WS_EX_TRANSPARENT)
 
-    def mousePressEvent(self, e):
-        if e.button() == QtCore.Qt.LeftButton:
-            self._dragging = True
-            self._press_global = e.globalPos()
-            print("🟥 操作用ドラッグ開始")
-            self.dragStarted.emit(self._press_global)
-        super().mousePressEvent(e)
+def numbered(path, i):
+    """複数のオーバーレイ用に出力ファイル名へ番号を付ける: out.wcap → out-1.wcap(i = 0 はそのまま)"""
+    if not i: return path
+    root, ext = os.path.splitext(path)
+    return f"{root}-{i}{ext}"
 
-    def mouseMoveEvent(self, e):
-        if self._dragging and (e.buttons() & QtCore.Qt.LeftButton):
-            delta = e.globalPos() - self._press_global
-            self.dragUpdated.emit(delta)
-        super().mouseMoveEvent(e)
 
-    def mouseReleaseEvent(self, e):
-        if self._dragging and e.button() == QtCore.Qt.LeftButton:
-            self._dragging = False
-            delta = e.globalPos() - self._press_global
-            print("🟥 操作用ドラッグ終了")
-            self.dragFinished.emit(delta)
-        super().mouseReleaseEvent(e)
-
-    def resizeEvent(self, event):
-        super().resizeEvent(event)
-        if hasattr(self, "square"):
-            self.square.setGeometry(self.rect())
-
-    def closeEvent(self, event):
-        if hasattr(self, "_raise_timer") and self._raise_timer.isActive():
-            self._raise_timer.stop()
-        super().closeEvent(event)
-
-# =======================================================
-# Window list & entry point
-# =======================================================
 def list_visible_windows():
-    wins = []
-    def enum_cb(hwnd, _):
-        if not win32gui.IsWindowVisible(hwnd) or win32gui.IsIconic(hwnd): return
-        title = win32gui.GetWindowText(hwnd)
-        if not title.strip(): return
-        try:
-            _, pid = win32process.GetWindowThreadProcessId(hwnd)
-            exe = psutil.Process(pid).name()
-        except: exe = "Unknown"
-        wins.append((hwnd, exe, title))
-    win32gui.EnumWindows(enum_cb, None)
-    return wins
+    """[(hwnd, exe, title)]。呼ぶたびに WindowIndex を差分更新する(exe 名は pid ごとにキャッシュ)"""
+    global _index
+    if _index is None: _index = WindowIndex()
+    _index.refresh()
+    return _index.list()
 
 
 if __name__ == "__main__":
-    app = QtWidgets.QApplication(sys.argv)
-    wins = list_visible_windows()
-    if not wins:
+    import argparse
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--policy", default="latest", help='latest / every / max:N (fps)')
+    ap.add_argument("--backend", action="append",
+                    help="synthetic:1920x1080@60[:bars] / replay:<file>[@fast] (複数指定でオーバーレイを並べる)")
+    ap.add_argument("--crop", type=lambda v: tuple(int(x) for x in v.split(",")),
+                    help="left,top,right,bottom (ソース座標)")
+    ap.add_argument("--scale", default="fast", choices=["fast", "quality", "off"],
+                    help="キャプチャスレッドでの縮小方法 (off で Qt が描画時に拡縮)")
+    ap.add_argument("--hud", action="store_true", help="計測 HUD を表示 (赤四角の右クリックで切り替え)")
+    ap.add_argument("--stats-log", help="計測値を JSON Lines で追記するファイル")
+    ap.add_argument("--record", help="録画ファイル (.wcap)。オーバーレイが複数なら name-1.wcap ... になる")
+    ap.add_argument("--record-codec", default="delta", choices=["raw", "delta"])
+    ap.add_argument("--record-compress", default="zlib", choices=["zlib", "none"])
+    ap.add_argument("--share", help="フレームを共有メモリに公開する名前。オーバーレイが複数なら name-1 ... になる")
+    ap.add_argument("--stream", help="HOST:PORT でフレームを配信する (例 0.0.0.0:8765)。オーバーレイが複数なら PORT+1 ...")
+    ap.add_argument("--watch", help="ROI 監視の設定 JSON ([{name, rect: [l, t, r, b], mean / change / hist / template ...}])")
+    ap.add_argument("--watch-budget-ms", type=float, help="ROI 判定の 1 フレームあたりの予算 (超えたら ROI を順に回す)")
+    ap.add_argument("--governor", action="store_true",
+                    help="内容の変化率と表示状態から取得 fps を自動で決める (--policy が上限)")
+    ap.add_argument("--cpu-budget", type=float, help="--governor の全オーバーレイ合計の CPU 予算 (CPU 何個分)")
+    ap.add_argument("--idle-fps", type=float, default=10.0, help="--governor で内容が止まっているときの fps")
+    ap.add_argument("--trace-changes", help="フレームごとの変化の有無を記録するファイル (python -m bench governor で再生)")
+    ap.add_argument("--composite", nargs="?", const="shelf", choices=["shelf", "grid"],
+                    help="複数のソースを 1 つのオーバーレイに並べる (並べ方)。ウィンドウはキャンセルするまで続けて選ぶ")
+    ap.add_argument("--composite-scale", type=float, default=0.5, help="--composite での各ソースの倍率")
+    ap.add_argument("--thumb-budget", type=float, default=20.0,
+                    help="ウィンドウ選択のサムネイル取得の予算 (元ウィンドウの Mpx/秒。0 でサムネイル無しの一覧)")
+    ap.add_argument("--workers", type=int, help="キャプチャ処理のワーカースレッド数 (既定は CPU 数)")
+    ap.add_argument("--keepalive", type=float, default=1.0,
+                    help="ターゲット最小化中・非表示中にフレームを取る間隔 (秒)")
+    ap.add_argument("--readback-depth", type=int,
+                    help="並行に走らせる GPU リードバックの数 (0 で 1 フレームずつ同期。"
+                         "既定は --policy every なら 2、それ以外は 1)")
+    ap.add_argument("--config", default="overlay_settings/profiles.json",
+                    help="位置・大きさ・トリミングを保存する設定ファイル (旧オーバーレイと共用。none で保存しない)")
+    ap.add_argument("--gpu-reduce", action="store_true",
+                    help="トリミング・縮小を GPU 上で行ってから読み出す (読み出し量が表示サイズに比例)")
+    ap.add_argument("--display-format", default="rgb32", choices=["rgb32", "argb32", "rgb"],
+                    help="表示の画素形式。rgb32/argb32 は BGRA のままコピーせずに描画、rgb は旧方式 (RGB888)")
+    ap.add_argument("--no-prewarm", action="store_true",
+                    help="ウィンドウ選択中にデバイス等を先に作らない (選んでから順に作る)")
+    ap.add_argument("--trace-startup", action="store_true", help="起動の各段階の経過時間を表示")
+    ap.add_argument("--exit-after-first-frame", action="store_true",
+                    help="最初のフレームを受け取ったら終了 (起動時間の計測用)")
+    args, qt_args = ap.parse_known_args()
+    if args.workers is not None and args.workers < 1:
+        ap.error("--workers must be >= 1")
+    TRACE = args.trace_startup
+    opts = OverlayOptions.from_args(args, layout=args.composite or "shelf")
+    trace("light imports done")
+    prewarm = Prewarm(args.workers, device=not args.backend)
+    if not args.no_prewarm: prewarm.start()
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
+
+    def stack():
+        return capture_stack(prewarm, args, app.aboutToQuit.connect)
+    def first_frame(overlay):
+        """最初のフレームで trace する(接続前にもう届いていればすぐ)"""
+        seen = []
+        def on_frame(_=None):
+            if seen: return
+            seen.append(True)
+            trace("first frame")
+            if args.exit_after_first_frame: QtCore.QTimer.singleShot(0, app.quit)
+        overlay.cap.new_frame.connect(on_frame)
+        if overlay.ring.published: on_frame()
+
+    def recorder(i):
+        if not args.record: return None
+        from recorder import FrameRecorder
+        return FrameRecorder(numbered(args.record, i), codec=args.record_codec,
+                             compress=None if args.record_compress == "none" else args.record_compress)
+    def share(i):
+        if not args.share: return None
+        from shm_export import SharedFramePublisher
+        return SharedFramePublisher(f"{args.share}-{i}" if i else args.share)
+    def stream(i):
+        if not args.stream: return None
+        from stream_server import StreamServer
+        host, _, port = args.stream.rpartition(":")
+        srv = StreamServer(host or "127.0.0.1", int(port) + i if int(port) else 0)
+        print("📡 stream:", srv.start())
+        return srv
+    def watch(i):
+        if not args.watch: return None
+        from roi_watch import RoiWatcher
+        w = RoiWatcher(budget_ms=args.watch_budget_ms)
+        w.load(args.watch, lambda ev: print(f"🔔 [{i}] {ev.name}: {'ON' if ev.active else 'OFF'} ({ev.value:.3f})"))
+        return w.start()
+    def outputs(i):
+        """i 番目のオーバーレイの出力(Overlay の recorder / share / stream / watch)"""
+        return dict(recorder=recorder(i), share=share(i), stream=stream(i), watch=watch(i))
+    def trace_changes(overlay, i):
+        if not args.trace_changes: return
+        from governor import ChangeTraceWriter
+        writer = ChangeTraceWriter(numbered(args.trace_changes, i))
+        overlay.cap.pipeline.change_listeners.append(writer)
+        app.aboutToQuit.connect(writer.close)
+    def composite(specs):
+        """[(backend, hwnd, name)] を 1 つのオーバーレイに並べる(backend が None ならウィンドウを取る)"""
+        manager, _ = stack()
+        from overlay import CompositeOverlay
+        from compositor import CompositeSource
+        sources = [CompositeSource(b or manager.window_backend(hwnd), crop=opts.crop, scale=opts.composite_scale,
+                                   policy=opts.policy, name=name, hwnd=hwnd) for b, hwnd, name in specs]
+        overlay = CompositeOverlay(sources, opts, manager=manager)
+        overlay.show()
+        QtCore.QTimer.singleShot(0, lambda: trace("overlay shown"))
+        return overlay
+    if args.backend and args.composite:
+        from capture_backend import make_backend
+        overlay = composite([(make_backend(spec), 0, spec) for spec in args.backend])
+        sys.exit(app.exec_())
+    if args.backend:
+        # ウィンドウ選択を省略して合成/再生ソースを表示
+        manager, governor = stack()
+        from overlay import Overlay
+        from capture_backend import make_backend
+        overlays = []
+        for i, spec in enumerate(args.backend):
+            overlay = Overlay(0, spec.split(":")[0], spec, opts, backend=make_backend(spec), manager=manager,
+                              governor=governor, **outputs(i))
+            overlay.move(100 + 40 * i, 100 + 40 * i)
+            trace_changes(overlay, i)
+            overlay.show()
+            if i == 0: first_frame(overlay)
+            overlays.append(overlay)
+        sys.exit(app.exec_())
+    if not list_visible_windows():
         print("No windows found."); sys.exit(1)
-    items = [f"[{exe}] {title}" for hwnd, exe, title in wins]
-    item, ok = QtWidgets.QInputDialog.getItem(None, "Select window", "Capture target:", items, 0, False)
-    if not ok: sys.exit(0)
-    hwnd, exe, title = wins[items.index(item)]
+    QtCore.QTimer.singleShot(0, lambda: trace("picker shown"))
+    thumbs = None
+    if args.thumb_budget > 0:
+        from thumbnails import ThumbnailScheduler
+        thumbs = ThumbnailScheduler(_index.provider, budget=args.thumb_budget * 1e6)
+    picked = pick_window(_index, None, "Select window", thumbs=thumbs)
+    if args.composite and picked is not None:
+        # キャンセルするまで続けて選ぶ
+        chosen = [picked]
+        while True:
+            more = pick_window(_index, None, f"Add window ({len(chosen)} selected, cancel to start)", thumbs=thumbs)
+            if more is None: break
+            if all(more[0] != c[0] for c in chosen): chosen.append(more)
+        if thumbs is not None: thumbs.close()
+        trace("windows picked")
+        for _, exe, title in chosen: print(f"🎬 Target: {exe} - {title}")
+        overlay = composite([(None, hwnd, f"[{exe}] {title}") for hwnd, exe, title in chosen])
+        sys.exit(app.exec_())
+    if thumbs is not None: thumbs.close()
+    if picked is None: sys.exit(0)
+    hwnd, exe, title = picked
+    trace("window picked")
     print(f"🎬 Target: {exe} - {title}")
-    overlay = Overlay(hwnd, exe, title)
+    manager, governor = stack()
+    from overlay import Overlay
+    config = None
+    if args.config != "none":
+        from config_store import ConfigStore
+        config = ConfigStore(args.config, legacy_dir=os.path.dirname(args.config) or None)
+        app.aboutToQuit.connect(config.close)
+    overlay = Overlay(hwnd, exe, title, opts, manager=manager, governor=governor, config=config, **outputs(0))
+    first_frame(overlay)
+    trace_changes(overlay, 0)
     overlay.show()
+    trace("overlay shown")
     sys.exit(app.exec_())
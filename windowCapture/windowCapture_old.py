@@ -1,11 +1,12 @@
 import sys
 import os
-import json
 import ctypes
 from ctypes import wintypes
-import win32gui, win32con, win32process
-import psutil
+import win32gui, win32con
 from PyQt5 import QtCore, QtGui, QtWidgets
+from window_index import WindowIndex
+from window_picker import WindowPicker, pick_window
+from config_store import ConfigStore
 
 # ===== DPI対応 =====
 try:
@@ -46,101 +47,36 @@ DWM_TNP_OPACITY              = 0x00000004
 DWM_TNP_VISIBLE              = 0x00000008
 DWM_TNP_SOURCECLIENTAREAONLY = 0x00000010
 
-# ===== ディレクトリ構成 =====
+# ===== 設定ファイル =====
 BASE_DIR = "overlay_settings"
-WINDOW_DIR = os.path.join(BASE_DIR, "window_config")
-EXE_DIR = os.path.join(BASE_DIR, "exe_config")
-os.makedirs(WINDOW_DIR, exist_ok=True)
-os.makedirs(EXE_DIR, exist_ok=True)
+# 全ウィンドウ分を 1 ファイルにまとめて起動時に 1 回だけ読む。
+# 旧形式(window_config/*.json, exe_config/*.json)は見つからなかったときだけ読みにいく
+_config = ConfigStore(os.path.join(BASE_DIR, "profiles.json"), legacy_dir=BASE_DIR)
 
 # ===== 設定ロード／保存 =====
-def sanitize_filename(name: str):
-    invalid = '<>:"/\\|?*'
-    for ch in invalid:
-        name = name.replace(ch, "_")
-    return name.strip() or "noname"
-
-def load_json(path):
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
-
-def save_json(data, path):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
 def load_config(title: str, exe: str):
-    title_path = os.path.join(WINDOW_DIR, f"{sanitize_filename(title)}.json")
-    exe_path = os.path.join(EXE_DIR, f"{sanitize_filename(exe)}.json")
-    if os.path.exists(title_path):
-        print(f"📄 ウィンドウ設定ロード: {title_path}")
-        return load_json(title_path)
-    elif os.path.exists(exe_path):
-        print(f"📄 EXE設定ロード: {exe_path}")
-        return load_json(exe_path)
-    return {}
+    kind, data = _config.lookup(exe, title)
+    if data is None:
+        return {}
+    print(f"📄 設定ロード ({kind}): [{exe}] {title}")
+    return dict(data)
 
 def save_config(data: dict, title: str, exe: str):
-    title_path = os.path.join(WINDOW_DIR, f"{sanitize_filename(title)}.json")
-    exe_path = os.path.join(EXE_DIR, f"{sanitize_filename(exe)}.json")
-    save_json(data, exe_path)
-    save_json(data, title_path)
-    print(f"💾 設定保存: {title_path} / {exe_path}")
+    # メモリ上で更新し、ファイルへはまとめて書く(終了時は _config.close() で書き切る)
+    _config.put(exe, title, data)
+    print(f"💾 設定保存: [{exe}] {title}")
 
 # ===== ウィンドウ列挙 =====
-def list_visible_windows():
-    """有効なアプリケーションウィンドウのみ列挙"""
-    windows = []
-
-    def enum_cb(hwnd, _):
-        # 非表示・最小化ウィンドウを除外
-        if not win32gui.IsWindowVisible(hwnd) or win32gui.IsIconic(hwnd):
-            return
+_index = None
 
-        # タイトル取得（空白は除外）
-        title = win32gui.GetWindowText(hwnd)
-        if not title or not title.strip():
-            return
-
-        # サイズ取得（極小は除外）
-        try:
-            rect = win32gui.GetWindowRect(hwnd)
-            width = rect[2] - rect[0]
-            height = rect[3] - rect[1]
-            if width < 80 or height < 80:
-                return
-        except Exception:
-            return
-
-        # 子ウィンドウや内部UIを除外
-        GA_ROOT = 2
-        root = ctypes.windll.user32.GetAncestor(hwnd, GA_ROOT)
-        if root != hwnd:
-            return
 
-        # 実行ファイル名取得
-        try:
-            _, pid = win32process.GetWindowThreadProcessId(hwnd)
-            exe = psutil.Process(pid).name()
-        except Exception:
-            exe = "Unknown"
-
-        windows.append((hwnd, exe, title))
-
-    win32gui.EnumWindows(enum_cb, None)
-
-    # 重複や無効タイトル除外
-    unique = []
-    seen = set()
-    for hwnd, exe, title in windows:
-        key = (exe.lower(), title)
-        if key not in seen:
-            seen.add(key)
-            unique.append((hwnd, exe, title))
-    return unique
+def list_visible_windows():
+    """有効なアプリケーションウィンドウのみ列挙（極小・子ウィンドウ・重複を除外）"""
+    global _index
+    if _index is None:
+        _index = WindowIndex(min_size=80, roots_only=True)
+    _index.refresh()     # 前回からの差分だけ取り直す
+    return _index.list(unique=True)
 
 
 # ===== Overlay =====
@@ -223,64 +159,40 @@ class Overlay(QtWidgets.QWidget):
         save_config(current_data, self.title, self.exe_name)
         print(f"💾 現在の設定を保存: [{self.exe_name}] {self.title}")
 
-        wins = list_visible_windows()
-        if not wins:
+        if not list_visible_windows():
             print("ウィンドウが見つかりません")
             return
 
-        # 非モーダル選択ダイアログ
-        dialog = QtWidgets.QDialog(self)
-        dialog.setWindowTitle("ウィンドウ再選択")
+        # 非モーダル選択ダイアログ（入力欄であいまい検索）
+        dialog = WindowPicker(_index, self, "ウィンドウ再選択", unique=True)
         dialog.setWindowModality(QtCore.Qt.NonModal)
         dialog.setAttribute(QtCore.Qt.WA_DeleteOnClose)
         dialog.setGeometry(self.x() + 50, self.y() + 50, 400, 300)
 
-        layout = QtWidgets.QVBoxLayout(dialog)
-        listbox = QtWidgets.QListWidget()
-        for hwnd, exe, title in wins:
-            listbox.addItem(f"[{exe}] {title}")
-        layout.addWidget(listbox)
-
-        btn_ok = QtWidgets.QPushButton("OK")
-        btn_cancel = QtWidgets.QPushButton("キャンセル")
-        btns = QtWidgets.QHBoxLayout()
-        btns.addWidget(btn_ok)
-        btns.addWidget(btn_cancel)
-        layout.addLayout(btns)
-
-        def on_ok():
-            sel = listbox.currentRow()
-            if sel >= 0:
-                hwnd, exe, title = wins[sel]
-                if self.hthumb.value:
-                    DwmUnregisterThumbnail(self.hthumb)
-                self.target_hwnd = hwnd
-                self.exe_name = exe
-                self.title = title
-                self.register_thumbnail()
-                print(f"🔁 再選択: [{exe}] {title}")
-
-                # --- 新しいウィンドウの設定をロード ---
-                cfg = load_config(title, exe)
-                if cfg:
-                    x, y = cfg.get("pos", [self.x(), self.y()])
-                    w, h = cfg.get("size", [self.width(), self.height()])
-                    crop = cfg.get("crop", [0, 0, w, h])
-                    opacity = cfg.get("opacity", self.windowOpacity())
-                    self.setGeometry(x, y, w, h)
-                    self.crop = QtCore.QRect(*crop)
-                    self.setWindowOpacity(opacity)
-                    print(f"📄 設定を読み込み: [{exe}] {title}")
-                else:
-                    print(f"⚠ 新しい設定が見つかりません。デフォルトで開始。")
-            dialog.close()
-
-        def on_cancel():
-            dialog.close()
-
-        btn_ok.clicked.connect(on_ok)
-        btn_cancel.clicked.connect(on_cancel)
-
+        def on_picked(hwnd, exe, title):
+            if self.hthumb.value:
+                DwmUnregisterThumbnail(self.hthumb)
+            self.target_hwnd = hwnd
+            self.exe_name = exe
+            self.title = title
+            self.register_thumbnail()
+            print(f"🔁 再選択: [{exe}] {title}")
+
+            # --- 新しいウィンドウの設定をロード ---
+            cfg = load_config(title, exe)
+            if cfg:
+                x, y = cfg.get("pos", [self.x(), self.y()])
+                w, h = cfg.get("size", [self.width(), self.height()])
+                crop = cfg.get("crop", [0, 0, w, h])
+                opacity = cfg.get("opacity", self.windowOpacity())
+                self.setGeometry(x, y, w, h)
+                self.crop = QtCore.QRect(*crop)
+                self.setWindowOpacity(opacity)
+                print(f"📄 設定を読み込み: [{exe}] {title}")
+            else:
+                print(f"⚠ 新しい設定が見つかりません。デフォルトで開始。")
+
+        dialog.picked.connect(on_picked)
         dialog.show()
 
         
@@ -484,17 +396,14 @@ class Overlay(QtWidgets.QWidget):
 # ===== 実行 =====
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
-    wins = list_visible_windows()
-    if not wins:
+    app.aboutToQuit.connect(_config.close)
+    if not list_visible_windows():
         print("ウィンドウが見つかりません")
         sys.exit(1)
-    items = [f"[{exe}] {title}" for hwnd, exe, title in wins]
-    item, ok = QtWidgets.QInputDialog.getItem(None, "ウィンドウ選択",
-                                              "プレビューするウィンドウを選んでください:",
-                                              items, 0, False)
-    if not ok:
+    picked = pick_window(_index, None, "ウィンドウ選択", unique=True)
+    if picked is None:
         sys.exit(0)
-    hwnd, exe, title = wins[items.index(item)]
+    hwnd, exe, title = picked
     overlay = Overlay(hwnd, exe, title)
     overlay.show()
     sys.exit(app.exec_())
@@ -0,0 +1,272 @@
+import collections
+
+
+# =======================================================
+# ウィンドウ一覧（hwnd ごとのキャッシュ＋差分更新）
+# =======================================================
+Window = collections.namedtuple("Window", "hwnd pid exe title")
+
+
+class Win32WindowProvider:
+    """WindowIndex が使う Win32 呼び出し。テストでは FakeWindowProvider に差し替える"""
+    def __init__(self):
+        import win32gui, win32process, psutil
+        self.win32gui, self.win32process, self.psutil = win32gui, win32process, psutil
+
+    def hwnds(self):
+        """トップレベルウィンドウ(Z 順)"""
+        out = []
+        self.win32gui.EnumWindows(lambda h, _: out.append(h), None)
+        return out
+
+    def shown(self, hwnd):
+        g = self.win32gui
+        return bool(g.IsWindowVisible(hwnd)) and not g.IsIconic(hwnd)
+
+    def title(self, hwnd):
+        return self.win32gui.GetWindowText(hwnd)
+
+    def size(self, hwnd):
+        l, t, r, b = self.win32gui.GetWindowRect(hwnd)
+        return r - l, b - t
+
+    def owner(self, hwnd):
+        """(pid, ルートウィンドウか)。ウィンドウが生きている間は変わらない"""
+        import ctypes
+        _, pid = self.win32process.GetWindowThreadProcessId(hwnd)
+        return pid, ctypes.windll.user32.GetAncestor(hwnd, 2) == hwnd    # GA_ROOT
+
+    def create_time(self, pid):
+        return self.psutil.Process(pid).create_time()
+
+    def process(self, pid):
+        """(作成時刻, 実行ファイル名)。重い"""
+        p = self.psutil.Process(pid)
+        with p.oneshot():
+            return p.create_time(), p.name()
+
+    def thumbnail(self, hwnd, w, h):
+        """ウィンドウを w x h に縮めた BGRA (h, w, 4)。PrintWindow で描かせて GDI(HALFTONE)で縮め、縮小後だけ読み出す"""
+        import ctypes, numpy as np, win32ui
+        g = self.win32gui
+        sw, sh = self.size(hwnd)
+        if sw <= 0 or sh <= 0: return None
+        hdc = g.GetWindowDC(hwnd)
+        src = win32ui.CreateDCFromHandle(hdc)
+        full, small = src.CreateCompatibleDC(), src.CreateCompatibleDC()
+        bmp, thumb = win32ui.CreateBitmap(), win32ui.CreateBitmap()
+        try:
+            bmp.CreateCompatibleBitmap(src, sw, sh)
+            thumb.CreateCompatibleBitmap(src, w, h)
+            full.SelectObject(bmp)
+            small.SelectObject(thumb)
+            if not ctypes.windll.user32.PrintWindow(hwnd, full.GetSafeHdc(), 2): return None    # PW_RENDERFULLCONTENT
+            g.SetStretchBltMode(small.GetSafeHdc(), 4)         # HALFTONE
+            small.StretchBlt((0, 0), (w, h), full, (0, 0), (sw, sh), 0x00CC0020)     # SRCCOPY
+            data = thumb.GetBitmapBits(True)
+        finally:
+            for b in (bmp, thumb): g.DeleteObject(b.GetHandle())
+            full.DeleteDC(); small.DeleteDC(); src.DeleteDC()
+            g.ReleaseDC(hwnd, hdc)
+        return np.frombuffer(data, np.uint8).reshape(h, w, 4)
+
+
+class FakeWindowProvider:
+    """テスト・ベンチマーク用。windows: {hwnd: dict(pid, title, shown, size, root)}, procs: {pid: (作成時刻, exe)}
+
+    cost に呼び出しごとの秒数を入れると time.sleep で重さを再現する。calls に呼び出し回数を数える。
+    """
+    def __init__(self, windows=None, procs=None, cost=None):
+        self.windows = {} if windows is None else windows     # 書き換えればそのまま次の refresh に反映される
+        self.procs = {} if procs is None else procs
+        self.cost = cost or {}
+        self.calls = collections.Counter()
+
+    def _call(self, name):
+        self.calls[name] += 1
+        if self.cost.get(name):
+            import time
+            time.sleep(self.cost[name])
+
+    def _win(self, hwnd):
+        w = self.windows.get(hwnd)
+        if w is None: raise OSError(f"invalid window handle {hwnd}")
+        return w
+
+    def hwnds(self):
+        self._call("hwnds")
+        return list(self.windows)
+
+    def shown(self, hwnd):
+        self._call("shown")
+        return self._win(hwnd).get("shown", True)
+
+    def title(self, hwnd):
+        self._call("title")
+        return self._win(hwnd).get("title", "")
+
+    def size(self, hwnd):
+        self._call("size")
+        return self._win(hwnd).get("size", (800, 600))
+
+    def owner(self, hwnd):
+        self._call("owner")
+        w = self._win(hwnd)
+        return w["pid"], w.get("root", True)
+
+    def create_time(self, pid):
+        self._call("create_time")
+        if pid not in self.procs: raise OSError(f"no such process {pid}")
+        return self.procs[pid][0]
+
+    def process(self, pid):
+        self._call("process")
+        if pid not in self.procs: raise OSError(f"no such process {pid}")
+        return self.procs[pid]
+
+    def thumbnail(self, hwnd, w, h):
+        """縮小済みの BGRA (h, w, 4)。ウィンドウごとの色に、呼び出すたびに動く縦線"""
+        import numpy as np
+        self._call("thumbnail")
+        self._win(hwnd)
+        img = np.empty((h, w, 4), np.uint8)
+        img[:] = (hwnd * 37 % 256, hwnd * 91 % 256, hwnd * 53 % 256, 255)
+        img[:, self.calls["thumbnail"] % w, :3] = 255
+        return img
+
+
+def fuzzy_score(query, text):
+    """query の各語が text に部分列として含まれれば点数(大きいほど良い)、含まれなければ None。
+
+    連続一致・単語の先頭での一致・前の方での一致ほど高い。大文字小文字は区別しない。
+    """
+    text = text.lower()
+    total = 0
+    for word in query.lower().split():
+        i = text.find(word)
+        if i >= 0:
+            start = i == 0 or not text[i - 1].isalnum()
+            total += 100 + 10 * len(word) + (30 if start else 0) - min(i, 50)
+            continue
+        score, pos, prev = 0, 0, -2
+        for ch in word:
+            j = text.find(ch, pos)
+            if j < 0: return None
+            if j == prev + 1: score += 10
+            if j == 0 or not text[j - 1].isalnum(): score += 8
+            score -= min(j - pos, 10)
+            prev, pos = j, j + 1
+        total += score
+    return total
+
+
+class WindowIndex:
+    """表示中のウィンドウを hwnd ごとに保持し、refresh() で差分だけ取り直す。
+
+    毎回取り直すのは EnumWindows と表示状態・タイトル(安い)だけで、pid とルート判定は hwnd ごと、
+    実行ファイル名は pid ごとにキャッシュする。pid の再利用はプロセスの作成時刻で見分ける
+    (新しい hwnd が既知の pid を指したときだけ作成時刻を確かめる)。
+    min_size / roots_only は旧版の絞り込み(極小ウィンドウ・子ウィンドウの除外)。
+    """
+    def __init__(self, provider=None, min_size=0, roots_only=False):
+        self.provider = provider or Win32WindowProvider()
+        self.min_size, self.roots_only = min_size, roots_only
+        self.windows = {}       # hwnd -> Window
+        self.order = []         # Z 順の hwnd
+        self._owners = {}       # hwnd -> (pid, ルートか)
+        self._procs = {}        # pid -> (作成時刻, exe)
+        # 統計
+        self.refreshes = 0
+        self.process_lookups = 0
+        self.process_hits = 0
+
+    def _exe(self, pid, checked):
+        p = self.provider
+        ent = self._procs.get(pid)
+        if ent is not None:
+            if pid in checked: return ent[1]
+            checked.add(pid)
+            try: alive = p.create_time(pid) == ent[0]
+            except Exception: alive = False
+            if alive:
+                self.process_hits += 1
+                return ent[1]
+        checked.add(pid)
+        self.process_lookups += 1
+        try:
+            ent = p.process(pid)
+        except Exception:
+            ent = (None, "Unknown")
+        self._procs[pid] = ent
+        return ent[1]
+
+    def _scan(self, hwnd, checked):
+        p = self.provider
+        if not p.shown(hwnd): return None
+        title = p.title(hwnd)
+        if not title.strip(): return None
+        if self.min_size:
+            w, h = p.size(hwnd)
+            if w < self.min_size or h < self.min_size: return None
+        owner = self._owners.get(hwnd)
+        if owner is None:
+            owner = self._owners[hwnd] = p.owner(hwnd)
+        pid, root = owner
+        if self.roots_only and not root: return None
+        old = self.windows.get(hwnd)
+        exe = old.exe if old is not None and old.pid == pid else self._exe(pid, checked)
+        return Window(hwnd, pid, exe, title)
+
+    def refresh(self):
+        """一覧を取り直して (追加, 削除, 変化) の hwnd リストを返す"""
+        hwnds = self.provider.hwnds()
+        checked = set()     # 今回作成時刻を確かめた pid
+        new, order = {}, []
+        for hwnd in hwnds:
+            try:
+                win = self._scan(hwnd, checked)
+            except Exception:       # 列挙中に閉じられた
+                win = None
+            if win is not None:
+                new[hwnd] = win
+                order.append(hwnd)
+        alive = set(hwnds)
+        for hwnd in [h for h in self._owners if h not in alive]:
+            del self._owners[hwnd]
+        pids = {w.pid for w in new.values()}
+        for pid in [p for p in self._procs if p not in pids]:
+            del self._procs[pid]
+        added = [h for h in order if h not in self.windows]
+        removed = [h for h in self.windows if h not in new]
+        changed = [h for h in order if h in self.windows and self.windows[h] != new[h]]
+        self.windows, self.order = new, order
+        self.refreshes += 1
+        return added, removed, changed
+
+    def list(self, unique=False):
+        """[(hwnd, exe, title)] を Z 順で。unique なら (exe, title) が同じものは最初の 1 つだけ"""
+        out, seen = [], set()
+        for hwnd in self.order:
+            w = self.windows[hwnd]
+            if unique:
+                key = (w.exe.lower(), w.title)
+                if key in seen: continue
+                seen.add(key)
+            out.append((w.hwnd, w.exe, w.title))
+        return out
+
+    def search(self, query, limit=None, unique=False):
+        """"[exe] title" にあいまい一致するものを点数順に。query が空なら list() と同じ"""
+        wins = self.list(unique)
+        if not query.strip(): return wins[:limit]
+        scored = []
+        for i, (hwnd, exe, title) in enumerate(wins):
+            s = fuzzy_score(query, f"{exe} {title}")
+            if s is not None: scored.append((-s, i, (hwnd, exe, title)))
+        scored.sort()
+        return [w for _, _, w in scored[:limit]]
+
+    def stats(self):
+        return {"windows": len(self.windows), "refreshes": self.refreshes,
+                "process_lookups": self.process_lookups, "process_hits": self.process_hits,
+                "cached_pids": len(self._procs)}
@@ -0,0 +1,165 @@
+from PyQt5 import QtCore, QtGui, QtWidgets
+from window_index import WindowIndex
+
+
+def thumb_icon(t):
+    """Thumb → QIcon(GUI スレッドで。縮小済みなので小さい)"""
+    img = t.image
+    qimg = QtGui.QImage(img.data, img.shape[1], img.shape[0], img.strides[0], QtGui.QImage.Format_RGB32)
+    return QtGui.QIcon(QtGui.QPixmap.fromImage(qimg))
+
+
+# =======================================================
+# ウィンドウ選択ダイアログ（あいまい検索＋差分更新）
+# =======================================================
+class WindowPicker(QtWidgets.QDialog):
+    """入力欄であいまい検索できるウィンドウ一覧。開いている間は interval ミリ秒ごとに
+    index.refresh() し、一覧が変わったときだけ並べ直す。選ぶと picked(hwnd, exe, title) を出す。
+
+    thumbs(ThumbnailScheduler)を渡すとサムネイルのグリッドになる。取得はそのワーカースレッドで行い、
+    ここではキャッシュにあるものをすぐ並べて、thumb_interval ミリ秒ごとに新しくなった分だけ差し替える。
+    優先して取り直すのは画面に見えている行だけで、並べ直し・スクロール・リサイズのたびに選び直す。
+    """
+    picked = QtCore.pyqtSignal(int, str, str)
+
+    def __init__(self, index=None, parent=None, title="Select window", unique=False, interval=1000,
+                 thumbs=None, thumb_interval=100):
+        super().__init__(parent)
+        self.index = index or WindowIndex()
+        self.unique = unique
+        self.thumbs = thumbs
+        self.setWindowTitle(title)
+        self.resize(480, 360)
+        self.query = QtWidgets.QLineEdit()
+        self.query.setPlaceholderText("exe / タイトルで検索")
+        self.listbox = QtWidgets.QListWidget()
+        self._rows = {}         # hwnd -> 行
+        self._seq = 0           # 反映済みのキャッシュの seq
+        if thumbs is not None:
+            tw, th = thumbs.max_size
+            lb = self.listbox
+            lb.setViewMode(QtWidgets.QListView.IconMode)
+            lb.setIconSize(QtCore.QSize(tw, th))
+            lb.setGridSize(QtCore.QSize(tw + 24, th + 44))
+            lb.setResizeMode(QtWidgets.QListView.Adjust)
+            lb.setMovement(QtWidgets.QListView.Static)
+            lb.setUniformItemSizes(True)
+            lb.setWordWrap(True)
+            blank = QtGui.QPixmap(tw, th)
+            blank.fill(QtGui.QColor(48, 48, 48))
+            self._blank = QtGui.QIcon(blank)     # まだ取れていないもの
+            self.resize(4 * (tw + 24) + 40, 3 * (th + 44) + 90)
+        btn_ok = QtWidgets.QPushButton("OK")
+        btn_cancel = QtWidgets.QPushButton("キャンセル")
+        btns = QtWidgets.QHBoxLayout()
+        btns.addWidget(btn_ok)
+        btns.addWidget(btn_cancel)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addWidget(self.query)
+        layout.addWidget(self.listbox)
+        layout.addLayout(btns)
+        self._wins = []
+        self.query.textChanged.connect(self.update_list)
+        self.query.returnPressed.connect(self.accept)
+        self.listbox.itemActivated.connect(lambda _: self.accept())
+        btn_ok.clicked.connect(self.accept)
+        btn_cancel.clicked.connect(self.reject)
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(interval)
+        self._timer.timeout.connect(self.refresh)
+        self._timer.start()
+        if thumbs is not None:
+            self._thumb_timer = QtCore.QTimer(self)
+            self._thumb_timer.setInterval(thumb_interval)
+            self._thumb_timer.timeout.connect(self.update_thumbs)
+            self._thumb_timer.start()
+            # 見えている行の選び直し(スクロール中は間引く。並べ直した直後は配置が済んでから)
+            self._targets_timer = QtCore.QTimer(self)
+            self._targets_timer.setSingleShot(True)
+            self._targets_timer.setInterval(50)
+            self._targets_timer.timeout.connect(self.update_targets)
+            self.listbox.verticalScrollBar().valueChanged.connect(lambda _: self._targets_timer.start())
+        self.refresh(force=True)
+        if thumbs is not None: thumbs.resume()
+
+    def refresh(self, force=False):
+        added, removed, changed = self.index.refresh()
+        if force or added or removed or changed:
+            self.update_list()
+
+    def update_list(self):
+        cur = self.selected()
+        self._wins = self.index.search(self.query.text(), unique=self.unique)
+        self.listbox.clear()
+        self._rows = {w[0]: i for i, w in enumerate(self._wins)}
+        for hwnd, exe, title in self._wins:
+            text = f"[{exe}] {title}"
+            if self.thumbs is None:
+                self.listbox.addItem(text)
+                continue
+            t = self.thumbs.cache.get(hwnd)
+            item = QtWidgets.QListWidgetItem(self._blank if t is None else thumb_icon(t),
+                                             text if len(text) <= 40 else text[:39] + "…")
+            item.setToolTip(text)
+            self.listbox.addItem(item)
+        if self.thumbs is not None:
+            self._seq = self.thumbs.cache.seq
+            self.update_targets()
+            self._targets_timer.start()
+        rows = [i for i, w in enumerate(self._wins) if cur and w[0] == cur[0]]
+        if self._wins: self.listbox.setCurrentRow(rows[0] if rows else 0)
+
+    def visible_hwnds(self):
+        """一覧のうち、いま画面(ビューポート)に見えている行の hwnd(上から順)"""
+        lb = self.listbox
+        vp = lb.viewport().rect()
+        out = []
+        for row, (hwnd, _, _) in enumerate(self._wins):
+            r = lb.visualItemRect(lb.item(row))
+            if r.intersects(vp): out.append(hwnd)
+            elif out and r.top() > vp.bottom(): break      # 見えている範囲を過ぎた
+        return out
+
+    def update_targets(self):
+        if self.thumbs is not None:
+            self.thumbs.set_targets(self.index.order, self.visible_hwnds())
+
+    def resizeEvent(self, e):
+        super().resizeEvent(e)
+        if self.thumbs is not None: self._targets_timer.start()
+
+    def update_thumbs(self):
+        """キャッシュで新しくなったサムネイルだけアイコンを差し替える"""
+        seq = self._seq
+        for t in self.thumbs.cache.changed(seq):
+            seq = max(seq, t.seq)
+            row = self._rows.get(t.hwnd)
+            if row is not None: self.listbox.item(row).setIcon(thumb_icon(t))
+        self._seq = seq
+
+    def selected(self):
+        i = self.listbox.currentRow()
+        return self._wins[i] if 0 <= i < len(self._wins) else None
+
+    def _stop(self):
+        self._timer.stop()
+        if self.thumbs is not None:
+            self._thumb_timer.stop()
+            self.thumbs.pause()     # キャッシュは残るので次に開いたときはすぐ並ぶ
+
+    def accept(self):
+        sel = self.selected()
+        if sel is None: return
+        self._stop()
+        self.picked.emit(*sel)
+        super().accept()
+
+    def reject(self):
+        self._stop()
+        super().reject()
+
+
+def pick_window(index=None, parent=None, title="Select window", unique=False, thumbs=None):
+    """モーダルで 1 つ選ばせて (hwnd, exe, title) を返す。キャンセルなら None"""
+    dlg = WindowPicker(index, parent, title, unique, thumbs=thumbs)
+    return dlg.selected() if dlg.exec_() == QtWidgets.QDialog.Accepted else None